@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Django2.settings')
+os.environ.setdefault('DJANGO_SERVIDOR', 'asgi')
+# Indica às settings (settings.ASGI) que as views assíncronas de core/views_async.py devem ser usadas.
+# Em produção este módulo é servido pelo gunicorn com workers do uvicorn (veja gunicorn_asgi.conf.py).
 
 application = get_asgi_application()
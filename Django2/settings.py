@@ -48,12 +48,53 @@ DATABASES = {
         # Tempo máximo (em segundos) que a conexão com o banco pode permanecer aberta e reutilizada.
         # Usado para melhorar a performance evitando abrir uma conexão a cada requisição.
 
+        conn_health_checks = True,
+        # Antes de reutilizar uma conexão persistente em uma nova requisição, o Django verifica se ela ainda responde
+        # (pre-ping) e, se o banco a derrubou (reinício, timeout de ociosidade), abre outra em vez de falhar a requisição.
+
         ssl_require = False
         # Define se a conexão com o banco de dados requer SSL.
         # False significa que a conexão não usará criptografia SSL.
     )
 }
 
+BANCO_POOL = os.environ.get('BANCO_POOL', 'FALSE') == 'TRUE'
+# Com TRUE e PostgreSQL com psycopg 3, as conexões passam a vir de um pool por processo (psycopg_pool, via OPTIONS['pool']),
+# compartilhado pelas threads do processo, em vez de uma conexão persistente por thread.
+# Nos demais bancos (MySQL) o ajuste não tem efeito: ficam as conexões persistentes com verificação de saúde acima.
+
+BANCO_POOL_MIN = int(os.environ.get('BANCO_POOL_MIN', 1))
+# Conexões mantidas abertas no pool mesmo sem uso.
+
+BANCO_POOL_MAX = int(os.environ.get('BANCO_POOL_MAX', 4))
+# Limite de conexões do pool por processo. Multiplicado pelo número de workers, não deve passar do max_connections do banco.
+
+BANCO_POOL_VIDA_MAXIMA = int(os.environ.get('BANCO_POOL_VIDA_MAXIMA', 30 * 60))
+# Segundos após os quais uma conexão do pool é fechada e substituída (libera memória do servidor e acompanha failovers).
+
+BANCO_POOL_OCIOSA_MAXIMA = int(os.environ.get('BANCO_POOL_OCIOSA_MAXIMA', 4 * 60))
+# Segundos após os quais uma conexão ociosa acima de BANCO_POOL_MIN é fechada (antes que o banco ou um proxy a derrube).
+
+BANCO_POOL_ESPERA = float(os.environ.get('BANCO_POOL_ESPERA', 10))
+# Segundos que uma requisição espera por uma conexão livre antes de falhar com PoolTimeout.
+
+if BANCO_POOL and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    from psycopg_pool import ConnectionPool
+
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    # O Django não aceita conexões persistentes junto com o pool: a "persistência" passa a ser do pool.
+
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': BANCO_POOL_MIN,
+        'max_size': BANCO_POOL_MAX,
+        'max_lifetime': BANCO_POOL_VIDA_MAXIMA,
+        'max_idle': BANCO_POOL_OCIOSA_MAXIMA,
+        'timeout': BANCO_POOL_ESPERA,
+        'check': ConnectionPool.check_connection,
+        # Verificação de saúde (pre-ping) de cada conexão ao sair do pool: conexões mortas são descartadas e substituídas.
+    }
+    # As estatísticas do pool de cada processo são exportadas em /metrics (veja core/instrumentacao.py).
+
 # Construção do caminho absoluto para a raiz do projeto
 BASE_DIR = Path(__file__).resolve().parent.parent
 # BASE_DIR será um objeto Path que representa o diretório dois níveis acima deste arquivo settings.py,
@@ -110,9 +151,14 @@ INSTALLED_APPS = [
 # Lista de aplicações Django e apps externos que estão ativados neste projeto.
 # Cada string é o caminho do módulo do app, que será carregado automaticamente pelo Django.
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    INSTALLED_APPS.append('django.contrib.postgres')
+    # Registra os lookups do pg_trgm (trigram_word_similar), usados pela busca de produtos (core/busca.py).
+
 MIDDLEWARE = [
+    'core.instrumentacao.MedicaoMiddleware',                       # Mede SQL, templates e armazenamento de cada requisição.
     'django.middleware.security.SecurityMiddleware',               # Aplica medidas básicas de segurança.
-    'whitenoise.middleware.WhiteNoiseMiddleware',                  # Serve arquivos estáticos no ambiente de produção.
+    'whitenoise.middleware.WhiteNoiseMiddleware',                  # Serve arquivos estáticos sob WSGI (retirado sob ASGI; veja MIDDLEWARE_SOMENTE_WSGI).
     'django.contrib.sessions.middleware.SessionMiddleware',        # Gerencia o ciclo de vida da sessão HTTP.
     'django.middleware.common.CommonMiddleware',                   # Middleware para tarefas comuns (como redirecionamento).
     'django.middleware.csrf.CsrfViewMiddleware',                   # Proteção contra ataques CSRF.
@@ -122,6 +168,27 @@ MIDDLEWARE = [
 ]
 # Configuração dos middlewares - componentes que processam a requisição/resposta.
 # Eles atuam antes das views e depois para tarefas como segurança, sessão e mensagens.
+# O MedicaoMiddleware (core/instrumentacao.py) é o primeiro para que o tempo total da requisição inclua todos os demais.
+
+METRICAS_SERVER_TIMING = True
+# Acrescenta às respostas o cabeçalho Server-Timing com o tempo gasto em SQL, templates e armazenamento (veja core/instrumentacao.py).
+
+METRICAS_LENTA_MS = int(os.environ.get('METRICAS_LENTA_MS', 500))
+# Duração (em milissegundos) a partir da qual uma requisição é considerada lenta: ela é contada em
+# django2_requisicoes_lentas_total e pode ser registrada no log com o detalhamento do tempo.
+
+METRICAS_AMOSTRAGEM_LENTAS = float(os.environ.get('METRICAS_AMOSTRAGEM_LENTAS', 1.0))
+# Fração (de 0 a 1) das requisições lentas registradas no log. Sob muitas requisições lentas, um valor menor evita
+# que o próprio log vire um problema.
+
+METRICAS_DIRETORIO = os.environ.get('METRICAS_DIRETORIO', os.path.join(tempfile.gettempdir(), 'django2-metricas'))
+METRICAS_INTERVALO = 5
+# Cada processo do gunicorn grava os seus totais em um arquivo de METRICAS_DIRETORIO no máximo a cada METRICAS_INTERVALO
+# segundos; a view /metrics soma os arquivos de todos os processos.
+
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN')
+# Com um token definido, /metrics exige o cabeçalho "Authorization: Bearer <token>" (configurado no Prometheus).
+# Sem token, /metrics só responde a requisições da própria máquina.
 
 ROOT_URLCONF = 'Django2.urls'
 # Indica o módulo de configuração principal das URLs do projeto.
@@ -144,19 +211,162 @@ TEMPLATES = [
 # Context processors injetam variáveis globais em todos os templates, facilitando uso em layouts.
 
 PICTURES = {
-    "BREAKPOINTS": {'thumb': 200, "mobile": 576, "tablet": 768, "desktop": 992},
+    "BREAKPOINTS": {'thumb': 200, "mobile": 576, "desktop": 992},
     "GRID_COLUMNS": 12,
     "CONTAINER_WIDTH": 1200,
-    "FILE_TYPES": ["WEBP", "JPG", "JPEG", "BMP", "PNG"],
+    "FILE_TYPES": ["AVIF", "WEBP", "JPEG"],
     "PIXEL_DENSITIES": [1, 2],
-    "USE_PLACEHOLDERS": True,
+    "USE_PLACEHOLDERS": DEBUG,
+    "PROCESSOR": "core.tasks.enfileirar_versoes",
+    "PICTURE_CLASS": "core.versoes.VersaoPillow",
 }
 # Configurações específicas para a biblioteca 'pictures' (galeria/imagens).
 # Define tamanhos responsivos, tipos aceitos e uso de placeholders para carregamento progressivo.
+# BREAKPOINTS e FILE_TYPES são os mesmos declarados em Produto.imagem (o campo é quem vale para as imagens de produto);
+# mantê-los iguais evita que outro PictureField, ou o prune_pictures, parta de uma matriz de versões diferente.
+# Os placeholders (imagens geradas na hora, servidas por pictures.urls) só são usados em desenvolvimento:
+# em produção o srcset da tag imagem_responsiva (core/templatetags/imagens.py) precisa apontar para as versões reais.
+# PROCESSOR troca a geração das versões redimensionadas dentro da requisição por uma fila local (core/tasks.py),
+# consumida em segundo plano pelo comando `python manage.py process_pictures`.
+# PICTURE_CLASS troca a codificação das versões pela de core/versoes.py (qualidade por formato e breakpoint).
+# FILE_TYPES vai do formato mais compacto ao mais compatível: o navegador usa o primeiro <source> cujo tipo suporta
+# (AVIF, depois WebP) e o JPEG serve de alternativa para os demais. O AVIF só é gerado e oferecido se o Pillow o suportar.
+
+PRODUTO_IMAGEM_QUALIDADE = {
+    'thumb': {'AVIF': 60, 'WEBP': 82, 'JPEG': 85},
+    'mobile': {'AVIF': 55, 'WEBP': 78, 'JPEG': 82},
+    'desktop': {'AVIF': 50, 'WEBP': 75, 'JPEG': 80},
+}
+# Qualidade de codificação das versões de imagens de produto, por breakpoint de Produto.imagem e formato (veja core/versoes.py).
+# Cada versão usa a linha do menor breakpoint que comporta a sua largura. As escalas não são comparáveis entre formatos:
+# AVIF 50-60 equivale, a olho, a WebP 75-82 e a JPEG 80-85, com arquivos bem menores.
+# `python manage.py benchmark_image_formats` mede o tamanho e o tempo de codificação de cada formato nas imagens atuais.
+
+PRODUTO_IMAGEM_MAX_BYTES = 25 * 1024 * 1024
+# Tamanho máximo (em bytes) de uma imagem de produto enviada em partes (veja core/envios.py).
+
+PRODUTO_IMAGEM_MAX_LADO = 10000
+# Largura/altura máxima (em pixels) aceita para uma imagem de produto. É verificada pelo cabeçalho do arquivo,
+# logo nas primeiras partes do envio, antes de o restante do arquivo ser recebido.
+
+ENVIO_MAX_PARTE_BYTES = 8 * 1024 * 1024
+# Tamanho máximo de cada parte (requisição PATCH) de um envio em partes.
+
+ENVIO_VALIDADE = 60 * 60 * 24
+# Segundos sem alteração depois dos quais um envio em partes é considerado abandonado e apagado, com as suas partes
+# (veja expirar_envios, em core/envios.py, chamada pelo comando sweep_reservations).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'django2-default',
+    },
+    'catalogo': {
+        'BACKEND': os.environ.get(
+            'CATALOGO_CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache' if RENDER else 'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.environ.get(
+            'CATALOGO_CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'django2-catalogo') if RENDER else 'django2-catalogo',
+        ),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+# Configuração dos caches do Django.
+# 'default' é o cache genérico, usado pelo próprio Django e por bibliotecas de terceiros.
+# 'catalogo' guarda as páginas e os fragmentos HTML da listagem de produtos (veja core/cache_catalogo.py).
+# Em produção usamos o cache em arquivos (FileBasedCache): ele é compartilhado pelos vários processos do gunicorn
+# (WEB_CONCURRENCY no render.yaml), de modo que a invalidação feita por um processo vale para todos.
+# Localmente usamos o cache em memória (LocMemCache), que dispensa qualquer configuração.
+# Ambos podem ser trocados pelas variáveis de ambiente CATALOGO_CACHE_BACKEND e CATALOGO_CACHE_LOCATION
+# (por exemplo, para usar Redis ou Memcached sem alterar o código).
+
+CATALOGO_CACHE_TIMEOUT = 60 * 15
+# Tempo máximo (em segundos) que uma página ou fragmento do catálogo permanece em cache.
+# A invalidação pelos signals de Produto é imediata; o timeout é apenas uma rede de segurança para alterações feitas
+# sem passar pelos signals (por exemplo, QuerySet.update()).
+
+CATALOGO_ITENS_POR_PAGINA = 20
+# Quantidade padrão de produtos exibidos por página na listagem (view index).
+
+CATALOGO_MAX_ITENS_POR_PAGINA = 100
+# Limite superior para o parâmetro '?tamanho=' da listagem, evitando que um cliente peça o catálogo inteiro de uma vez.
+
+CATALOGO_FAIXAS_DE_PRECO = [50, 100, 250, 500, 1000]
+# Limites (em reais) das faixas de preço da faceta de preço: abaixo de 50, de 50 a 100, ..., 1000 ou mais (core/facetas.py).
+# Depois de alterá-los, recalcule as contagens com `python manage.py rebuild_facets`.
+
+BUSCA_MAX_RESULTADOS = 500
+# Quantidade máxima de produtos considerados por uma busca (view busca); páginas além desse limite ficam vazias.
+# Os resultados são ordenados por relevância, então as últimas páginas raramente interessam e só encareceriam a consulta.
+
+BUSCA_SUGESTOES = 8
+# Quantidade de sugestões devolvidas pelo autocompletar (view sugestoes).
+
+BUSCA_MINIMO_SUGESTOES = 2
+# Quantidade mínima de caracteres digitados para o autocompletar sugerir produtos.
+
+BUSCA_SUGESTOES_TIMEOUT = 60 * 15
+# Segundos durante os quais as sugestões de um termo ficam no cache 'catalogo'. Qualquer alteração de produto as invalida
+# antes disso (veja core/busca.py).
+
+ADMIN_CONTAGEM_EXATA_ATE = 10000
+# Quantidade de linhas (estimada pelas estatísticas do banco) até a qual a listagem de produtos do admin conta os resultados
+# com COUNT(*). Acima dela, a contagem e a paginação usam a estimativa (veja PaginadorEstimado, em core/pagination.py).
+
+ESTOQUE_RESERVA_VALIDADE = 60 * 15
+# Segundos durante os quais uma reserva de estoque não confirmada segura os itens (core/estoque.py). Depois disso, o comando
+# `python manage.py sweep_reservations` a marca como expirada e devolve os itens ao estoque.
+
+SERVICOS_EM_SEGUNDO_PLANO = [
+    ['process_pictures'],
+    ['send_outbox'],
+    ['import_products', '--fila'],
+    ['sweep_reservations'],
+]
+# Comandos (argumentos de manage.py) que rodam em segundo plano ao lado do servidor web, supervisionados pelo comando
+# `python manage.py run_services` (veja render.yaml): a fila de imagens, a caixa de saída de e-mails, as importações
+# enviadas pelo admin e a varredura das reservas de estoque expiradas e dos envios de imagem abandonados.
+
+PRODUTO_CACHE_MAX_AGE = 60
+# Segundos durante os quais navegadores e CDNs podem reutilizar a página de detalhe de um produto sem consultar o servidor.
+# Depois disso a cópia é revalidada com If-None-Match / If-Modified-Since e, se o produto não mudou, a resposta é um 304 vazio.
+
+PRODUTO_VERSOES_SOB_DEMANDA = os.environ.get('PRODUTO_VERSOES_SOB_DEMANDA', 'TRUE') == 'TRUE'
+# Com True, as versões redimensionadas das imagens de produto são geradas apenas quando um navegador as pede pela primeira vez
+# (veja core/versoes.py), em vez de toda a matriz de versões ser gerada pela fila a cada imagem salva.
+# Assim o disco, o GCS e a CPU acompanham as versões realmente usadas. Com FALSE, volta a geração antecipada pela fila.
+
+PRODUTO_VERSAO_CACHE_MAX_AGE = 24 * 60 * 60
+# Segundos durante os quais o navegador reutiliza o redirecionamento de /imagens/... para o arquivo da versão.
+# O nome das versões deriva do hash do original (core/armazenamento.py), portanto o destino não muda.
+
+MIDIA_URLS_ASSINADAS = os.environ.get('MIDIA_URLS_ASSINADAS', 'FALSE' if DEBUG else 'TRUE') == 'TRUE'
+# Com True, as URLs das imagens de produto são assinadas (V4) com GS_CREDENTIALS, como o GoogleCloudStorage faz por padrão;
+# com FALSE (bucket público ou desenvolvimento), são simplesmente MEDIA_URL + o nome do arquivo.
+# Em ambos os casos as URLs são montadas por core/enderecos.py sem chamar o armazenamento.
+
+MIDIA_URL_JANELA = 60 * 60
+# Segundos durante os quais uma URL assinada é reaproveitada em cada processo; todas as URLs da janela expiram GS_EXPIRATION
+# depois do início dela. Deve ser bem menor que GS_EXPIRATION (1 dia por padrão), a validade das URLs.
 
 WSGI_APPLICATION = 'Django2.wsgi.application'
 # Definição da aplicação WSGI (interface entre o Django e o servidor web).
 
+ASGI = os.environ.get('DJANGO_SERVIDOR') == 'asgi'
+# True quando o projeto é carregado por Django2/asgi.py (que define DJANGO_SERVIDOR=asgi).
+# Nesse caso core/urls.py usa as views assíncronas de core/views_async.py no lugar das síncronas de core/views.py.
+
+MIDDLEWARE_SOMENTE_WSGI = ['whitenoise.middleware.WhiteNoiseMiddleware']
+# Middlewares que só funcionam de forma síncrona (async_capable = False). Sob ASGI, um único middleware síncrono obriga o
+# Django a adaptar cada requisição com sync_to_async(thread_sensitive = True): as views assíncronas de um worker passam a
+# rodar uma de cada vez, e o ASGI fica mais lento que o WSGI. Por isso eles são retirados de MIDDLEWARE sob ASGI.
+# O WhiteNoise não faz falta lá: em produção os arquivos estáticos são servidos pelo bucket (veja upload_static).
+
+if ASGI:
+    MIDDLEWARE = [middleware for middleware in MIDDLEWARE if middleware not in MIDDLEWARE_SOMENTE_WSGI]
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},  # Previne senhas similares a atributos do usuário.
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},            # Exige comprimento mínimo da senha.
@@ -262,12 +472,7 @@ if not DEBUG:
             },
         },
         "staticfiles": {
-            "BACKEND": "storages.backends.gcloud.GoogleCloudStorage",
-            "OPTIONS": {
-                "bucket_name": GS_BUCKET_NAME,
-                "credentials": GS_CREDENTIALS,
-                "location": "static",
-            },
+            "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
         },
     }
     # Configuração que o Django usa para definir como e onde ele vai armazenar arquivos — principalmente arquivos estáticos (CSS, JS, imagens do layout)
@@ -291,10 +496,9 @@ if not DEBUG:
     # Quando o Django salva um arquivo de mídia (por exemplo, um upload de imagem),
     # ele usará esse backend para enviar o arquivo para o bucket configurado no GCS, ao invés de salvar localmente no disco do servidor.
 
-    STATICFILES_STORAGE = 'storages.backends.gcloud.GoogleCloudStorage'
-    # Define qual backend será usado para armazenar e servir os arquivos estáticos (CSS, JavaScript, imagens fixas usadas pelo site).
-    # Também aponta para o backend do GCS. Isso indica que, quando você executar o comando collectstatic do Django,
-    # os arquivos estáticos serão enviados para o bucket no Google Cloud, ao invés de serem guardados localmente.
+    # Os arquivos estáticos não são gravados direto no bucket: o collectstatic os grava em STATIC_ROOT, com hash do conteúdo
+    # no nome e versões comprimidas (veja STORAGES["staticfiles"] abaixo), e o comando `python manage.py upload_static`
+    # envia ao bucket apenas os arquivos com hash que ainda não estão lá (veja build.sh).
 
 else:
     STATIC_URL = '/static/'
@@ -303,10 +507,6 @@ else:
     MEDIA_URL = '/media/'
     # Define a URL base para acessar arquivos de mídia (uploads de usuários) localmente.
 
-    STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
-    # Diretório local no servidor onde o comando collectstatic vai reunir todos os arquivos estáticos do projeto.
-    # Em ambiente local, o Django coleta todos os arquivos estáticos (de apps e pastas STATICFILES_DIRS) e os coloca nessa pasta para serem servidos pelo servidor local.
-
     MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
     # Diretório local onde o Django salva os arquivos de mídia (uploads de usuários) quando você está rodando o projeto localmente.
     # Para desenvolvimento local, onde normalmente não se usa armazenamento em nuvem, mas salva arquivos no disco do próprio computador.
@@ -321,14 +521,30 @@ else:
     # Ao invés de enviar para o Google Cloud Storage, o Django vai salvar os arquivos no diretório local definido por MEDIA_ROOT.
     # Esse é o comportamento padrão do Django quando você não configura nada relacionado a armazenamento em nuvem.
 
-    STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
-    # Backend padrão para lidar com arquivos estáticos (CSS, JS, imagens do site).
-    # Ao rodar python manage.py collectstatic, todos os arquivos estáticos serão reunidos no diretório local STATIC_ROOT.    #
-    # Eles não serão enviados para um bucket em nuvem.
-    # Esse backend apenas cuida de copiar e organizar os arquivos localmente para que o servidor de desenvolvimento ou um servidor web (como Nginx) possa servi-los.
+    STORAGES = {
+        "default": {
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+        },
+        "staticfiles": {
+            "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+        },
+    }
+    # Os arquivos de mídia ficam em MEDIA_ROOT; os estáticos usam o mesmo armazenamento da produção (veja abaixo).
+    # Com DEBUG = True, a tag {% static %} devolve os nomes originais, sem hash, e o collectstatic não é necessário.
 
 # ---------- FIM DA CONFIGURAÇÃO CONDICIONAL PARA AMBIENTES ----------
 
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+# Diretório local no servidor onde o comando collectstatic vai reunir todos os arquivos estáticos do projeto, nos dois ambientes.
+# Em ambiente local, o Django coleta todos os arquivos estáticos (de apps e pastas STATICFILES_DIRS) e os coloca nessa pasta para serem servidos pelo servidor local.
+# O armazenamento CompressedManifestStaticFilesStorage, do WhiteNoise:
+# 1) grava cada arquivo também com o hash do conteúdo no nome (css/styles.3f2a9c1b7e04.css) e o manifesto staticfiles.json,
+#    que a tag {% static %} consulta em memória, sem acessar o armazenamento (antes, no GCS, cada {% static %} montava e
+#    assinava uma URL); como o nome muda sempre que o conteúdo muda, o arquivo pode ficar em cache para sempre;
+# 2) grava versões pré-comprimidas de cada arquivo de texto: .gz e, se o pacote Brotli estiver instalado, .br.
+# O WhiteNoise serve os arquivos com hash com Cache-Control: max-age de 10 anos e immutable, escolhendo a versão comprimida
+# conforme o Accept-Encoding; no GCS, o comando upload_static grava os mesmos cabeçalhos.
+
 # Comentários adicionais:
 # Ao executar o comando 'python manage.py collectstatic', o Django irá coletar
 # os arquivos estáticos de todos os apps instalados e também de STATICFILES_DIRS
@@ -344,3 +560,9 @@ EMAIL_HOST_USER = 'no-reply@seudominio.com'
 """
 # Configurações de email, atualmente comentadas.
 # Servem para enviar emails via servidor SMTP, como confirmação de cadastro, reset de senha, etc.
+
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+# Servidor SMTP usado pelo comando send_outbox para entregar a caixa de saída (core/caixa_saida.py).
+# Os valores padrão são os mesmos do Django; as variáveis de ambiente permitem apontar para outro servidor,
+# por exemplo um servidor SMTP local de testes (`python -m aiosmtpd -n -l localhost:1025` e EMAIL_PORT=1025).
@@ -18,11 +18,24 @@ echo "Coletando arquivos estáticos"
 # Essa ação consolida arquivos CSS, JS, imagens e outros recursos em um único local para serem servidos no ambiente de produção.
 python manage.py collectstatic --noinput
 # O parâmetro --noinput previne que o comando pause pedindo confirmação.
+# Os arquivos são gravados com o hash do conteúdo no nome, com o manifesto staticfiles.json e com versões .gz/.br
+# pré-comprimidas (armazenamento CompressedManifestStaticFilesStorage do WhiteNoise; veja STATIC_ROOT em settings.py).
+
+echo "Enviando arquivos estáticos ao bucket GCS"
+python manage.py upload_static
+# Envia ao bucket apenas os arquivos com hash que ainda não estão lá, com Cache-Control: immutable (e comprimidos com gzip).
 
 echo "Carregando dados iniciais"
 # Carrega dados fixos iniciais no banco a partir de um arquivo JSON
-python manage.py loaddata backup.json
+python manage.py load_catalog backup.json
 # Útil para importar fixtures com dados essenciais, como categorias, configurações, ou usuários base.
+# O comando load_catalog (core/carga.py) lê o arquivo em streaming e grava os produtos em lotes; produtos que não mudaram
+# desde o último deploy são ignorados, de modo que o tempo e a memória do build não crescem com o tamanho do catálogo.
+
+echo "Conferindo as contagens das facetas"
+python manage.py rebuild_facets
+# Recalcula o cubo das facetas (core/facetas.py) com uma única consulta agrupada e só grava se algo mudou. Corrige bancos
+# migrados antes de a migração 0014 preencher o cubo e qualquer divergência deixada por alterações fora dos signals.
 
 echo "Sincronizando mídia com bucket GCS"
 # Comando customizado que sincroniza a pasta local media com o bucket do Google Cloud Storage
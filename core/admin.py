@@ -1,8 +1,209 @@
 # Esse código configura como o modelo Produto será exibido na interface de administração do Django (/admin).
+from django.conf import settings
 from django.contrib import admin # Importa o módulo de administração do Django, que permite registrar e personalizar modelos no painel administrativo.
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.html import format_html
 
-from .models import Produto # Importa o modelo Produto do arquivo models.py da mesma aplicação.
+from .estoque import liberar
+from .facetas import TITULOS, contagens, filtrar, ler_filtros
+from .pagination import VAR_ANTES, VAR_DEPOIS, PaginadorEstimado
+from .versoes import menor_versao, url_sob_demanda
+from .enderecos import url_midia
+from .importacao import linhas_exportacao
+from .models import ImagemConteudo, ImportacaoProdutos, ItemReserva, MensagemEmail, Produto, Reserva, TarefaImagem, VersaoImagem # Importa os modelos do arquivo models.py da mesma aplicação.
+
+# Os filtros a seguir são as facetas da listagem (veja core/facetas.py) na barra lateral do admin.
+# As quantidades exibidas ao lado de cada opção vêm do cubo de contagens, e não de um COUNT(*) por opção;
+# elas consideram as demais facetas escolhidas, mas não a caixa de pesquisa do admin.
+class FiltroFaceta(admin.SimpleListFilter):
+    def lookups(self, request, model_admin):
+        filtros = ler_filtros(request.GET)
+        faceta, = contagens(filtros, [self.parameter_name])
+        return [(opcao['valor'], f"{opcao['rotulo']} ({opcao['quantidade']})") for opcao in faceta['opcoes']]
+
+    def queryset(self, request, queryset):
+        filtros = ler_filtros({self.parameter_name: self.value()})
+        return filtrar(queryset, filtros)
+
+class FiltroPreco(FiltroFaceta):
+    title = TITULOS['preco']
+    parameter_name = 'preco'
+
+class FiltroEstoque(FiltroFaceta):
+    title = TITULOS['estoque']
+    parameter_name = 'estoque'
+
+class FiltroAtivo(FiltroFaceta):
+    title = TITULOS['ativo']
+    parameter_name = 'ativo'
+
+# A listagem de produtos do admin foi preparada para catálogos com centenas de milhares de produtos:
+# 1) o total vem das estatísticas do banco acima de ADMIN_CONTAGEM_EXATA_ATE linhas, e as páginas são lidas por cursor,
+#    descendo pelo índice da ordenação até a posição do último item exibido, sem OFFSET (veja PaginadorEstimado, em
+#    core/pagination.py, e o template admin/core/produto/pagination.html, com os links "Anterior" e "Próxima");
+#    show_full_result_count = False dispensa o segundo COUNT(*), o do total sem filtros;
+# 2) só é possível ordenar pelas colunas com índice (nome, slug e data de criação, além do id, a ordem padrão);
+# 3) as linhas trazem apenas as colunas exibidas (only), e a miniatura é a menor versão da imagem, e não o original.
+CAMPOS_DA_LISTAGEM = ('nome', 'preco', 'estoque', 'slug', 'criado', 'modificado', 'ativo', 'imagem', 'image_width', 'image_height')
+
+class ListagemProdutos(ChangeList):
+    def get_filters_params(self, params = None):
+        # Os cursores não são filtros: sem isto, o admin tentaria filtrar os produtos por um campo 'depois'.
+        parametros = super().get_filters_params(params)
+        for nome in (VAR_DEPOIS, VAR_ANTES):
+            parametros.pop(nome, None)
+        return parametros
+
+    def get_query_string(self, new_params = None, remove = None):
+        # Os links de ordenação, filtros e busca voltam à primeira página: o cursor só vale para a ordem e os filtros em que foi gerado.
+        return super().get_query_string(new_params, [*(remove or ()), VAR_DEPOIS, VAR_ANTES])
+
+    def get_queryset(self, request, exclude_parameters = None):
+        return super().get_queryset(request, exclude_parameters).only(*CAMPOS_DA_LISTAGEM)
+
+    def get_results(self, request):
+        super().get_results(request)
+        # Links "Anterior" e "Próxima" da paginação por cursor; o número da página na URL serve só para exibição.
+        pagina = getattr(self.paginator, 'pagina_atual', None)
+        self.url_primeira = self.get_query_string({PAGE_VAR: None}) if self.page_num > 1 else None
+        self.url_anterior = pagina and pagina.anterior and self.get_query_string({PAGE_VAR: max(self.page_num - 1, 1), VAR_ANTES: pagina.anterior})
+        self.url_proxima = pagina and pagina.proximo and self.get_query_string({PAGE_VAR: self.page_num + 1, VAR_DEPOIS: pagina.proximo})
+        miniaturas = _miniaturas(self.result_list)
+        for produto in self.result_list: # Avalia a consulta da página uma vez; o template percorre os mesmos objetos.
+            produto._miniatura = miniaturas.get(produto.pk)
+
+def _miniaturas(produtos):
+    # URLs das miniaturas dos `produtos` de uma página: {id do produto: URL}, com uma única consulta para todos eles.
+    # Com as versões geradas pela fila (core/tasks.py), as imagens com tarefas abertas ficam sem miniatura até a fila concluir;
+    # com as versões sob demanda (core/versoes.py), uma miniatura ainda não gerada é gerada no primeiro pedido (é a menor versão).
+    versoes = {}
+    for produto in produtos:
+        if produto.imagem and produto.image_width and produto.image_height:
+            versao = menor_versao(produto.imagem.name, produto.image_width, produto.image_height)
+            if versao:
+                versoes[produto.pk] = versao
+    if not versoes:
+        return {}
+    if settings.PRODUTO_VERSOES_SOB_DEMANDA:
+        prontas = set(VersaoImagem.objects.filter(nome__in = [v.name for v in versoes.values()], pronta = True).values_list('nome', flat = True))
+        return {pk: url_midia(v.name) if v.name in prontas else url_sob_demanda(v) for pk, v in versoes.items()}
+    pendentes = set(TarefaImagem.objects.filter(
+        arquivo__in = [v.parent_name for v in versoes.values()], estado__in = TarefaImagem.ESTADOS_ABERTOS).values_list('arquivo', flat = True))
+    return {pk: url_midia(v.name) for pk, v in versoes.items() if v.parent_name not in pendentes}
 
 @admin.register(Produto) # Esse é um decorator que registra diretamente o modelo Produto no admin
 class ProdutoAdmin(admin.ModelAdmin): # Cria uma classe de configuração para o admin do modelo Produto. Essa classe herda de admin.ModelAdmin, que permite customizar como os dados aparecem no painel de administração.
-    list_display = ('nome', 'preco', 'estoque', 'slug', 'criado', 'modificado', 'ativo') # Define quais campos serão exibidos na tabela de listagem de produtos no admin.
+    list_display = ('miniatura', 'nome', 'preco', 'estoque', 'slug', 'criado', 'modificado', 'ativo') # Define quais campos serão exibidos na tabela de listagem de produtos no admin.
+    list_display_links = ('nome',)
+    sortable_by = ('nome', 'slug', 'criado')
+    paginator = PaginadorEstimado
+    show_full_result_count = False
+    list_filter = (FiltroPreco, FiltroEstoque, FiltroAtivo)
+    show_facets = admin.ShowFacets.NEVER
+    # As quantidades já estão nos rótulos dos filtros; as facetas do próprio Django fariam um COUNT por opção.
+    actions = ['exportar_csv', 'exportar_jsonl']
+
+    def get_changelist(self, request, **kwargs):
+        return ListagemProdutos
+
+    def get_paginator(self, request, queryset, per_page, orphans = 0, allow_empty_first_page = True):
+        return self.paginator(queryset, per_page, orphans, allow_empty_first_page,
+                              depois = request.GET.get(VAR_DEPOIS), antes = request.GET.get(VAR_ANTES))
+
+    @admin.display(description = 'Imagem')
+    def miniatura(self, produto):
+        url = getattr(produto, '_miniatura', None)
+        if not url:
+            return '-'
+        return format_html('<img src = "{}" alt = "" width = "50" height = "50" loading = "lazy">', url)
+
+    # As exportações são enviadas em streaming (veja core/importacao.py): o arquivo é gerado enquanto é baixado,
+    # sem montar a resposta inteira na memória, mesmo com milhares de produtos selecionados.
+    def _exportar(self, queryset, formato, tipo):
+        response = StreamingHttpResponse(linhas_exportacao(queryset, formato), content_type = tipo)
+        response['Content-Disposition'] = f'attachment; filename="produtos.{formato}"'
+        return response
+
+    @admin.action(description = 'Exportar os produtos selecionados (CSV)')
+    def exportar_csv(self, request, queryset):
+        return self._exportar(queryset, 'csv', 'text/csv; charset=utf-8')
+
+    @admin.action(description = 'Exportar os produtos selecionados (JSONL)')
+    def exportar_jsonl(self, request, queryset):
+        return self._exportar(queryset, 'jsonl', 'application/jsonl; charset=utf-8')
+
+@admin.register(TarefaImagem) # Permite acompanhar pelo admin a fila de geração das versões das imagens (veja core/tasks.py).
+class TarefaImagemAdmin(admin.ModelAdmin):
+    list_display = ('arquivo', 'estado', 'tentativas', 'proxima_tentativa', 'criado', 'modificado')
+    list_filter = ('estado',)
+    readonly_fields = ('armazenamento', 'arquivo', 'novas', 'antigas', 'tentativas', 'erro', 'criado', 'modificado')
+
+@admin.register(ImagemConteudo) # Contagem de referências das imagens endereçadas por conteúdo (veja core/armazenamento.py); somente leitura.
+class ImagemConteudoAdmin(admin.ModelAdmin):
+    list_display = ('arquivo', 'referencias', 'largura', 'altura', 'criado')
+    readonly_fields = ('arquivo', 'referencias', 'largura', 'altura', 'criado')
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(MensagemEmail) # Permite acompanhar a caixa de saída de e-mails (veja core/caixa_saida.py) e reenviar mensagens que falharam.
+class MensagemEmailAdmin(admin.ModelAdmin):
+    list_display = ('assunto', 'destinatarios', 'estado', 'tentativas', 'criado', 'enviado')
+    list_filter = ('estado',)
+    readonly_fields = ('tentativas', 'erro', 'criado', 'enviado')
+    actions = ['reenviar']
+
+    @admin.action(description = 'Reenviar as mensagens selecionadas')
+    def reenviar(self, request, queryset):
+        alteradas = queryset.exclude(estado = MensagemEmail.ENVIADA).update(
+            estado = MensagemEmail.PENDENTE, tentativas = 0, proxima_tentativa = timezone.now())
+        self.message_user(request, f'{alteradas} mensagem(ns) devolvida(s) à fila.')
+
+@admin.register(ImportacaoProdutos) # Importações em massa: o manifesto e o ZIP enviados aqui são processados por `python manage.py import_products --fila`.
+class ImportacaoProdutosAdmin(admin.ModelAdmin):
+    list_display = ('manifesto', 'estado', 'linha', 'importados', 'erros', 'usuario', 'criado', 'modificado')
+    list_filter = ('estado',)
+    readonly_fields = ('estado', 'linha', 'importados', 'erros', 'relatorio', 'usuario', 'criado', 'modificado')
+    actions = ['retomar']
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.usuario = request.user
+        super().save_model(request, obj, form, change)
+
+    @admin.action(description = 'Retomar as importações selecionadas')
+    def retomar(self, request, queryset):
+        # A importação volta para a fila e continua do último registro gravado (campo 'linha'), sem duplicar produtos.
+        alteradas = queryset.filter(estado = ImportacaoProdutos.FALHOU).update(
+            estado = ImportacaoProdutos.PENDENTE, modificado = timezone.now())
+        self.message_user(request, f'{alteradas} importação(ões) devolvida(s) à fila.')
+
+# As reservas de estoque (veja core/estoque.py) são somente leitura no admin: o estoque só é retirado e devolvido pelas
+# funções de core/estoque.py, e a ação abaixo libera as reservas escolhidas pelo mesmo caminho.
+class ItemReservaInline(admin.TabularInline):
+    model = ItemReserva
+    fields = ('produto', 'quantidade')
+    readonly_fields = ('produto', 'quantidade')
+    extra = 0
+    can_delete = False
+
+@admin.register(Reserva)
+class ReservaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'usuario', 'estado', 'expira_em', 'criado', 'modificado')
+    list_filter = ('estado',)
+    readonly_fields = ('usuario', 'estado', 'expira_em', 'criado', 'modificado')
+    inlines = [ItemReservaInline]
+    actions = ['liberar']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj = None):
+        return False # Excluir uma reserva ativa sumiria com os itens retirados do estoque.
+
+    @admin.action(description = 'Liberar as reservas selecionadas (devolve os itens ao estoque)')
+    def liberar(self, request, queryset):
+        liberadas = sum(liberar(pk).linhas for pk in queryset.filter(estado = Reserva.ATIVA).values_list('pk', flat = True))
+        self.message_user(request, f'{liberadas} reserva(s) liberada(s).')
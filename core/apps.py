@@ -3,3 +3,8 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from .instrumentacao import instalar
+
+        instalar() # Ganchos de medição de SQL, templates e armazenamento usados pelo MedicaoMiddleware.
@@ -0,0 +1,206 @@
+# Este módulo implementa o armazenamento endereçado por conteúdo das imagens de Produto (storage de Produto.imagem).
+# Sem ele, cada upload é gravado com o nome original do arquivo: a mesma foto do fornecedor enviada duas vezes é gravada
+# duas vezes, tem as suas ~20 versões redimensionadas geradas duas vezes pelo Pillow e é sincronizada duas vezes com o GCS
+# (comando upload_media). Aqui:
+# 1) o arquivo original é gravado com o SHA-256 do conteúdo no nome ("produtos/<sha256>.jpg"); se um arquivo com esse nome
+#    já existe, o upload simplesmente reaproveita o original (e, como o nome das versões deriva do nome do original,
+#    também as versões já geradas);
+# 2) o modelo ImagemConteudo conta quantos produtos usam cada arquivo; quando a contagem chega a zero, o original e as versões
+#    são apagados. Arquivos com nomes antigos (anteriores a este armazenamento) não são contados nem apagados.
+#    Um registro com zero referências marca uma exclusão pendente: quem apaga (_apagar_se_livre) e quem reaproveita o
+#    arquivo (save) travam esse registro (SELECT ... FOR UPDATE) antes de decidir. Se o upload chega primeiro, ele apaga o
+#    registro e a exclusão é cancelada; se a exclusão chega primeiro, o upload espera por ela e grava o arquivo de novo.
+# A gravação e a leitura são delegadas ao armazenamento padrão do Django (STORAGES['default']: GCS no Render, disco local
+# no desenvolvimento).
+
+import hashlib
+import posixpath
+import re
+from collections import Counter
+
+from django.core.files import File
+from django.core.files.storage import Storage, default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+from django.utils.module_loading import import_string
+from pictures import conf
+
+from .enderecos import url_midia
+
+NOME_POR_CONTEUDO = re.compile(r'(^|/)[0-9a-f]{64}\.\w+$')
+# Nomes gerados por nome_por_conteudo; apenas esses arquivos têm contagem de referências.
+
+
+def nome_por_conteudo(nome, sha256):
+    """
+    Retorna o nome endereçado por conteúdo de um arquivo: o diretório de `nome`, o hash e a extensão (em minúsculas).
+
+    Parâmetros:
+    - nome (str): Nome sugerido para o arquivo (por exemplo, "produtos/foto.JPG"); apenas o diretório e a extensão são usados.
+    - sha256 (str): SHA-256 do conteúdo, em hexadecimal.
+    """
+    diretorio, extensao = posixpath.dirname(nome), posixpath.splitext(nome)[1].lower()
+    return posixpath.join(diretorio, f'{sha256}{extensao}')
+
+
+@deconstructible(path = 'core.armazenamento.ArmazenamentoPorConteudo')
+class ArmazenamentoPorConteudo(Storage):
+    """
+    Armazenamento que grava cada arquivo com o hash do conteúdo no nome e não grava de novo um conteúdo já existente.
+
+    Todas as operações são delegadas ao armazenamento padrão. Não recebe argumentos: a desconstrução
+    ('core.armazenamento.ArmazenamentoPorConteudo', [], {}) pode ser gravada em JSON nas tarefas da fila de imagens (core/tasks.py).
+    """
+
+    @property
+    def base(self):
+        return default_storage
+
+    def save(self, name, content, max_length = None):
+        from .models import ImagemConteudo
+
+        # O conteúdo é lido uma vez para calcular o hash e, se ainda não existir um arquivo igual, uma segunda vez para gravá-lo.
+        # Apenas os originais, gravados direto no diretório do upload_to ("produtos/foto.jpg"), são nomeados pelo conteúdo;
+        # as versões, que o django-pictures grava em subdiretórios com o nome do original ("produtos/<sha256>/1/400w.png"),
+        # mantêm o nome recebido.
+        if name is None:
+            name = content.name
+        if '/' in posixpath.dirname(name):
+            return self.base.save(name, content, max_length = max_length)
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        sha256 = hashlib.sha256()
+        for bloco in content.chunks():
+            sha256.update(bloco)
+        content.seek(0)
+        return self.salvar_com_hash(name, content, sha256.hexdigest(), max_length = max_length)
+
+    def salvar_com_hash(self, name, content, sha256, max_length = None):
+        """
+        Grava um original cujo SHA-256 já foi calculado por quem chama, sem ler o conteúdo para o hash (veja save).
+
+        Usado por montar_envio (core/envios.py), que calcula o hash enquanto junta as partes do envio: assim as partes
+        são lidas do armazenamento uma única vez. Retorna o nome gravado (ou o do arquivo igual já existente).
+        """
+        from .models import ImagemConteudo
+
+        nome = nome_por_conteudo(self.generate_filename(name), sha256)
+        with transaction.atomic():
+            pendente = ImagemConteudo.objects.select_for_update().filter(arquivo = nome, referencias = 0).first()
+            if pendente is not None:
+                pendente.delete() # Cancela a exclusão pendente do arquivo (veja _apagar_se_livre).
+            if self.exists(nome):
+                return nome
+            return self.base.save(nome, content, max_length = max_length)
+
+    def _open(self, name, mode = 'rb'):
+        return self.base.open(name, mode)
+
+    def _save(self, name, content):
+        return self.base.save(name, content)
+
+    def delete(self, name):
+        return self.base.delete(name)
+
+    def exists(self, name):
+        return self.base.exists(name)
+
+    def listdir(self, path):
+        return self.base.listdir(path)
+
+    def size(self, name):
+        return self.base.size(name)
+
+    def url(self, name):
+        return url_midia(name) # Montada a partir do nome, sem chamar o armazenamento padrão (veja core/enderecos.py).
+
+    def path(self, name):
+        return self.base.path(name)
+
+    def get_accessed_time(self, name):
+        return self.base.get_accessed_time(name)
+
+    def get_created_time(self, name):
+        return self.base.get_created_time(name)
+
+    def get_modified_time(self, name):
+        return self.base.get_modified_time(name)
+
+    def get_valid_name(self, name):
+        return self.base.get_valid_name(name)
+
+    def get_available_name(self, name, max_length = None):
+        return self.base.get_available_name(name, max_length = max_length)
+
+    def generate_filename(self, filename):
+        return self.base.generate_filename(filename)
+
+
+armazenamento_produtos = ArmazenamentoPorConteudo()
+
+
+def em_uso(nome):
+    """Retorna True se algum produto usa o arquivo `nome` (e, portanto, as suas versões já foram ou serão geradas)."""
+    from .models import ImagemConteudo
+
+    return ImagemConteudo.objects.filter(arquivo = nome, referencias__gt = 0).exists()
+
+
+def ajustar_referencias(removidas = (), adicionadas = ()):
+    """
+    Atualiza a contagem de referências dos arquivos de imagem endereçados por conteúdo.
+
+    Parâmetros:
+    - removidas (iterável de str): Arquivos que deixaram de ser usados, uma vez por produto.
+    - adicionadas (iterável de tuplas (arquivo, largura, altura)): Arquivos que passaram a ser usados, uma vez por produto.
+      As dimensões são guardadas para que as versões possam ser apagadas sem abrir o original.
+
+    Deve ser chamada na mesma transação que alterou os produtos. Os arquivos que ficarem sem nenhuma referência são
+    apagados (o original imediatamente e as versões pela fila de imagens) depois que a transação for confirmada.
+    """
+    from .models import ImagemConteudo
+
+    adicionadas = [item for item in adicionadas if item[0] and NOME_POR_CONTEUDO.search(item[0])]
+    removidas = Counter(nome for nome in removidas if nome and NOME_POR_CONTEUDO.search(nome))
+    dimensoes = {nome: (largura, altura) for nome, largura, altura in adicionadas}
+
+    for nome, quantidade in Counter(nome for nome, _, _ in adicionadas).items():
+        if ImagemConteudo.objects.filter(arquivo = nome).update(referencias = F('referencias') + quantidade):
+            continue
+        largura, altura = dimensoes[nome]
+        try:
+            with transaction.atomic():
+                ImagemConteudo.objects.create(arquivo = nome, largura = largura, altura = altura, referencias = quantidade)
+        except IntegrityError:
+            # Outro processo criou o registro entre o UPDATE e o INSERT.
+            ImagemConteudo.objects.filter(arquivo = nome).update(referencias = F('referencias') + quantidade)
+
+    for nome, quantidade in removidas.items():
+        if not ImagemConteudo.objects.filter(arquivo = nome, referencias__gte = quantidade).update(
+                referencias = F('referencias') - quantidade):
+            ImagemConteudo.objects.filter(arquivo = nome).update(referencias = 0)
+        transaction.on_commit(lambda nome = nome: _apagar_se_livre(nome))
+
+
+def _apagar_se_livre(nome):
+    from .models import ImagemConteudo, Produto, VersaoImagem
+    from .versoes import versoes_previstas
+
+    with transaction.atomic():
+        # A trava do registro vale até o arquivo ser apagado: um upload do mesmo conteúdo (ArmazenamentoPorConteudo.save)
+        # ou o cancela antes, apagando o registro, ou espera aqui e, ao ver que o arquivo não existe mais, grava-o de novo.
+        conteudo = ImagemConteudo.objects.select_for_update().filter(arquivo = nome, referencias = 0).first()
+        if conteudo is None or Produto.objects.filter(imagem = nome).exists():
+            # Ainda em uso: outro upload do mesmo conteúdo chegou nesse meio tempo, ou o produto foi gravado sem contagem
+            # (por exemplo, por uma fixture antiga).
+            return
+        conteudo.delete()
+
+        campo = Produto._meta.get_field('imagem')
+        if conteudo.largura and conteudo.altura:
+            antigas = [versao.deconstruct() for versao in versoes_previstas(nome, conteudo.largura, conteudo.altura)]
+            import_string(conf.get_settings().PROCESSOR)(campo.storage.deconstruct(), nome, [], antigas)
+            # As versões são apagadas pela fila de imagens (process_pictures), como as demais operações sobre versões.
+        VersaoImagem.objects.filter(arquivo = nome).delete()
+        campo.storage.delete(nome)
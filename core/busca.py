@@ -0,0 +1,278 @@
+# Este módulo implementa a busca de produtos pelo nome e pelo slug (views busca e sugestoes).
+# Um filtro nome__icontains percorreria a tabela inteira a cada busca (LIKE '%termo%' não usa índice) e não ordenaria os
+# resultados por relevância. Aqui a busca é feita por trigramas (sequências de 3 caracteres de cada palavra), que toleram
+# erros de digitação e encontram palavras pelo começo, como em um campo de busca com autocompletar:
+# 1) no PostgreSQL, pela extensão pg_trgm, com índices GIN sobre o nome e o slug (migração 0013): o operador %> (lookup
+#    trigram_word_similar) usa o índice e a ordenação é pela similaridade (word_similarity);
+# 2) nos demais bancos (MySQL, SQLite), por um índice invertido de trigramas mantido em memória em cada processo, com a
+#    mesma medida de similaridade. Ele é montado no primeiro uso com uma única consulta (id, nome e slug dos produtos ativos)
+#    e atualizado pelos signals de Produto (core/models.py). Como cada processo do gunicorn tem o seu índice, toda alteração
+#    que muda o que a busca encontra (produto novo ou excluído, nome, slug ou campo ativo alterado) incrementa um contador de geração no cache 'catalogo' (compartilhado pelos processos): o processo que fez a alteração
+#    a aplica no seu índice, e os demais, ao perceberem a geração nova, remontam o índice.
+# As sugestões do autocompletar (view sugestoes) são guardadas no cache 'catalogo' com a geração na chave: repetidas,
+# custam uma leitura do cache, e uma dessas alterações as invalida todas de uma vez. As demais (preço, estoque, imagem)
+# não mexem na busca: os resultados são os fragmentos do catálogo, invalidados um a um (core/cache_catalogo.py).
+
+import functools
+import hashlib
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+
+from .cache_catalogo import fragmentos
+from .pagination import Pagina
+
+CHAVE_GERACAO = 'busca:geracao'
+# Contador incrementado a cada alteração de produto que afeta a busca (veja cache_catalogo.CHAVE_GERACAO).
+
+SIMILARIDADE_MINIMA = 0.6
+# Fração mínima dos trigramas do termo que precisam aparecer no produto, no índice em memória.
+# É o mesmo padrão de pg_trgm.word_similarity_threshold, usado pelo operador %> no PostgreSQL.
+
+_trava = threading.Lock()
+_indice = None
+_geracao_do_indice = None
+# Índice em memória deste processo e a geração com que ele está atualizado (veja _indice_atual).
+
+
+def _cache():
+    return caches['catalogo']
+
+
+def _geracao():
+    return _cache().get_or_set(CHAVE_GERACAO, time.time_ns(), timeout = None)
+
+
+def _incrementar_geracao():
+    # Incrementa a geração e retorna o novo valor.
+    cache = _cache()
+    try:
+        return cache.incr(CHAVE_GERACAO)
+    except ValueError:
+        # A chave ainda não existe (cache vazio ou expirado): todos os processos vão remontar os seus índices.
+        geracao = time.time_ns()
+        cache.set(CHAVE_GERACAO, geracao, timeout = None)
+        return geracao
+
+
+def normalizar(texto):
+    """Texto em minúsculas e sem acentos ("Camisão" -> "camisao"), para que a busca ignore acentuação e maiúsculas."""
+    if texto.isascii(): # O caso comum, sem acentos: evita percorrer o texto caractere por caractere.
+        return texto.casefold()
+    decomposto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).casefold()
+
+
+def trigramas(texto):
+    """
+    Conjunto de trigramas de `texto`, calculados como no pg_trgm.
+
+    Cada palavra (sequência de letras e dígitos) ganha dois espaços à esquerda e um à direita antes de ser dividida:
+    "gg" gera {"  g", " gg", "gg "}. Assim o começo das palavras pesa mais, e "cam" encontra "camiseta".
+    """
+    resultado = set()
+    for palavra in re.findall(r'[^\W_]+', texto):
+        resultado.update(_trigramas_da_palavra(palavra))
+    return resultado
+
+
+@functools.lru_cache(maxsize = 10000)
+def _trigramas_da_palavra(palavra):
+    # As mesmas palavras se repetem em muitos nomes ("camiseta", "azul"): memorizadas, aceleram a montagem do índice.
+    palavra = f'  {normalizar(palavra)} '
+    return frozenset(palavra[i:i + 3] for i in range(len(palavra) - 2))
+
+
+class IndiceNgramas:
+    """
+    Índice invertido de trigramas dos produtos ativos: para cada trigrama, os ids dos produtos que o contêm.
+
+    Usado nos bancos sem pg_trgm. A busca conta, para cada produto, quantos trigramas do termo ele contém e ordena os
+    produtos pela fração encontrada (a mesma medida do word_similarity do pg_trgm, aproximada).
+    """
+
+    def __init__(self):
+        self.postagens = {} # trigrama -> set de ids
+        self.produtos = {}  # id -> (nome, slug, trigramas, nome normalizado)
+
+    def adicionar(self, pk, nome, slug):
+        self.remover(pk)
+        conjunto = trigramas(nome) | trigramas(slug.replace('-', ' '))
+        self.produtos[pk] = (nome, slug, conjunto, normalizar(nome))
+        for trigrama in conjunto:
+            self.postagens.setdefault(trigrama, set()).add(pk)
+
+    def remover(self, pk):
+        anterior = self.produtos.pop(pk, None)
+        if anterior is None:
+            return
+        for trigrama in anterior[2]:
+            ids = self.postagens[trigrama]
+            ids.discard(pk)
+            if not ids:
+                del self.postagens[trigrama]
+
+    def buscar(self, termo, limite):
+        """Retorna até `limite` ids de produtos, do mais ao menos similar a `termo`."""
+        procurados = trigramas(termo)
+        if not procurados:
+            return []
+        encontrados = Counter()
+        for trigrama in procurados:
+            encontrados.update(self.postagens.get(trigrama, ()))
+        minimo = math.ceil(SIMILARIDADE_MINIMA * len(procurados))
+        inicio = normalizar(termo)
+
+        def relevancia(pk):
+            # Mais trigramas em comum primeiro; depois os nomes que começam pelo termo, os mais curtos e os mais antigos.
+            nome = self.produtos[pk][3]
+            return (-encontrados[pk], not nome.startswith(inicio), len(nome), pk)
+
+        candidatos = (pk for pk, quantidade in encontrados.items() if quantidade >= minimo)
+        return heapq.nsmallest(limite, candidatos, key = relevancia) # Sem ordenar todos os candidatos.
+
+
+def _usa_pg_trgm():
+    # No PostgreSQL a busca é feita pelo próprio banco, com os índices da migração 0013.
+    return connection.vendor == 'postgresql'
+
+
+def _indice_atual():
+    # Retorna o índice em memória, montando-o de novo se não existir ou se outro processo alterou algum produto.
+    global _indice, _geracao_do_indice
+    from .models import Produto
+
+    geracao = _geracao()
+    with _trava:
+        if _indice is None or _geracao_do_indice != geracao:
+            indice = IndiceNgramas()
+            for pk, nome, slug in Produto.objects.filter(ativo = True).values_list('pk', 'nome', 'slug').iterator(chunk_size = 2000):
+                indice.adicionar(pk, nome, slug)
+            _indice, _geracao_do_indice = indice, geracao
+        return _indice
+
+
+def _atualizar_indice(alteracao):
+    # Incrementa a geração e, se o índice deste processo estava na geração anterior, aplica nele a alteração.
+    # Se outro processo alterou um produto no meio tempo, a geração terá saltado mais de uma unidade:
+    # o índice fica para trás e é remontado na próxima busca.
+    global _geracao_do_indice
+    geracao = _incrementar_geracao()
+    with _trava:
+        if _indice is not None and _geracao_do_indice == geracao - 1:
+            alteracao(_indice)
+            _geracao_do_indice = geracao
+
+
+def indexar_produto(produto):
+    """
+    Atualiza a busca após `produto` ser salvo (chamada por produto_post_save, em core/models.py).
+
+    A atualização acontece depois do commit da transação corrente, como a invalidação do cache do catálogo.
+    """
+    pk, nome, slug, ativo = produto.pk, produto.nome, produto.slug, produto.ativo
+
+    def alterar(indice):
+        if ativo:
+            indice.adicionar(pk, nome, slug)
+        else:
+            indice.remover(pk)
+
+    transaction.on_commit(lambda: _atualizar_indice(alterar))
+
+
+def remover_produto(pk):
+    """Retira da busca o produto excluído (chamada por produto_post_delete, em core/models.py)."""
+    transaction.on_commit(lambda: _atualizar_indice(lambda indice: indice.remover(pk)))
+
+
+def invalidar_busca():
+    """
+    Invalida os índices em memória de todos os processos e as sugestões em cache.
+
+    Usada pelas gravações em massa (bulk_create), que não disparam os signals de Produto.
+    """
+    transaction.on_commit(_incrementar_geracao)
+
+
+def _encontrados_no_banco(termo):
+    # Produtos ativos encontrados para `termo` pelo pg_trgm, do mais ao menos similar.
+    from django.contrib.postgres.search import TrigramWordSimilarity
+    from django.db.models import Q
+    from django.db.models.functions import Greatest
+
+    from .models import Produto
+
+    return (
+        Produto.objects.filter(Q(nome__trigram_word_similar = termo) | Q(slug__trigram_word_similar = termo), ativo = True)
+        .annotate(similaridade = Greatest(TrigramWordSimilarity(termo, 'nome'), TrigramWordSimilarity(termo, 'slug')))
+        .order_by('-similaridade', 'id')
+    )
+
+
+def _ids_encontrados(termo, limite):
+    # Ids dos produtos ativos encontrados para `termo`, do mais ao menos relevante.
+    if _usa_pg_trgm():
+        return list(_encontrados_no_banco(termo).values_list('pk', flat = True)[:limite])
+    return _indice_atual().buscar(termo, limite)
+
+
+def pagina_da_busca(termo, tamanho, numero = 1):
+    """
+    Retorna a `numero`-ésima Pagina dos produtos encontrados para `termo`, do mais ao menos relevante.
+
+    Parâmetros:
+    - termo (str): Texto digitado pelo usuário.
+    - tamanho (int): Quantidade de produtos por página.
+    - numero (int): Número da página, a partir de 1. A busca considera no máximo BUSCA_MAX_RESULTADOS produtos.
+
+    Assim como em pagina_do_catalogo, os itens são os fragmentos HTML dos produtos (template produto_linha.html), lidos do
+    cache do catálogo. Como a ordem é a da relevância, e não a do cadastro, a navegação é por número de página:
+    'proximo' e 'anterior' são os números das páginas vizinhas (ou None).
+    """
+    from .models import Produto
+
+    termo = termo.strip()
+    inicio = (numero - 1) * tamanho
+    if not termo or inicio >= settings.BUSCA_MAX_RESULTADOS:
+        return Pagina([], tamanho)
+    ids = _ids_encontrados(termo, min(inicio + tamanho + 1, settings.BUSCA_MAX_RESULTADOS))
+    # Um item além da página indica se existe a próxima.
+    return Pagina(
+        fragmentos(Produto.objects.filter(ativo = True), ids[inicio:inicio + tamanho]),
+        tamanho,
+        proximo = numero + 1 if len(ids) > inicio + tamanho else None,
+        anterior = numero - 1 if numero > 1 else None,
+    )
+
+
+def sugestoes(termo):
+    """
+    Retorna as sugestões do autocompletar para `termo`: uma lista de até BUSCA_SUGESTOES dicionários {'nome', 'slug'}.
+
+    O resultado fica em cache (cache 'catalogo') até a próxima alteração de produto ou por BUSCA_SUGESTOES_TIMEOUT segundos.
+    Termos com menos de BUSCA_MINIMO_SUGESTOES caracteres não têm sugestões.
+    """
+    termo = normalizar(termo.strip())
+    if len(termo) < settings.BUSCA_MINIMO_SUGESTOES:
+        return []
+    cache = _cache()
+    chave = f'busca:sugestoes:{_geracao()}:{hashlib.md5(termo.encode()).hexdigest()}'
+    resultado = cache.get(chave)
+    if resultado is None:
+        if _usa_pg_trgm():
+            resultado = list(_encontrados_no_banco(termo).values('nome', 'slug')[:settings.BUSCA_SUGESTOES])
+        else:
+            indice = _indice_atual()
+            resultado = [{'nome': indice.produtos[pk][0], 'slug': indice.produtos[pk][1]}
+                         for pk in indice.buscar(termo, settings.BUSCA_SUGESTOES)]
+        cache.set(chave, resultado, timeout = settings.BUSCA_SUGESTOES_TIMEOUT)
+    return resultado
@@ -0,0 +1,202 @@
+# Este módulo implementa o cache da listagem de produtos (view index).
+# A página é dividida em duas partes que são guardadas separadamente no cache 'catalogo' (veja CACHES em settings.py):
+# 1) A "casca" da página: quais produtos aparecem nela (lista de ids) e os cursores de navegação.
+#    Ela só muda quando um produto entra ou sai da listagem (criação, exclusão ou mudança do campo ativo) ou de uma
+#    faceta (mudança de faixa de preço, ou de "em estoque" para "sem estoque"; veja core/facetas.py).
+# 2) Os fragmentos de cada produto: o HTML já renderizado da linha da tabela (template produto_linha.html).
+#    Cada fragmento é invalidado individualmente quando o produto correspondente é salvo ou excluído.
+# Assim, uma alteração de estoque que não zera o estoque descarta apenas o fragmento daquele produto, e não a página inteira.
+# A invalidação é feita pelos signals de Produto conectados em core/models.py.
+
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .pagination import Pagina, apaginar, paginar
+
+CHAVE_GERACAO = 'catalogo:geracao'
+# Contador incrementado sempre que a composição da listagem muda.
+# Ele faz parte da chave de todas as cascas, então incrementá-lo invalida todas de uma vez (as antigas expiram pelo timeout).
+# O valor inicial é derivado do relógio, para que um contador descartado pelo cache nunca "volte" a um valor já usado.
+
+
+def _cache():
+    # Retorna o backend configurado para o catálogo em settings.CACHES['catalogo'].
+    return caches['catalogo']
+
+
+def chave_produto(pk):
+    """Chave do fragmento HTML (linha da tabela) de um produto."""
+    return f'catalogo:linha:{pk}'
+    # O prefixo mudou de 'catalogo:produto' para 'catalogo:linha' quando o fragmento deixou de conter o modal do produto,
+    # para que fragmentos antigos guardados em um cache persistente não voltem a ser exibidos.
+
+
+def _geracao():
+    return _cache().get_or_set(CHAVE_GERACAO, time.time_ns(), timeout = None)
+
+
+async def _ageracao():
+    return await _cache().aget_or_set(CHAVE_GERACAO, time.time_ns(), timeout = None)
+
+
+def chave_pagina(tamanho, depois = None, antes = None, geracao = None, filtros = ''):
+    """
+    Chave da casca de uma página da listagem, atrelada à geração atual do catálogo.
+
+    `filtros` é a query string dos filtros por faceta da página (veja facetas.consulta); cada combinação de filtros tem
+    as suas próprias páginas.
+    """
+    geracao = geracao or _geracao()
+    return f'catalogo:pagina:{geracao}:{filtros}:{tamanho}:{depois or ""}:{antes or ""}'
+
+
+def _faltando(ids, em_cache, conhecidos):
+    # Ids cujo fragmento não está em cache e cujo produto ainda não foi carregado do banco.
+    return [pk for pk in ids if chave_produto(pk) not in em_cache and pk not in conhecidos]
+
+
+def _renderizar(ids, em_cache, conhecidos):
+    # Renderiza o template produto_linha.html de cada produto cujo fragmento não estava em cache.
+    return {
+        chave_produto(pk): render_to_string('produto_linha.html', {'produto': conhecidos[pk]})
+        for pk in ids
+        if chave_produto(pk) not in em_cache and pk in conhecidos
+    }
+
+
+def _ordenar(ids, html):
+    # Devolve os fragmentos na ordem da página, omitindo produtos que desapareceram do banco.
+    return [mark_safe(html[chave_produto(pk)]) for pk in ids if chave_produto(pk) in html]
+
+
+def _casca(pagina):
+    return {
+        'ids': [produto.pk for produto in pagina],
+        'proximo': pagina.proximo,
+        'anterior': pagina.anterior,
+    }
+
+
+def fragmentos(queryset, ids, conhecidos = None):
+    """
+    Retorna o HTML renderizado de cada produto em `ids`, na mesma ordem.
+
+    Parâmetros:
+    - queryset (QuerySet): Consulta usada para buscar no banco os produtos cujo fragmento não está em cache.
+    - ids (list[int]): Ids dos produtos da página, na ordem de exibição.
+    - conhecidos (dict[int, Produto] | None): Produtos já carregados pela chamada atual, evitando buscá-los de novo.
+
+    Todos os fragmentos são lidos do cache com um único get_many; apenas os ausentes são renderizados e gravados.
+    Produtos que desapareceram do banco são simplesmente omitidos.
+    """
+    cache = _cache()
+    conhecidos = dict(conhecidos or {})
+    em_cache = cache.get_many([chave_produto(pk) for pk in ids])
+    faltando = _faltando(ids, em_cache, conhecidos)
+    if faltando:
+        conhecidos.update(queryset.in_bulk(faltando))
+    novos = _renderizar(ids, em_cache, conhecidos)
+    if novos:
+        cache.set_many(novos, timeout = settings.CATALOGO_CACHE_TIMEOUT)
+    return _ordenar(ids, {**em_cache, **novos})
+
+
+async def afragmentos(queryset, ids, conhecidos = None):
+    """
+    Versão assíncrona de fragmentos.
+
+    O cache e o banco são acessados pelas APIs assíncronas (aget_many, ain_bulk, aset_many). A renderização dos
+    templates roda em uma thread (sync_to_async), pois o sistema de templates do Django é síncrono.
+    """
+    cache = _cache()
+    conhecidos = dict(conhecidos or {})
+    em_cache = await cache.aget_many([chave_produto(pk) for pk in ids])
+    faltando = _faltando(ids, em_cache, conhecidos)
+    if faltando:
+        conhecidos.update(await queryset.ain_bulk(faltando))
+    novos = await sync_to_async(_renderizar)(ids, em_cache, conhecidos)
+    if novos:
+        await cache.aset_many(novos, timeout = settings.CATALOGO_CACHE_TIMEOUT)
+    return _ordenar(ids, {**em_cache, **novos})
+
+
+def pagina_do_catalogo(queryset, tamanho, depois = None, antes = None, filtros = ''):
+    """
+    Retorna uma Pagina cujos itens são os fragmentos HTML dos produtos (em vez das instâncias de Produto).
+
+    Com a casca e os fragmentos em cache, a página é montada sem nenhuma consulta ao banco
+    e sem renderizar o template de nenhum produto. Pode lançar CursorInvalido, assim como paginar().
+    `filtros` identifica, na chave do cache, os filtros por faceta já aplicados ao `queryset` (veja chave_pagina).
+    """
+    cache = _cache()
+    chave = chave_pagina(tamanho, depois, antes, filtros = filtros)
+    casca = cache.get(chave)
+    conhecidos = {}
+
+    if casca is None:
+        pagina = paginar(queryset, tamanho, depois = depois, antes = antes)
+        conhecidos = {produto.pk: produto for produto in pagina}
+        casca = _casca(pagina)
+        cache.set(chave, casca, timeout = settings.CATALOGO_CACHE_TIMEOUT)
+
+    return Pagina(
+        fragmentos(queryset, casca['ids'], conhecidos),
+        tamanho,
+        proximo = casca['proximo'],
+        anterior = casca['anterior'],
+    )
+
+
+async def apagina_do_catalogo(queryset, tamanho, depois = None, antes = None, filtros = ''):
+    """Versão assíncrona de pagina_do_catalogo, usada pela view index assíncrona (core/views_async.py)."""
+    cache = _cache()
+    chave = chave_pagina(tamanho, depois, antes, geracao = await _ageracao(), filtros = filtros)
+    casca = await cache.aget(chave)
+    conhecidos = {}
+
+    if casca is None:
+        pagina = await apaginar(queryset, tamanho, depois = depois, antes = antes)
+        conhecidos = {produto.pk: produto for produto in pagina}
+        casca = _casca(pagina)
+        await cache.aset(chave, casca, timeout = settings.CATALOGO_CACHE_TIMEOUT)
+
+    return Pagina(
+        await afragmentos(queryset, casca['ids'], conhecidos),
+        tamanho,
+        proximo = casca['proximo'],
+        anterior = casca['anterior'],
+    )
+
+
+def invalidar_produto(pk, listagem = False):
+    """
+    Descarta o fragmento de um produto e, se `listagem` for True, todas as cascas de página.
+
+    A remoção é adiada para depois do commit da transação corrente (transaction.on_commit): se fosse feita antes,
+    uma requisição concorrente poderia reler o valor antigo do banco e gravá-lo de volta no cache.
+    """
+    invalidar_produtos([pk], listagem = listagem)
+
+
+def invalidar_produtos(pks, listagem = False):
+    """Versão de invalidar_produto para vários produtos de uma vez (um único delete_many no cache)."""
+    chaves = [chave_produto(pk) for pk in pks]
+
+    def _invalidar():
+        cache = _cache()
+        if chaves:
+            cache.delete_many(chaves)
+        if listagem:
+            try:
+                cache.incr(CHAVE_GERACAO)
+            except ValueError:
+                # A chave ainda não existe (cache vazio ou expirado): não há cascas antigas a invalidar.
+                cache.add(CHAVE_GERACAO, time.time_ns(), timeout = None)
+
+    transaction.on_commit(_invalidar)
@@ -0,0 +1,138 @@
+# Este módulo implementa a caixa de saída ("outbox") dos e-mails do sistema.
+# Enviar um e-mail dentro da requisição obriga o worker do gunicorn a esperar toda a conversa SMTP
+# (conexão, TLS, autenticação, envio), e cada formulário de contato abria uma conexão nova.
+# Com a caixa de saída:
+# 1) enfileirar_email grava a mensagem no banco (modelo MensagemEmail) e retorna imediatamente;
+# 2) entregar_lote, chamada pelo comando `python manage.py send_outbox`, envia as mensagens pendentes em lotes,
+#    usando uma única conexão SMTP por lote, com novas tentativas e espera exponencial em caso de falha.
+
+from datetime import timedelta
+
+from django.core import mail
+from django.core.mail.message import EmailMessage
+from django.utils import timezone
+
+
+def _campos(mensagem):
+    # Converte um EmailMessage nos campos do modelo MensagemEmail.
+    return {
+        'assunto': mensagem.subject,
+        'corpo': mensagem.body,
+        'remetente': mensagem.from_email,
+        'destinatarios': list(mensagem.to),
+        'cabecalhos': dict(mensagem.extra_headers),
+    }
+
+
+def enfileirar_email(mensagem):
+    """
+    Grava um EmailMessage na caixa de saída para ser entregue em segundo plano.
+
+    Parâmetros:
+    - mensagem (EmailMessage): Mensagem já montada (assunto, corpo, remetente, destinatários e cabeçalhos).
+
+    Retorna a MensagemEmail criada.
+    """
+    from .models import MensagemEmail
+
+    return MensagemEmail.objects.create(**_campos(mensagem))
+
+
+async def aenfileirar_email(mensagem):
+    """Versão assíncrona de enfileirar_email, usada pelas views assíncronas (core/views_async.py)."""
+    from .models import MensagemEmail
+
+    return await MensagemEmail.objects.acreate(**_campos(mensagem))
+
+
+def _reservar(limite):
+    # Retira da fila até `limite` mensagens pendentes cujo horário de tentativa já chegou.
+    # Cada mensagem é reservada com um UPDATE condicional, de modo que dois workers nunca enviem a mesma mensagem.
+    # O horário da reserva fica em proxima_tentativa, usado por recuperar_abandonadas.
+    from .models import MensagemEmail
+
+    candidatas = MensagemEmail.objects.filter(
+        estado = MensagemEmail.PENDENTE,
+        proxima_tentativa__lte = timezone.now(),
+    ).order_by('proxima_tentativa', 'id')[:limite]
+    reservadas = []
+    for mensagem in candidatas:
+        if MensagemEmail.objects.filter(pk = mensagem.pk, estado = MensagemEmail.PENDENTE).update(
+                estado = MensagemEmail.ENVIANDO, tentativas = mensagem.tentativas + 1, proxima_tentativa = timezone.now()):
+            mensagem.tentativas += 1
+            reservadas.append(mensagem)
+    return reservadas
+
+
+def entregar_lote(limite = 50, max_tentativas = 5, espera = 30, connection = None):
+    """
+    Envia um lote de mensagens pendentes reaproveitando uma única conexão com o servidor de e-mail.
+
+    Parâmetros:
+    - limite (int): Quantidade máxima de mensagens do lote.
+    - max_tentativas (int): Tentativas por mensagem antes de movê-la para o estado 'falhou' (fila de mensagens mortas).
+    - espera (int): Espera base, em segundos, antes de uma nova tentativa; dobra a cada falha (30s, 60s, 120s...).
+    - connection: Conexão de e-mail a usar; por padrão mail.get_connection(), isto é, o EMAIL_BACKEND das settings.
+
+    Retorna a tupla (enviadas, falhas).
+    """
+    from .models import MensagemEmail
+
+    mensagens = _reservar(limite)
+    if not mensagens:
+        return 0, 0
+
+    connection = connection or mail.get_connection()
+    enviadas = falhas = 0
+    try:
+        connection.open()
+        # Abre a conexão uma única vez para o lote inteiro; send_messages a reaproveita enquanto estiver aberta.
+        for mensagem in mensagens:
+            email = EmailMessage(
+                subject = mensagem.assunto,
+                body = mensagem.corpo,
+                from_email = mensagem.remetente,
+                to = mensagem.destinatarios,
+                headers = mensagem.cabecalhos,
+                connection = connection,
+            )
+            try:
+                connection.send_messages([email])
+            except Exception as e:
+                falhas += 1
+                _registrar_falha(mensagem, e, max_tentativas, espera)
+            else:
+                enviadas += 1
+                MensagemEmail.objects.filter(pk = mensagem.pk).update(
+                    estado = MensagemEmail.ENVIADA, enviado = timezone.now(), erro = '')
+    except Exception as e:
+        # Falha ao abrir a conexão: todas as mensagens reservadas (e ainda não processadas) voltam para a fila.
+        for mensagem in mensagens[enviadas + falhas:]:
+            falhas += 1
+            _registrar_falha(mensagem, e, max_tentativas, espera)
+    finally:
+        connection.close()
+    return enviadas, falhas
+
+
+def _registrar_falha(mensagem, erro, max_tentativas, espera):
+    from .models import MensagemEmail
+
+    if mensagem.tentativas >= max_tentativas:
+        estado = MensagemEmail.FALHOU
+    else:
+        estado = MensagemEmail.PENDENTE
+    MensagemEmail.objects.filter(pk = mensagem.pk).update(
+        estado = estado,
+        erro = repr(erro),
+        proxima_tentativa = timezone.now() + timedelta(seconds = espera * 2 ** (mensagem.tentativas - 1)),
+    )
+
+
+def recuperar_abandonadas(expiracao = 600):
+    """Devolve à fila as mensagens presas em 'enviando' (por exemplo, se o worker foi encerrado no meio de um lote)."""
+    from .models import MensagemEmail
+
+    limite = timezone.now() - timedelta(seconds = expiracao)
+    return MensagemEmail.objects.filter(estado = MensagemEmail.ENVIANDO, proxima_tentativa__lt = limite).update(
+        estado = MensagemEmail.PENDENTE)
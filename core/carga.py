@@ -0,0 +1,261 @@
+# Este módulo implementa a carga em massa de produtos a partir de fixtures (comando `python manage.py load_catalog`).
+# O `loaddata` do Django desserializa o arquivo inteiro na memória e salva os produtos um a um, disparando os signals
+# de cada um (slug, cache do catálogo). Aqui:
+# 1) os registros são lidos em streaming, um de cada vez, de um arquivo JSON (lista no formato do dumpdata) ou JSONL
+#    (um registro por linha), de modo que a memória usada não depende do tamanho do arquivo;
+# 2) os registros são gravados em lotes, com um único INSERT ... ON CONFLICT/ON DUPLICATE KEY UPDATE por lote (bulk_create);
+# 3) cada produto guarda o hash do registro que o gerou (Produto.hash_carga): registros que não mudaram desde a última
+#    carga são ignorados sem nenhuma escrita no banco;
+# 4) os slugs são calculados por lote, com uma consulta por lote, em vez de uma por produto no signal pre_save.
+
+import hashlib
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.color import no_style
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .armazenamento import ajustar_referencias
+from .busca import invalidar_busca
+from .cache_catalogo import invalidar_produtos
+from .facetas import recalcular_contagens
+
+BLOCO = 64 * 1024
+# Quantidade de caracteres lidos do arquivo JSON por vez.
+
+MODELO = 'core.produto'
+
+
+class CargaInvalida(ValueError):
+    """Exceção lançada quando o arquivo de carga está malformado ou contém registros de outro modelo."""
+
+
+def registros_json(arquivo):
+    """
+    Lê, em streaming, os registros de um arquivo JSON com uma lista de objetos (o formato gerado pelo dumpdata).
+
+    Parâmetros:
+    - arquivo: Arquivo aberto em modo texto.
+
+    Apenas um bloco do arquivo e o registro atual ficam na memória: cada objeto é decodificado com
+    JSONDecoder.raw_decode assim que termina de chegar, e o texto já consumido é descartado.
+    """
+    decoder = json.JSONDecoder()
+    texto, posicao, abriu = '', 0, False
+    while True:
+        while posicao < len(texto) and (texto[posicao].isspace() or abriu and texto[posicao] == ','):
+            posicao += 1
+        if posicao < len(texto):
+            if not abriu:
+                if texto[posicao] != '[':
+                    raise CargaInvalida("O arquivo JSON deve conter uma lista de registros.")
+                abriu = True
+                posicao += 1
+                continue
+            if texto[posicao] == ']':
+                return
+            try:
+                registro, posicao = decoder.raw_decode(texto, posicao)
+            except json.JSONDecodeError:
+                pass # O registro ainda não chegou inteiro: lemos mais um bloco abaixo.
+            else:
+                yield registro
+                continue
+        bloco = arquivo.read(BLOCO)
+        if not bloco:
+            raise CargaInvalida("Fim inesperado do arquivo JSON.")
+        texto, posicao = texto[posicao:] + bloco, 0
+
+
+def registros_jsonl(arquivo):
+    """Lê os registros de um arquivo JSONL (um objeto JSON por linha), ignorando linhas em branco."""
+    for numero, linha in enumerate(arquivo, start = 1):
+        if linha.strip():
+            try:
+                yield json.loads(linha)
+            except json.JSONDecodeError as e:
+                raise CargaInvalida(f"Linha {numero}: {e}") from e
+
+
+def ler_registros(arquivo, formato):
+    """Retorna o gerador de registros adequado ao formato ('json' ou 'jsonl')."""
+    if formato == 'jsonl':
+        return registros_jsonl(arquivo)
+    return registros_json(arquivo)
+
+
+def hash_registro(registro):
+    """SHA-256 do registro (modelo, id e campos), independente da ordem das chaves e da formatação do arquivo."""
+    conteudo = json.dumps([registro.get('pk'), registro.get('fields')], sort_keys = True, ensure_ascii = False, default = str)
+    return hashlib.sha256(conteudo.encode()).hexdigest()
+
+
+def carregar_produtos(registros, lote = 500, progresso = None):
+    """
+    Grava os registros de produtos no banco, em lotes, criando os novos e atualizando os que mudaram.
+
+    Parâmetros:
+    - registros (iterável de dict): Registros no formato do dumpdata ({"model": "core.produto", "pk": ..., "fields": {...}}).
+    - lote (int): Quantidade de registros gravados por vez.
+    - progresso (callable | None): Função chamada após cada lote com o dicionário de contagens acumuladas.
+
+    Retorna o dicionário {'criados': ..., 'atualizados': ..., 'inalterados': ...}.
+    Os signals de Produto não são disparados; o cache do catálogo é invalidado aqui, uma vez por lote, e a busca e as
+    contagens das facetas são atualizadas no final.
+    """
+    from .models import Produto
+
+    contagem = {'criados': 0, 'atualizados': 0, 'inalterados': 0}
+    registros = iter(registros)
+    while pedaco := list(islice(registros, lote)):
+        criados, atualizados, inalterados = _carregar_lote(Produto, pedaco)
+        contagem['criados'] += criados
+        contagem['atualizados'] += atualizados
+        contagem['inalterados'] += inalterados
+        if progresso:
+            progresso(contagem)
+
+    if contagem['criados']:
+        _reiniciar_sequencia(Produto)
+    if contagem['criados'] or contagem['atualizados']:
+        invalidar_produtos([], listagem = True)
+        invalidar_busca()
+        recalcular_contagens() # Os produtos atualizados podem ter mudado de faixa de preço ou de estoque.
+    return contagem
+
+
+def _carregar_lote(Produto, pedaco):
+    itens = {} # Indexado pelo id: se o mesmo produto aparecer duas vezes no lote, vale o último registro.
+    for registro in pedaco:
+        if str(registro.get('model', '')).lower() != MODELO or registro.get('pk') is None:
+            raise CargaInvalida(f"Registro inválido (esperado {MODELO} com 'pk'): {str(registro)[:200]}")
+        itens[registro['pk']] = registro
+
+    existentes = Produto.objects.filter(pk__in = list(itens)).values_list('pk', 'hash_carga', 'slug', 'imagem')
+    existentes = {pk: (h, slug, imagem) for pk, h, slug, imagem in existentes}
+    hashes = {pk: h for pk, (h, _, _) in existentes.items()}
+    alterados = [(registro, hash_registro(registro)) for registro in itens.values()]
+    alterados = [(registro, h) for registro, h in alterados if hashes.get(registro['pk']) != h]
+    if not alterados:
+        return 0, 0, len(pedaco)
+
+    agora = timezone.now()
+    objetos = [_instancia(Produto, registro, h, agora) for registro, h in alterados]
+    atribuir_slugs(Produto, objetos, {pk: slug for pk, (_, slug, _) in existentes.items()})
+    criacao = {objeto.pk: objeto.criado for objeto in objetos}
+    novos = [objeto for objeto in objetos if objeto.pk not in hashes]
+
+    conexao = connections[router.db_for_write(Produto)]
+    campos = [f.name for f in Produto._meta.concrete_fields if not f.primary_key and f.name != 'criado']
+    # Em um produto existente, 'criado' é preservado; 'modificado' passa a ser o instante da carga (auto_now),
+    # o que também muda o ETag da página de detalhe do produto.
+    with transaction.atomic(using = conexao.alias):
+        Produto.objects.bulk_create(
+            objetos,
+            update_conflicts = True,
+            update_fields = campos,
+            unique_fields = ['id'] if conexao.features.supports_update_conflicts_with_target else None,
+            # O MySQL não aceita indicar a coluna do conflito (ON DUPLICATE KEY UPDATE vale para qualquer chave única).
+        )
+        if novos:
+            # bulk_create preenche 'criado' com o instante atual (auto_now_add); restauramos a data do registro nos produtos novos,
+            # pois ela define a ordem da listagem. Um UPDATE simples por produto, enviado com executemany, é bem mais leve
+            # que o bulk_update (que monta um CASE WHEN com uma cláusula por produto).
+            tabela = conexao.ops.quote_name(Produto._meta.db_table)
+            with conexao.cursor() as cursor:
+                cursor.executemany(
+                    f"UPDATE {tabela} SET {conexao.ops.quote_name('criado')} = %s WHERE {conexao.ops.quote_name('id')} = %s",
+                    [(conexao.ops.adapt_datetimefield_value(criacao[objeto.pk]), objeto.pk) for objeto in novos],
+                )
+        anteriores = {pk: imagem for pk, (_, _, imagem) in existentes.items()}
+        trocadas = [objeto for objeto in objetos if objeto.imagem.name != anteriores.get(objeto.pk)]
+        ajustar_referencias(
+            removidas = [anteriores[objeto.pk] for objeto in trocadas if anteriores.get(objeto.pk)],
+            adicionadas = [(objeto.imagem.name, objeto.image_width, objeto.image_height) for objeto in trocadas],
+        ) # Contagem de referências das imagens (core/armazenamento.py), que o bulk_create não atualiza por não disparar signals.
+        invalidar_produtos([objeto.pk for objeto in objetos])
+
+    return len(novos), len(objetos) - len(novos), len(pedaco) - len(objetos)
+
+
+def _instancia(Produto, registro, h, agora):
+    valores = {}
+    for nome, valor in registro.get('fields', {}).items():
+        try:
+            campo = Produto._meta.get_field(nome)
+        except FieldDoesNotExist:
+            raise CargaInvalida(f"Produto {registro['pk']}: campo desconhecido '{nome}'.")
+        valores[campo.attname] = campo.to_python(valor)
+    valores.setdefault('criado', agora)
+    return Produto(pk = registro['pk'], hash_carga = h, **valores)
+
+
+def atribuir_slugs(Produto, objetos, atuais = None):
+    """
+    Calcula o slug de todos os produtos de um lote, sem o signal pre_save (usado por bulk_create).
+
+    Parâmetros:
+    - Produto: O modelo Produto.
+    - objetos (list[Produto]): Instâncias do lote, salvas ou não (pk None).
+    - atuais (dict[int, str] | None): Slugs que os produtos já existentes têm hoje no banco, por id.
+
+    Cada produto mantém o slug informado ou o que já tem no banco, se for compatível com o nome (veja slug_compativel)
+    e não pertencer a outro produto; caso contrário, recebe um novo slug. A verificação custa uma consulta por lote,
+    e a resolução dos conflitos (nomes repetidos) mais uma.
+    """
+    from .models import slug_base, slug_compativel, slugs_livres
+
+    atuais = atuais or {}
+    desejados = []
+    for objeto in objetos:
+        candidatos = [objeto.slug, atuais.get(objeto.pk)]
+        desejados.append(next((c for c in candidatos if slug_compativel(c, objeto.nome)), slug_base(objeto.nome)))
+    donos = dict(Produto.objects.filter(slug__in = set(desejados)).values_list('slug', 'pk'))
+
+    usados = set()
+    conflitos = defaultdict(list)
+    for objeto, slug in zip(objetos, desejados):
+        if donos.get(slug, objeto.pk) != objeto.pk or slug in usados:
+            conflitos[slug_base(objeto.nome)].append(objeto)
+        else:
+            objeto.slug = slug
+            usados.add(slug)
+
+    if not conflitos:
+        return
+    # Uma consulta (para cada grupo de até 100 bases, limite prático do tamanho da cláusula WHERE) traz os slugs já usados
+    # que começam por alguma das bases em conflito; cada slug é então atribuído à sua base ("camiseta" ou "camiseta-<número>").
+    ocupados = defaultdict(set)
+    bases = list(conflitos)
+    pks = [objeto.pk for grupo in conflitos.values() for objeto in grupo if objeto.pk is not None]
+    for inicio in range(0, len(bases), 100):
+        filtro = Q()
+        for base in bases[inicio:inicio + 100]:
+            filtro |= Q(slug = base) | Q(slug__startswith = f'{base}-')
+        for slug in Produto.objects.filter(filtro).exclude(pk__in = pks).values_list('slug', flat = True):
+            prefixo, _, sufixo = slug.rpartition('-')
+            if slug in conflitos:
+                ocupados[slug].add(slug)
+            elif sufixo.isdigit() and prefixo in conflitos:
+                ocupados[prefixo].add(slug)
+
+    for base, grupo in conflitos.items():
+        livres = slugs_livres(base, ocupados[base] | usados)
+        for objeto in grupo:
+            objeto.slug = next(livres)
+            usados.add(objeto.slug)
+
+
+def _reiniciar_sequencia(Produto):
+    # Os produtos são inseridos com o id do registro; no PostgreSQL isso não avança a sequência do id, e o próximo
+    # produto criado pelo site receberia um id já usado. O loaddata faz o mesmo ajuste ao final da carga.
+    conexao = connections[router.db_for_write(Produto)]
+    comandos = conexao.ops.sequence_reset_sql(no_style(), [Produto])
+    if comandos:
+        with conexao.cursor() as cursor:
+            for comando in comandos:
+                cursor.execute(comando)
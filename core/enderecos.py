@@ -0,0 +1,71 @@
+# Este módulo implementa a resolução das URLs dos arquivos de mídia (imagens de produto e suas versões) sem chamadas ao
+# armazenamento.
+# Em produção o armazenamento padrão é o GoogleCloudStorage, e cada storage.url() monta um objeto Blob e, com
+# GS_QUERYSTRING_AUTH (o padrão do django-storages), assina a URL com a chave privada da conta de serviço: uma página do
+# catálogo com N produtos fazia N × (versões no srcset) assinaturas RSA. Aqui:
+# 1) com MIDIA_URLS_ASSINADAS desligado, a URL é apenas MEDIA_URL + o nome do arquivo (o mesmo que blob.public_url, ou que o
+#    FileSystemStorage no desenvolvimento), sem nenhum objeto do armazenamento;
+# 2) com MIDIA_URLS_ASSINADAS ligado, a URL é assinada (V4) localmente com as credenciais já carregadas em GS_CREDENTIALS,
+#    pela API pública do google-cloud-storage (Blob.generate_signed_url), sem rede. O tempo é dividido em janelas de
+#    MIDIA_URL_JANELA segundos: a URL de um arquivo é assinada uma vez por janela em cada processo e reaproveitada até o
+#    fim dela, de modo que as páginas repetem a mesma URL e o navegador reaproveita o que já baixou. Todas as URLs de uma
+#    janela expiram no mesmo instante, GS_EXPIRATION depois do início dela: uma URL servida (inclusive de uma página em
+#    cache) ainda vale pelo menos GS_EXPIRATION - janela.
+#    A memória das URLs assinadas é um LRU limitado a MAXIMO_MEMORIZADAS entradas (as das janelas anteriores saem primeiro).
+# Nenhum dos dois caminhos faz entrada/saída de rede ou consulta metadados do arquivo.
+
+import time
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import storages
+
+MAXIMO_MEMORIZADAS = 10000
+# Limite de URLs assinadas memorizadas por processo (cerca de 1 KB cada); ao atingi-lo, as menos usadas são descartadas.
+
+
+def url_midia(nome):
+    """
+    Retorna a URL do arquivo de mídia `nome` (por exemplo, "produtos/<sha256>/1/400w.avif") sem acessar o armazenamento.
+
+    Parâmetros:
+    - nome (str): Nome do arquivo no armazenamento padrão, como gravado no banco (FieldFile.name) ou gerado pelo
+      django-pictures (Picture.name).
+    """
+    if not nome:
+        return ''
+    if not settings.MIDIA_URLS_ASSINADAS:
+        return settings.MEDIA_URL + quote(nome, safe = '/~')
+
+    janela = int(time.time()) // settings.MIDIA_URL_JANELA * settings.MIDIA_URL_JANELA
+    return _assinar(nome, janela)
+
+
+def validade_garantida():
+    """
+    Retorna por quantos segundos, no mínimo, uma URL devolvida agora por url_midia continua válida, ou None se ela não expira.
+
+    Serve para limitar o tempo em cache de respostas que apontam para a URL (por exemplo, o redirecionamento de versao_imagem).
+    """
+    if not settings.MIDIA_URLS_ASSINADAS:
+        return None
+    expiracao = getattr(settings, 'GS_EXPIRATION', timedelta(days = 1))
+    return max(int(expiracao.total_seconds()) - settings.MIDIA_URL_JANELA, 0)
+
+
+@lru_cache(maxsize = MAXIMO_MEMORIZADAS)
+def _assinar(nome, janela):
+    # Assina a URL com a chave da conta de serviço (RSA, em memória desde a carga de GS_CREDENTIALS), válida até
+    # GS_EXPIRATION depois do início da janela. O bucket (e o cliente) são os do armazenamento padrão, criados uma única
+    # vez por processo pelo django-storages; montar o Blob não faz nenhuma chamada ao GCS.
+    # A janela faz parte da chave do lru_cache: na janela seguinte a URL é assinada de novo.
+    armazenamento = storages['default']
+    caminho = '/'.join(filter(None, [armazenamento.location, nome]))
+    expiracao = getattr(settings, 'GS_EXPIRATION', timedelta(days = 1))
+    return armazenamento.bucket.blob(caminho).generate_signed_url(
+        version = 'v4',
+        expiration = datetime.fromtimestamp(janela, timezone.utc) + expiracao,
+        credentials = settings.GS_CREDENTIALS,
+    )
@@ -0,0 +1,274 @@
+# Este módulo implementa o envio em partes ("chunked") e retomável das imagens de Produto, inspirado no protocolo tus (https://tus.io).
+# Em vez de mandar a foto inteira em um único POST multipart (que o Django grava em um arquivo temporário e depois
+# relê para salvar no armazenamento), o cliente:
+# 1) cria um envio informando o tamanho total (POST /produto/envios/, cabeçalho Upload-Length);
+# 2) manda o arquivo em partes (PATCH /produto/envios/<id>/, cabeçalho Upload-Offset), cada uma gravada direto no armazenamento;
+# 3) se a conexão cair, pergunta quanto já foi recebido (HEAD /produto/envios/<id>/) e continua dali.
+# As dimensões da imagem são validadas a partir dos primeiros bytes (o cabeçalho do arquivo), antes de o corpo inteiro chegar.
+# Quando a última parte chega, as partes são concatenadas em streaming no arquivo final, e o id do envio pode ser usado
+# no campo 'envio' do ProdutoModelForm no lugar do upload tradicional.
+# Envios abandonados (sem partes novas e sem uso por ENVIO_VALIDADE segundos) são apagados, com as suas partes, pelo
+# comando sweep_reservations (veja expirar_envios).
+
+import base64
+import hashlib
+import tempfile
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import ImageFile
+
+BLOCO = 64 * 1024
+# Tamanho dos blocos lidos do corpo da requisição e das partes gravadas.
+
+LIMITE_CABECALHO = 512 * 1024
+# Quantidade máxima de bytes do início do arquivo examinados para descobrir o formato e as dimensões da imagem.
+# Se o Pillow não conseguir identificar uma imagem nesse trecho, o envio é recusado.
+
+
+class EnvioInvalido(Exception):
+    """
+    Erro de protocolo ou de validação em um envio.
+
+    O atributo status contém o código HTTP que a view deve devolver ao cliente
+    (409 para deslocamento divergente, 413 para tamanho excedido, 415 para arquivo que não é imagem etc.).
+    """
+
+    def __init__(self, mensagem, status = 400):
+        super().__init__(mensagem)
+        self.status = status
+
+
+class _LeitorConcatenado:
+    """
+    Objeto "arquivo" somente leitura que entrega o conteúdo das partes gravadas no armazenamento, em ordem,
+    como se fosse um único arquivo.
+
+    Nenhuma parte é carregada inteira na memória: cada read() lê no máximo o tamanho pedido da parte atual.
+    Suporta apenas seek(0) (voltar ao início).
+    """
+
+    def __init__(self, armazenamento, partes):
+        self.armazenamento = armazenamento
+        self.partes = partes
+        self.seek(0)
+
+    def seek(self, posicao, whence = 0):
+        if posicao != 0 or whence != 0:
+            raise OSError("Só é possível voltar ao início de um envio concatenado.")
+        self.close()
+        self.indice = 0
+        self.atual = None
+        self.posicao = 0
+        return 0
+
+    def tell(self):
+        return self.posicao
+
+    def read(self, tamanho = -1):
+        pedacos = []
+        while tamanho != 0 and self.indice < len(self.partes):
+            if self.atual is None:
+                self.atual = self.armazenamento.open(self.partes[self.indice], 'rb')
+            pedaco = self.atual.read(tamanho if tamanho > 0 else BLOCO)
+            if not pedaco:
+                self.atual.close()
+                self.atual = None
+                self.indice += 1
+                continue
+            pedacos.append(pedaco)
+            if tamanho > 0:
+                tamanho -= len(pedaco)
+        dados = b''.join(pedacos)
+        self.posicao += len(dados)
+        return dados
+
+    def close(self):
+        if getattr(self, 'atual', None) is not None:
+            self.atual.close()
+            self.atual = None
+
+
+def _dimensoes(blocos):
+    # Alimenta o parser incremental do Pillow até que ele identifique o formato e o tamanho da imagem.
+    # Retorna (largura, altura) ou None se o trecho examinado não for suficiente.
+    parser = ImageFile.Parser()
+    for bloco in blocos:
+        try:
+            parser.feed(bloco)
+        except Exception as e:
+            # Formato corrompido ou imagem grande demais (Image.MAX_IMAGE_PIXELS, proteção contra "decompression bombs").
+            raise EnvioInvalido(f"O arquivo enviado não é uma imagem válida: {e}", status = 415)
+        if parser.image:
+            return parser.image.size
+    return None
+
+
+def criar_envio(nome, tamanho, usuario = None):
+    """Cria um novo EnvioImagem, validando o tamanho total declarado (cabeçalho Upload-Length)."""
+    from .models import EnvioImagem
+
+    if tamanho <= 0:
+        raise EnvioInvalido("Upload-Length deve ser um inteiro positivo.")
+    if tamanho > settings.PRODUTO_IMAGEM_MAX_BYTES:
+        raise EnvioInvalido(f"A imagem excede o limite de {settings.PRODUTO_IMAGEM_MAX_BYTES} bytes.", status = 413)
+    return EnvioImagem.objects.create(nome = nome or 'imagem', tamanho = tamanho, usuario = usuario)
+
+
+def receber_parte(envio, deslocamento, corpo, tamanho, checksum = None):
+    """
+    Grava no armazenamento uma parte do envio e avança o deslocamento recebido.
+
+    Parâmetros:
+    - envio (EnvioImagem): Envio em andamento.
+    - deslocamento (int): Posição da parte no arquivo (cabeçalho Upload-Offset); deve ser igual a envio.recebido.
+    - corpo: Objeto com metodo read(n), normalmente a própria requisição (o corpo é lido em streaming).
+    - tamanho (int): Quantidade de bytes da parte (cabeçalho Content-Length).
+    - checksum (str | None): Cabeçalho Upload-Checksum no formato "sha256 <base64>", verificado ao final da leitura.
+
+    A parte é lida em blocos, com o hash calculado durante a leitura, e guardada em um arquivo temporário que só vai
+    para o disco se passar de 1 MiB (o tamanho de cada parte é limitado por settings.ENVIO_MAX_PARTE_BYTES).
+    Quando a última parte chega, o arquivo final é montado (veja montar_envio).
+    """
+    from .models import EnvioImagem
+
+    if envio.concluido:
+        raise EnvioInvalido("Este envio já foi concluído.", status = 409)
+    if deslocamento != envio.recebido:
+        raise EnvioInvalido(f"Upload-Offset divergente: esperado {envio.recebido}.", status = 409)
+    if tamanho <= 0 or tamanho > settings.ENVIO_MAX_PARTE_BYTES or deslocamento + tamanho > envio.tamanho:
+        raise EnvioInvalido("Tamanho da parte inválido.", status = 413)
+
+    algoritmo, _, esperado = (checksum or '').partition(' ')
+    if checksum and algoritmo.lower() != 'sha256':
+        raise EnvioInvalido("Apenas Upload-Checksum sha256 é suportado.")
+
+    sha256 = hashlib.sha256()
+    validar = envio.largura is None and deslocamento < LIMITE_CABECALHO
+    cabecalho = [_ler(nome) for nome in envio.partes] if validar else []
+    # Se o cabeçalho não coube nas partes anteriores (partes muito pequenas), reexaminamos o início já recebido (no máximo LIMITE_CABECALHO bytes).
+
+    with tempfile.SpooledTemporaryFile(max_size = 1024 * 1024) as temporario:
+        restante = tamanho
+        while restante:
+            bloco = corpo.read(min(BLOCO, restante))
+            if not bloco:
+                raise EnvioInvalido("Conexão encerrada antes do fim da parte.")
+            restante -= len(bloco)
+            sha256.update(bloco)
+            temporario.write(bloco)
+            if validar:
+                cabecalho.append(bloco)
+                dimensoes = _dimensoes(cabecalho)
+                if dimensoes:
+                    _validar_dimensoes(*dimensoes)
+                    envio.largura, envio.altura = dimensoes
+                    validar = False
+                    cabecalho = []
+
+        if validar and deslocamento + tamanho >= min(LIMITE_CABECALHO, envio.tamanho):
+            raise EnvioInvalido("Não foi possível identificar a imagem pelo cabeçalho do arquivo.", status = 415)
+        if checksum and base64.b64encode(sha256.digest()).decode() != esperado:
+            raise EnvioInvalido("Upload-Checksum não confere.", status = 460)
+
+        temporario.seek(0)
+        nome = default_storage.save(f'envios/{envio.pk}/{deslocamento:012d}-{uuid.uuid4().hex[:8]}.parte', File(temporario))
+
+    # A atualização é condicional (WHERE recebido = deslocamento): se outra requisição gravou a mesma parte antes,
+    # nenhuma linha é alterada, a parte duplicada é descartada e o cliente recebe 409 para consultar o deslocamento atual.
+    alterados = EnvioImagem.objects.filter(pk = envio.pk, recebido = deslocamento).update(
+        recebido = deslocamento + tamanho,
+        partes = envio.partes + [nome],
+        largura = envio.largura,
+        altura = envio.altura,
+        modificado = timezone.now(), # O update() não preenche os campos auto_now; expirar_envios se guia por este.
+    )
+    if not alterados:
+        default_storage.delete(nome)
+        raise EnvioInvalido("Upload-Offset divergente: parte já recebida por outra requisição.", status = 409)
+
+    envio.refresh_from_db()
+    if envio.recebido == envio.tamanho:
+        montar_envio(envio)
+    return envio
+
+
+def _ler(nome):
+    with default_storage.open(nome, 'rb') as arquivo:
+        return arquivo.read()
+
+
+def _validar_dimensoes(largura, altura):
+    if max(largura, altura) > settings.PRODUTO_IMAGEM_MAX_LADO:
+        raise EnvioInvalido(
+            f"A imagem tem {largura}x{altura} pixels; o máximo permitido é {settings.PRODUTO_IMAGEM_MAX_LADO} pixels por lado.",
+            status = 422,
+        )
+
+
+def montar_envio(envio):
+    """
+    Concatena as partes no arquivo final (em upload_to de Produto.imagem), registra o SHA-256 e apaga as partes.
+
+    As partes são lidas do armazenamento uma única vez, em streaming, para um arquivo temporário (que só vai para o disco
+    se passar de 1 MiB), com o hash calculado durante a leitura. O arquivo final é gravado pelo armazenamento de
+    Produto.imagem com esse hash no nome (core/armazenamento.py); uma imagem já existente não é gravada de novo.
+    """
+    from .models import Produto
+
+    campo = Produto._meta.get_field('imagem')
+    leitor = _LeitorConcatenado(default_storage, envio.partes)
+    sha256 = hashlib.sha256()
+    with tempfile.SpooledTemporaryFile(max_size = 1024 * 1024) as temporario:
+        try:
+            while bloco := leitor.read(BLOCO):
+                sha256.update(bloco)
+                temporario.write(bloco)
+        finally:
+            leitor.close()
+        temporario.seek(0)
+        arquivo = File(temporario, name = envio.nome)
+        envio.arquivo = campo.storage.salvar_com_hash(campo.generate_filename(None, envio.nome), arquivo, sha256.hexdigest())
+    envio.sha256 = sha256.hexdigest()
+    for nome in envio.partes:
+        default_storage.delete(nome)
+    envio.partes = []
+    envio.save(update_fields = ['arquivo', 'sha256', 'partes', 'modificado'])
+    return envio
+
+
+def cancelar_envio(envio):
+    """Apaga as partes já recebidas (e o arquivo final, se não tiver sido usado por um produto) e o próprio envio."""
+    from .armazenamento import em_uso
+    from .models import Produto
+
+    for nome in envio.partes:
+        default_storage.delete(nome)
+    if envio.arquivo and not em_uso(envio.arquivo) and not Produto.objects.filter(imagem = envio.arquivo).exists():
+        # Com o armazenamento endereçado por conteúdo, o arquivo final pode ser o mesmo de um produto já existente.
+        default_storage.delete(envio.arquivo)
+    envio.delete()
+
+
+def expirar_envios(lote = 100):
+    """
+    Apaga os envios abandonados e retorna quantos foram apagados (chamada pelo comando sweep_reservations).
+
+    Um envio é abandonado quando fica ENVIO_VALIDADE segundos sem alteração: nenhuma parte nova chegou ou, se concluído,
+    nenhum produto o usou (o ProdutoModelForm apaga o envio ao usá-lo). As partes e o arquivo final não usado são
+    apagados com ele (veja cancelar_envio); o cliente que ainda tente continuar o envio recebe 404.
+
+    Parâmetros:
+    - lote (int): Quantidade máxima de envios apagados por chamada.
+    """
+    from .models import EnvioImagem
+
+    limite = timezone.now() - timedelta(seconds = settings.ENVIO_VALIDADE)
+    abandonados = list(EnvioImagem.objects.filter(modificado__lt = limite).order_by('modificado')[:lote])
+    for envio in abandonados:
+        cancelar_envio(envio)
+    return len(abandonados)
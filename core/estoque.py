@@ -0,0 +1,263 @@
+# Este módulo implementa as baixas e reservas de estoque dos produtos.
+# Alterar Produto.estoque lendo o produto, subtraindo e chamando save() perde atualizações quando dois pedidos do mesmo
+# produto chegam juntos (os dois leem o mesmo valor e o último save vence), além de regravar todas as colunas e disparar
+# produto_pre_save (que consulta o produto e confere o slug). Aqui cada alteração é um UPDATE condicional com F():
+#     UPDATE core_produto SET estoque = estoque - n WHERE id = ... AND estoque >= n
+# O banco aplica a condição e a subtração sobre o valor atual da linha, sob a trava da própria linha, sem leitura prévia:
+# se o UPDATE não alterar nenhuma linha, o estoque era insuficiente, e nada foi gravado.
+# 1) baixar e reservar tratam vários produtos (SKUs) de uma vez, com um único UPDATE (CASE id WHEN ... THEN n) dentro de
+#    uma transação: ou todos os itens são atendidos ou nenhum é; as linhas são travadas pelo índice da chave primária, na
+#    mesma ordem em todos os pedidos, e apenas até o fim da transação, que não espera nada além do próprio banco.
+# 2) Uma reserva (modelo Reserva) retira o estoque na hora e expira depois de ESTOQUE_RESERVA_VALIDADE segundos se não for
+#    confirmada; o comando `python manage.py sweep_reservations` devolve ao estoque as reservas expiradas.
+# 3) Cada operação retorna um Resultado com as linhas alteradas e a quantidade de comandos SQL enviados ao banco, que não
+#    depende da quantidade de itens (exceto na varredura do SQLite; veja varrer_expiradas).
+# Como o UPDATE não dispara os signals de Produto, as mesmas consequências de um save() são aplicadas aqui: o campo
+# 'modificado' (ETag da página de detalhe), o cache do catálogo e, quando um produto fica sem estoque ou volta a tê-lo,
+# as contagens das facetas (core/facetas.py).
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from .cache_catalogo import invalidar_produtos
+from .facetas import ajustar_contagens, celula
+
+
+class EstoqueInsuficiente(Exception):
+    """
+    Exceção lançada quando algum item não tem estoque suficiente; nenhum item é baixado ou reservado.
+
+    O atributo faltando é o dicionário {id do produto: quantidade disponível} dos itens não atendidos
+    (0 para produtos inexistentes).
+    """
+
+    def __init__(self, faltando):
+        super().__init__(f"Estoque insuficiente para os produtos {sorted(faltando)}.")
+        self.faltando = faltando
+
+
+class ReservaEncerrada(Exception):
+    """Exceção lançada ao confirmar uma reserva que já foi confirmada, liberada ou que expirou."""
+
+
+class Resultado:
+    """
+    Resumo de uma operação de estoque.
+
+    - linhas: quantidade de linhas alteradas (produtos, na baixa e na reserva; reservas, na liberação e na varredura).
+    - consultas: comandos SQL enviados ao banco pela operação. No SQLite, o BEGIN da transação passa pelo cursor e é
+      contado (o COMMIT, não); no PostgreSQL, o psycopg2 abre a transação sozinho, e a contagem é uma unidade menor.
+    - reserva: a Reserva criada (apenas em reservar).
+    """
+
+    def __init__(self, linhas = 0, consultas = 0, reserva = None):
+        self.linhas = linhas
+        self.consultas = consultas
+        self.reserva = reserva
+
+    def __repr__(self):
+        return f'Resultado(linhas = {self.linhas}, consultas = {self.consultas})'
+
+
+class _Contador:
+    # execute_wrapper que conta os comandos SQL enviados durante uma operação.
+    def __init__(self):
+        self.consultas = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.consultas += 1
+        return execute(sql, params, many, context)
+
+
+def _quantidades(itens):
+    # Valida os itens ({id do produto: quantidade}) e os retorna ordenados pelo id.
+    quantidades = {}
+    for pk, quantidade in itens.items():
+        quantidade = int(quantidade)
+        if quantidade <= 0:
+            raise ValueError(f"Quantidade inválida para o produto {pk}: {quantidade}.")
+        quantidades[int(pk)] = quantidade
+    if not quantidades:
+        raise ValueError("Nenhum item informado.")
+    return dict(sorted(quantidades.items()))
+
+
+def _por_produto(quantidades):
+    # Expressão com a quantidade de cada produto: um valor fixo para um único produto, ou CASE id WHEN ... THEN n END.
+    if len(quantidades) == 1:
+        return Value(next(iter(quantidades.values())))
+    return Case(*[When(pk = pk, then = Value(n)) for pk, n in quantidades.items()], output_field = IntegerField())
+
+
+def _alterar(quantidades, sinal):
+    # Soma (sinal = 1) ou subtrai (sinal = -1) as quantidades do estoque com um único UPDATE e aplica as consequências.
+    # Na subtração, só são alteradas as linhas com estoque suficiente; retorna a quantidade de linhas alteradas.
+    from .models import Produto
+
+    produtos = Produto.objects.filter(pk__in = list(quantidades))
+    quantidade = _por_produto(quantidades)
+    if sinal < 0:
+        produtos = produtos.filter(estoque__gte = quantidade)
+        linhas = produtos.update(estoque = F('estoque') - quantidade, modificado = timezone.now())
+    else:
+        linhas = produtos.update(estoque = F('estoque') + quantidade, modificado = timezone.now())
+    if linhas and (sinal > 0 or linhas == len(quantidades)):
+        # Se a subtração não atendeu todos os itens, a transação será desfeita: nada a propagar.
+        _propagar(quantidades, sinal)
+    return linhas
+
+
+def _propagar(quantidades, sinal):
+    # Lê os valores gravados (as linhas continuam travadas pela transação) e atualiza as contagens das facetas dos produtos
+    # que ficaram sem estoque ou voltaram a tê-lo, além do cache do catálogo, como produto_post_save faria.
+    from .models import Produto
+
+    removidas, adicionadas = [], []
+    for pk, ativo, preco, estoque in Produto.objects.filter(pk__in = list(quantidades)).values_list('pk', 'ativo', 'preco', 'estoque'):
+        anterior = estoque - sinal * quantidades[pk]
+        if (anterior > 0) != (estoque > 0):
+            removidas.append(celula(ativo, preco, anterior))
+            adicionadas.append(celula(ativo, preco, estoque))
+    if removidas:
+        ajustar_contagens(removidas = removidas, adicionadas = adicionadas)
+    invalidar_produtos(list(quantidades), listagem = bool(removidas))
+
+
+def _faltando(quantidades):
+    # Itens que o UPDATE não atendeu, com o estoque disponível de cada um.
+    from .models import Produto
+
+    disponiveis = dict(Produto.objects.filter(pk__in = list(quantidades)).values_list('pk', 'estoque'))
+    return {pk: max(disponiveis.get(pk, 0), 0) for pk, n in quantidades.items() if disponiveis.get(pk, 0) < n}
+
+
+def baixar(itens):
+    """
+    Baixa do estoque os `itens` (por exemplo, uma venda confirmada sem reserva prévia): todos ou nenhum.
+
+    Parâmetros:
+    - itens (dict): {id do produto: quantidade}, com quantidades positivas.
+
+    Retorna um Resultado. Lança EstoqueInsuficiente se algum produto não tiver a quantidade pedida.
+    São enviados 3 comandos SQL (o BEGIN, o UPDATE e a leitura dos valores gravados), mais um UPDATE por combinação de
+    facetas alterada quando algum produto fica sem estoque: normalmente 2 (a combinação "com estoque" perde o produto e a
+    "sem estoque" o ganha), ou seja, 5 comandos. Se a combinação ainda não existir no cubo, somam-se a leitura, o INSERT
+    e o SAVEPOINT de get_or_create (veja facetas.ajustar_contagens).
+    """
+    quantidades = _quantidades(itens)
+    contador = _Contador()
+    with connection.execute_wrapper(contador), transaction.atomic():
+        if _alterar(quantidades, -1) != len(quantidades):
+            raise EstoqueInsuficiente(_faltando(quantidades)) # A exceção desfaz as linhas já subtraídas dos demais itens.
+    return Resultado(len(quantidades), contador.consultas)
+
+
+def reservar(itens, usuario = None, validade = None):
+    """
+    Reserva os `itens`, retirando-os do estoque até que a reserva seja confirmada, liberada ou expire: todos ou nenhum.
+
+    Parâmetros:
+    - itens (dict): {id do produto: quantidade}, com quantidades positivas.
+    - usuario (User | None): Usuário dono da reserva.
+    - validade (int | None): Segundos até a reserva expirar (padrão: ESTOQUE_RESERVA_VALIDADE).
+
+    Retorna um Resultado com a Reserva criada em 'reserva'. Lança EstoqueInsuficiente se algum produto não tiver a
+    quantidade pedida. Qualquer que seja a quantidade de itens, são enviados 5 comandos SQL: o BEGIN, o UPDATE dos
+    produtos, a leitura dos valores gravados e os INSERTs da reserva e dos seus itens. Quando a reserva esgota algum
+    produto, somam-se os UPDATEs das contagens das facetas, como em baixar: normalmente 2, ou seja, 7 comandos.
+    """
+    from .models import ItemReserva, Reserva
+
+    quantidades = _quantidades(itens)
+    validade = settings.ESTOQUE_RESERVA_VALIDADE if validade is None else validade
+    contador = _Contador()
+    with connection.execute_wrapper(contador), transaction.atomic():
+        if _alterar(quantidades, -1) != len(quantidades):
+            raise EstoqueInsuficiente(_faltando(quantidades))
+        reserva = Reserva.objects.create(usuario = usuario, expira_em = timezone.now() + timedelta(seconds = validade))
+        ItemReserva.objects.bulk_create([
+            ItemReserva(reserva = reserva, produto_id = pk, quantidade = quantidade) for pk, quantidade in quantidades.items()
+        ])
+    return Resultado(len(quantidades), contador.consultas, reserva)
+
+
+def confirmar(reserva):
+    """
+    Confirma a `reserva` (Reserva ou id): o estoque reservado passa a ser definitivamente baixado.
+
+    Lança ReservaEncerrada se a reserva não estiver ativa ou já tiver expirado. Envia um único UPDATE condicional,
+    de modo que uma confirmação nunca disputa a mesma reserva com a varredura das expiradas.
+    """
+    from .models import Reserva
+
+    contador = _Contador()
+    with connection.execute_wrapper(contador):
+        agora = timezone.now()
+        linhas = Reserva.objects.filter(pk = getattr(reserva, 'pk', reserva), estado = Reserva.ATIVA, expira_em__gt = agora).update(
+            estado = Reserva.CONFIRMADA, modificado = agora)
+    if not linhas:
+        raise ReservaEncerrada(f"A reserva {getattr(reserva, 'pk', reserva)} não está mais ativa.")
+    return Resultado(linhas, contador.consultas)
+
+
+def _devolver(ids):
+    # Devolve ao estoque os itens das reservas `ids`, já marcadas como liberadas ou expiradas, com um único UPDATE.
+    from .models import ItemReserva
+
+    quantidades = dict(
+        ItemReserva.objects.filter(reserva_id__in = ids).values_list('produto_id').annotate(total = Sum('quantidade')).order_by('produto_id')
+    )
+    if quantidades:
+        _alterar(quantidades, 1)
+
+
+def liberar(reserva):
+    """
+    Cancela a `reserva` (Reserva ou id) ainda ativa, devolvendo os itens ao estoque.
+
+    Retorna um Resultado com linhas = 1, ou 0 se a reserva já não estava ativa (nesse caso nada é devolvido, de modo que
+    liberar duas vezes não devolve o estoque duas vezes).
+    """
+    from .models import Reserva
+
+    contador = _Contador()
+    with connection.execute_wrapper(contador), transaction.atomic():
+        linhas = Reserva.objects.filter(pk = getattr(reserva, 'pk', reserva), estado = Reserva.ATIVA).update(
+            estado = Reserva.LIBERADA, modificado = timezone.now())
+        if linhas:
+            _devolver([getattr(reserva, 'pk', reserva)])
+    return Resultado(linhas, contador.consultas)
+
+
+def varrer_expiradas(lote = 500, agora = None):
+    """
+    Marca como expiradas até `lote` reservas ativas cujo prazo já passou e devolve os seus itens ao estoque.
+
+    Parâmetros:
+    - lote (int): Quantidade máxima de reservas tratadas por transação.
+    - agora (datetime | None): Instante de referência (padrão: timezone.now()).
+
+    Retorna um Resultado com a quantidade de reservas expiradas. Nos bancos com SELECT ... FOR UPDATE SKIP LOCKED
+    (PostgreSQL, MySQL 8), as reservas são travadas pela leitura e vários processos podem varrer ao mesmo tempo, cada um
+    com as suas; no SQLite, cada reserva é marcada por um UPDATE condicional próprio.
+    """
+    from .models import Reserva
+
+    agora = agora or timezone.now()
+    contador = _Contador()
+    with connection.execute_wrapper(contador), transaction.atomic():
+        expiradas = Reserva.objects.filter(estado = Reserva.ATIVA, expira_em__lte = agora).order_by('expira_em')
+        if connection.features.has_select_for_update_skip_locked:
+            ids = list(expiradas.select_for_update(skip_locked = True).values_list('pk', flat = True)[:lote])
+            if ids:
+                Reserva.objects.filter(pk__in = ids).update(estado = Reserva.EXPIRADA, modificado = agora)
+        else:
+            ids = [pk for pk in expiradas.values_list('pk', flat = True)[:lote]
+                   if Reserva.objects.filter(pk = pk, estado = Reserva.ATIVA).update(estado = Reserva.EXPIRADA, modificado = agora)]
+        if ids:
+            _devolver(ids)
+    return Resultado(len(ids), contador.consultas)
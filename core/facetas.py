@@ -0,0 +1,225 @@
+# Este módulo implementa os filtros por faceta da listagem de produtos (view index) e do admin (ProdutoAdmin.list_filter):
+# faixa de preço, em estoque / sem estoque e ativo / inativo, cada opção com a quantidade de produtos correspondente.
+# Em vez de um COUNT(*) por opção a cada requisição, as quantidades vêm de uma tabela de agregados (ContagemProdutos):
+# uma linha por combinação de (ativo, faixa de preço, com estoque) — o "cubo" das facetas, com poucas dezenas de linhas.
+# 1) Os signals de Produto (core/models.py) mantêm o cubo atualizado: quando um produto muda de combinação (ou é criado
+#    ou excluído), as duas linhas afetadas recebem um UPDATE ... SET quantidade = quantidade ± 1, na mesma transação.
+# 2) As gravações em massa, que não disparam signals, recalculam o cubo inteiro com uma única consulta agrupada
+#    (recalcular_contagens; também pelo comando `python manage.py rebuild_facets`).
+# 3) A leitura do cubo é guardada no cache 'catalogo' junto com a geração da listagem (core/cache_catalogo.py), que muda
+#    sempre que um produto muda de combinação: as quantidades exibidas custam uma leitura do cache.
+# Como o cubo tem todas as combinações, a quantidade de cada opção respeita os demais filtros escolhidos
+# (por exemplo, as faixas de preço contam apenas os produtos em estoque quando esse filtro está ativo).
+
+from bisect import bisect_right
+from collections import Counter
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import BooleanField, Case, Count, F, IntegerField, Value, When
+
+FACETAS = ('preco', 'estoque', 'ativo')
+# Facetas disponíveis, na ordem de exibição.
+
+POSICAO = {'ativo': 0, 'preco': 1, 'estoque': 2}
+# Posição de cada faceta nas combinações (ativo, faixa de preço, com estoque) do cubo.
+
+TITULOS = {'preco': 'Preço', 'estoque': 'Estoque', 'ativo': 'Situação'}
+
+VALORES_NA_URL = {
+    'estoque': {True: 'com', False: 'sem'},
+    'ativo': {True: 'sim', False: 'nao'},
+}
+# Como as facetas booleanas aparecem na query string (?estoque=com&ativo=nao). A faixa de preço é o número da faixa.
+
+
+def _cache():
+    return caches['catalogo']
+
+
+def faixa_de_preco(preco):
+    """Número da faixa de preço (0 a len(CATALOGO_FAIXAS_DE_PRECO)) em que `preco` se encontra."""
+    return bisect_right(settings.CATALOGO_FAIXAS_DE_PRECO, Decimal(preco))
+
+
+def celula(ativo, preco, estoque):
+    """Combinação (ativo, faixa de preço, com estoque) de um produto: a linha do cubo em que ele é contado."""
+    return (bool(ativo), faixa_de_preco(preco), estoque > 0)
+
+
+def opcoes(faceta):
+    """Lista de pares (valor, rótulo) das opções de `faceta`."""
+    if faceta == 'estoque':
+        return [(True, 'Em estoque'), (False, 'Sem estoque')]
+    if faceta == 'ativo':
+        return [(True, 'Ativos'), (False, 'Inativos')]
+    limites = settings.CATALOGO_FAIXAS_DE_PRECO
+    rotulos = [f'Abaixo de R$ {limites[0]}']
+    rotulos += [f'R$ {inicio} a R$ {fim}' for inicio, fim in zip(limites, limites[1:])]
+    rotulos.append(f'R$ {limites[-1]} ou mais')
+    return list(enumerate(rotulos))
+
+
+def valor_na_url(faceta, valor):
+    return str(valor) if faceta == 'preco' else VALORES_NA_URL[faceta][valor]
+
+
+def ler_filtros(parametros):
+    """
+    Lê os filtros da query string e retorna o dicionário {faceta: valor ou None}.
+
+    Parâmetros:
+    - parametros (QueryDict | dict): Parâmetros da requisição (?preco=1&estoque=com&ativo=sim).
+      Valores ausentes ou inválidos resultam em None (faceta sem filtro).
+    """
+    filtros = dict.fromkeys(FACETAS)
+    for faceta in FACETAS:
+        texto = parametros.get(faceta)
+        for valor, _ in opcoes(faceta):
+            if texto == valor_na_url(faceta, valor):
+                filtros[faceta] = valor
+    return filtros
+
+
+def filtrar(queryset, filtros):
+    """Aplica ao `queryset` de produtos os filtros lidos por ler_filtros."""
+    if filtros['ativo'] is not None:
+        queryset = queryset.filter(ativo = filtros['ativo'])
+    if filtros['estoque'] is not None:
+        queryset = queryset.filter(estoque__gt = 0) if filtros['estoque'] else queryset.filter(estoque__lte = 0)
+    if filtros['preco'] is not None:
+        limites = settings.CATALOGO_FAIXAS_DE_PRECO
+        if filtros['preco'] > 0:
+            queryset = queryset.filter(preco__gte = limites[filtros['preco'] - 1])
+        if filtros['preco'] < len(limites):
+            queryset = queryset.filter(preco__lt = limites[filtros['preco']])
+    return queryset
+
+
+def consulta(filtros, **alteracoes):
+    """Query string dos `filtros` (com as `alteracoes` aplicadas), sempre na mesma ordem; também usada nas chaves de cache."""
+    filtros = {**filtros, **alteracoes}
+    return urlencode([(faceta, valor_na_url(faceta, filtros[faceta])) for faceta in FACETAS if filtros[faceta] is not None])
+
+
+def ajustar_contagens(removidas = (), adicionadas = ()):
+    """
+    Atualiza o cubo: subtrai um produto de cada combinação em `removidas` e soma um em cada combinação em `adicionadas`.
+
+    Parâmetros:
+    - removidas, adicionadas (iterável de tuplas devolvidas por celula): Combinações antigas e novas dos produtos alterados.
+
+    Executa um UPDATE por combinação que de fato mudou, com F('quantidade'), sem ler o valor atual: duas gravações
+    simultâneas na mesma combinação não perdem atualizações.
+    """
+    from .models import ContagemProdutos
+
+    variacoes = Counter(adicionadas)
+    variacoes.subtract(Counter(removidas))
+    for (ativo, faixa, com_estoque), variacao in variacoes.items():
+        if not variacao:
+            continue
+        linhas = ContagemProdutos.objects.filter(ativo = ativo, faixa_preco = faixa, com_estoque = com_estoque)
+        if not linhas.update(quantidade = F('quantidade') + variacao):
+            ContagemProdutos.objects.get_or_create(ativo = ativo, faixa_preco = faixa, com_estoque = com_estoque)
+            linhas.update(quantidade = F('quantidade') + variacao)
+
+
+def recalcular_contagens():
+    """
+    Recalcula o cubo inteiro com uma única consulta agrupada e retorna as novas linhas (ativo, faixa, com estoque, quantidade).
+
+    Usada após gravações em massa e quando CATALOGO_FAIXAS_DE_PRECO muda.
+    """
+    from .cache_catalogo import invalidar_produtos
+    from .models import ContagemProdutos, Produto
+
+    limites = settings.CATALOGO_FAIXAS_DE_PRECO
+    faixa = Case(
+        *[When(preco__lt = limite, then = Value(numero)) for numero, limite in enumerate(limites)],
+        default = Value(len(limites)), output_field = IntegerField(),
+    )
+    com_estoque = Case(When(estoque__gt = 0, then = Value(True)), default = Value(False), output_field = BooleanField())
+    agrupadas = (
+        Produto.objects.annotate(faixa = faixa, com_estoque = com_estoque)
+        .values('ativo', 'faixa', 'com_estoque').annotate(quantidade = Count('pk')).order_by()
+    )
+    linhas = [(l['ativo'], l['faixa'], l['com_estoque'], l['quantidade']) for l in agrupadas]
+    with transaction.atomic():
+        anteriores = ContagemProdutos.objects.values_list('ativo', 'faixa_preco', 'com_estoque', 'quantidade')
+        if set(anteriores) != set(linhas):
+            ContagemProdutos.objects.all().delete()
+            ContagemProdutos.objects.bulk_create([
+                ContagemProdutos(ativo = ativo, faixa_preco = faixa, com_estoque = com_estoque, quantidade = quantidade)
+                for ativo, faixa, com_estoque, quantidade in linhas
+            ])
+            invalidar_produtos([], listagem = True) # As páginas filtradas e as quantidades em cache também mudam.
+    return linhas
+
+
+def _chave():
+    from .cache_catalogo import _geracao
+
+    return f'catalogo:contagens:{_geracao()}'
+
+
+def cubo():
+    """Linhas (ativo, faixa, com estoque, quantidade) do cubo, lidas do cache 'catalogo' ou, na falta, do banco."""
+    from .models import ContagemProdutos
+
+    cache = _cache()
+    chave = _chave()
+    linhas = cache.get(chave)
+    if linhas is None:
+        linhas = list(ContagemProdutos.objects.values_list('ativo', 'faixa_preco', 'com_estoque', 'quantidade'))
+        if not linhas:
+            linhas = recalcular_contagens() # Tabela recém-criada (ou esvaziada): o cubo é montado a partir dos produtos.
+            chave = _chave() # recalcular_contagens invalida a geração da listagem.
+        cache.set(chave, linhas, timeout = settings.CATALOGO_CACHE_TIMEOUT)
+    return linhas
+
+
+def contagens(filtros, facetas = FACETAS, linhas = None):
+    """
+    Retorna as opções de cada faceta com as suas quantidades, respeitando os filtros das demais facetas.
+
+    Parâmetros:
+    - filtros (dict): Filtros escolhidos (veja ler_filtros).
+    - facetas (iterável de str): Facetas retornadas.
+    - linhas (list | None): Linhas do cubo já lidas (por padrão, as de cubo()).
+
+    Retorna uma lista de dicionários {'faceta', 'titulo', 'opcoes'}; cada opção é um dicionário com 'valor' (como na
+    query string), 'rotulo', 'quantidade', 'selecionada' e 'consulta', a query string que escolhe a opção (ou, se ela
+    já estiver escolhida, que a desfaz).
+    """
+    linhas = cubo() if linhas is None else linhas
+    resultado = []
+    for faceta in facetas:
+        demais = [(POSICAO[outra], valor) for outra, valor in filtros.items() if outra != faceta and valor is not None]
+        quantidades = Counter()
+        for linha in linhas:
+            if all(linha[posicao] == valor for posicao, valor in demais):
+                quantidades[linha[POSICAO[faceta]]] += linha[3]
+        resultado.append({'faceta': faceta, 'titulo': TITULOS[faceta], 'opcoes': [{
+            'valor': valor_na_url(faceta, valor),
+            'rotulo': rotulo,
+            'quantidade': quantidades[valor],
+            'selecionada': filtros[faceta] == valor,
+            'consulta': consulta(filtros, **{faceta: None if filtros[faceta] == valor else valor}),
+        } for valor, rotulo in opcoes(faceta)]})
+    return resultado
+
+
+async def acontagens(filtros, facetas = FACETAS):
+    """Versão assíncrona de contagens, para a view index assíncrona (o cubo quase sempre vem do cache)."""
+    from asgiref.sync import sync_to_async
+
+    from .cache_catalogo import _ageracao
+
+    linhas = await _cache().aget(f'catalogo:contagens:{await _ageracao()}')
+    if linhas is None:
+        linhas = await sync_to_async(cubo)()
+    return contagens(filtros, facetas, linhas = linhas)
@@ -1,10 +1,12 @@
 # Cada aplicação django pode ter um arquivo forms.py. É neste arquivo que nós criamos os formulários
 
+from asgiref.sync import sync_to_async
 from django import forms
 from django.forms import Textarea
 from django.core.mail.message import EmailMessage # Classe que traz métodos e funções que permitem enviar emails
 
-from .models import Produto # Importamos do módulo models a classe Produto
+from .caixa_saida import aenfileirar_email, enfileirar_email # Funções que gravam o e-mail na caixa de saída, para envio em segundo plano
+from .models import EnvioImagem, Produto # Importamos do módulo models as classes EnvioImagem e Produto
 
 # O django tem um módulo forms o qual, por sua vez, possui uma classe chamada Form.
 # Nossa classe ContatoForm irá herdar alguns atributos e métodos interessantes que serão utilizados em nossa aplicação: Herança da Orientação a Objetos
@@ -16,7 +18,7 @@ class ContatoForm(forms.Form):
     # só que para uma mensagem, este campo de texto de 1 linha não é suficiente. Com o atributo widget = Textarea(), temos uma caixa de texto com várias linhas.
     mensagem = forms.CharField(label = 'Mensagem', max_length = 1000, widget = Textarea())
 
-    def send_mail(self):
+    def _montar_email(self):
         nome = self.cleaned_data['nome'] # Recuperamos os dados inseridos nos campos do formulário
         email = self.cleaned_data['email']
         assunto = self.cleaned_data['assunto']
@@ -31,8 +33,13 @@ class ContatoForm(forms.Form):
             to = ['contato@seudominio.com.br'],
             headers = {'Reply-To': email}
         ) # Definimos o objeto mail da classe EmailMessage, passando os valores aos atributos
+        return mail
+
+    def send_mail(self):
+        enfileirar_email(self._montar_email()) # Grava a mensagem na caixa de saída (core/caixa_saida.py); ela será entregue em segundo plano pelo comando send_outbox, sem bloquear a requisição.
 
-        mail.send() # Aplica o metodo send() ao objeto mail da classe EmailMessage definido acima
+    async def asend_mail(self):
+        await aenfileirar_email(self._montar_email()) # Versão assíncrona, usada pela view contato de core/views_async.py.
 
 # forms.Form é uma classe base do Django para criar formulários manuais, isto é, sem vínculo direto com modelos.
 # Usamos forms.Form quando:
@@ -47,6 +54,77 @@ class ContatoForm(forms.Form):
 # 3) Queremos evitar repetir código já definido no modelo
 # O seguinte código define um formulário baseado em modelo (ModelForm) no Django.
 class ProdutoModelForm(forms.ModelForm): # Cria uma classe de formulário chamada ProdutoModelForm, que herda de forms.ModelForm. Isso indica que o formulário será gerado automaticamente com base no modelo Produto.
+    # Campo opcional com o id de um envio em partes já concluído (veja core/envios.py).
+    # Quando informado, a imagem enviada em partes é usada no lugar do campo 'imagem', sem reenviar o arquivo.
+    envio = forms.UUIDField(required = False, widget = forms.HiddenInput())
+
     class Meta: #  A classe interna Meta serve para configurar como o ModelForm se conecta ao modelo.
         model = Produto # model = Produto: indica que este formulário está associado ao modelo Produto.
         fields = ['nome', 'preco', 'estoque', 'imagem'] # fields = [...]: especifica quais campos do modelo serão exibidos no formulário.
+
+    def __init__(self, *args, usuario = None, **kwargs):
+        # usuario: quem está enviando o formulário; só os envios em partes criados por ele podem ser usados.
+        super().__init__(*args, **kwargs)
+        self.usuario = usuario
+        self.fields['imagem'].required = False # A imagem pode vir do campo 'imagem' ou de um envio em partes; clean() exige um dos dois.
+
+    def clean(self):
+        cleaned_data = super().clean()
+        envio = cleaned_data.get('envio')
+        if envio:
+            envio = EnvioImagem.objects.filter(pk = envio, usuario = self.usuario).exclude(arquivo = '').first()
+            # Sem o filtro por usuário, quem soubesse o id do envio de outra pessoa poderia usar a imagem dela.
+            # Um formulário sem usuário (usuario = None) só aceita envios anônimos.
+            if envio is None:
+                self.add_error('envio', 'Envio de imagem inexistente ou ainda não concluído.')
+            cleaned_data['envio'] = envio
+        elif not cleaned_data.get('imagem') and not self.instance.imagem:
+            self.add_error('imagem', 'Este campo é obrigatório.')
+        return cleaned_data
+
+    def save(self, commit = True):
+        envio = self.cleaned_data.get('envio')
+        if envio and not self.cleaned_data.get('imagem'):
+            self.instance.imagem = envio.arquivo
+            # O arquivo já está no armazenamento: basta apontar o campo para ele (as dimensões são lidas do cabeçalho).
+            if commit:
+                self.instance.imagem.save_all() # Enfileira a geração das versões redimensionadas, como um upload tradicional faria.
+                # Chamado antes de gravar o produto, como no upload tradicional: a fila só ignora as versões de um arquivo
+                # que outro produto já usa (veja core/armazenamento.py), e depois de gravado o próprio produto já contaria.
+        produto = super().save(commit = commit)
+        if envio and commit:
+            envio.delete() # O arquivo agora pertence ao produto; o registro do envio não é mais necessário.
+        return produto
+
+    async def asave(self):
+        # Versão assíncrona de save(commit = True), usada pela view produto de core/views_async.py.
+        # O produto é gravado com o ORM assíncrono; a gravação da imagem no armazenamento (GCS) acontece dentro de
+        # Model.save e, assim como save_all, roda em uma thread (sync_to_async), sem bloquear o loop de eventos.
+        envio = self.cleaned_data.get('envio')
+        produto = self.save(commit = False)
+        if envio:
+            await sync_to_async(produto.imagem.save_all)() # Antes de gravar o produto, como em save().
+        await produto.asave()
+        if envio:
+            await envio.adelete()
+        return produto
+
+# O formulário a seguir valida uma linha do manifesto de importação em massa (veja core/importacao.py).
+# Não é exibido em nenhuma página: cada linha do CSV/JSONL é passada como 'data' e, se for válida, cleaned_data vira um Produto.
+class ProdutoImportacaoForm(forms.Form):
+    VERDADEIROS = {'', '1', 'true', 'sim', 's', 'yes', 'y'} # Coluna 'ativo' ausente ou vazia: o produto entra ativo.
+    FALSOS = {'0', 'false', 'nao', 'não', 'n', 'no'}
+
+    nome = forms.CharField(max_length = 100)
+    preco = forms.DecimalField(max_digits = 8, decimal_places = 2, min_value = 0)
+    estoque = forms.IntegerField(min_value = 0)
+    imagem = forms.CharField(max_length = 255) # Caminho da imagem dentro do diretório ou do arquivo ZIP de imagens.
+    ativo = forms.CharField(required = False)
+
+    def clean_ativo(self):
+        valor = str(self.cleaned_data.get('ativo', '')).strip().lower()
+        if valor in self.VERDADEIROS:
+            return True
+        if valor in self.FALSOS:
+            return False
+        raise forms.ValidationError('Valor inválido para ativo (use sim/não, true/false ou 1/0).')
@@ -0,0 +1,242 @@
+# Este módulo implementa a importação e a exportação de produtos em massa
+# (comandos `python manage.py import_products` e `export_products` e ações do admin).
+# Uma importação recebe um manifesto (CSV com cabeçalho ou JSONL, um produto por linha/registro, com as colunas
+# nome, preco, estoque, imagem e, opcionalmente, ativo) e as imagens, em um diretório ou em um arquivo ZIP. Aqui:
+# 1) o manifesto é lido e validado em streaming (ProdutoImportacaoForm), um lote de registros por vez;
+# 2) as imagens do lote são decodificadas, validadas e salvas, e suas versões redimensionadas geradas, em um pool de processos,
+#    aproveitando todos os núcleos da máquina; a mesma imagem usada por vários produtos é processada uma única vez;
+# 3) os produtos válidos de cada lote são gravados com um único bulk_create;
+# 4) após cada lote, o número do último registro processado é entregue a ao_concluir_lote, que o grava como ponto de
+#    retomada (checkpoint): uma importação interrompida pode continuar de onde parou, sem duplicar produtos.
+# A exportação percorre os produtos em blocos (QuerySet.iterator) e gera o arquivo linha a linha, sem carregá-lo na memória.
+
+import csv
+import hashlib
+import json
+import os
+import zipfile
+from io import BytesIO
+from itertools import islice
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router, transaction
+from PIL import Image, UnidentifiedImageError
+
+from .armazenamento import ajustar_referencias, nome_por_conteudo
+from .busca import invalidar_busca
+from .cache_catalogo import invalidar_produtos
+from .facetas import ajustar_contagens, celula
+from .carga import atribuir_slugs, registros_jsonl
+from .tasks import pool_de_processos
+from .versoes import versoes_previstas
+
+COLUNAS_EXPORTACAO = ['id', 'nome', 'slug', 'preco', 'estoque', 'ativo', 'imagem', 'criado', 'modificado']
+# As colunas nome, preco, estoque, imagem e ativo são as mesmas do manifesto de importação: um arquivo exportado pode ser
+# importado de volta (as demais colunas são ignoradas), usando o diretório de mídia como origem das imagens.
+
+_zip_aberto = (None, None)
+# (caminho, ZipFile) do último arquivo ZIP de imagens aberto neste processo. Cada processo do pool abre o ZIP uma única vez
+# e o reaproveita em todas as imagens que recebe, em vez de reler o índice do arquivo a cada imagem.
+
+
+def ler_manifesto(arquivo, formato):
+    """
+    Lê, em streaming, os registros de um manifesto de importação.
+
+    Parâmetros:
+    - arquivo: Arquivo aberto em modo texto (para CSV, com newline = '').
+    - formato (str): 'csv' (com cabeçalho) ou 'jsonl' (um objeto JSON por linha).
+
+    Gera pares (número do registro, dicionário), numerados a partir de 1. É esse número que serve de ponto de retomada.
+    """
+    if formato == 'jsonl':
+        return enumerate(registros_jsonl(arquivo), start = 1)
+    return enumerate(csv.DictReader(arquivo), start = 1)
+
+
+def _ler_imagem(origem, nome):
+    # Lê os bytes da imagem `nome` a partir de um diretório ou de um arquivo ZIP, recusando arquivos acima do limite
+    # antes de lê-los (um ZIP informa o tamanho descompactado de cada arquivo no seu índice).
+    global _zip_aberto
+    limite = settings.PRODUTO_IMAGEM_MAX_BYTES
+    if zipfile.is_zipfile(origem):
+        if _zip_aberto[0] != origem:
+            if _zip_aberto[1]:
+                _zip_aberto[1].close()
+            _zip_aberto = (origem, zipfile.ZipFile(origem))
+        try:
+            info = _zip_aberto[1].getinfo(nome.removeprefix('./'))
+        except KeyError:
+            raise ValueError("imagem não encontrada no arquivo ZIP.")
+        if info.file_size > limite:
+            raise ValueError(f"imagem maior que {limite} bytes.")
+        return _zip_aberto[1].read(info)
+
+    raiz = os.path.realpath(origem)
+    caminho = os.path.realpath(os.path.join(raiz, nome))
+    if not caminho.startswith(raiz + os.sep):
+        raise ValueError("caminho de imagem fora do diretório de imagens.")
+    if not os.path.isfile(caminho):
+        raise ValueError("imagem não encontrada no diretório.")
+    if os.path.getsize(caminho) > limite:
+        raise ValueError(f"imagem maior que {limite} bytes.")
+    with open(caminho, 'rb') as f:
+        return f.read()
+
+
+def ingerir_imagem(origem, nome):
+    """
+    Valida e salva uma imagem do manifesto e gera as suas versões redimensionadas.
+
+    Parâmetros:
+    - origem (str): Diretório ou arquivo ZIP com as imagens.
+    - nome (str): Caminho da imagem dentro da origem, como informado no manifesto.
+
+    Executada nos processos do pool de importar(); não acessa o banco de dados. Retorna {'arquivo', 'largura', 'altura'}
+    e lança ValueError (ou o erro do Pillow) se a imagem for inválida.
+
+    O arquivo é salvo com o hash do conteúdo no nome (core/armazenamento.py): a mesma imagem já enviada por upload,
+    por outra importação ou por uma importação retomada não é gravada nem processada de novo. As versões são geradas antes do original, de modo que a existência do original
+    garante que as versões também existem.
+    """
+    from .models import Produto
+
+    dados = _ler_imagem(origem, nome)
+    try:
+        imagem = Image.open(BytesIO(dados))
+    except UnidentifiedImageError:
+        raise ValueError("o arquivo não é uma imagem em um formato suportado.")
+    with imagem:
+        largura, altura = imagem.size # Lido do cabeçalho, antes de decodificar os pixels.
+        if max(largura, altura) > settings.PRODUTO_IMAGEM_MAX_LADO:
+            raise ValueError(f"imagem maior que {settings.PRODUTO_IMAGEM_MAX_LADO} pixels de lado.")
+
+        campo = Produto._meta.get_field('imagem')
+        arquivo = nome_por_conteudo(campo.generate_filename(None, os.path.basename(nome)), hashlib.sha256(dados).hexdigest())
+        if not campo.storage.exists(arquivo):
+            if not settings.PRODUTO_VERSOES_SOB_DEMANDA: # No modo sob demanda, as versões são geradas no primeiro pedido.
+                imagem.load()
+                for versao in versoes_previstas(arquivo, largura, altura):
+                    versao.save(imagem)
+            arquivo = campo.storage.save(arquivo, ContentFile(dados))
+
+    return {'arquivo': arquivo, 'largura': largura, 'altura': altura}
+
+
+def _erros_do_form(form):
+    return '; '.join(f"{campo}: {' '.join(mensagens)}" for campo, mensagens in form.errors.items())
+
+
+def importar(manifesto, formato, origem, lote = 200, processos = None, inicio = 0, ao_concluir_lote = None):
+    """
+    Importa os produtos de um manifesto, com as imagens processadas em paralelo.
+
+    Parâmetros:
+    - manifesto: Arquivo do manifesto aberto em modo texto (veja ler_manifesto).
+    - formato (str): 'csv' ou 'jsonl'.
+    - origem (str): Diretório ou arquivo ZIP com as imagens referenciadas pela coluna 'imagem'.
+    - lote (int): Quantidade de registros validados e gravados por vez.
+    - processos (int | None): Quantidade de processos do pool de imagens (padrão: número de CPUs).
+    - inicio (int): Número do último registro já importado (checkpoint); os registros até ele são pulados.
+    - ao_concluir_lote (callable | None): Função chamada após cada lote como ao_concluir_lote(registro, contagem, erros),
+      onde `registro` é o número do último registro do lote, `contagem` o dicionário de contagens acumuladas e `erros`
+      a lista de pares (número do registro, mensagem) do lote. É chamada dentro da transação que gravou o lote: se ela
+      gravar o checkpoint no banco, produtos e checkpoint são confirmados juntos.
+
+    Retorna o dicionário {'importados': ..., 'erros': ...}. Registros inválidos não interrompem a importação.
+    """
+    from .forms import ProdutoImportacaoForm
+    from .models import Produto
+
+    contagem = {'importados': 0, 'erros': 0}
+    imagens = {} # Resultado de cada imagem já processada (ou a mensagem de erro), pelo nome usado no manifesto.
+    registros = ((numero, registro) for numero, registro in ler_manifesto(manifesto, formato) if numero > inicio)
+
+    with pool_de_processos(processos) as pool:
+        # Os filhos são iniciados por 'spawn' e não herdam a conexão com o banco, que a validação dos registros reabre
+        # antes do primeiro submit (veja core/tasks.py).
+        while pedaco := list(islice(registros, lote)):
+            validos, erros = [], []
+            for numero, registro in pedaco:
+                if not isinstance(registro, dict):
+                    erros.append((numero, "o registro deve ser um objeto com os campos do produto."))
+                    continue
+                form = ProdutoImportacaoForm(registro)
+                if form.is_valid():
+                    validos.append((numero, form.cleaned_data))
+                else:
+                    erros.append((numero, _erros_do_form(form)))
+
+            novas = {dados['imagem'] for _, dados in validos} - imagens.keys()
+            futuros = {nome: pool.submit(ingerir_imagem, origem, nome) for nome in novas}
+            for nome, futuro in futuros.items():
+                try:
+                    imagens[nome] = futuro.result()
+                except Exception as e:
+                    imagens[nome] = f"imagem '{nome}': {e}"
+
+            objetos = []
+            for numero, dados in validos:
+                imagem = imagens[dados['imagem']]
+                if isinstance(imagem, str):
+                    erros.append((numero, imagem))
+                    continue
+                objetos.append(Produto(
+                    nome = dados['nome'],
+                    preco = dados['preco'],
+                    estoque = dados['estoque'],
+                    ativo = dados['ativo'],
+                    imagem = imagem['arquivo'],
+                    image_width = imagem['largura'],
+                    image_height = imagem['altura'],
+                ))
+
+            erros.sort()
+            contagem['importados'] += len(objetos)
+            contagem['erros'] += len(erros)
+            with transaction.atomic(using = router.db_for_write(Produto)):
+                if objetos:
+                    atribuir_slugs(Produto, objetos)
+                    Produto.objects.bulk_create(objetos)
+                    ajustar_referencias(adicionadas = [(o.imagem.name, o.image_width, o.image_height) for o in objetos])
+                    invalidar_produtos([], listagem = True)
+                    invalidar_busca()
+                    ajustar_contagens(adicionadas = [celula(o.ativo, o.preco, o.estoque) for o in objetos])
+                if ao_concluir_lote:
+                    ao_concluir_lote(pedaco[-1][0], contagem, erros)
+
+    return contagem
+
+
+class _Eco:
+    # "Arquivo" que apenas devolve o que recebe: permite usar csv.writer para gerar uma linha de texto por vez.
+    def write(self, valor):
+        return valor
+
+
+def linhas_exportacao(queryset, formato = 'csv'):
+    """
+    Gera, linha a linha, a exportação dos produtos de `queryset` em CSV (com cabeçalho) ou JSONL.
+
+    Parâmetros:
+    - queryset (QuerySet[Produto]): Produtos a exportar.
+    - formato (str): 'csv' ou 'jsonl'.
+
+    Os produtos são lidos do banco em blocos de 2000 (QuerySet.iterator), como dicionários, sem instanciar os modelos;
+    o resultado pode ser escrito direto em um arquivo ou enviado em uma StreamingHttpResponse.
+    """
+    linhas = queryset.order_by('id').values(*COLUNAS_EXPORTACAO).iterator(chunk_size = 2000)
+    if formato == 'jsonl':
+        for linha in linhas:
+            yield json.dumps(linha, cls = DjangoJSONEncoder, ensure_ascii = False) + '\n'
+        return
+
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(COLUNAS_EXPORTACAO)
+    for linha in linhas:
+        yield escritor.writerow([
+            valor.isoformat() if hasattr(valor, 'isoformat') else valor for valor in linha.values()
+        ])
+
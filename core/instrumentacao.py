@@ -0,0 +1,364 @@
+# Este módulo implementa a instrumentação das requisições: para cada requisição, onde foi gasto o tempo.
+# Quando a vitrine fica lenta, a pergunta é sempre a mesma: foi o banco, a renderização dos templates ou o armazenamento
+# (no Render, cada chamada ao armazenamento pode ser uma requisição ao GCS)? Aqui:
+# 1) MedicaoMiddleware abre, para cada requisição, uma Medicao guardada em uma ContextVar (que acompanha a requisição
+#    também nas threads do sync_to_async, sob ASGI) e, ao final, a fecha;
+# 2) ganchos instalados por instalar() (chamada em CoreConfig.ready) somam à Medicao da requisição atual:
+#    - as consultas SQL, por um execute_wrapper adicionado a cada conexão criada (signal connection_created);
+#    - a renderização dos templates (o render do backend de templates do Django);
+#    - as chamadas ao armazenamento de mídia (url, exists, open, save, delete, size, listdir): as instâncias do armazenamento
+#      padrão e do armazenamento das imagens de produto, e não as suas classes, que o armazenamento dos arquivos estáticos
+#      também herda (cada {% static %} seria contado como uma chamada ao armazenamento);
+#    fora de uma requisição (comandos, fila de imagens) os ganchos só repassam a chamada;
+# 3) a resposta recebe o cabeçalho Server-Timing (sql, tpl, arm e total), que o DevTools do navegador exibe na aba Network;
+# 4) os totais são agregados por view em memória e gravados periodicamente em um arquivo por processo, e a view metricas
+#    (/metrics) soma os arquivos de todos os processos do gunicorn no formato de texto do Prometheus;
+# 5) as requisições acima de METRICAS_LENTA_MS são contadas e, por amostragem (METRICAS_AMOSTRAGEM_LENTAS), registradas
+#    no log com o detalhamento e a consulta SQL mais lenta;
+# 6) as conexões abertas com o banco são contadas e, com o pool de conexões do PostgreSQL (BANCO_POOL em settings.py),
+#    as estatísticas do pool de cada processo também são exportadas.
+# O custo por requisição é de alguns perf_counter e somas, para que a instrumentação fique ligada em produção.
+
+import functools
+import glob
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+LIMITES = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Limites (em segundos) dos intervalos do histograma da duração das requisições (os mesmos padrões do cliente do Prometheus).
+
+METODOS_DE_ARMAZENAMENTO = ('url', 'exists', 'open', 'save', 'delete', 'size', 'listdir')
+# Métodos dos armazenamentos de mídia medidos. As chamadas internas (por exemplo, o exists feito pelo save) não são contadas de novo.
+
+_atual = ContextVar('medicao', default = None)
+# Medicao da requisição em andamento, ou None fora de uma requisição.
+
+_trava = threading.Lock()
+_totais = {'requisicoes': {}, 'views': {}, 'conexoes': {}}
+# Totais deste processo desde que ele começou: requisições por (view, método, status), métricas por view e conexões
+# abertas com cada banco.
+
+RECENTE = 120
+# Segundos desde a última gravação após os quais as estatísticas do pool de um processo deixam de ser exportadas
+# (o processo terminou ou está ocioso). Os contadores somados não dependem disso.
+
+ESTATISTICAS_DO_POOL = (
+    ('pool_size', 'django2_pool_conexoes', 'gauge', 'Conexões abertas pelo pool (em uso ou disponíveis).'),
+    ('pool_available', 'django2_pool_disponiveis', 'gauge', 'Conexões ociosas disponíveis no pool.'),
+    ('requests_waiting', 'django2_pool_esperando', 'gauge', 'Pedidos de conexão esperando o pool.'),
+    ('requests_num', 'django2_pool_pedidos_total', 'counter', 'Pedidos de conexão atendidos pelo pool.'),
+    ('requests_queued', 'django2_pool_pedidos_em_espera_total', 'counter', 'Pedidos de conexão que precisaram esperar.'),
+    ('requests_wait_ms', 'django2_pool_espera_milissegundos_total', 'counter', 'Tempo total de espera por conexões.'),
+    ('requests_errors', 'django2_pool_erros_total', 'counter', 'Pedidos de conexão que falharam (por exemplo, por timeout).'),
+    ('returns_bad', 'django2_pool_devolvidas_ruins_total', 'counter', 'Conexões devolvidas ao pool em estado inválido.'),
+    ('connections_num', 'django2_pool_conexoes_criadas_total', 'counter', 'Conexões criadas pelo pool.'),
+    ('connections_lost', 'django2_pool_conexoes_perdidas_total', 'counter', 'Conexões descartadas pela verificação de saúde.'),
+)
+# Estatísticas do psycopg_pool (ConnectionPool.get_stats) exportadas: chave, nome da métrica, tipo e descrição.
+
+_arquivo = None
+_gravado = 0.0
+# Arquivo em que este processo grava os seus totais e quando foi a última gravação (veja _gravar).
+
+
+class Medicao:
+    """Tempos e contagens de uma requisição."""
+
+    __slots__ = ('inicio', 'sql_consultas', 'sql_segundos', 'sql_mais_lenta', 'template_segundos', 'template_profundidade',
+                 'armazenamento_chamadas', 'armazenamento_segundos', 'armazenamento_profundidade')
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.sql_consultas = 0
+        self.sql_segundos = 0.0
+        self.sql_mais_lenta = (0.0, '')
+        self.template_segundos = 0.0
+        self.template_profundidade = 0
+        self.armazenamento_chamadas = 0
+        self.armazenamento_segundos = 0.0
+        self.armazenamento_profundidade = 0
+
+
+def _medir_sql(execute, sql, params, many, context):
+    # execute_wrapper de todas as conexões (veja instalar).
+    medicao = _atual.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duracao = time.perf_counter() - inicio
+        medicao.sql_consultas += 1
+        medicao.sql_segundos += duracao
+        if duracao > medicao.sql_mais_lenta[0]:
+            medicao.sql_mais_lenta = (duracao, sql)
+
+
+def _ao_criar_conexao(sender, connection, **kwargs):
+    if _medir_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_medir_sql)
+    with _trava:
+        # Conexões novas por segundo medem a rotatividade: com conexões persistentes, devem ser raras. Com o pool, o sinal
+        # é enviado a cada conexão retirada do pool; as conexões realmente abertas estão em django2_pool_conexoes_criadas_total.
+        _totais['conexoes'][connection.alias] = _totais['conexoes'].get(connection.alias, 0) + 1
+
+
+def _medido(funcao, contador, tempo, profundidade):
+    # Envolve `funcao` para somar a sua duração (e, se `contador` não for None, o número de chamadas) à Medicao atual.
+    # Só a chamada mais externa é medida: um template incluído por outro, ou o exists de dentro do save, já estão no tempo
+    # da chamada que os contém.
+    @functools.wraps(funcao)
+    def medida(*args, **kwargs):
+        medicao = _atual.get()
+        if medicao is None or getattr(medicao, profundidade):
+            return funcao(*args, **kwargs)
+        setattr(medicao, profundidade, 1)
+        inicio = time.perf_counter()
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            setattr(medicao, tempo, getattr(medicao, tempo) + time.perf_counter() - inicio)
+            if contador:
+                setattr(medicao, contador, getattr(medicao, contador) + 1)
+            setattr(medicao, profundidade, 0)
+    medida._medido = True
+    return medida
+
+
+def instalar():
+    """
+    Instala os ganchos de medição do SQL, dos templates e do armazenamento. Chamada uma vez, em CoreConfig.ready().
+    """
+    from django.template.backends.django import Template
+
+    connection_created.connect(_ao_criar_conexao, dispatch_uid = 'core.instrumentacao')
+    if not getattr(Template.render, '_medido', False):
+        Template.render = _medido(Template.render, None, 'template_segundos', 'template_profundidade')
+
+    from django.core.files.storage import storages
+
+    from .armazenamento import armazenamento_produtos
+
+    for armazenamento in (storages['default'], armazenamento_produtos):
+        for nome in METODOS_DE_ARMAZENAMENTO:
+            metodo = getattr(armazenamento, nome)
+            if not getattr(metodo, '_medido', False):
+                setattr(armazenamento, nome, _medido(
+                    metodo, 'armazenamento_chamadas', 'armazenamento_segundos', 'armazenamento_profundidade'))
+
+
+class MedicaoMiddleware:
+    """
+    Middleware que mede cada requisição, acrescenta o cabeçalho Server-Timing e soma os totais da view (veja o início do módulo).
+
+    Deve ser o primeiro de MIDDLEWARE, para que o total inclua os demais middlewares. Funciona sob WSGI e sob ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _atual.set(Medicao())
+        try:
+            response = self.get_response(request)
+            _concluir(request, response, _atual.get())
+            return response
+        finally:
+            _atual.reset(token)
+
+    async def __acall__(self, request):
+        token = _atual.set(Medicao())
+        try:
+            response = await self.get_response(request)
+            _concluir(request, response, _atual.get())
+            return response
+        finally:
+            _atual.reset(token)
+
+
+def _concluir(request, response, medicao):
+    total = time.perf_counter() - medicao.inicio
+    if settings.METRICAS_SERVER_TIMING:
+        response['Server-Timing'] = (
+            f'sql;dur={1000 * medicao.sql_segundos:.1f};desc="{medicao.sql_consultas} consultas", '
+            f'tpl;dur={1000 * medicao.template_segundos:.1f}, '
+            f'arm;dur={1000 * medicao.armazenamento_segundos:.1f};desc="{medicao.armazenamento_chamadas} chamadas", '
+            f'total;dur={1000 * total:.1f}'
+        )
+
+    view = request.resolver_match.view_name if request.resolver_match else '<sem rota>'
+    lenta = 1000 * total >= settings.METRICAS_LENTA_MS
+    with _trava:
+        chave = f'{view}|{request.method}|{response.status_code}'
+        _totais['requisicoes'][chave] = _totais['requisicoes'].get(chave, 0) + 1
+        dados = _totais['views'].setdefault(view, _view_vazia())
+        for i, limite in enumerate(LIMITES):
+            if total <= limite:
+                dados['intervalos'][i] += 1
+                break
+        dados['segundos'] += total
+        dados['contagem'] += 1
+        dados['sql_consultas'] += medicao.sql_consultas
+        dados['sql_segundos'] += medicao.sql_segundos
+        dados['template_segundos'] += medicao.template_segundos
+        dados['armazenamento_chamadas'] += medicao.armazenamento_chamadas
+        dados['armazenamento_segundos'] += medicao.armazenamento_segundos
+        dados['lentas'] += lenta
+    _gravar()
+
+    if lenta and random.random() < settings.METRICAS_AMOSTRAGEM_LENTAS:
+        logger.warning(
+            "Requisição lenta: %s %s (%s) em %.0f ms; SQL %.0f ms em %d consultas; templates %.0f ms; "
+            "armazenamento %.0f ms em %d chamadas. Consulta mais lenta (%.0f ms): %s",
+            request.method, request.path, view, 1000 * total, 1000 * medicao.sql_segundos, medicao.sql_consultas,
+            1000 * medicao.template_segundos, 1000 * medicao.armazenamento_segundos, medicao.armazenamento_chamadas,
+            1000 * medicao.sql_mais_lenta[0], medicao.sql_mais_lenta[1][:500] or '-',
+        )
+
+
+def _view_vazia():
+    return {'intervalos': [0] * len(LIMITES), 'segundos': 0.0, 'contagem': 0, 'sql_consultas': 0, 'sql_segundos': 0.0,
+            'template_segundos': 0.0, 'armazenamento_chamadas': 0, 'armazenamento_segundos': 0.0, 'lentas': 0}
+
+
+def _gravar(forcar = False):
+    # Grava os totais deste processo no seu arquivo, no máximo uma vez a cada METRICAS_INTERVALO segundos.
+    # O nome inclui o pid e o instante em que o processo começou: um worker reiniciado grava em outro arquivo, e os totais
+    # do anterior continuam somados (os contadores do Prometheus nunca diminuem).
+    global _arquivo, _gravado
+    agora = time.monotonic()
+    if not forcar and agora - _gravado < settings.METRICAS_INTERVALO:
+        return
+    _gravado = agora
+    if _arquivo is None:
+        os.makedirs(settings.METRICAS_DIRETORIO, exist_ok = True)
+        _arquivo = os.path.join(settings.METRICAS_DIRETORIO, f'{os.getpid()}-{time.time_ns()}.json')
+    pools = _estatisticas_dos_pools()
+    with _trava:
+        conteudo = json.dumps(dict(_totais, pools = pools))
+    with open(f'{_arquivo}.tmp', 'w', encoding = 'utf-8') as f:
+        f.write(conteudo)
+    os.replace(f'{_arquivo}.tmp', _arquivo)
+
+
+def _estatisticas_dos_pools():
+    # Estatísticas dos pools de conexões deste processo, por banco (apenas os bancos configurados com OPTIONS['pool']).
+    estatisticas = {}
+    for alias, banco in settings.DATABASES.items():
+        if banco.get('OPTIONS', {}).get('pool'):
+            pool = connections[alias].pool # Os pools são compartilhados por todas as threads do processo.
+            if pool is not None:
+                estatisticas[alias] = pool.get_stats()
+    return estatisticas
+
+
+def totais():
+    """
+    Soma os totais gravados por todos os processos (incluindo os totais atuais deste) e os retorna.
+
+    As estatísticas dos pools não são somadas: 'pools' traz uma lista (processo, banco, estatísticas) com os processos que
+    gravaram nos últimos RECENTE segundos.
+    """
+    _gravar(forcar = True)
+    soma = {'requisicoes': {}, 'views': {}, 'conexoes': {}, 'pools': []}
+    agora = time.time()
+    for caminho in glob.glob(os.path.join(settings.METRICAS_DIRETORIO, '*.json')):
+        try:
+            with open(caminho, encoding = 'utf-8') as f:
+                dados = json.load(f)
+            recente = agora - os.path.getmtime(caminho) < RECENTE
+        except (OSError, ValueError):
+            continue # Arquivo sendo substituído ou removido por outro processo.
+        for chave, quantidade in dados['requisicoes'].items():
+            soma['requisicoes'][chave] = soma['requisicoes'].get(chave, 0) + quantidade
+        for alias, quantidade in dados.get('conexoes', {}).items():
+            soma['conexoes'][alias] = soma['conexoes'].get(alias, 0) + quantidade
+        if recente:
+            processo = os.path.splitext(os.path.basename(caminho))[0]
+            soma['pools'] += [(processo, alias, estatisticas) for alias, estatisticas in dados.get('pools', {}).items()]
+        for view, valores in dados['views'].items():
+            destino = soma['views'].setdefault(view, _view_vazia())
+            for campo, valor in valores.items():
+                if campo == 'intervalos':
+                    destino[campo] = [a + b for a, b in zip(destino[campo], valor)]
+                else:
+                    destino[campo] += valor
+    return soma
+
+
+def _rotulos(**rotulos):
+    # Rótulos de uma amostra ({view="index",...}), com os escapes do formato de texto do Prometheus.
+    escapados = (str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for valor in rotulos.values())
+    return '{' + ','.join(f'{nome}="{valor}"' for nome, valor in zip(rotulos, escapados)) + '}'
+
+
+def texto_prometheus():
+    """Retorna os totais de todos os processos no formato de texto do Prometheus (version=0.0.4)."""
+    soma = totais()
+    linhas = [
+        '# HELP django2_requisicoes_total Requisições atendidas, por view, método e status.',
+        '# TYPE django2_requisicoes_total counter',
+    ]
+    for chave, quantidade in sorted(soma['requisicoes'].items()):
+        view, metodo, status = chave.rsplit('|', 2)
+        linhas.append(f'django2_requisicoes_total{_rotulos(view = view, metodo = metodo, status = status)} {quantidade}')
+
+    linhas += [
+        '# HELP django2_requisicao_segundos Duração das requisições, por view.',
+        '# TYPE django2_requisicao_segundos histogram',
+    ]
+    for view, dados in sorted(soma['views'].items()):
+        acumulado = 0
+        for limite, quantidade in zip(LIMITES, dados['intervalos']):
+            acumulado += quantidade
+            linhas.append(f'django2_requisicao_segundos_bucket{_rotulos(view = view, le = limite)} {acumulado}')
+        linhas.append(f'django2_requisicao_segundos_bucket{_rotulos(view = view, le = "+Inf")} {dados["contagem"]}')
+        linhas.append(f'django2_requisicao_segundos_sum{_rotulos(view = view)} {dados["segundos"]}')
+        linhas.append(f'django2_requisicao_segundos_count{_rotulos(view = view)} {dados["contagem"]}')
+
+    contadores = [
+        ('sql_consultas', 'django2_sql_consultas_total', 'Consultas SQL executadas, por view.'),
+        ('sql_segundos', 'django2_sql_segundos_total', 'Tempo gasto em consultas SQL, por view.'),
+        ('template_segundos', 'django2_template_segundos_total', 'Tempo gasto renderizando templates, por view.'),
+        ('armazenamento_chamadas', 'django2_armazenamento_chamadas_total', 'Chamadas ao armazenamento padrão, por view.'),
+        ('armazenamento_segundos', 'django2_armazenamento_segundos_total', 'Tempo gasto no armazenamento padrão, por view.'),
+        ('lentas', 'django2_requisicoes_lentas_total', 'Requisições acima de METRICAS_LENTA_MS, por view.'),
+    ]
+    for campo, nome, descricao in contadores:
+        linhas += [f'# HELP {nome} {descricao}', f'# TYPE {nome} counter']
+        for view, dados in sorted(soma['views'].items()):
+            linhas.append(f'{nome}{_rotulos(view = view)} {dados[campo]}')
+
+    linhas += [
+        '# HELP django2_conexoes_abertas_total Conexões abertas com o banco de dados (com o pool, retiradas do pool).',
+        '# TYPE django2_conexoes_abertas_total counter',
+    ]
+    for alias, quantidade in sorted(soma['conexoes'].items()):
+        linhas.append(f'django2_conexoes_abertas_total{_rotulos(banco = alias)} {quantidade}')
+
+    if soma['pools']:
+        for chave, nome, tipo, descricao in ESTATISTICAS_DO_POOL:
+            linhas += [f'# HELP {nome} {descricao}', f'# TYPE {nome} {tipo}']
+            for processo, alias, estatisticas in sorted(soma['pools']):
+                linhas.append(f'{nome}{_rotulos(banco = alias, processo = processo)} {estatisticas.get(chave, 0)}')
+    return '\n'.join(linhas) + '\n'
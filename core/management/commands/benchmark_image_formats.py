@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image, ImageOps
+
+from core.models import Produto
+from core.versoes import codificar, formato_suportado
+
+EXTENSOES = ('.jpg', '.jpeg', '.png', '.webp', '.avif', '.bmp', '.gif')
+# Extensões dos arquivos originais considerados na medição.
+
+
+class Command(BaseCommand):
+    """
+    Comando que compara os formatos de imagem nas imagens de produtos atuais: bytes gerados e tempo de codificação.
+
+    Cada original do diretório de Produto.imagem é reduzido às larguras dos breakpoints do campo e codificado em cada
+    formato com as mesmas opções usadas na geração das versões (core/versoes.py, codificar). O PNG, formato usado antes,
+    é a referência para a economia de bytes.
+
+    Uso:
+      python manage.py benchmark_image_formats
+      python manage.py benchmark_image_formats --limite 10 --formatos PNG WEBP AVIF
+      python manage.py benchmark_image_formats --larguras 400 800 1600
+    """
+
+    help = "Mede o tamanho e o tempo de codificação das versões de imagem em cada formato (PNG, JPEG, WebP, AVIF)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formatos', nargs = '+', default = ['PNG', 'JPEG', 'WEBP', 'AVIF'],
+                            help = "Formatos comparados (o primeiro é a referência para a economia de bytes).")
+        parser.add_argument('--larguras', nargs = '+', type = int, default = None,
+                            help = "Larguras das versões (padrão: as larguras dos breakpoints de Produto.imagem).")
+        parser.add_argument('--limite', type = int, default = None,
+                            help = "Quantidade máxima de imagens originais medidas.")
+
+    def handle(self, *args, **options):
+        campo = Produto._meta.get_field('imagem')
+        formatos = [f.upper() for f in options['formatos'] if formato_suportado(f)]
+        for ignorado in set(f.upper() for f in options['formatos']) - set(formatos):
+            self.stderr.write(self.style.WARNING(f"O Pillow instalado não grava {ignorado}; formato ignorado."))
+        if not formatos:
+            raise CommandError("Nenhum dos formatos pedidos é suportado.")
+        larguras = options['larguras'] or sorted(campo.breakpoints.values())
+
+        _, arquivos = campo.storage.listdir(campo.upload_to)
+        arquivos = sorted(a for a in arquivos if a.lower().endswith(EXTENSOES))[:options['limite']]
+        if not arquivos:
+            raise CommandError(f"Nenhuma imagem encontrada em '{campo.upload_to}'.")
+
+        totais = {formato: {'bytes': 0, 'segundos': 0.0, 'versoes': 0} for formato in formatos}
+        for arquivo in arquivos:
+            with campo.storage.open(f'{campo.upload_to}/{arquivo}') as f, Image.open(f) as original:
+                original = ImageOps.exif_transpose(original) # Mesma correção de orientação aplicada às versões.
+                for largura in larguras:
+                    if largura > original.width:
+                        continue # As versões nunca ampliam o original.
+                    versao = original.copy()
+                    versao.thumbnail((largura, original.height))
+                    for formato in formatos:
+                        inicio = time.perf_counter()
+                        dados = codificar(versao, formato, largura)
+                        totais[formato]['segundos'] += time.perf_counter() - inicio
+                        totais[formato]['bytes'] += len(dados)
+                        totais[formato]['versoes'] += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{arquivo} medido.")
+
+        referencia = totais[formatos[0]]['bytes']
+        self.stdout.write(f"{len(arquivos)} imagens, larguras {', '.join(map(str, larguras))}.")
+        self.stdout.write(f"{'formato':<8}{'versões':>9}{'KiB':>12}{'economia':>11}{'ms/versão':>12}")
+        for formato, total in totais.items():
+            economia = 1 - total['bytes'] / referencia if referencia else 0
+            ms = 1000 * total['segundos'] / total['versoes'] if total['versoes'] else 0
+            self.stdout.write(
+                f"{formato:<8}{total['versoes']:>9}{total['bytes'] / 1024:>12.1f}{economia:>10.1%}{ms:>12.1f}")
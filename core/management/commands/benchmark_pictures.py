@@ -0,0 +1,81 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.medicao import CAMINHOS, MODOS, carregar_originais, medir
+from core.models import Produto
+from core.versoes import formato_suportado
+
+
+class Command(BaseCommand):
+    """
+    Comando que mede o desempenho da geração das versões de Produto.imagem e emite o resultado em JSON (veja core/medicao.py).
+
+    Mede a decodificação, o redimensionamento e a codificação de cada formato, o tempo da matriz de versões de cada
+    original e a geração de todas as matrizes em série, com um pool de threads e com um pool de processos, nos caminhos
+    padrão, draft() e reduce(). Guardando o JSON de cada execução, dá para comparar o efeito de uma mudança.
+
+    Uso:
+      python manage.py benchmark_pictures > medicao.json
+      python manage.py benchmark_pictures --saida medicao.json                # grava o JSON e exibe um resumo
+      python manage.py benchmark_pictures --formatos WEBP JPEG --repeticoes 1 --modos serial processos
+    """
+
+    help = "Mede decodificação, redimensionamento, codificação, memória e paralelismo na geração das versões de imagens."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--diretorio', default = None,
+                            help = "Diretório dos originais no armazenamento (padrão: o upload_to de Produto.imagem).")
+        parser.add_argument('--limite', type = int, default = None,
+                            help = "Quantidade máxima de originais medidos.")
+        parser.add_argument('--formatos', nargs = '+', default = None,
+                            help = "Formatos de versão medidos (padrão: os file_types de Produto.imagem).")
+        parser.add_argument('--modos', nargs = '+', choices = MODOS, default = list(MODOS),
+                            help = "Modos de execução comparados.")
+        parser.add_argument('--caminhos', nargs = '+', choices = CAMINHOS, default = list(CAMINHOS),
+                            help = "Caminhos de redimensionamento comparados.")
+        parser.add_argument('--trabalhadores', type = int, default = None,
+                            help = "Tamanho dos pools de threads e de processos (padrão: número de CPUs).")
+        parser.add_argument('--repeticoes', type = int, default = 3,
+                            help = "Repetições de cada medição (os tempos informados são as medianas).")
+        parser.add_argument('--saida', default = None,
+                            help = "Arquivo em que o JSON é gravado (padrão: a saída padrão).")
+
+    def handle(self, *args, **options):
+        campo = Produto._meta.get_field('imagem')
+        formatos = {f.upper() for f in options['formatos'] or campo.file_types}
+        for ignorado in sorted(f for f in formatos if not formato_suportado(f)):
+            self.stderr.write(self.style.WARNING(f"O Pillow instalado não grava {ignorado}; formato ignorado."))
+        formatos = {f for f in formatos if formato_suportado(f)}
+        if not formatos:
+            raise CommandError("Nenhum dos formatos pedidos é suportado.")
+
+        originais = carregar_originais(campo.storage, options['diretorio'] or campo.upload_to, limite = options['limite'])
+        for original in originais:
+            original['versoes'] = [versao for versao in original['versoes'] if versao.file_type in formatos]
+        if not originais:
+            raise CommandError("Nenhuma imagem encontrada.")
+
+        def ao_medir(nome):
+            if options['verbosity'] > 1:
+                self.stderr.write(f"{nome} medido.")
+
+        relatorio = medir(originais, modos = options['modos'], caminhos = options['caminhos'],
+                          trabalhadores = options['trabalhadores'], repeticoes = options['repeticoes'], ao_medir = ao_medir)
+
+        if not options['saida']:
+            self.stdout.write(json.dumps(relatorio, indent = 2))
+            return
+        with open(options['saida'], 'w', encoding = 'utf-8') as f:
+            json.dump(relatorio, f, indent = 2)
+
+        etapas = relatorio['etapas']
+        self.stdout.write(f"Decodificação: {etapas['decodificacao']['megapixels_por_segundo']} megapixels/s; "
+                          f"redimensionamento: {etapas['redimensionamento']['versoes_por_segundo']} versões/s.")
+        for formato, valores in etapas['codificacao'].items():
+            self.stdout.write(f"Codificação {formato}: {valores['versoes_por_segundo']} versões/s, "
+                              f"{valores['bytes'] / 1024:.1f} KiB.")
+        for cenario in relatorio['cenarios']:
+            self.stdout.write(f"{cenario['modo']:<10}{cenario['caminho']:<8}{cenario['segundos']:>9.2f} s"
+                              f"{cenario['versoes_por_segundo']:>10} versões/s  pico {cenario['rss_pico_kib']} KiB")
+        self.stdout.write(self.style.SUCCESS(f"Resultado gravado em {options['saida']}."))
@@ -0,0 +1,179 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from core.medicao_http import VIEWS, ClienteDjango, ClienteHttp, ambiente, comparar, criar_dados, medir_recursos, medir_view
+from core.models import Produto
+
+
+class Command(BaseCommand):
+    """
+    Comando que mede a vazão, as latências, as consultas SQL e a memória das views principais (veja core/medicao_http.py).
+
+    Cria um banco de testes com produtos sintéticos, dispara as requisições (pelo cliente de testes do Django ou, com
+    --gunicorn, por HTTP até um gunicorn local) e destrói o banco no final. Com --comparar, compara o resultado com uma
+    execução anterior e falha se alguma métrica piorou além da tolerância, o que permite usá-lo antes de um deploy.
+
+    Uso:
+      python manage.py benchmark_views --saida referencia.json                  # grava a referência
+      python manage.py benchmark_views --comparar referencia.json               # compara e falha se houver regressão
+      python manage.py benchmark_views --produtos 5000 --requisicoes 500 --concorrencia 4
+      python manage.py benchmark_views --gunicorn --servidor asgi --trabalhadores 4
+    """
+
+    help = "Mede vazão, latências p50/p95/p99, consultas SQL e memória das views index, contato, produto e detalhe."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produtos', type = int, default = 1000,
+                            help = "Quantidade de produtos sintéticos gravados no banco de testes.")
+        parser.add_argument('--requisicoes', type = int, default = 200,
+                            help = "Requisições medidas por view.")
+        parser.add_argument('--concorrencia', type = int, default = 1,
+                            help = "Quantidade de clientes disparando requisições ao mesmo tempo.")
+        parser.add_argument('--aquecimento', type = int, default = 10,
+                            help = "Requisições por cliente antes da medição de cada view.")
+        parser.add_argument('--amostras', type = int, default = 20,
+                            help = "Requisições da rodada que conta as consultas SQL e a memória alocada.")
+        parser.add_argument('--views', nargs = '+', choices = VIEWS, default = list(VIEWS),
+                            help = "Views medidas.")
+        parser.add_argument('--sem-imagens', action = 'store_true',
+                            help = "Cria os produtos sem foto (por padrão, reaproveita as imagens dos produtos existentes).")
+        parser.add_argument('--gunicorn', action = 'store_true',
+                            help = "Mede as requisições por HTTP até um gunicorn local, em vez do cliente de testes.")
+        parser.add_argument('--servidor', choices = ['wsgi', 'asgi'], default = 'wsgi',
+                            help = "Com --gunicorn, serve o projeto por WSGI ou por ASGI (gunicorn_asgi.conf.py).")
+        parser.add_argument('--trabalhadores', type = int, default = 2,
+                            help = "Com --gunicorn, quantidade de workers do gunicorn.")
+        parser.add_argument('--saida', default = None,
+                            help = "Arquivo em que o resultado JSON é gravado (padrão: a saída padrão).")
+        parser.add_argument('--comparar', default = None,
+                            help = "Resultado JSON de referência: exibe as diferenças e falha se houver regressão.")
+        parser.add_argument('--tolerancia', type = float, default = 10.0,
+                            help = "Com --comparar, piora (em %%) tolerada na vazão, nas latências e na memória.")
+
+    def handle(self, *args, **options):
+        referencia = None
+        if options['comparar']:
+            with open(options['comparar'], encoding = 'utf-8') as f:
+                referencia = json.load(f)
+
+        imagens = []
+        if not options['sem_imagens']:
+            imagens = list(Produto.objects.exclude(imagem = '').filter(image_width__isnull = False).values_list(
+                'imagem', 'image_width', 'image_height').distinct()[:20])
+
+        caches = {alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'benchmark-{alias}'}
+                  for alias in settings.CACHES}
+        # Caches próprios: as páginas em cache do banco de testes não podem se misturar com as do banco real (os ids coincidem).
+        with override_settings(CACHES = caches, EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend',
+                               ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']):
+            views = self.medir(options, imagens)
+
+        relatorio = {
+            'ambiente': ambiente(),
+            'parametros': {chave: options[chave] for chave in (
+                'produtos', 'requisicoes', 'concorrencia', 'aquecimento', 'amostras', 'gunicorn', 'servidor', 'trabalhadores')},
+            'views': views,
+        }
+        if options['saida']:
+            with open(options['saida'], 'w', encoding = 'utf-8') as f:
+                json.dump(relatorio, f, indent = 2)
+            for view, valores in views.items():
+                self.stdout.write(
+                    f"{view:<16}{valores['requisicoes_por_segundo']:>9} req/s  p50 {valores['p50_ms']} ms  "
+                    f"p95 {valores['p95_ms']} ms  p99 {valores['p99_ms']} ms  {valores['consultas']} consultas  "
+                    f"{valores['memoria_kib']} KiB  {valores['erros']} erros")
+        else:
+            self.stdout.write(json.dumps(relatorio, indent = 2))
+
+        if referencia is not None:
+            if referencia.get('parametros') != relatorio['parametros'] or referencia.get('ambiente') != relatorio['ambiente']:
+                self.stderr.write(self.style.WARNING(
+                    "A referência foi medida com outros parâmetros ou em outro ambiente: as diferenças podem não ser regressões."))
+            diferencas = comparar(relatorio, referencia, tolerancia = options['tolerancia'])
+            for d in diferencas:
+                linha = f"{d['view']:<16}{d['metrica']:<24}{d['referencia']:>10} -> {d['atual']:<10} ({d['variacao']:+.1f}%)"
+                self.stderr.write(self.style.ERROR(linha) if d['regressao'] else linha)
+            regressoes = [d for d in diferencas if d['regressao']]
+            if regressoes:
+                raise CommandError(f"{len(regressoes)} métricas pioraram em relação a {options['comparar']}.")
+            self.stderr.write(self.style.SUCCESS(f"Nenhuma regressão em relação a {options['comparar']}."))
+
+    def medir(self, options, imagens):
+        # Cria o banco de testes, mede cada view e destrói o banco, mesmo se a medição falhar.
+        # No SQLite, o banco de testes precisa ser um arquivo (o padrão é em memória), pois as threads de concorrência
+        # e o gunicorn abrem as suas próprias conexões.
+        if connection.vendor == 'sqlite' and not connection.settings_dict['TEST']['NAME']:
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.gettempdir(), 'benchmark_views.sqlite3')
+        nome_original = connection.creation.create_test_db(verbosity = 0, autoclobber = True, serialize = False)
+        servidor = None
+        try:
+            slugs = criar_dados(options['produtos'], imagens)
+            fabrica = ClienteDjango
+            if options['gunicorn']:
+                servidor, porta = self.iniciar_gunicorn(options)
+                fabrica = partial(ClienteHttp, '127.0.0.1', porta)
+
+            views = {}
+            for view in options['views']:
+                views[view] = medir_view(fabrica, view, slugs, options['requisicoes'],
+                                         concorrencia = options['concorrencia'], aquecimento = options['aquecimento'])
+                views[view].update(medir_recursos(view, slugs, amostras = options['amostras']))
+                if options['verbosity'] > 1:
+                    self.stderr.write(f"{view} medida.")
+            return views
+        finally:
+            if servidor:
+                servidor.terminate()
+                servidor.wait()
+            connection.creation.destroy_test_db(nome_original, verbosity = 0)
+
+    def iniciar_gunicorn(self, options):
+        # Inicia o gunicorn em uma porta livre, apontando para o banco de testes, e espera até que ele aceite conexões.
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            porta = s.getsockname()[1]
+
+        ambiente_servidor = dict(
+            os.environ,
+            DATABASE_URL = self.url_do_banco(connection.settings_dict),
+            CATALOGO_CACHE_BACKEND = 'django.core.cache.backends.locmem.LocMemCache',
+            CATALOGO_CACHE_LOCATION = 'benchmark-catalogo',
+        )
+        comando = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{porta}',
+                   '--workers', str(options['trabalhadores']), '--log-level', 'warning']
+        if options['servidor'] == 'asgi':
+            ambiente_servidor['DJANGO_SERVIDOR'] = 'asgi'
+            comando += ['-c', 'gunicorn_asgi.conf.py'] # As opções da linha de comando têm precedência sobre o arquivo.
+        else:
+            comando.append('Django2.wsgi:application')
+        servidor = subprocess.Popen(comando, cwd = settings.BASE_DIR, env = ambiente_servidor)
+
+        limite = time.monotonic() + 30
+        while time.monotonic() < limite:
+            if servidor.poll() is not None:
+                raise CommandError("O gunicorn terminou antes de aceitar conexões.")
+            try:
+                socket.create_connection(('127.0.0.1', porta), timeout = 1).close()
+                return servidor, porta
+            except OSError:
+                time.sleep(0.2)
+        servidor.terminate()
+        raise CommandError("O gunicorn não aceitou conexões em 30 segundos.")
+
+    def url_do_banco(self, banco):
+        # URL no formato do dj_database_url (DATABASE_URL) para o banco atual, que o gunicorn lê do ambiente.
+        if connection.vendor == 'sqlite':
+            return f"sqlite:///{banco['NAME']}"
+        esquema = {'postgresql': 'postgres', 'mysql': 'mysql'}[connection.vendor]
+        return f"{esquema}://{banco['USER']}:{banco['PASSWORD']}@{banco['HOST'] or 'localhost'}:{banco['PORT']}/{banco['NAME']}"
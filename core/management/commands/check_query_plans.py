@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.planos import LIMITE_LINHAS, BancoNaoSuportado, PlanoIneficiente, consultas_criticas, verificar_planos
+
+
+class Command(BaseCommand):
+    """
+    Comando que verifica, com EXPLAIN, se as consultas do caminho crítico usam índices (veja core/planos.py).
+
+    Uso:
+      python manage.py check_query_plans                 # falha se alguma consulta ler sequencialmente mais de 1000 linhas
+      python manage.py check_query_plans --limite 0      # acusa qualquer leitura sequencial, mesmo em tabelas pequenas
+      python manage.py check_query_plans --mostrar       # exibe também o plano completo de cada consulta
+    """
+
+    help = "Verifica os planos de execução (EXPLAIN) das consultas principais e falha se houver leitura sequencial acima do limite."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limite', type = int, default = LIMITE_LINHAS,
+                            help = "Quantidade de linhas estimadas a partir da qual uma leitura sequencial é considerada um problema.")
+        parser.add_argument('--mostrar', action = 'store_true',
+                            help = "Exibe o plano de execução completo de cada consulta.")
+
+    def handle(self, *args, **options):
+        consultas = consultas_criticas()
+        if options['mostrar']:
+            for nome, queryset in consultas.items():
+                self.stdout.write(self.style.MIGRATE_HEADING(nome))
+                self.stdout.write(queryset.explain())
+
+        try:
+            encontradas = verificar_planos(consultas, limite = options['limite'])
+        except (PlanoIneficiente, BancoNaoSuportado) as e:
+            raise CommandError(str(e))
+
+        for nome in consultas:
+            lista = encontradas[nome]
+            detalhe = ', '.join(f"{tabela} (~{linhas} linhas)" for tabela, linhas in lista) or 'usa índices'
+            self.stdout.write(f"{nome}: {detalhe}")
+        self.stdout.write(self.style.SUCCESS("Planos de execução dentro do limite."))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from core.importacao import linhas_exportacao
+from core.models import Produto
+
+
+class Command(BaseCommand):
+    """
+    Comando que exporta os produtos em CSV ou JSONL, em streaming (veja core/importacao.py).
+
+    O arquivo CSV tem as mesmas colunas do manifesto aceito por import_products (mais id, slug e datas).
+
+    Uso:
+      python manage.py export_products produtos.csv
+      python manage.py export_products produtos.jsonl --formato jsonl
+      python manage.py export_products --ativos > produtos.csv    # sem arquivo: escreve na saída padrão
+    """
+
+    help = "Exporta os produtos em CSV ou JSONL, lendo-os do banco em blocos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', nargs = '?', help = "Arquivo de destino (padrão: saída padrão).")
+        parser.add_argument('--formato', choices = ['csv', 'jsonl'], default = None,
+                            help = "Formato da exportação (padrão: deduzido da extensão; csv na saída padrão).")
+        parser.add_argument('--ativos', action = 'store_true', help = "Exporta apenas os produtos ativos.")
+
+    def handle(self, *args, **options):
+        caminho = options['arquivo']
+        formato = options['formato'] or ('jsonl' if caminho and caminho.endswith('.jsonl') else 'csv')
+        produtos = Produto.objects.filter(ativo = True) if options['ativos'] else Produto.objects.all()
+
+        if not caminho:
+            for linha in linhas_exportacao(produtos, formato):
+                self.stdout.write(linha, ending = '')
+            return
+        with open(caminho, 'w', encoding = 'utf-8', newline = '') as destino:
+            destino.writelines(linhas_exportacao(produtos, formato))
@@ -0,0 +1,188 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import traceback
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.carga import CargaInvalida
+from core.importacao import importar
+from core.models import ImportacaoProdutos
+
+LIMITE_RELATORIO = 1000
+# Quantidade máxima de erros detalhados no relatório de uma importação da fila (todos continuam contados em 'erros').
+
+
+class Command(BaseCommand):
+    """
+    Comando que importa produtos em massa a partir de um manifesto CSV/JSONL e de um diretório ou ZIP de imagens
+    (veja core/importacao.py).
+
+    As imagens são processadas em paralelo por um pool de processos e os produtos gravados em lotes. Após cada lote,
+    o número do último registro processado é salvo em um arquivo de checkpoint: se o comando for interrompido,
+    basta executá-lo de novo para continuar de onde parou.
+
+    Com --fila, processa as importações enviadas pelo admin (ImportacaoProdutos), guardando o checkpoint no próprio registro.
+
+    Uso:
+      python manage.py import_products produtos.csv --imagens fotos.zip
+      python manage.py import_products produtos.jsonl --imagens fotos/ --lote 500 --processos 4
+      python manage.py import_products produtos.csv --imagens fotos.zip --recomecar   # ignora o checkpoint existente
+      python manage.py import_products --fila                                          # roda continuamente
+      python manage.py import_products --fila --uma-vez                                # processa a fila e encerra
+    """
+
+    help = "Importa produtos de um manifesto CSV/JSONL com imagens em um diretório ou ZIP, em lotes e com checkpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument('manifesto', nargs = '?',
+                            help = "Caminho do manifesto (colunas nome, preco, estoque, imagem e, opcionalmente, ativo).")
+        parser.add_argument('--imagens',
+                            help = "Diretório ou arquivo ZIP com as imagens referenciadas pela coluna 'imagem'.")
+        parser.add_argument('--formato', choices = ['csv', 'jsonl'], default = None,
+                            help = "Formato do manifesto (padrão: deduzido da extensão).")
+        parser.add_argument('--lote', type = int, default = 200,
+                            help = "Quantidade de registros validados e gravados por vez.")
+        parser.add_argument('--processos', type = int, default = None,
+                            help = "Quantidade de processos do pool de imagens (padrão: número de CPUs).")
+        parser.add_argument('--checkpoint', default = None,
+                            help = "Arquivo de checkpoint (padrão: <manifesto>.checkpoint.json).")
+        parser.add_argument('--recomecar', action = 'store_true',
+                            help = "Ignora o checkpoint existente e importa o manifesto desde o início.")
+        parser.add_argument('--fila', action = 'store_true',
+                            help = "Processa as importações enviadas pelo admin em vez de um manifesto local.")
+        parser.add_argument('--uma-vez', action = 'store_true',
+                            help = "Com --fila, processa as importações pendentes e encerra, em vez de rodar continuamente.")
+        parser.add_argument('--intervalo', type = float, default = 5.0,
+                            help = "Com --fila, segundos de espera quando a fila está vazia.")
+        parser.add_argument('--expiracao', type = int, default = 1800,
+                            help = "Com --fila, segundos sem progresso após os quais uma importação 'processando' é retomada.")
+
+    def handle(self, *args, **options):
+        if options['fila']:
+            return self.processar_fila(options)
+        if not options['manifesto'] or not options['imagens']:
+            raise CommandError("Informe o manifesto e --imagens (ou use --fila).")
+
+        caminho = options['manifesto']
+        formato = options['formato'] or ('jsonl' if caminho.endswith('.jsonl') else 'csv')
+        for arquivo in (caminho, options['imagens']):
+            if not os.path.exists(arquivo):
+                raise CommandError(f"Arquivo não encontrado: {arquivo}")
+
+        checkpoint = options['checkpoint'] or f'{caminho}.checkpoint.json'
+        estado = {'registro': 0, 'importados': 0, 'erros': 0, 'concluida': False}
+        if os.path.exists(checkpoint) and not options['recomecar']:
+            with open(checkpoint, encoding = 'utf-8') as f:
+                estado.update(json.load(f))
+            if estado['concluida']:
+                self.stdout.write(f"Importação já concluída segundo {checkpoint} (use --recomecar para importar de novo).")
+                return
+            self.stdout.write(f"Retomando após o registro {estado['registro']}.")
+
+        def salvar_checkpoint():
+            # Grava em um arquivo temporário e o renomeia: uma interrupção no meio da escrita não corrompe o checkpoint.
+            with open(f'{checkpoint}.tmp', 'w', encoding = 'utf-8') as f:
+                json.dump(estado, f)
+            os.replace(f'{checkpoint}.tmp', checkpoint)
+
+        anteriores = dict(importados = estado['importados'], erros = estado['erros'])
+        inicio = time.monotonic()
+
+        def ao_concluir_lote(registro, contagem, erros):
+            for numero, mensagem in erros:
+                self.stderr.write(f"Registro {numero}: {mensagem}")
+            estado.update(registro = registro, **{chave: anteriores[chave] + contagem[chave] for chave in anteriores})
+            salvar_checkpoint()
+            processados = contagem['importados'] + contagem['erros']
+            self.stdout.write(
+                f"Até o registro {registro}: {estado['importados']} importados, {estado['erros']} com erro "
+                f"({processados / max(time.monotonic() - inicio, 1e-6):.0f} registros/s)."
+            )
+
+        try:
+            with open(caminho, encoding = 'utf-8-sig', newline = '') as manifesto:
+                importar(manifesto, formato, options['imagens'], lote = options['lote'], processos = options['processos'],
+                         inicio = estado['registro'], ao_concluir_lote = ao_concluir_lote)
+        except CargaInvalida as e:
+            raise CommandError(str(e))
+
+        estado['concluida'] = True
+        salvar_checkpoint()
+        self.stdout.write(self.style.SUCCESS(
+            f"{estado['importados']} produtos importados, {estado['erros']} registros com erro."
+        ))
+
+    def processar_fila(self, options):
+        while True:
+            self.recuperar_abandonadas(options['expiracao'])
+            importacao = self.reservar()
+            if importacao:
+                self.processar(importacao, options)
+            elif options['uma_vez']:
+                break
+            else:
+                time.sleep(options['intervalo'])
+
+    def recuperar_abandonadas(self, expiracao):
+        # Importações presas em 'processando' sem progresso (por exemplo, se o worker foi reiniciado) voltam para a fila;
+        # como o checkpoint é gravado na mesma transação de cada lote, elas continuam do último lote confirmado.
+        limite = timezone.now() - timedelta(seconds = expiracao)
+        ImportacaoProdutos.objects.filter(estado = ImportacaoProdutos.PROCESSANDO, modificado__lt = limite).update(
+            estado = ImportacaoProdutos.PENDENTE, modificado = timezone.now())
+
+    def reservar(self):
+        # Mesma reserva por UPDATE condicional usada em process_pictures: só um worker consegue mudar o estado da importação.
+        for importacao in ImportacaoProdutos.objects.filter(estado = ImportacaoProdutos.PENDENTE).order_by('id')[:5]:
+            if ImportacaoProdutos.objects.filter(pk = importacao.pk, estado = ImportacaoProdutos.PENDENTE).update(
+                    estado = ImportacaoProdutos.PROCESSANDO, modificado = timezone.now()):
+                importacao.estado = ImportacaoProdutos.PROCESSANDO
+                return importacao
+        return None
+
+    def processar(self, importacao, options):
+        formato = 'jsonl' if importacao.manifesto.name.endswith('.jsonl') else 'csv'
+        self.stdout.write(f"Importando {importacao.manifesto.name} a partir do registro {importacao.linha + 1}...")
+
+        def ao_concluir_lote(registro, contagem, erros):
+            linhas = [f"Registro {numero}: {mensagem}" for numero, mensagem in erros]
+            existentes = importacao.relatorio.count('\n') + bool(importacao.relatorio)
+            linhas = linhas[:max(LIMITE_RELATORIO - existentes, 0)]
+            importacao.relatorio = '\n'.join(filter(None, [importacao.relatorio, *linhas]))
+            importacao.linha = registro
+            importacao.importados = importados + contagem['importados']
+            importacao.erros = erros_anteriores + contagem['erros']
+            importacao.save(update_fields = ['linha', 'importados', 'erros', 'relatorio', 'modificado'])
+
+        importados, erros_anteriores = importacao.importados, importacao.erros
+        try:
+            with tempfile.TemporaryDirectory() as diretorio:
+                # O manifesto e o ZIP estão no armazenamento (no Render, o GCS): copiamos os dois para arquivos locais,
+                # que o importador e os processos do pool leem diretamente.
+                caminhos = []
+                for campo in (importacao.manifesto, importacao.imagens):
+                    caminho = os.path.join(diretorio, os.path.basename(campo.name))
+                    with campo.open('rb') as origem, open(caminho, 'wb') as destino:
+                        shutil.copyfileobj(origem, destino)
+                    caminhos.append(caminho)
+
+                with open(caminhos[0], encoding = 'utf-8-sig', newline = '') as manifesto:
+                    importar(manifesto, formato, caminhos[1], lote = options['lote'], processos = options['processos'],
+                             inicio = importacao.linha, ao_concluir_lote = ao_concluir_lote)
+        except Exception:
+            erro = traceback.format_exc()
+            importacao.estado = ImportacaoProdutos.FALHOU
+            importacao.relatorio = '\n'.join(filter(None, [importacao.relatorio, erro]))
+            importacao.save(update_fields = ['estado', 'relatorio', 'modificado'])
+            self.stderr.write(self.style.ERROR(f"Erro ao importar {importacao.manifesto.name}:\n{erro}"))
+            return
+
+        importacao.estado = ImportacaoProdutos.CONCLUIDA
+        importacao.save(update_fields = ['estado', 'modificado'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{importacao.manifesto.name}: {importacao.importados} produtos importados, {importacao.erros} registros com erro."
+        ))
@@ -0,0 +1,48 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.carga import CargaInvalida, carregar_produtos, ler_registros
+
+
+class Command(BaseCommand):
+    """
+    Comando que carrega produtos de uma fixture JSON ou JSONL em lotes, substituindo o `loaddata backup.json` do build.
+
+    Os registros são lidos em streaming e gravados com bulk_create (um INSERT ... ON CONFLICT por lote);
+    registros que não mudaram desde a última carga são ignorados (veja core/carga.py).
+
+    Uso:
+      python manage.py load_catalog backup.json
+      python manage.py load_catalog catalogo.jsonl --lote 2000
+    """
+
+    help = "Carrega produtos de uma fixture JSON ou JSONL em lotes, pulando os registros que não mudaram."
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help = "Caminho da fixture (formato do dumpdata; '.jsonl' para um registro por linha).")
+        parser.add_argument('--formato', choices = ['json', 'jsonl'], default = None,
+                            help = "Formato do arquivo (padrão: deduzido da extensão).")
+        parser.add_argument('--lote', type = int, default = 500,
+                            help = "Quantidade de registros gravados por vez.")
+
+    def handle(self, *args, **options):
+        caminho = options['arquivo']
+        formato = options['formato'] or ('jsonl' if caminho.endswith('.jsonl') else 'json')
+        if not os.path.exists(caminho):
+            raise CommandError(f"Arquivo não encontrado: {caminho}")
+
+        def progresso(contagem):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{sum(contagem.values())} registros processados...")
+
+        try:
+            with open(caminho, encoding = 'utf-8') as arquivo:
+                contagem = carregar_produtos(ler_registros(arquivo, formato), lote = options['lote'], progresso = progresso)
+        except CargaInvalida as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{contagem['criados']} produtos criados, {contagem['atualizados']} atualizados, "
+            f"{contagem['inalterados']} inalterados."
+        ))
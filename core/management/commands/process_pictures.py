@@ -0,0 +1,115 @@
+import time
+import traceback
+from concurrent.futures import as_completed
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.cache_catalogo import invalidar_produtos
+from core.models import Produto, TarefaImagem
+from core.tasks import gerar_versoes, pool_de_processos
+
+
+class Command(BaseCommand):
+    """
+    Comando que consome a fila de geração de imagens (TarefaImagem) em segundo plano.
+
+    As tarefas são criadas por core.tasks.enfileirar_versoes sempre que a imagem de um Produto é salva.
+    O comando busca lotes de tarefas pendentes no banco de dados e distribui o trabalho do Pillow
+    (decodificar, redimensionar e codificar cada versão) entre vários processos, aproveitando todos os núcleos da máquina.
+
+    Uso:
+      python manage.py process_pictures              # roda continuamente, verificando a fila a cada --intervalo segundos
+      python manage.py process_pictures --uma-vez    # processa o que estiver pendente e encerra
+    """
+
+    help = "Processa a fila de geração das versões redimensionadas das imagens de produtos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processos', type = int, default = None,
+                            help = "Quantidade de processos do pool (padrão: número de CPUs).")
+        parser.add_argument('--lote', type = int, default = 20,
+                            help = "Quantidade máxima de tarefas retiradas da fila por vez.")
+        parser.add_argument('--intervalo', type = float, default = 2.0,
+                            help = "Segundos de espera quando a fila está vazia.")
+        parser.add_argument('--tentativas', type = int, default = 3,
+                            help = "Quantidade de tentativas antes de marcar a tarefa como falha.")
+        parser.add_argument('--espera', type = int, default = 30,
+                            help = "Espera base (segundos) antes de uma nova tentativa; dobra a cada falha.")
+        parser.add_argument('--expiracao', type = int, default = 600,
+                            help = "Segundos após os quais uma tarefa 'processando' é considerada abandonada e volta para a fila.")
+        parser.add_argument('--uma-vez', action = 'store_true',
+                            help = "Processa as tarefas pendentes e encerra, em vez de rodar continuamente.")
+
+    def handle(self, *args, **options):
+        with pool_de_processos(options['processos']) as pool:
+            # Os filhos são iniciados por 'spawn' e não herdam a conexão com o banco (veja core/tasks.py).
+            while True:
+                self.recuperar_abandonadas(options['expiracao'])
+                tarefas = self.reservar(options['lote'])
+                if tarefas:
+                    self.processar(pool, tarefas, options['tentativas'], options['espera'])
+                elif options['uma_vez']:
+                    break
+                else:
+                    time.sleep(options['intervalo'])
+
+    def recuperar_abandonadas(self, expiracao):
+        # Tarefas presas em 'processando' por mais tempo que o limite (por exemplo, se o worker foi reiniciado) voltam para a fila.
+        limite = timezone.now() - timedelta(seconds = expiracao)
+        TarefaImagem.objects.filter(estado = TarefaImagem.PROCESSANDO, modificado__lt = limite).update(
+            estado = TarefaImagem.PENDENTE, modificado = timezone.now())
+
+    def reservar(self, lote):
+        """
+        Retira até `lote` tarefas pendentes da fila, marcando-as como 'processando'.
+
+        Cada tarefa é reservada com um UPDATE condicional (WHERE estado = 'pendente'): se outro worker a reservou
+        primeiro, o UPDATE não altera nenhuma linha e a tarefa é ignorada. Assim vários workers podem consumir
+        a mesma fila sem processar uma tarefa duas vezes, em qualquer banco de dados.
+        Tarefas que falharam só são reservadas depois do horário da próxima tentativa (veja processar).
+        """
+        candidatas = TarefaImagem.objects.filter(
+            estado = TarefaImagem.PENDENTE, proxima_tentativa__lte = timezone.now()).order_by('id')[:lote]
+        reservadas = []
+        for tarefa in candidatas:
+            if TarefaImagem.objects.filter(pk = tarefa.pk, estado = TarefaImagem.PENDENTE).update(
+                    estado = TarefaImagem.PROCESSANDO, tentativas = tarefa.tentativas + 1, modificado = timezone.now()):
+                tarefa.tentativas += 1
+                reservadas.append(tarefa)
+        return reservadas
+
+    def processar(self, pool, tarefas, max_tentativas, espera):
+        futuros = {
+            pool.submit(gerar_versoes, tarefa.armazenamento, tarefa.arquivo, tarefa.novas, tarefa.antigas): tarefa
+            for tarefa in tarefas
+        }
+        for futuro in as_completed(futuros):
+            tarefa = futuros[futuro]
+            try:
+                futuro.result()
+            except Exception:
+                erro = traceback.format_exc()
+                estado = TarefaImagem.FALHOU if tarefa.tentativas >= max_tentativas else TarefaImagem.PENDENTE
+                # Espera exponencial (espera, 2 × espera, 4 × espera...), como na caixa de saída (core/caixa_saida.py):
+                # uma falha passageira (por exemplo, o GCS indisponível) não consome todas as tentativas em poucos segundos.
+                TarefaImagem.objects.filter(pk = tarefa.pk).update(
+                    estado = estado,
+                    erro = erro,
+                    proxima_tentativa = timezone.now() + timedelta(seconds = espera * 2 ** (tarefa.tentativas - 1)),
+                    modificado = timezone.now(),
+                )
+                self.stderr.write(self.style.ERROR(f"Erro ao processar {tarefa.arquivo} (tentativa {tarefa.tentativas}):\n{erro}"))
+                continue
+
+            TarefaImagem.objects.filter(pk = tarefa.pk).update(estado = TarefaImagem.CONCLUIDA, erro = '', modificado = timezone.now())
+            if not TarefaImagem.objects.filter(arquivo = tarefa.arquivo, estado__in = TarefaImagem.ESTADOS_ABERTOS).exists():
+                # Todas as versões da imagem estão prontas: a página de detalhe dos produtos que a usam deixa de exibir placeholders.
+                # Atualizamos 'modificado' para que o ETag/Last-Modified dessas páginas mude e navegadores e CDNs busquem a nova versão.
+                # O fragmento desses produtos na listagem, renderizado com placeholders, também é descartado do cache do catálogo.
+                pks = list(Produto.objects.filter(imagem = tarefa.arquivo).values_list('pk', flat = True))
+                if pks:
+                    Produto.objects.filter(pk__in = pks).update(modificado = timezone.now())
+                    invalidar_produtos(pks)
+            self.stdout.write(f"Versões de {tarefa.arquivo} geradas.")
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Produto, VersaoImagem
+from core.versoes import versoes_obsoletas
+
+
+class Command(BaseCommand):
+    """
+    Comando que apaga as versões redimensionadas de imagens que a configuração atual de Produto.imagem não prevê mais
+    (veja core/versoes.py).
+
+    Depois de remover um tipo de arquivo, uma proporção ou um breakpoint do campo, as versões antigas continuam
+    ocupando espaço no disco e no GCS (e sendo sincronizadas pelo upload_media). Este comando percorre o diretório das
+    imagens e apaga essas versões, além das versões de originais que nenhum produto usa.
+
+    Uso:
+      python manage.py prune_pictures              # apaga as versões obsoletas
+      python manage.py prune_pictures --simular    # apenas lista o que seria apagado
+    """
+
+    help = "Apaga as versões de imagens de produtos que não correspondem mais à configuração do PictureField."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action = 'store_true',
+                            help = "Lista as versões obsoletas sem apagá-las.")
+
+    def handle(self, *args, **options):
+        campo = Produto._meta.get_field('imagem')
+        total, lote = 0, []
+        for nome in versoes_obsoletas(campo.storage, campo.upload_to):
+            if options['verbosity'] > 1 or options['simular']:
+                self.stdout.write(nome)
+            total += 1
+            if options['simular']:
+                continue
+            campo.storage.delete(nome)
+            lote.append(nome)
+            if len(lote) >= 500:
+                self.esquecer(lote)
+        self.esquecer(lote)
+
+        acao = "seriam apagadas" if options['simular'] else "apagadas"
+        self.stdout.write(self.style.SUCCESS(f"{total} versões obsoletas {acao}."))
+
+    def esquecer(self, lote):
+        # Remove, em lotes, os registros das versões sob demanda apagadas, para que sejam geradas de novo se voltarem a ser pedidas.
+        VersaoImagem.objects.filter(nome__in = lote).delete()
+        lote.clear()
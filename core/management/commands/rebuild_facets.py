@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from core.facetas import FACETAS, contagens, ler_filtros, recalcular_contagens
+
+
+class Command(BaseCommand):
+    """
+    Comando que recalcula as contagens das facetas da listagem (ContagemProdutos; veja core/facetas.py).
+
+    Os signals de Produto mantêm as contagens atualizadas; o recálculo só é necessário depois de alterações que não passam
+    por eles (QuerySet.update(), SQL direto) ou de uma mudança em settings.CATALOGO_FAIXAS_DE_PRECO.
+
+    Uso:
+      python manage.py rebuild_facets
+    """
+
+    help = "Recalcula as contagens de produtos por faceta (preço, estoque e ativo) com uma única consulta agrupada."
+
+    def handle(self, *args, **options):
+        linhas = recalcular_contagens()
+        self.stdout.write(self.style.SUCCESS(f"{sum(linha[3] for linha in linhas)} produtos em {len(linhas)} combinações."))
+        if options['verbosity'] > 1:
+            for faceta in contagens(ler_filtros({}), FACETAS, linhas = linhas):
+                opcoes = ', '.join(f"{opcao['rotulo']}: {opcao['quantidade']}" for opcao in faceta['opcoes'])
+                self.stdout.write(f"{faceta['titulo']}: {opcoes}")
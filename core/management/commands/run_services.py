@@ -0,0 +1,116 @@
+import argparse
+import signal
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """
+    Comando que roda o servidor web junto com os comandos de segundo plano (SERVICOS_EM_SEGUNDO_PLANO), supervisionando-os.
+
+    Os comandos de segundo plano rodam na mesma instância do servidor web de propósito: o cache 'catalogo' do Render é um
+    FileBasedCache no disco da instância (veja CACHES em settings.py), e process_pictures, import_products e
+    sweep_reservations precisam invalidar os mesmos fragmentos que o servidor web lê.
+    1) Um comando de segundo plano que termina é iniciado de novo, com espera exponencial (--espera, dobrando a cada
+       término seguido). Se ele terminar --tentativas vezes seguidas antes de completar --estabilidade segundos, o erro
+       não é passageiro (configuração, migração pendente, dependência ausente): todos os processos são encerrados e o
+       comando termina com erro, o que faz o Render acusar a falha do deploy em vez de servir o site sem o trabalhador.
+    2) Se o servidor web terminar, os demais processos são encerrados e o comando termina com o mesmo código de saída.
+    3) SIGTERM e SIGINT (o Render envia SIGTERM ao substituir a instância) são repassados a todos os processos, que têm
+       --encerramento segundos para terminar antes de serem mortos.
+
+    Uso:
+      python manage.py run_services gunicorn -c gunicorn_asgi.conf.py
+    """
+
+    help = "Roda o servidor web e os comandos de segundo plano, reiniciando os que terminarem."
+
+    def add_arguments(self, parser):
+        parser.add_argument('web', nargs = argparse.REMAINDER,
+                            help = "Comando do servidor web (por exemplo: gunicorn -c gunicorn_asgi.conf.py); deve vir depois das opções.")
+        parser.add_argument('--tentativas', type = int, default = 3,
+                            help = "Términos seguidos de um comando de segundo plano, antes de --estabilidade segundos, que encerram tudo.")
+        parser.add_argument('--estabilidade', type = float, default = 30.0,
+                            help = "Segundos de execução a partir dos quais um término deixa de contar como falha ao iniciar.")
+        parser.add_argument('--espera', type = float, default = 1.0,
+                            help = "Espera base (segundos) antes de reiniciar um comando que terminou; dobra a cada término seguido.")
+        parser.add_argument('--encerramento', type = float, default = 30.0,
+                            help = "Segundos que os processos têm para terminar depois do SIGTERM, antes do SIGKILL.")
+
+    def handle(self, *args, **options):
+        if not options['web']:
+            raise CommandError("Informe o comando do servidor web.")
+        self.options = options
+        self.encerrar = False
+        anteriores = {numero: signal.signal(numero, self._sinal) for numero in (signal.SIGTERM, signal.SIGINT)}
+        web = subprocess.Popen(options['web'])
+        trabalhadores = [self._iniciar(argumentos) for argumentos in settings.SERVICOS_EM_SEGUNDO_PLANO]
+        try:
+            while not self.encerrar:
+                codigo = web.poll()
+                if codigo is not None:
+                    self.stderr.write(f"O servidor web terminou (código {codigo}).")
+                    return self._sair(codigo)
+                for trabalhador in trabalhadores:
+                    self._supervisionar(trabalhador)
+                time.sleep(0.2)
+        finally:
+            self._encerrar([web] + [t['processo'] for t in trabalhadores if t['processo'] is not None])
+            for numero, tratador in anteriores.items():
+                signal.signal(numero, tratador)
+
+    def _sinal(self, numero, quadro):
+        self.encerrar = True
+
+    def _sair(self, codigo):
+        # BaseCommand.execute espera uma string (ou None) de handle; o código de saída vai por SystemExit.
+        if codigo:
+            raise SystemExit(codigo)
+
+    def _iniciar(self, argumentos):
+        # Cada comando de segundo plano é um processo "python manage.py <argumentos>" próprio.
+        return {
+            'argumentos': argumentos,
+            'processo': subprocess.Popen([sys.executable, str(settings.BASE_DIR / 'manage.py'), *argumentos]),
+            'inicio': time.monotonic(),
+            'falhas': 0,
+            'reinicio': None,
+        }
+
+    def _supervisionar(self, trabalhador):
+        nome = ' '.join(trabalhador['argumentos'])
+        agora = time.monotonic()
+        if trabalhador['processo'] is None:
+            if agora >= trabalhador['reinicio']:
+                falhas = trabalhador['falhas']
+                trabalhador.update(self._iniciar(trabalhador['argumentos']), falhas = falhas)
+            return
+        codigo = trabalhador['processo'].poll()
+        if codigo is None:
+            return
+        if agora - trabalhador['inicio'] < self.options['estabilidade']:
+            trabalhador['falhas'] += 1
+        else:
+            trabalhador['falhas'] = 1 # Rodou por tempo suficiente: o término não vem de uma falha ao iniciar.
+        if trabalhador['falhas'] >= self.options['tentativas']:
+            raise CommandError(f"'{nome}' terminou {trabalhador['falhas']} vezes seguidas logo após iniciar (código {codigo}).")
+        espera = self.options['espera'] * 2 ** (trabalhador['falhas'] - 1)
+        self.stderr.write(f"'{nome}' terminou (código {codigo}); reiniciando em {espera:g} s.")
+        trabalhador.update(processo = None, reinicio = agora + espera)
+
+    def _encerrar(self, processos):
+        # Repassa o SIGTERM a todos os processos e espera o término de cada um, até o limite de --encerramento segundos.
+        ativos = [processo for processo in processos if processo.poll() is None]
+        for processo in ativos:
+            processo.terminate()
+        limite = time.monotonic() + self.options['encerramento']
+        for processo in ativos:
+            try:
+                processo.wait(timeout = max(limite - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                processo.kill()
+                processo.wait()
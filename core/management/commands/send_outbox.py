@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.caixa_saida import entregar_lote, recuperar_abandonadas
+
+
+class Command(BaseCommand):
+    """
+    Comando que entrega os e-mails gravados na caixa de saída (MensagemEmail) em segundo plano.
+
+    As mensagens são criadas por core.caixa_saida.enfileirar_email (por exemplo, no formulário de contato).
+    Cada lote reaproveita uma única conexão com o servidor de e-mail configurado em EMAIL_BACKEND/EMAIL_HOST/EMAIL_PORT.
+
+    Uso:
+      python manage.py send_outbox              # roda continuamente, verificando a fila a cada --intervalo segundos
+      python manage.py send_outbox --uma-vez    # entrega o que estiver pendente e encerra
+    """
+
+    help = "Entrega em lotes os e-mails pendentes da caixa de saída."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type = int, default = 50,
+                            help = "Quantidade máxima de mensagens enviadas por conexão.")
+        parser.add_argument('--tentativas', type = int, default = 5,
+                            help = "Tentativas por mensagem antes de movê-la para o estado 'falhou'.")
+        parser.add_argument('--espera', type = int, default = 30,
+                            help = "Espera base (segundos) antes de uma nova tentativa; dobra a cada falha.")
+        parser.add_argument('--intervalo', type = float, default = 5.0,
+                            help = "Segundos de espera quando a fila está vazia.")
+        parser.add_argument('--uma-vez', action = 'store_true',
+                            help = "Entrega as mensagens pendentes e encerra, em vez de rodar continuamente.")
+
+    def handle(self, *args, **options):
+        while True:
+            recuperar_abandonadas()
+            enviadas, falhas = entregar_lote(
+                limite = options['lote'],
+                max_tentativas = options['tentativas'],
+                espera = options['espera'],
+            )
+            if enviadas or falhas:
+                self.stdout.write(f"{enviadas} mensagem(ns) enviada(s), {falhas} falha(s).")
+            elif options['uma_vez']:
+                break
+            else:
+                time.sleep(options['intervalo'])
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.envios import expirar_envios
+from core.estoque import varrer_expiradas
+
+
+class Command(BaseCommand):
+    """
+    Comando que devolve ao estoque os itens das reservas expiradas (Reserva; veja core/estoque.py).
+
+    Cada lote é tratado em uma transação: as reservas ativas cujo prazo passou são marcadas como expiradas e os seus itens
+    voltam ao estoque com um único UPDATE. Nos bancos com SELECT ... FOR UPDATE SKIP LOCKED, vários processos podem rodar
+    o comando ao mesmo tempo sem disputar as mesmas reservas.
+
+    A cada passagem, o comando também apaga os envios de imagem em partes abandonados há mais de ENVIO_VALIDADE segundos,
+    com as suas partes (veja expirar_envios, em core/envios.py).
+
+    Uso:
+      python manage.py sweep_reservations              # roda continuamente, verificando a cada --intervalo segundos
+      python manage.py sweep_reservations --uma-vez    # devolve o que estiver expirado e encerra
+    """
+
+    help = "Marca como expiradas as reservas de estoque vencidas, devolve os seus itens ao estoque e apaga os envios de imagem abandonados."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type = int, default = 500,
+                            help = "Quantidade máxima de reservas (e de envios abandonados) tratados por passagem.")
+        parser.add_argument('--intervalo', type = float, default = 30.0,
+                            help = "Segundos de espera quando não há reservas expiradas.")
+        parser.add_argument('--uma-vez', action = 'store_true',
+                            help = "Trata as reservas expiradas e encerra, em vez de rodar continuamente.")
+
+    def handle(self, *args, **options):
+        while True:
+            resultado = varrer_expiradas(lote = options['lote'])
+            if resultado.linhas:
+                self.stdout.write(f"{resultado.linhas} reserva(s) expirada(s) ({resultado.consultas} comandos SQL).")
+            envios = expirar_envios(lote = options['lote'])
+            if envios:
+                self.stdout.write(f"{envios} envio(s) de imagem abandonado(s) apagado(s).")
+            if resultado.linhas or envios:
+                continue
+            if options['uma_vez']:
+                break
+            time.sleep(options['intervalo'])
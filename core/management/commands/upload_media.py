@@ -1,162 +1,291 @@
+import base64
+# Biblioteca padrão usada para converter os hashes MD5/CRC32C para base64, o mesmo formato em que o GCS os informa.
+
+import hashlib
+# Biblioteca padrão para calcular o hash MD5 de cada arquivo local.
+
+import json
+# Biblioteca padrão para ler e gravar o manifesto local (cache dos hashes já calculados).
+
 import os
 # Biblioteca padrão do Python para interagir com o sistema operacional.
 # Fornece funcionalidades para manipular caminhos de arquivos, navegar por diretórios,
 # ler variáveis de ambiente, executar comandos do SO, entre outras operações.
 
-from django.core.management.base import BaseCommand
+import random
+import shutil
+import time
+import traceback
+# Bibliotecas padrão usadas nas retentativas com espera exponencial (random, time), no destino local (shutil)
+# e para imprimir o rastreamento de exceções (traceback).
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+# Pool de threads usado para enviar vários arquivos em paralelo. Como o envio é limitado pela rede (e não pela CPU),
+# threads são suficientes: enquanto uma espera a resposta do GCS, as outras continuam enviando.
+
+from django.core.management.base import BaseCommand, CommandError
 # Importa a classe BaseCommand do módulo django.core.management.base.
 # BaseCommand é a classe base para criar comandos customizados no Django.
-# Esses comandos podem ser executados via manage.py e são úteis para tarefas administrativas,
-# como sincronizar arquivos, limpar dados, gerar relatórios etc.
-
-from google.cloud import storage
-# Importa o módulo 'storage' da SDK oficial do Google Cloud.
-# Essa biblioteca fornece classes e métodos para interagir com o Google Cloud Storage (GCS),
-# que é o serviço de armazenamento de arquivos na nuvem do Google.
-# Permite criar clientes, acessar buckets (containers de arquivos), criar blobs (arquivos),
-# fazer upload, download, listagem e exclusão de arquivos no bucket.
-
-from google.oauth2 import service_account
-# Importa a classe service_account do pacote google.oauth2.
-# Essa classe permite carregar credenciais (chaves) de uma conta de serviço do Google,
-# normalmente armazenadas em arquivos JSON, para autenticar e autorizar acessos às APIs Google,
-# como a do Cloud Storage. Essencial para operações seguras via SDK.
+# CommandError encerra o comando com código de saída diferente de zero (usado quando algum envio falha, interrompendo o build.sh).
+
+CHUNK = 1024 * 1024
+# Tamanho dos blocos (1 MiB) lidos de cada arquivo ao calcular os hashes, para não carregar arquivos grandes inteiros na memória.
+
+
+def _hashes(caminho):
+    """Calcula o MD5 e o CRC32C de um arquivo, ambos em base64 (formato usado pelos metadados do GCS)."""
+    md5 = hashlib.md5()
+    try:
+        import google_crc32c
+        crc = google_crc32c.Checksum()
+    except ImportError:
+        crc = None
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(CHUNK), b''):
+            md5.update(bloco)
+            if crc is not None:
+                crc.update(bloco)
+    return (
+        base64.b64encode(md5.digest()).decode(),
+        base64.b64encode(crc.digest()).decode() if crc is not None else None,
+    )
+
+
+def manifesto_local(local_media_path, cache = None):
+    """
+    Gera o manifesto da pasta local: {caminho relativo: {'size', 'mtime', 'md5', 'crc32c'}}.
 
-import traceback
-# Biblioteca padrão para imprimir o rastreamento de exceções (útil para debug detalhado).
+    Parâmetros:
+    - local_media_path (str): Pasta local a ser sincronizada.
+    - cache (dict | None): Manifesto gerado em uma execução anterior. Arquivos cujo tamanho e data de modificação
+      não mudaram reaproveitam os hashes do cache, evitando reler o conteúdo do disco.
 
-def upload_media_to_gcs(local_media_path, bucket_name, credentials, prefix='media'):
+    Arquivos vazios são ignorados, como na versão anterior do comando.
     """
-    Função que sincroniza recursivamente os arquivos da pasta local_media_path (local)
-    para o bucket do Google Cloud Storage (GCS) especificado, dentro da pasta prefix (padrão: 'media').
+    cache = cache or {}
+    manifesto = {}
+    for root, dirs, files in os.walk(local_media_path):
+        for filename in files:
+            local_path = os.path.join(root, filename)
+            estado = os.stat(local_path)
+            if estado.st_size == 0:
+                continue
+            relativo = os.path.relpath(local_path, local_media_path).replace(os.sep, '/')
+            anterior = cache.get(relativo)
+            if anterior and anterior['size'] == estado.st_size and anterior['mtime'] == estado.st_mtime:
+                manifesto[relativo] = anterior
+                continue
+            md5, crc32c = _hashes(local_path)
+            manifesto[relativo] = {'size': estado.st_size, 'mtime': estado.st_mtime, 'md5': md5, 'crc32c': crc32c}
+    return manifesto
 
-    Parâmetros:
-    - local_media_path (str): Caminho absoluto ou relativo para a pasta local que contém os arquivos a enviar.
-    - bucket_name (str): Nome do bucket GCS onde os arquivos serão armazenados.
-    - credentials (google.oauth2.service_account.Credentials): Objeto contendo as credenciais para autenticação no GCS.
-    - prefix (str): Prefixo/pasta dentro do bucket para organizar os arquivos. Por padrão 'media'.
 
-    Essa função faz upload dos arquivos mantendo a estrutura de pastas relativa dentro do prefixo.
+class DestinoGCS:
     """
+    Destino da sincronização no Google Cloud Storage.
 
-    client = storage.Client(credentials = credentials)
-    # Cria um cliente autenticado para se comunicar com o Google Cloud Storage.
-    # O objeto 'client' é uma instância da classe google.cloud.storage.Client,
-    # que representa o ponto de entrada para interagir com o serviço GCS.
-
-    bucket = client.bucket(bucket_name)
-    # Obtém uma referência ao bucket no GCS pelo nome fornecido.
-    # 'bucket' é uma instância da classe google.cloud.storage.bucket.Bucket,
-    # que representa um container lógico de objetos (arquivos) dentro do GCS.
-
-    success_count = 0
-    error_count = 0
-    total_count = 0
-    # Contadores de sucesso/erro para relatório final
-
-    for root, dirs, files in os.walk (local_media_path):
-    # Percorre a árvore de diretórios da pasta local_media_path usando os.walk do módulo os.
-    # os.walk gera uma tupla (root, dirs, files) para cada diretório:
-    # - root: caminho atual sendo percorrido,
-    # - dirs: lista de subdiretórios dentro de root,
-    # - files: lista de arquivos dentro de root.
-    # Aqui usamos para processar todos os arquivos de forma recursiva.
-
-        # print(f"[DEBUG] upload_media_to_gcs - diretório atual: {root}")
-        # DEBUG: indica em que diretório estamos iterando
-
-        if dirs:
-            # print(f"[DEBUG] upload_media_to_gcs - subpastas encontradas: {dirs}")
-            # DEBUG: lista subpastas no diretório atual
-            pass
-
-        if files:
-            # print(f"[DEBUG] upload_media_to_gcs - arquivos encontrados: {files}")
-            # DEBUG: lista arquivos no diretório atual
-            pass
+    Todos os destinos oferecem a mesma interface (listar, enviar, apagar), de modo que o comando pode ser testado
+    com DestinoLocal, sem acesso à rede.
+    """
 
-        for filename in files:
-            total_count += 1
+    def __init__(self, bucket_name, credentials, prefix = 'media'):
+        from google.cloud import storage
+        # Importado aqui para que o DestinoLocal funcione mesmo sem as credenciais/biblioteca do Google.
 
-            local_path = os.path.join(root, filename)
-            # Junta o caminho do diretório atual 'root' com o nome do arquivo,
-            # formando o caminho absoluto ou relativo completo para o arquivo local.
+        self.client = storage.Client(credentials = credentials)
+        self.bucket = self.client.bucket(bucket_name)
+        self.prefix = prefix
 
-            if os.path.getsize(local_path) == 0:
-                # print(f"Aviso: Ignorando arquivo vazio {local_path}")
-                continue
-                # Ignorar arquivos vazios (tamanho 0 bytes)
+    def _nome(self, relativo):
+        return f"{self.prefix}/{relativo}"
+
+    def listar(self):
+        """Retorna {caminho relativo: {'size', 'md5', 'crc32c'}} de todos os objetos sob o prefixo, em uma única listagem paginada."""
+        remotos = {}
+        for blob in self.client.list_blobs(self.bucket, prefix = f"{self.prefix}/"):
+            relativo = blob.name[len(self.prefix) + 1:]
+            remotos[relativo] = {'size': blob.size, 'md5': blob.md5_hash, 'crc32c': blob.crc32c}
+        return remotos
+
+    def enviar(self, local_path, relativo, content_type = None, **metadados):
+        # metadados: propriedades do objeto gravadas junto com o envio (cache_control, content_encoding...; veja upload_static).
+        blob = self.bucket.blob(self._nome(relativo))
+        for propriedade, valor in metadados.items():
+            setattr(blob, propriedade, valor)
+        blob.upload_from_filename(local_path, content_type = content_type)
+
+    def apagar(self, relativo):
+        self.bucket.blob(self._nome(relativo)).delete()
+
+
+class DestinoLocal:
+    """Destino da sincronização em uma pasta local, com a mesma interface de DestinoGCS (útil para testes)."""
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
 
-            relative_path = os.path.relpath(local_path, local_media_path)
-            # Calcula o caminho relativo do arquivo em relação ao diretório base local_media_path.
-            # Isso é importante para preservar a estrutura de pastas ao enviar para o bucket.
-            # Exemplo: se local_path = "media/uploads/img.jpg" e local_media_path = "media",
-            # relative_path será "uploads/img.jpg".
+    def listar(self):
+        remotos = {}
+        if os.path.exists(self.diretorio):
+            for relativo, dados in manifesto_local(self.diretorio).items():
+                remotos[relativo] = {'size': dados['size'], 'md5': dados['md5'], 'crc32c': dados['crc32c']}
+        return remotos
 
-            gcs_path = f"{prefix}/{relative_path.replace(os.sep, '/')}"
-            # Gera o caminho final dentro do bucket, concatenando o prefixo com o caminho relativo do arquivo.
-            # Substitui '\' por '/' para garantir compatibilidade com a forma Unix de caminhos no GCS,
-            # pois GCS usa caminhos estilo URL (com '/').
+    def enviar(self, local_path, relativo, **metadados):
+        # Os metadados (tipo, cabeçalhos) só existem no GCS e são ignorados aqui.
+        destino = os.path.join(self.diretorio, *relativo.split('/'))
+        os.makedirs(os.path.dirname(destino), exist_ok = True)
+        shutil.copyfile(local_path, destino)
 
-            # print(f"[DEBUG] upload_media_to_gcs - preparando upload: {local_path} -> gs://{bucket_name}/{gcs_path}")
-            # DEBUG: mostra o mapeamento local -> remoto antes do upload
+    def apagar(self, relativo):
+        os.remove(os.path.join(self.diretorio, *relativo.split('/')))
 
-            blob = bucket.blob(gcs_path)
-            # Cria um objeto Blob no bucket, que representa um arquivo armazenado em GCS.
-            # A classe google.cloud.storage.blob.Blob encapsula funcionalidades para upload,
-            # download e manipulação de arquivos no bucket.
 
+def alterados(local, remoto):
+    """
+    Compara o manifesto local com os metadados remotos.
+
+    Retorna a tupla (enviar, orfaos):
+    - enviar: caminhos que não existem no destino ou cujo conteúdo difere (tamanho, MD5 ou, na falta dele, CRC32C);
+    - orfaos: caminhos que existem apenas no destino.
+    """
+    enviar = []
+    for relativo, dados in sorted(local.items()):
+        destino = remoto.get(relativo)
+        if destino is None or destino['size'] != dados['size']:
+            enviar.append(relativo)
+        elif destino.get('md5'):
+            if destino['md5'] != dados['md5']:
+                enviar.append(relativo)
+        elif destino.get('crc32c') != dados['crc32c'] or dados['crc32c'] is None:
+            # Objetos compostos do GCS não têm MD5; sem nenhum hash comparável, reenviamos por segurança.
+            enviar.append(relativo)
+    orfaos = sorted(set(remoto) - set(local))
+    return enviar, orfaos
+
+
+def _com_retentativas(funcao, *args, tentativas = 3, espera = 0.5):
+    # Executa funcao(*args), repetindo em caso de erro com espera exponencial (0.5s, 1s, 2s...) mais um pequeno valor aleatório,
+    # para que várias threads que falharam juntas não tentem de novo exatamente ao mesmo tempo.
+    for tentativa in range(1, tentativas + 1):
+        try:
+            return funcao(*args)
+        except Exception:
+            if tentativa == tentativas:
+                raise
+            time.sleep(espera * 2 ** (tentativa - 1) + random.uniform(0, espera))
+
+
+def sincronizar(local_media_path, destino, threads = 8, tentativas = 3, dry_run = False, delete_orphans = False, cache = None):
+    """
+    Sincroniza a pasta local com o destino, enviando apenas arquivos novos ou alterados.
+
+    Parâmetros:
+    - local_media_path (str): Pasta local com os arquivos a enviar.
+    - destino (DestinoGCS | DestinoLocal): Onde os arquivos serão gravados.
+    - threads (int): Quantidade máxima de envios simultâneos.
+    - tentativas (int): Quantidade de tentativas por arquivo antes de considerá-lo uma falha.
+    - dry_run (bool): Se True, apenas calcula o que seria enviado/apagado, sem alterar o destino.
+    - delete_orphans (bool): Se True, apaga do destino os arquivos que não existem mais localmente.
+    - cache (dict | None): Manifesto de uma execução anterior (veja manifesto_local).
+
+    Retorna um dicionário com o manifesto local e as listas de arquivos enviados, apagados, inalterados e com falha.
+    """
+    local = manifesto_local(local_media_path, cache)
+    enviar, orfaos = alterados(local, destino.listar())
+    relatorio = {
+        'manifesto': local,
+        'enviados': [],
+        'apagados': [],
+        'falhas': [],
+        'inalterados': len(local) - len(enviar),
+    }
+    if not delete_orphans:
+        orfaos = []
+    if dry_run:
+        relatorio['enviados'] = enviar
+        relatorio['apagados'] = orfaos
+        return relatorio
+
+    with ThreadPoolExecutor(max_workers = threads) as pool:
+        futuros = {
+            pool.submit(_com_retentativas, destino.enviar, os.path.join(local_media_path, *relativo.split('/')), relativo,
+                        tentativas = tentativas): ('enviados', relativo)
+            for relativo in enviar
+        }
+        futuros.update({
+            pool.submit(_com_retentativas, destino.apagar, relativo, tentativas = tentativas): ('apagados', relativo)
+            for relativo in orfaos
+        })
+        for futuro in as_completed(futuros):
+            lista, relativo = futuros[futuro]
             try:
-                blob.upload_from_filename(local_path)
-                # Faz upload do arquivo local para o blob no bucket usando o caminho do arquivo local.
-                # O metodo upload_from_filename lê o arquivo local e envia seu conteúdo para o GCS.
-
-                # print(f"Uploaded {local_path} to gs://{bucket_name}/{gcs_path}")
-                # Imprime no terminal uma mensagem indicando que o upload foi concluído para aquele arquivo.
-                # Útil para monitorar o progresso do script durante a execução.
-                success_count += 1
-
-            except Exception as e:
-                # print(f"Erro ao fazer upload do arquivo {local_path}: {e}")
-                # Caso ocorra algum erro durante o upload, imprime o erro no terminal
-                # DEBUG: imprime traceback completo para diagnóstico
+                futuro.result()
+                relatorio[lista].append(relativo)
+            except Exception:
                 traceback.print_exc()
-                error_count += 1
+                relatorio['falhas'].append(relativo)
+    return relatorio
+
+
+def upload_media_to_gcs(local_media_path, bucket_name, credentials, prefix = 'media', **kwargs):
+    """
+    Função que sincroniza recursivamente os arquivos da pasta local_media_path (local)
+    para o bucket do Google Cloud Storage (GCS) especificado, dentro da pasta prefix (padrão: 'media').
+
+    Parâmetros:
+    - local_media_path (str): Caminho absoluto ou relativo para a pasta local que contém os arquivos a enviar.
+    - bucket_name (str): Nome do bucket GCS onde os arquivos serão armazenados.
+    - credentials (google.oauth2.service_account.Credentials): Objeto contendo as credenciais para autenticação no GCS.
+    - prefix (str): Prefixo/pasta dentro do bucket para organizar os arquivos. Por padrão 'media'.
+    - kwargs: Opções repassadas para sincronizar (threads, tentativas, dry_run, delete_orphans, cache).
+
+    Essa função faz upload dos arquivos mantendo a estrutura de pastas relativa dentro do prefixo,
+    enviando apenas os arquivos novos ou alterados desde a última sincronização.
+    """
+    return sincronizar(local_media_path, DestinoGCS(bucket_name, credentials, prefix), **kwargs)
 
-    # print(f"Upload finalizado: total verificados: {total_count}, enviados com sucesso: {success_count}, falhas: {error_count}")
-    # Relatório final resumido
 
 class Command(BaseCommand):
     """
     Classe que define o comando customizado Django para sincronizar arquivos locais da pasta 'media'
     com o bucket do Google Cloud Storage.
 
-    - Essa classe herda de BaseCommand e deve estar localizada dentro de uma pasta
-      'management/commands' de algum app Django para ser reconhecida.
-
     - Pode ser executada via linha de comando Django com:
-      python manage.py sync_media
+      python manage.py upload_media
+      python manage.py upload_media --dry-run            # mostra o que seria enviado, sem enviar
+      python manage.py upload_media --delete-orphans     # apaga do bucket arquivos que não existem mais localmente
+      python manage.py upload_media --destino-local DIR  # sincroniza com uma pasta local em vez do GCS (testes)
     """
 
-    help = "Sincroniza a pasta media local com o bucket Google Cloud Storage."
+    help = "Sincroniza a pasta media local com o bucket Google Cloud Storage, enviando apenas arquivos novos ou alterados."
     # Atributo de classe 'help' que fornece uma descrição curta do que o comando faz,
-    # exibida quando o usuário roda `python manage.py help sync_media`.
-
-    def handle(self, *args, **kwargs):
+    # exibida quando o usuário roda `python manage.py help upload_media`.
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action = 'store_true',
+                            help = "Apenas lista os arquivos que seriam enviados/apagados.")
+        parser.add_argument('--delete-orphans', action = 'store_true',
+                            help = "Apaga do destino os arquivos que não existem mais na pasta local.")
+        parser.add_argument('--threads', type = int, default = 8,
+                            help = "Quantidade máxima de envios simultâneos.")
+        parser.add_argument('--tentativas', type = int, default = 3,
+                            help = "Tentativas por arquivo, com espera exponencial entre elas.")
+        parser.add_argument('--destino-local', default = None,
+                            help = "Pasta local usada como destino no lugar do bucket GCS.")
+        parser.add_argument('--manifesto', default = os.path.join(os.getcwd(), '.upload_media_manifest.json'),
+                            help = "Arquivo onde os hashes calculados são guardados para a próxima execução.")
+
+    def handle(self, *args, **options):
         """
         Metodo principal executado quando o comando customizado é chamado via manage.py.
 
         Passos:
-        1. Obtém o caminho da pasta local 'media' onde estão os arquivos a enviar.
-        2. Define o nome do bucket do Google Cloud Storage (GCS) onde os arquivos serão enviados.
-        3. Define o caminho do arquivo de credenciais local 'credenciais.json'.
-        4. Verifica se a pasta 'media' existe e se tem arquivos para enviar.
-        5. Verifica se o arquivo de credenciais existe; caso contrário, interrompe com erro.
-        6. Carrega as credenciais a partir do arquivo local usando a classe
-           `service_account.Credentials.from_service_account_file`.
-        7. Chama a função `upload_media_to_gcs` para sincronizar os arquivos da pasta local
-           com o bucket do GCS usando as credenciais autenticadas.
-        8. Imprime uma mensagem de sucesso no terminal.
+        1. Obtém o caminho da pasta local 'media' e verifica se ela existe e tem arquivos.
+        2. Monta o destino: uma pasta local (--destino-local) ou o bucket GCS autenticado com 'credenciais.json'.
+        3. Compara o manifesto local (tamanho, data de modificação e hashes) com os metadados do destino.
+        4. Envia em paralelo apenas os arquivos novos ou alterados e, com --delete-orphans, apaga os órfãos.
+        5. Grava o manifesto para a próxima execução e imprime o relatório.
         """
 
         local_media_path = os.path.join(os.getcwd(), "media")
@@ -170,33 +299,51 @@ class Command(BaseCommand):
             return  # Interrompe execução se pasta estiver vazia
         # Verificação extra: se a pasta 'media' não existe ou está vazia, avisa e encerra
 
-        total_files = 0
-        for _, _, files in os.walk(local_media_path):
-            total_files += len(files)
-        # print(f"[DEBUG] handle - total de arquivos encontrados em '{local_media_path}': {total_files}")
-        # DEBUG: conta total de arquivos na pasta media (recursivamente)
-
-        bucket_name = "django-render"
-        # Passo 2: Nome do bucket no Google Cloud Storage (ajuste conforme seu bucket)
-
-        cred_file_path = os.path.join(os.getcwd(), "credenciais.json")
-        # Passo 3: Define o caminho local para o arquivo de credenciais JSON
-
-        # print(f"[DEBUG] handle - cred_file_path = {cred_file_path}, existe? {os.path.exists(cred_file_path)}")
-        # DEBUG: informa se o arquivo de credenciais existe
-
-        if not os.path.exists(cred_file_path):
-            raise Exception(f"Arquivo de credenciais '{cred_file_path}' não encontrado. Impossível autenticar no Google Cloud Storage.")
-        # Passo 5: Verifica se o arquivo de credenciais existe
-
-        credentials = service_account.Credentials.from_service_account_file(cred_file_path)
-        # DEBUG: confirma tipo de objeto de credenciais carregado (sem imprimir conteúdo sensível)
-        # print(f"[DEBUG] handle - credenciais carregadas: {type(credentials)}")
-        # Passo 6: Carrega as credenciais do arquivo JSON local
-
-        # print("[DEBUG] handle - iniciando upload_media_to_gcs()")
-        upload_media_to_gcs(local_media_path, bucket_name, credentials)
-        # Passo 7: Chama a função que faz o upload dos arquivos locais para o bucket GCS
-
-        self.stdout.write(self.style.SUCCESS("Sincronização concluída com sucesso!"))
-        # Passo 8: Imprime mensagem de sucesso na saída padrão do Django
+        if options['destino_local']:
+            destino = DestinoLocal(options['destino_local'])
+        else:
+            from google.oauth2 import service_account
+            # Importa a classe service_account do pacote google.oauth2, usada para carregar as credenciais
+            # da conta de serviço do Google a partir do arquivo JSON.
+
+            bucket_name = "django-render"
+            # Nome do bucket no Google Cloud Storage (ajuste conforme seu bucket)
+
+            cred_file_path = os.path.join(os.getcwd(), "credenciais.json")
+            if not os.path.exists(cred_file_path):
+                raise Exception(f"Arquivo de credenciais '{cred_file_path}' não encontrado. Impossível autenticar no Google Cloud Storage.")
+            credentials = service_account.Credentials.from_service_account_file(cred_file_path)
+            destino = DestinoGCS(bucket_name, credentials)
+        # Passo 2: Monta o destino da sincronização
+
+        cache = None
+        if os.path.exists(options['manifesto']):
+            with open(options['manifesto']) as arquivo:
+                cache = json.load(arquivo)
+
+        relatorio = sincronizar(
+            local_media_path,
+            destino,
+            threads = options['threads'],
+            tentativas = options['tentativas'],
+            dry_run = options['dry_run'],
+            delete_orphans = options['delete_orphans'],
+            cache = cache,
+        )
+        # Passos 3 e 4: Compara, envia e apaga
+
+        if not options['dry_run']:
+            with open(options['manifesto'], 'w') as arquivo:
+                json.dump(relatorio['manifesto'], arquivo)
+        # Passo 5: Guarda os hashes para que a próxima execução não precise reler arquivos inalterados
+
+        prefixo = "[dry-run] " if options['dry_run'] else ""
+        for relativo in relatorio['enviados']:
+            self.stdout.write(f"{prefixo}enviar: {relativo}")
+        for relativo in relatorio['apagados']:
+            self.stdout.write(f"{prefixo}apagar: {relativo}")
+        resumo = (f"{prefixo}{len(relatorio['enviados'])} enviados, {len(relatorio['apagados'])} apagados, "
+                  f"{relatorio['inalterados']} inalterados, {len(relatorio['falhas'])} falhas.")
+        if relatorio['falhas']:
+            raise CommandError(resumo)
+        self.stdout.write(self.style.SUCCESS(resumo))
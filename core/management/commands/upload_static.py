@@ -0,0 +1,111 @@
+import json
+import mimetypes
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from core.management.commands.upload_media import DestinoGCS, DestinoLocal, _com_retentativas
+
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Cabeçalho gravado em cada arquivo enviado: como o nome contém o hash do conteúdo, o arquivo nunca muda e navegadores e
+# CDNs podem guardá-lo por um ano sem revalidar (nas visitas seguintes, nenhum byte dos arquivos estáticos é baixado).
+
+
+def arquivos_com_hash():
+    """
+    Retorna os nomes (por exemplo, "css/styles.3f2a9c1b7e04.css") dos arquivos com hash listados no manifesto
+    gravado pelo collectstatic (staticfiles.json, em STATIC_ROOT).
+    """
+    caminho = staticfiles_storage.path(staticfiles_storage.manifest_name)
+    if not os.path.exists(caminho):
+        raise CommandError(f"Manifesto '{caminho}' não encontrado. Execute `python manage.py collectstatic` antes.")
+    with open(caminho, encoding = 'utf-8') as arquivo:
+        return sorted(set(json.load(arquivo)['paths'].values()))
+
+
+def _versao_para_envio(nome):
+    # Retorna (caminho local, metadados) do arquivo a enviar.
+    # Se o collectstatic gravou uma versão .gz (apenas dos arquivos de texto, e quando ela é menor), é ela que vai para o bucket,
+    # com Content-Encoding: gzip: o GCS a entrega comprimida aos navegadores que aceitam gzip e a descomprime para os demais
+    # ("decompressive transcoding"). O GCS não faz o mesmo com Brotli, por isso as versões .br só são usadas pelo WhiteNoise.
+    caminho = staticfiles_storage.path(nome)
+    metadados = {
+        'content_type': mimetypes.guess_type(nome)[0] or 'application/octet-stream',
+        'cache_control': CACHE_CONTROL,
+    }
+    if os.path.exists(caminho + '.gz'):
+        return caminho + '.gz', dict(metadados, content_encoding = 'gzip')
+    return caminho, metadados
+
+
+class Command(BaseCommand):
+    """
+    Comando que envia ao bucket do Google Cloud Storage (pasta "static") os arquivos estáticos gerados pelo collectstatic.
+
+    Somente os arquivos com hash no nome são enviados, com Cache-Control: immutable, e apenas os que ainda não estão no
+    bucket: como o nome muda sempre que o conteúdo muda, um nome já presente no bucket tem exatamente o mesmo conteúdo,
+    e a comparação dispensa os hashes usados pelo upload_media. Os arquivos de versões anteriores continuam no bucket,
+    para as páginas em cache que ainda apontam para eles.
+
+    Uso:
+      python manage.py collectstatic --noinput && python manage.py upload_static
+      python manage.py upload_static --dry-run            # mostra o que seria enviado, sem enviar
+      python manage.py upload_static --destino-local DIR  # envia para uma pasta local em vez do GCS (testes)
+    """
+
+    help = "Envia ao bucket GCS os arquivos estáticos com hash (e comprimidos) gerados pelo collectstatic que ainda não estão lá."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action = 'store_true',
+                            help = "Apenas lista os arquivos que seriam enviados.")
+        parser.add_argument('--threads', type = int, default = 8,
+                            help = "Quantidade máxima de envios simultâneos.")
+        parser.add_argument('--tentativas', type = int, default = 3,
+                            help = "Tentativas por arquivo, com espera exponencial entre elas.")
+        parser.add_argument('--destino-local', default = None,
+                            help = "Pasta local usada como destino no lugar do bucket GCS.")
+
+    def handle(self, *args, **options):
+        nomes = arquivos_com_hash()
+        if options['destino_local']:
+            destino = DestinoLocal(options['destino_local'])
+        else:
+            if settings.GS_CREDENTIALS is None:
+                raise CommandError("GS_CREDENTIALS não configurado: o envio ao GCS só é possível com DEBUG = False.")
+            destino = DestinoGCS(settings.GS_BUCKET_NAME, settings.GS_CREDENTIALS, prefix = 'static')
+
+        remotos = destino.listar()
+        enviar = [nome for nome in nomes if nome not in remotos]
+        prefixo = "[dry-run] " if options['dry_run'] else ""
+        if options['dry_run']:
+            for nome in enviar:
+                self.stdout.write(f"{prefixo}enviar: {nome}")
+            self.stdout.write(self.style.SUCCESS(f"{prefixo}{len(enviar)} a enviar, {len(nomes) - len(enviar)} inalterados."))
+            return
+
+        enviados, falhas = [], []
+        with ThreadPoolExecutor(max_workers = options['threads']) as pool:
+            futuros = {}
+            for nome in enviar:
+                caminho, metadados = _versao_para_envio(nome)
+                futuros[pool.submit(_com_retentativas, partial(destino.enviar, **metadados), caminho, nome,
+                                    tentativas = options['tentativas'])] = nome
+            for futuro in as_completed(futuros):
+                try:
+                    futuro.result()
+                    enviados.append(futuros[futuro])
+                except Exception:
+                    traceback.print_exc()
+                    falhas.append(futuros[futuro])
+
+        for nome in sorted(enviados):
+            self.stdout.write(f"enviado: {nome}")
+        resumo = f"{len(enviados)} enviados, {len(nomes) - len(enviar)} inalterados, {len(falhas)} falhas."
+        if falhas:
+            raise CommandError(resumo)
+        self.stdout.write(self.style.SUCCESS(resumo))
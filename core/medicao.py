@@ -0,0 +1,285 @@
+# Este módulo implementa as medições de desempenho do processamento das imagens de Produto
+# (comando `python manage.py benchmark_pictures`), para que as otimizações do caminho das imagens partam de números.
+# A partir dos originais de media/produtos (ou de outro diretório), mede:
+# 1) cada etapa separadamente, em série: decodificação (megapixels/s), redimensionamento e codificação por formato
+#    (versões/s e bytes gerados), além do tempo de geração da matriz completa de versões de cada original;
+# 2) a geração das matrizes de todos os originais em cada modo de execução (serial, pool de threads e pool de processos)
+#    e em cada caminho de redimensionamento: o padrão do django-pictures, draft() (o decodificador JPEG já entrega a
+#    imagem reduzida por 1/2, 1/4 ou 1/8) e reduce() (redução inteira por média antes do redimensionamento).
+# Cada cenário roda em um processo filho próprio (fork), para que o pico de memória (RSS) de um não contamine o do próximo.
+# As versões são as mesmas que o campo gera (versoes_previstas) e a codificação é a de produção (codificar), mas nada é
+# gravado no armazenamento. O resultado é um dicionário serializável em JSON, que pode ser guardado e comparado entre versões.
+
+import io
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import PIL
+from django import db
+from PIL import Image, UnidentifiedImageError
+
+from .versoes import codificar, formato_suportado, versoes_previstas
+
+try:
+    import resource
+except ImportError: # Windows: o pico de memória não é medido.
+    resource = None
+
+MODOS = ('serial', 'threads', 'processos')
+# Modos de execução comparados na geração das matrizes.
+
+CAMINHOS = ('padrao', 'draft', 'reduce')
+# Caminhos de redimensionamento comparados (veja gerar_matriz).
+
+FOLGA = 2
+# Os atalhos draft() e reduce() nunca reduzem a imagem abaixo do dobro do tamanho final: a mesma folga (reducing_gap)
+# que o Image.thumbnail usa, para que o redimensionamento final ainda tenha pixels suficientes para suavizar.
+
+
+def _rss_pico_kib(quem):
+    # Pico de memória residente (ru_maxrss) do processo atual ou dos seus filhos, em KiB (no macOS o valor vem em bytes).
+    if resource is None:
+        return None
+    pico = resource.getrusage(quem).ru_maxrss
+    return pico // 1024 if sys.platform == 'darwin' else pico
+
+
+def carregar_originais(armazenamento, diretorio, limite = None):
+    """
+    Lê os originais de `diretorio` e retorna uma lista de dicionários com nome, bytes, dimensões e a matriz de versões.
+
+    Parâmetros:
+    - armazenamento (Storage): Armazenamento das imagens (o de Produto.imagem).
+    - diretorio (str): Diretório dos originais (o upload_to de Produto.imagem).
+    - limite (int | None): Quantidade máxima de originais.
+
+    Os arquivos que o Pillow não reconhece são ignorados. Os bytes são lidos uma única vez, aqui: as medições não incluem
+    a leitura do armazenamento.
+    """
+    originais = []
+    for arquivo in sorted(armazenamento.listdir(diretorio)[1]):
+        nome = f'{diretorio}/{arquivo}'
+        with armazenamento.open(nome) as f:
+            dados = f.read()
+        try:
+            with Image.open(io.BytesIO(dados)) as imagem:
+                largura, altura, formato = imagem.width, imagem.height, imagem.format
+        except (UnidentifiedImageError, OSError):
+            continue
+        originais.append({'nome': nome, 'dados': dados, 'largura': largura, 'altura': altura, 'formato': formato,
+                          'versoes': versoes_previstas(nome, largura, altura)})
+        if limite and len(originais) >= limite:
+            break
+    return originais
+
+
+def _lado(versao, imagem):
+    # Maior lado da versão pronta. Usar o maior lado nas duas direções mantém draft() e reduce() seguros mesmo quando a
+    # orientação EXIF gira a imagem depois.
+    altura = versao.height or versao.width * imagem.height / imagem.width
+    return max(versao.width, int(altura))
+
+
+def gerar_matriz(dados, versoes, caminho = 'padrao'):
+    """
+    Gera e codifica, em memória, todas as versões de um original e retorna (quantidade de versões, bytes gerados).
+
+    Parâmetros:
+    - dados (bytes): Conteúdo do arquivo original.
+    - versoes (list): Versões a gerar (objetos Picture de versoes_previstas).
+    - caminho (str): 'padrao' (decodifica o original uma vez e redimensiona cada versão a partir dele, como o
+      django-pictures), 'draft' (decodifica o original de novo para cada versão, já reduzido pelo decodificador JPEG;
+      nos demais formatos draft() não tem efeito) ou 'reduce' (decodifica uma vez e reduz por um fator inteiro antes do
+      redimensionamento de cada versão).
+    """
+    total = 0
+    with Image.open(io.BytesIO(dados)) as original:
+        if caminho != 'draft':
+            original.load() # No caminho 'draft' cada versão decodifica o original já reduzido; este fica sem decodificar.
+        for versao in versoes:
+            if caminho == 'draft':
+                with Image.open(io.BytesIO(dados)) as imagem:
+                    lado = FOLGA * _lado(versao, imagem)
+                    imagem.draft(imagem.mode, (lado, lado))
+                    imagem.load()
+                    pronta = versao.process(imagem)
+            elif caminho == 'reduce':
+                fator = min(original.size) // (FOLGA * _lado(versao, original))
+                pronta = versao.process(original.reduce(fator) if fator > 1 else original)
+            else:
+                pronta = versao.process(original)
+            total += len(codificar(pronta, versao.file_type, versao.width))
+    return len(versoes), total
+
+
+def _gerar_matriz(tarefa):
+    # Ponto de entrada dos pools: uma tarefa por original.
+    return gerar_matriz(*tarefa)
+
+
+def medir_etapas(originais):
+    """
+    Mede, em série, o tempo de cada etapa e o tempo da matriz completa de cada original.
+
+    Retorna um dicionário com 'decodificacao', 'redimensionamento', 'codificacao' (por formato) e 'matrizes'
+    (segundos por original).
+    """
+    decodificacao = {'imagens': 0, 'megapixels': 0.0, 'segundos': 0.0}
+    redimensionamento = {'versoes': 0, 'segundos': 0.0}
+    codificacao = {}
+    matrizes = {}
+    for original in originais:
+        inicio = time.perf_counter()
+        with Image.open(io.BytesIO(original['dados'])) as imagem:
+            imagem.load()
+            decodificado = time.perf_counter()
+            decodificacao['imagens'] += 1
+            decodificacao['megapixels'] += imagem.width * imagem.height / 1e6
+            decodificacao['segundos'] += decodificado - inicio
+            for versao in original['versoes']:
+                antes = time.perf_counter()
+                pronta = versao.process(imagem)
+                meio = time.perf_counter()
+                dados = codificar(pronta, versao.file_type, versao.width)
+                depois = time.perf_counter()
+                redimensionamento['versoes'] += 1
+                redimensionamento['segundos'] += meio - antes
+                formato = codificacao.setdefault(versao.file_type, {'versoes': 0, 'segundos': 0.0, 'bytes': 0})
+                formato['versoes'] += 1
+                formato['segundos'] += depois - meio
+                formato['bytes'] += len(dados)
+        matrizes[original['nome']] = time.perf_counter() - inicio
+    return {'decodificacao': decodificacao, 'redimensionamento': redimensionamento, 'codificacao': codificacao,
+            'matrizes': matrizes}
+
+
+def medir_cenario(originais, modo, caminho, trabalhadores):
+    """
+    Gera as matrizes de versões de todos os originais em um modo de execução e retorna o tempo e o volume gerado.
+
+    Parâmetros:
+    - originais (list): Originais de carregar_originais.
+    - modo (str): 'serial', 'threads' ou 'processos'.
+    - caminho (str): Caminho de redimensionamento (veja gerar_matriz).
+    - trabalhadores (int): Tamanho do pool nos modos 'threads' e 'processos'.
+    """
+    tarefas = [(original['dados'], original['versoes'], caminho) for original in originais]
+    inicio = time.perf_counter()
+    if modo == 'serial':
+        resultados = list(map(_gerar_matriz, tarefas))
+    else:
+        executor = ThreadPoolExecutor if modo == 'threads' else ProcessPoolExecutor
+        with executor(max_workers = trabalhadores) as pool:
+            resultados = list(pool.map(_gerar_matriz, tarefas))
+    segundos = time.perf_counter() - inicio
+    return {'segundos': segundos, 'versoes': sum(r[0] for r in resultados), 'bytes': sum(r[1] for r in resultados)}
+
+
+def _filho(conexao, funcao, argumentos):
+    # Executa a medição no processo filho e devolve o resultado, com o pico de memória do filho e dos seus processos.
+    try:
+        inicial = _rss_pico_kib(resource.RUSAGE_SELF) if resource else None
+        resultado = funcao(*argumentos)
+        resultado['rss_inicial_kib'] = inicial
+        resultado['rss_pico_kib'] = _rss_pico_kib(resource.RUSAGE_SELF) if resource else None
+        resultado['rss_pico_processos_kib'] = _rss_pico_kib(resource.RUSAGE_CHILDREN) if resource else None
+        conexao.send(resultado)
+    except BaseException as e:
+        conexao.send(e)
+        raise
+    finally:
+        conexao.close()
+
+
+def _isolado(funcao, *argumentos):
+    # Executa funcao(*argumentos) em um processo filho criado por fork, que herda os originais já carregados na memória.
+    db.connections.close_all() # Uma conexão herdada por fork não pode ser compartilhada entre processos.
+    contexto = multiprocessing.get_context('fork')
+    recebe, envia = contexto.Pipe(duplex = False)
+    processo = contexto.Process(target = _filho, args = (envia, funcao, argumentos))
+    processo.start()
+    envia.close()
+    resultado = recebe.recv()
+    processo.join()
+    if isinstance(resultado, BaseException):
+        raise resultado
+    return resultado
+
+
+def _por_segundo(quantidade, segundos):
+    return round(quantidade / segundos, 2) if segundos else None
+
+
+def medir(originais, modos = MODOS, caminhos = CAMINHOS, trabalhadores = None, repeticoes = 3, ao_medir = None):
+    """
+    Executa todas as medições e retorna o relatório (dicionário serializável em JSON).
+
+    Parâmetros:
+    - originais (list): Originais de carregar_originais (as versões podem ter sido filtradas por formato).
+    - modos (iterável de str): Modos de execução comparados.
+    - caminhos (iterável de str): Caminhos de redimensionamento comparados.
+    - trabalhadores (int | None): Tamanho dos pools (padrão: número de CPUs).
+    - repeticoes (int): Quantas vezes cada medição é repetida; os tempos informados são as medianas e a memória, o maior pico.
+    - ao_medir (callable | None): Chamada com o nome de cada medição concluída (para exibir o progresso).
+    """
+    trabalhadores = trabalhadores or os.cpu_count()
+
+    rodadas = [_isolado(medir_etapas, originais) for _ in range(repeticoes)]
+    decodificacao = dict(rodadas[0]['decodificacao'],
+                         segundos = statistics.median(r['decodificacao']['segundos'] for r in rodadas))
+    decodificacao['megapixels_por_segundo'] = _por_segundo(decodificacao['megapixels'], decodificacao['segundos'])
+    redimensionamento = dict(rodadas[0]['redimensionamento'],
+                             segundos = statistics.median(r['redimensionamento']['segundos'] for r in rodadas))
+    redimensionamento['versoes_por_segundo'] = _por_segundo(redimensionamento['versoes'], redimensionamento['segundos'])
+    codificacao = {}
+    for formato, valores in rodadas[0]['codificacao'].items():
+        segundos = statistics.median(r['codificacao'][formato]['segundos'] for r in rodadas)
+        codificacao[formato] = dict(valores, segundos = segundos)
+        codificacao[formato]['versoes_por_segundo'] = _por_segundo(valores['versoes'], codificacao[formato]['segundos'])
+    if ao_medir:
+        ao_medir('etapas')
+
+    cenarios = []
+    for modo in modos:
+        for caminho in caminhos:
+            rodadas_cenario = [_isolado(medir_cenario, originais, modo, caminho, trabalhadores) for _ in range(repeticoes)]
+            segundos = statistics.median(r['segundos'] for r in rodadas_cenario)
+            cenarios.append({
+                'modo': modo,
+                'caminho': caminho,
+                'trabalhadores': 1 if modo == 'serial' else trabalhadores,
+                'segundos': round(segundos, 4),
+                'versoes': rodadas_cenario[0]['versoes'],
+                'bytes': rodadas_cenario[0]['bytes'],
+                'versoes_por_segundo': _por_segundo(rodadas_cenario[0]['versoes'], segundos),
+                'matrizes_por_segundo': _por_segundo(len(originais), segundos),
+                'rss_inicial_kib': rodadas_cenario[0]['rss_inicial_kib'],
+                'rss_pico_kib': max((r['rss_pico_kib'] or 0) for r in rodadas_cenario) or None,
+                'rss_pico_processos_kib': max((r['rss_pico_processos_kib'] or 0) for r in rodadas_cenario) or None,
+            })
+            if ao_medir:
+                ao_medir(f'{modo}/{caminho}')
+
+    matrizes = {nome: round(statistics.median(r['matrizes'][nome] for r in rodadas), 4) for nome in rodadas[0]['matrizes']}
+    return {
+        'ambiente': {
+            'python': platform.python_version(),
+            'pillow': PIL.__version__,
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+            'avif': formato_suportado('AVIF'),
+        },
+        'parametros': {'repeticoes': repeticoes, 'trabalhadores': trabalhadores, 'folga': FOLGA},
+        'originais': [
+            {'nome': o['nome'], 'formato': o['formato'], 'largura': o['largura'], 'altura': o['altura'],
+             'bytes': len(o['dados']), 'versoes': len(o['versoes']), 'segundos_matriz': matrizes[o['nome']]}
+            for o in originais
+        ],
+        'etapas': {'decodificacao': decodificacao, 'redimensionamento': redimensionamento, 'codificacao': codificacao},
+        'cenarios': cenarios,
+    }
@@ -0,0 +1,266 @@
+# Este módulo implementa o teste de carga das views principais (comando `python manage.py benchmark_views`), para que uma
+# regressão em core/views.py ou nos templates apareça como um número, e não como uma impressão de que "o site ficou lento".
+# O teste roda em um banco de dados próprio (o banco de testes do Django, criado e destruído pelo comando) com uma quantidade
+# configurável de produtos sintéticos, e dispara requisições contra:
+# - index (GET /), a vitrine paginada;
+# - contato (POST /contato/), com o backend de e-mail locmem: nenhuma mensagem sai da máquina;
+# - produto (GET /produto/), o formulário de cadastro, com um usuário autenticado;
+# - produto_detalhe (GET /produto/<slug>/), a página de cada produto.
+# As requisições passam pelo cliente de testes do Django (no mesmo processo, sem rede) ou, opcionalmente, por HTTP até um
+# gunicorn local, que mede também o servidor, o WSGI/ASGI e a rede local.
+# Para cada view são medidos a vazão (requisições/s) e as latências p50/p95/p99; no mesmo processo, também a quantidade
+# de consultas SQL e a memória alocada (pico do tracemalloc) por requisição, em uma rodada separada, para que a
+# instrumentação não distorça as latências. O resultado é um dicionário serializável em JSON, que pode ser guardado como
+# referência e comparado com as execuções seguintes (veja comparar).
+
+import http.client
+import math
+import os
+import platform
+import statistics
+import threading
+import time
+import tracemalloc
+from decimal import Decimal
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+import django
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+VIEWS = ('index', 'contato', 'produto', 'produto_detalhe')
+# Views medidas, na ordem do relatório.
+
+USUARIO = 'benchmark'
+SENHA = 'benchmark'
+# Superusuário criado no banco de testes para as views que exigem login.
+
+CONTATO = {'nome': 'Cliente', 'email': 'cliente@example.com', 'assunto': 'Teste de carga', 'mensagem': 'Mensagem.'}
+# Dados do formulário de contato (válidos: a mensagem é gravada na caixa de saída, como em uma requisição real).
+
+METRICAS = {
+    'requisicoes_por_segundo': -1,
+    'p50_ms': 1,
+    'p95_ms': 1,
+    'p99_ms': 1,
+    'consultas': 1,
+    'memoria_kib': 1,
+}
+# Métricas comparadas com a referência e o sentido em que pioram: 1 quando piora ao subir, -1 quando piora ao cair.
+
+
+def criar_dados(quantidade, imagens = ()):
+    """
+    Grava `quantidade` produtos sintéticos e o superusuário USUARIO no banco atual e retorna os slugs dos produtos.
+
+    Parâmetros:
+    - quantidade (int): Quantidade de produtos.
+    - imagens (iterável de tuplas (nome, largura, altura)): Originais já existentes no armazenamento, atribuídos aos produtos
+      em rodízio, para que os templates renderizem as tags de imagem como em produção. Sem imagens, os produtos ficam sem foto.
+
+    Os produtos são gravados com bulk_create, sem signals: não há contagem de referências nem geração de versões.
+    """
+    from django.contrib.auth import get_user_model
+
+    from .carga import atribuir_slugs
+    from .facetas import recalcular_contagens
+    from .models import Produto
+
+    imagens = list(imagens)
+    objetos = []
+    for numero in range(quantidade):
+        nome, largura, altura = imagens[numero % len(imagens)] if imagens else ('', None, None)
+        objetos.append(Produto(
+            nome = f'Produto sintético {numero + 1}', preco = Decimal(10 + numero % 990) + Decimal('0.90'),
+            estoque = numero % 50, imagem = nome, image_width = largura, image_height = altura))
+    atribuir_slugs(Produto, objetos)
+    Produto.objects.bulk_create(objetos, batch_size = 500)
+    recalcular_contagens() # Facetas da vitrine (core/facetas.py), que o bulk_create não atualiza.
+    get_user_model().objects.create_superuser(USUARIO, 'benchmark@example.com', SENHA)
+    return [objeto.slug for objeto in objetos]
+
+
+def roteiro(view, slugs, numero):
+    """Retorna (método, caminho, dados) da `numero`-ésima requisição a `view` (o detalhe percorre os produtos em rodízio)."""
+    if view == 'index':
+        return 'GET', '/', None
+    if view == 'contato':
+        return 'POST', '/contato/', CONTATO
+    if view == 'produto':
+        return 'GET', '/produto/', None
+    return 'GET', f'/produto/{slugs[numero % len(slugs)]}/', None
+
+
+class ClienteDjango:
+    """Cliente que envia as requisições pelo cliente de testes do Django, no mesmo processo (sem servidor e sem rede)."""
+
+    def __init__(self):
+        from django.contrib.auth import get_user_model
+
+        self.cliente = Client()
+        self.cliente.force_login(get_user_model().objects.get(username = USUARIO))
+
+    def requisitar(self, metodo, caminho, dados = None):
+        if metodo == 'POST':
+            return self.cliente.post(caminho, dados).status_code
+        return self.cliente.get(caminho).status_code
+
+
+class ClienteHttp:
+    """
+    Cliente HTTP para um servidor local (gunicorn), com uma conexão persistente e os cookies de sessão e de CSRF.
+
+    O login é feito pelo formulário do admin, como um usuário faria; nos POSTs, o token CSRF vai no campo
+    csrfmiddlewaretoken, como em um formulário enviado pelo navegador.
+    """
+
+    def __init__(self, host, porta):
+        self.conexao = http.client.HTTPConnection(host, porta, timeout = 30)
+        self.cookies = {}
+        self.requisitar('GET', '/admin/login/')
+        self.requisitar('POST', '/admin/login/', {'username': USUARIO, 'password': SENHA, 'next': '/admin/'})
+
+    def requisitar(self, metodo, caminho, dados = None):
+        cabecalhos = {'Cookie': '; '.join(f'{nome}={valor}' for nome, valor in self.cookies.items())}
+        corpo = None
+        if metodo == 'POST':
+            dados = dict(dados, csrfmiddlewaretoken = self.cookies.get('csrftoken', ''))
+            corpo = urlencode(dados)
+            cabecalhos['Content-Type'] = 'application/x-www-form-urlencoded'
+        self.conexao.request(metodo, caminho, body = corpo, headers = cabecalhos)
+        resposta = self.conexao.getresponse()
+        resposta.read()
+        for cookie in resposta.headers.get_all('Set-Cookie') or []:
+            for nome, morsel in SimpleCookie(cookie).items():
+                self.cookies[nome] = morsel.value
+        return resposta.status
+
+
+def percentil(ordenados, p):
+    """Percentil `p` (0 a 100) de uma lista já ordenada, pelo método do posto mais próximo."""
+    if not ordenados:
+        return None
+    return ordenados[max(math.ceil(p / 100 * len(ordenados)) - 1, 0)]
+
+
+def medir_view(fabrica, view, slugs, requisicoes, concorrencia = 1, aquecimento = 10):
+    """
+    Dispara `requisicoes` requisições a `view` em `concorrencia` threads e retorna vazão, latências e erros.
+
+    Parâmetros:
+    - fabrica (callable): Cria um cliente (ClienteDjango ou ClienteHttp); cada thread usa o seu.
+    - view (str): Uma das VIEWS.
+    - slugs (list[str]): Slugs dos produtos sintéticos.
+    - requisicoes (int): Quantidade total de requisições medidas.
+    - concorrencia (int): Quantidade de threads disparando requisições ao mesmo tempo.
+    - aquecimento (int): Requisições feitas por cada thread antes da medição (preenchem caches e conexões).
+
+    Toda resposta diferente de 200 conta como erro: todas as views medidas respondem 200 quando tudo corre bem
+    (um redirecionamento do formulário de produto, por exemplo, indicaria que o login do teste falhou).
+    """
+    clientes = [fabrica() for _ in range(concorrencia)]
+    for cliente in clientes:
+        for numero in range(aquecimento):
+            cliente.requisitar(*roteiro(view, slugs, numero))
+
+    latencias, erros = [], [0]
+    trava = threading.Lock()
+    proxima = iter(range(requisicoes))
+
+    def disparar(cliente):
+        while True:
+            with trava:
+                numero = next(proxima, None)
+            if numero is None:
+                return
+            inicio = time.perf_counter()
+            status = cliente.requisitar(*roteiro(view, slugs, numero))
+            duracao = time.perf_counter() - inicio
+            with trava:
+                latencias.append(duracao)
+                erros[0] += status != 200
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target = disparar, args = (cliente,)) for cliente in clientes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    segundos = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        'requisicoes': len(latencias),
+        'erros': erros[0],
+        'segundos': round(segundos, 4),
+        'requisicoes_por_segundo': round(len(latencias) / segundos, 2) if segundos else None,
+        'p50_ms': round(1000 * percentil(latencias, 50), 3),
+        'p95_ms': round(1000 * percentil(latencias, 95), 3),
+        'p99_ms': round(1000 * percentil(latencias, 99), 3),
+    }
+
+
+def medir_recursos(view, slugs, amostras = 20):
+    """
+    Mede, no mesmo processo, as consultas SQL e o pico de memória alocada (tracemalloc) por requisição a `view`.
+
+    Retorna a mediana de cada um: 'consultas' e 'memoria_kib'.
+    """
+    cliente = ClienteDjango()
+    cliente.requisitar(*roteiro(view, slugs, 0)) # Aquecimento: imports, templates compilados e caches.
+    consultas, memoria = [], []
+    tracemalloc.start()
+    try:
+        for numero in range(amostras):
+            tracemalloc.reset_peak()
+            atual = tracemalloc.get_traced_memory()[0]
+            with CaptureQueriesContext(connection) as capturadas:
+                cliente.requisitar(*roteiro(view, slugs, numero))
+            memoria.append((tracemalloc.get_traced_memory()[1] - atual) / 1024)
+            consultas.append(len(capturadas))
+    finally:
+        tracemalloc.stop()
+    return {'consultas': statistics.median_low(consultas), 'memoria_kib': round(statistics.median(memoria), 1)}
+
+
+def ambiente():
+    """Versões e máquina da medição, gravadas junto com o resultado (resultados de máquinas diferentes não se comparam)."""
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'banco': connection.vendor,
+    }
+
+
+def comparar(atual, referencia, tolerancia = 10.0):
+    """
+    Compara o resultado `atual` com uma execução de `referencia` e retorna uma lista de diferenças.
+
+    Parâmetros:
+    - atual, referencia (dict): Resultados do comando benchmark_views.
+    - tolerancia (float): Variação, em porcentagem, a partir da qual uma piora conta como regressão.
+      As consultas SQL não têm tolerância: qualquer consulta a mais é uma regressão.
+
+    Cada diferença é um dicionário com view, metrica, referencia, atual, variacao (em %) e regressao (bool).
+    """
+    diferencas = []
+    for view, valores in atual['views'].items():
+        anteriores = referencia['views'].get(view)
+        if not anteriores:
+            continue
+        for metrica, sentido in METRICAS.items():
+            antes, depois = anteriores.get(metrica), valores.get(metrica)
+            if antes is None or depois is None:
+                continue
+            variacao = 100 * (depois - antes) / antes if antes else 0.0
+            if metrica == 'consultas':
+                regressao = depois > antes
+            else:
+                regressao = sentido * variacao > tolerancia
+            diferencas.append({'view': view, 'metrica': metrica, 'referencia': antes, 'atual': depois,
+                               'variacao': round(variacao, 1), 'regressao': regressao})
+    return diferencas
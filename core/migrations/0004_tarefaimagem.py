@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 00:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_alter_produto_imagem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TarefaImagem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('armazenamento', models.JSONField(verbose_name='Armazenamento')),
+                ('arquivo', models.CharField(db_index=True, max_length=255, verbose_name='Arquivo')),
+                ('novas', models.JSONField(default=list, verbose_name='Versões a gerar')),
+                ('antigas', models.JSONField(default=list, verbose_name='Versões a apagar')),
+                ('estado', models.CharField(choices=[('pendente', 'Pendente'), ('processando', 'Processando'), ('concluida', 'Concluída'), ('falhou', 'Falhou')], db_index=True, default='pendente', max_length=20, verbose_name='Estado')),
+                ('tentativas', models.PositiveIntegerField(default=0, verbose_name='Tentativas')),
+                ('erro', models.TextField(blank=True, verbose_name='Último erro')),
+                ('criado', models.DateTimeField(auto_now_add=True, verbose_name='Data de criação')),
+                ('modificado', models.DateTimeField(auto_now=True, verbose_name='Data de modificação')),
+            ],
+            options={
+                'verbose_name': 'Tarefa de imagem',
+                'verbose_name_plural': 'Tarefas de imagem',
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-18 00:15
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_tarefaimagem'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnvioImagem',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('nome', models.CharField(max_length=255, verbose_name='Nome original')),
+                ('tamanho', models.BigIntegerField(verbose_name='Tamanho total (bytes)')),
+                ('recebido', models.BigIntegerField(default=0, verbose_name='Bytes recebidos')),
+                ('partes', models.JSONField(default=list, verbose_name='Partes gravadas')),
+                ('largura', models.PositiveIntegerField(editable=False, null=True)),
+                ('altura', models.PositiveIntegerField(editable=False, null=True)),
+                ('arquivo', models.CharField(blank=True, max_length=255, verbose_name='Arquivo final')),
+                ('sha256', models.CharField(blank=True, max_length=64, verbose_name='SHA-256')),
+                ('criado', models.DateTimeField(auto_now_add=True, verbose_name='Data de criação')),
+                ('modificado', models.DateTimeField(auto_now=True, verbose_name='Data de modificação')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Envio de imagem',
+                'verbose_name_plural': 'Envios de imagem',
+            },
+        ),
+    ]
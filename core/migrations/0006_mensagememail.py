@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 00:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_envioimagem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MensagemEmail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('assunto', models.CharField(max_length=255, verbose_name='Assunto')),
+                ('corpo', models.TextField(verbose_name='Corpo')),
+                ('remetente', models.CharField(max_length=255, verbose_name='Remetente')),
+                ('destinatarios', models.JSONField(default=list, verbose_name='Destinatários')),
+                ('cabecalhos', models.JSONField(default=dict, verbose_name='Cabeçalhos')),
+                ('estado', models.CharField(choices=[('pendente', 'Pendente'), ('enviando', 'Enviando'), ('enviada', 'Enviada'), ('falhou', 'Falhou')], default='pendente', max_length=20, verbose_name='Estado')),
+                ('tentativas', models.PositiveIntegerField(default=0, verbose_name='Tentativas')),
+                ('proxima_tentativa', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Próxima tentativa')),
+                ('erro', models.TextField(blank=True, verbose_name='Último erro')),
+                ('criado', models.DateTimeField(auto_now_add=True, verbose_name='Data de criação')),
+                ('enviado', models.DateTimeField(blank=True, null=True, verbose_name='Data de envio')),
+            ],
+            options={
+                'verbose_name': 'Mensagem de e-mail',
+                'verbose_name_plural': 'Mensagens de e-mail',
+                'indexes': [models.Index(fields=['estado', 'proxima_tentativa'], name='core_email_fila_idx')],
+            },
+        ),
+    ]
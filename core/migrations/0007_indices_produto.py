@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-18 00:20
+
+from django.db import migrations, models
+
+from core.models import slug_base, slugs_livres
+
+
+def desduplicar_slugs(apps, schema_editor):
+    # Antes de tornar o slug único, produtos com nomes repetidos (ou slug vazio) recebem um sufixo numérico.
+    # A mesma regra de slug_unico: os slugs das rotas fixas (SLUGS_RESERVADOS, como 'envios') também ficam de fora.
+    Produto = apps.get_model('core', 'Produto')
+    usados = set()
+    for produto in Produto.objects.order_by('id').only('id', 'nome', 'slug'):
+        slug = next(slugs_livres(slug_base(produto.nome), usados))
+        usados.add(slug)
+        if slug != produto.slug:
+            Produto.objects.filter(pk = produto.pk).update(slug = slug)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_mensagememail'),
+    ]
+
+    operations = [
+        migrations.RunPython(desduplicar_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='produto',
+            name='slug',
+            field=models.SlugField(blank=True, editable=False, max_length=100, unique=True, verbose_name='Slug'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['ativo', '-criado', '-id'], name='core_produto_vitrine_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['ativo', 'preco'], name='core_produto_preco_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 00:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_indices_produto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produto',
+            name='hash_carga',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Hash da carga'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 00:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_produto_hash_carga'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportacaoProdutos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('manifesto', models.FileField(upload_to='importacoes', verbose_name='Manifesto (CSV ou JSONL)')),
+                ('imagens', models.FileField(upload_to='importacoes', verbose_name='Imagens (ZIP)')),
+                ('estado', models.CharField(choices=[('pendente', 'Pendente'), ('processando', 'Processando'), ('concluida', 'Concluída'), ('falhou', 'Falhou')], db_index=True, default='pendente', editable=False, max_length=20, verbose_name='Estado')),
+                ('linha', models.PositiveIntegerField(default=0, editable=False, verbose_name='Último registro processado')),
+                ('importados', models.PositiveIntegerField(default=0, editable=False, verbose_name='Produtos importados')),
+                ('erros', models.PositiveIntegerField(default=0, editable=False, verbose_name='Linhas com erro')),
+                ('relatorio', models.TextField(blank=True, editable=False, verbose_name='Relatório de erros')),
+                ('criado', models.DateTimeField(auto_now_add=True, verbose_name='Data de criação')),
+                ('modificado', models.DateTimeField(auto_now=True, verbose_name='Data de modificação')),
+                ('usuario', models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Importação de produtos',
+                'verbose_name_plural': 'Importações de produtos',
+            },
+        ),
+    ]
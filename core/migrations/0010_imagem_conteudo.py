@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 00:43
+
+import core.armazenamento
+import pictures.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_importacaoprodutos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImagemConteudo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('arquivo', models.CharField(max_length=255, unique=True, verbose_name='Arquivo')),
+                ('largura', models.PositiveIntegerField(null=True)),
+                ('altura', models.PositiveIntegerField(null=True)),
+                ('referencias', models.PositiveIntegerField(default=0, verbose_name='Referências')),
+                ('criado', models.DateTimeField(auto_now_add=True, verbose_name='Data de criação')),
+            ],
+            options={
+                'verbose_name': 'Imagem (conteúdo)',
+                'verbose_name_plural': 'Imagens (conteúdo)',
+            },
+        ),
+        migrations.AlterField(
+            model_name='produto',
+            name='imagem',
+            field=pictures.models.PictureField(aspect_ratios=[None, '1/1'], breakpoints={'desktop': 992, 'mobile': 576, 'thumb': 200}, container_width=1200, file_types=['PNG'], grid_columns=12, height_field='image_height', pixel_densities=[1, 2], storage=core.armazenamento.ArmazenamentoPorConteudo(), upload_to='produtos', width_field='image_width'),
+        ),
+    ]
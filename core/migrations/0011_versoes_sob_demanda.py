@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 00:45
+
+import core.armazenamento
+import pictures.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_imagem_conteudo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersaoImagem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=255, unique=True, verbose_name='Versão')),
+                ('arquivo', models.CharField(db_index=True, max_length=255, verbose_name='Original')),
+                ('pronta', models.BooleanField(default=False, verbose_name='Pronta')),
+                ('criado', models.DateTimeField(auto_now_add=True, verbose_name='Data de criação')),
+                ('modificado', models.DateTimeField(auto_now=True, verbose_name='Data de modificação')),
+            ],
+            options={
+                'verbose_name': 'Versão de imagem',
+                'verbose_name_plural': 'Versões de imagem',
+            },
+        ),
+        migrations.AlterField(
+            model_name='produto',
+            name='imagem',
+            field=pictures.models.PictureField(aspect_ratios=[None, '1/1'], breakpoints={'desktop': 992, 'mobile': 576, 'thumb': 200}, container_width=1200, db_index=True, file_types=['PNG'], grid_columns=12, height_field='image_height', pixel_densities=[1, 2], storage=core.armazenamento.ArmazenamentoPorConteudo(), upload_to='produtos', width_field='image_width'),
+        ),
+    ]
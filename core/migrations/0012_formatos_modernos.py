@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-18 00:48
+
+import core.armazenamento
+import pictures.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_versoes_sob_demanda'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='produto',
+            name='imagem',
+            field=pictures.models.PictureField(aspect_ratios=[None, '1/1'], breakpoints={'desktop': 992, 'mobile': 576, 'thumb': 200}, container_width=1200, db_index=True, file_types=['AVIF', 'WEBP', 'JPEG'], grid_columns=12, height_field='image_height', pixel_densities=[1, 2], storage=core.armazenamento.ArmazenamentoPorConteudo(), upload_to='produtos', width_field='image_width'),
+        ),
+    ]
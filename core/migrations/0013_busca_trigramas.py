@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:10
+
+from django.db import migrations
+
+
+def criar_indices_de_busca(apps, schema_editor):
+    # Índices GIN de trigramas sobre o nome e o slug, usados pela busca de produtos (core/busca.py).
+    # Só existem no PostgreSQL: nos demais bancos a busca usa um índice em memória e não há nada a criar.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute('CREATE INDEX IF NOT EXISTS core_produto_nome_trgm_idx ON core_produto USING gin (nome gin_trgm_ops)')
+    schema_editor.execute('CREATE INDEX IF NOT EXISTS core_produto_slug_trgm_idx ON core_produto USING gin (slug gin_trgm_ops)')
+
+
+def remover_indices_de_busca(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS core_produto_nome_trgm_idx')
+    schema_editor.execute('DROP INDEX IF EXISTS core_produto_slug_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_formatos_modernos'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indices_de_busca, remover_indices_de_busca),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.5 on 2026-10-18 01:11
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def preencher_contagens(apps, schema_editor):
+    # Monta o cubo a partir dos produtos já existentes. Sem isso, a primeira gravação de um produto somaria ±1 a uma
+    # tabela vazia, e o cubo, que só é recalculado quando está vazio (facetas.cubo), ficaria errado para sempre.
+    from core.facetas import celula
+
+    Produto = apps.get_model('core', 'Produto')
+    ContagemProdutos = apps.get_model('core', 'ContagemProdutos')
+    quantidades = Counter(
+        celula(ativo, preco, estoque)
+        for ativo, preco, estoque in Produto.objects.values_list('ativo', 'preco', 'estoque').iterator()
+    )
+    ContagemProdutos.objects.bulk_create([
+        ContagemProdutos(ativo = ativo, faixa_preco = faixa, com_estoque = com_estoque, quantidade = quantidade)
+        for (ativo, faixa, com_estoque), quantidade in quantidades.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_busca_trigramas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContagemProdutos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ativo', models.BooleanField(verbose_name='Ativo?')),
+                ('faixa_preco', models.PositiveSmallIntegerField(verbose_name='Faixa de preço')),
+                ('com_estoque', models.BooleanField(verbose_name='Com estoque?')),
+                ('quantidade', models.IntegerField(default=0, verbose_name='Quantidade de produtos')),
+            ],
+            options={
+                'verbose_name': 'Contagem de produtos',
+                'verbose_name_plural': 'Contagens de produtos',
+                'constraints': [models.UniqueConstraint(fields=('ativo', 'faixa_preco', 'com_estoque'), name='core_contagem_combinacao_unica')],
+            },
+        ),
+        migrations.RunPython(preencher_contagens, migrations.RunPython.noop),
+    ]
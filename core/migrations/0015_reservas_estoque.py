@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-18 01:15
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_contagem_produtos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reserva',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('estado', models.CharField(choices=[('ativa', 'Ativa'), ('confirmada', 'Confirmada'), ('liberada', 'Liberada'), ('expirada', 'Expirada')], default='ativa', max_length=20, verbose_name='Estado')),
+                ('expira_em', models.DateTimeField(verbose_name='Expira em')),
+                ('criado', models.DateTimeField(auto_now_add=True, verbose_name='Data de criação')),
+                ('modificado', models.DateTimeField(auto_now=True, verbose_name='Data de modificação')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Reserva de estoque',
+                'verbose_name_plural': 'Reservas de estoque',
+            },
+        ),
+        migrations.CreateModel(
+            name='ItemReserva',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade', models.PositiveIntegerField(verbose_name='Quantidade')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.produto')),
+                ('reserva', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='itens', to='core.reserva')),
+            ],
+            options={
+                'verbose_name': 'Item de reserva',
+                'verbose_name_plural': 'Itens de reserva',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['estado', 'expira_em'], name='core_reserva_expiracao_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='itemreserva',
+            constraint=models.UniqueConstraint(fields=('reserva', 'produto'), name='core_item_reserva_unico'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 01:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_reservas_estoque'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['nome'], name='core_produto_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['criado', 'id'], name='core_produto_criado_idx'),
+        ),
+    ]
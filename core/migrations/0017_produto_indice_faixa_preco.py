@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 01:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_indices_admin'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='produto',
+            name='core_produto_preco_idx',
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['preco', 'ativo'], name='core_produto_faixa_preco_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 01:33
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_produto_indice_faixa_preco'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarefaimagem',
+            name='proxima_tentativa',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Próxima tentativa'),
+        ),
+    ]
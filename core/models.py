@@ -1,6 +1,16 @@
+import re
+import uuid
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from pictures.models import PictureField
 
+from .armazenamento import ajustar_referencias, armazenamento_produtos
+from .busca import indexar_produto, remover_produto
+from .cache_catalogo import invalidar_produto
+from .facetas import ajustar_contagens, celula
+
 # SIGNALS
 from django.db.models import signals
 # Esta linha de código serve para importar o módulo de sinais (signals) do Django, que permite conectar funções a certos eventos que ocorrem no
@@ -36,21 +46,103 @@ class Produto(Base): # Produto herda os atributos da classe Pai Base
     preco = models.DecimalField('Preço', max_digits = 8, decimal_places = 2)
     estoque = models.IntegerField('Estoque')
     imagem = PictureField(upload_to = 'produtos',
+        storage = armazenamento_produtos, # Grava o original com o hash do conteúdo no nome (veja core/armazenamento.py).
+        db_index = True, # Buscas pelo arquivo: versões sob demanda (core/versoes.py), fila de imagens e contagem de referências.
         width_field = "image_width",
         height_field = "image_height",
         aspect_ratios=[None, "1/1"],
         breakpoints = {'thumb': 200, "mobile": 576, "desktop": 992},
-        file_types = ["PNG"],
+        file_types = ["AVIF", "WEBP", "JPEG"], # Mesma ordem de PICTURES["FILE_TYPES"] (settings.py): do mais compacto ao mais compatível.
         grid_columns = 12,
         container_width = 1200,
         pixel_densities = [1, 2],)
     image_width = models.PositiveIntegerField(null = True, editable = False)
     image_height = models.PositiveIntegerField(null = True, editable = False)
-    slug = models.SlugField('Slug', max_length = 100, blank = True, editable = False)
+    slug = models.SlugField('Slug', max_length = 100, blank = True, editable = False, unique = True)
+    # O slug é único (veja slug_unico): ele identifica o produto na URL, e a restrição cria o índice usado nessa busca.
+    hash_carga = models.CharField('Hash da carga', max_length = 64, blank = True, editable = False)
+    # SHA-256 do registro de fixture que gerou ou atualizou o produto (veja core/carga.py).
+    # Permite que `python manage.py load_catalog` pule os registros que não mudaram desde a última carga.
+
+    class Meta:
+        indexes = [
+            models.Index(fields = ['ativo', '-criado', '-id'], name = 'core_produto_vitrine_idx'),
+            # Listagem da vitrine (core/pagination.py): filtra ativo = True e ordena por (criado, id) decrescentes.
+            # Com este índice o banco lê as linhas já na ordem da página e para depois de `tamanho + 1` entradas.
+            models.Index(fields = ['preco', 'ativo'], name = 'core_produto_faixa_preco_idx'),
+            # Filtros por faixa de preço (preco__gte / preco__lte) entre os produtos ativos, já na ordem de preço.
+            # O preço vem primeiro porque o SQLite escreve o filtro ativo = True como "WHERE ativo", sem comparação, e não
+            # usa índices iniciados por 'ativo' nesse caso; com o preço na frente, os três bancos percorrem só a faixa pedida
+            # e conferem 'ativo' no próprio índice.
+            models.Index(fields = ['nome'], name = 'core_produto_nome_idx'),
+            models.Index(fields = ['criado', 'id'], name = 'core_produto_criado_idx'),
+            # Ordenações da listagem do admin (veja ProdutoAdmin.sortable_by), sobre todos os produtos, ativos ou não.
+        ]
+        # Os índices da vitrine e da faixa de preço incluem a coluna 'ativo' em vez de serem índices parciais (condition = Q(ativo = True)):
+        # o MySQL, banco padrão do projeto, não suporta índices parciais e o Django simplesmente não os criaria.
 
     def __str__(self):
         return self.nome
 
+# O modelo a seguir é o "cubo" das facetas da listagem (veja core/facetas.py): cada linha conta os produtos de uma
+# combinação de (ativo, faixa de preço, com estoque). Os signals de Produto o mantêm atualizado, de modo que as quantidades
+# de cada filtro são lidas destas poucas linhas em vez de um COUNT(*) sobre a tabela de produtos.
+class ContagemProdutos(models.Model):
+    ativo = models.BooleanField('Ativo?')
+    faixa_preco = models.PositiveSmallIntegerField('Faixa de preço') # Posição em settings.CATALOGO_FAIXAS_DE_PRECO.
+    com_estoque = models.BooleanField('Com estoque?')
+    quantidade = models.IntegerField('Quantidade de produtos', default = 0)
+
+    class Meta:
+        verbose_name = 'Contagem de produtos'
+        verbose_name_plural = 'Contagens de produtos'
+        constraints = [
+            models.UniqueConstraint(fields = ['ativo', 'faixa_preco', 'com_estoque'], name = 'core_contagem_combinacao_unica'),
+        ]
+
+    def __str__(self):
+        return f'{self.ativo}/{self.faixa_preco}/{self.com_estoque}: {self.quantidade}'
+
+SLUGS_RESERVADOS = {'envios'}
+# Slugs que coincidem com rotas fixas em /produto/ (veja core/urls.py) e por isso não podem identificar um produto.
+
+def slug_base(nome):
+    # Slug sem sufixo; limitado a 90 caracteres para reservar espaço para o sufixo dentro do max_length do campo.
+    return slugify(nome)[:90] or 'produto'
+
+def slug_compativel(slug, nome):
+    """Retorna True se `slug` pode continuar identificando um produto com este nome ("camiseta" ou "camiseta-2" para "Camiseta")."""
+    base = slug_base(nome)
+    if not slug or slug in SLUGS_RESERVADOS:
+        return False
+    return slug == base or re.fullmatch(rf'{re.escape(base)}-\d+', slug) is not None
+
+def slug_unico(nome, pk = None, reservados = ()):
+    """
+    Gera, a partir do nome, um slug que ainda não é usado por nenhum outro produto.
+
+    Parâmetros:
+    - nome (str): Nome do produto.
+    - pk (int | None): Id do próprio produto, ignorado na verificação (ao editar um produto existente).
+    - reservados (set[str]): Slugs que também devem ser evitados, além dos já gravados no banco
+      (por exemplo, os atribuídos a outros produtos do mesmo lote de uma carga em massa).
+
+    Se o slug já existir, acrescenta um sufixo numérico: "camiseta", "camiseta-2", "camiseta-3"...
+    """
+    base = slug_base(nome)
+    usados = Produto.objects.filter(models.Q(slug = base) | models.Q(slug__startswith = f'{base}-')).exclude(pk = pk)
+    usados = set(usados.values_list('slug', flat = True))
+    return next(slugs_livres(base, usados | set(reservados)))
+
+def slugs_livres(base, usados):
+    # Gera, em ordem, os slugs "base", "base-2", "base-3"... que não estão em `usados` nem em SLUGS_RESERVADOS.
+    slug, numero = base, 2
+    while True:
+        if slug not in usados and slug not in SLUGS_RESERVADOS:
+            yield slug
+        slug = f'{base}-{numero}'
+        numero += 1
+
 # O trecho de código a seguir define uma função de signal no Django que cria automaticamente um slug a partir do nome de um produto antes de ele ser salvo
 # no banco de dados.
 def produto_pre_save(signal, instance, sender, *args, **kwargs):
@@ -58,10 +150,279 @@ def produto_pre_save(signal, instance, sender, *args, **kwargs):
     # Ela pega o valor de instance.nome, aplica o slugify() (converte para um formato URL-amigável) e atribui ao campo slug da instância.
     # Por exemplo, se instance.nome = "Camiseta Azul GG"
     # então, instance.slug = "camiseta-azul-gg"
-    instance.slug = slugify(instance.nome)
+    # Como o slug é único, um nome repetido recebe um sufixo ("camiseta-azul-gg-2"; veja slug_unico).
+    # Se o nome não mudou, o slug atual (com ou sem sufixo) é mantido, para não alterar a URL do produto.
+    if not slug_compativel(instance.slug, instance.nome):
+        instance.slug = slug_unico(instance.nome, pk = instance.pk)
+
+    # Antes de salvar, verificamos se a alteração muda a composição da listagem: produto novo, campo ativo alterado ou
+    # mudança de faixa de preço ou de estoque, que muda as páginas filtradas por faceta (core/facetas.py).
+    # O resultado é guardado na própria instância e usado por produto_post_save para decidir o que invalidar no cache do catálogo.
+    # A imagem anterior é guardada para que produto_post_save atualize a contagem de referências dos arquivos (core/armazenamento.py),
+    # a combinação de facetas anterior, para que atualize as contagens das facetas, e o nome, o slug e o campo ativo anteriores,
+    # para que só atualize a busca (core/busca.py) quando um deles mudar.
+    instance._imagem_anterior = instance._celula_anterior = instance._busca_anterior = None
+    if not instance._state.adding:
+        anterior = sender.objects.filter(pk = instance.pk).values_list('ativo', 'preco', 'estoque', 'imagem', 'nome', 'slug').first()
+        if anterior:
+            instance._celula_anterior, instance._imagem_anterior = celula(*anterior[:3]), anterior[3]
+            instance._busca_anterior = (anterior[4], anterior[5], anterior[0])
+    instance._altera_listagem = instance._celula_anterior != celula(instance.ativo, instance.preco, instance.estoque)
+
+# As funções a seguir mantêm o cache do catálogo (core/cache_catalogo.py) coerente com o banco de dados.
+# Uma alteração comum (preço, estoque, nome, imagem) descarta apenas o fragmento HTML do produto;
+# criação, exclusão ou mudança de ativo descartam também as páginas da listagem.
+def produto_post_save(signal, instance, sender, created, *args, **kwargs):
+    invalidar_produto(instance.pk, listagem = created or getattr(instance, '_altera_listagem', True))
+    busca = (instance.nome, instance.slug, instance.ativo)
+    if busca != getattr(instance, '_busca_anterior', None):
+        # Índice de busca (core/busca.py). Cada atualização invalida os índices dos demais processos e as sugestões em cache:
+        # uma alteração só de preço, estoque ou imagem não muda o que a busca encontra e não passa por aqui.
+        indexar_produto(instance)
+    instance._busca_anterior = busca
+    anterior = getattr(instance, '_imagem_anterior', None)
+    if instance.imagem.name != anterior:
+        ajustar_referencias(
+            removidas = [anterior] if anterior else [],
+            adicionadas = [(instance.imagem.name, instance.image_width, instance.image_height)] if instance.imagem else [],
+        )
+    instance._imagem_anterior = instance.imagem.name
+    atual = celula(instance.ativo, instance.preco, instance.estoque)
+    if atual != getattr(instance, '_celula_anterior', None):
+        # Na mesma transação do save: as contagens nunca divergem dos produtos gravados.
+        ajustar_contagens(removidas = [instance._celula_anterior] if instance._celula_anterior else [], adicionadas = [atual])
+    instance._celula_anterior = atual
+
+def produto_post_delete(signal, instance, sender, *args, **kwargs):
+    invalidar_produto(instance.pk, listagem = True)
+    remover_produto(instance.pk)
+    ajustar_contagens(removidas = [celula(instance.ativo, instance.preco, instance.estoque)])
+    if instance.imagem:
+        ajustar_referencias(removidas = [instance.imagem.name])
 
 # Sobre o código abaixo:
 # signals.pre_save: sinal do Django que é emitido antes de um objeto ser salvo.
 # connect(...): conecta a função produto_pre_save ao modelo Produto.
 # Resultado: toda vez que um Produto for salvo, a função será executada automaticamente antes do save().
-signals.pre_save.connect(produto_pre_save, sender = Produto)
\ No newline at end of file
+signals.pre_save.connect(produto_pre_save, sender = Produto)
+signals.post_save.connect(produto_post_save, sender = Produto)
+signals.post_delete.connect(produto_post_delete, sender = Produto)
+
+# O modelo a seguir representa uma tarefa da fila local de geração de imagens (veja core/tasks.py).
+# Cada vez que uma imagem de Produto é salva, o django-pictures chama o processador configurado em PICTURES["PROCESSOR"],
+# que grava aqui quais versões redimensionadas devem ser geradas ou apagadas.
+# O comando `python manage.py process_pictures` consome essas tarefas em segundo plano.
+class TarefaImagem(models.Model):
+    PENDENTE = 'pendente'
+    PROCESSANDO = 'processando'
+    CONCLUIDA = 'concluida'
+    FALHOU = 'falhou'
+    ESTADOS = [
+        (PENDENTE, 'Pendente'),
+        (PROCESSANDO, 'Processando'),
+        (CONCLUIDA, 'Concluída'),
+        (FALHOU, 'Falhou'),
+    ]
+    ESTADOS_ABERTOS = [PENDENTE, PROCESSANDO] # Estados em que as versões da imagem ainda não estão prontas.
+
+    armazenamento = models.JSONField('Armazenamento') # Armazenamento desconstruído onde está o arquivo original.
+    arquivo = models.CharField('Arquivo', max_length = 255, db_index = True) # Nome do arquivo original no armazenamento.
+    novas = models.JSONField('Versões a gerar', default = list)
+    antigas = models.JSONField('Versões a apagar', default = list)
+    estado = models.CharField('Estado', max_length = 20, choices = ESTADOS, default = PENDENTE, db_index = True)
+    tentativas = models.PositiveIntegerField('Tentativas', default = 0)
+    proxima_tentativa = models.DateTimeField('Próxima tentativa', default = timezone.now)
+    # Após uma falha, a tarefa só volta a ser reservada a partir deste horário (espera exponencial, veja process_pictures).
+    erro = models.TextField('Último erro', blank = True)
+    criado = models.DateTimeField('Data de criação', auto_now_add = True)
+    modificado = models.DateTimeField('Data de modificação', auto_now = True)
+
+    class Meta:
+        verbose_name = 'Tarefa de imagem'
+        verbose_name_plural = 'Tarefas de imagem'
+
+    def __str__(self):
+        return f'{self.arquivo} ({self.get_estado_display()})'
+
+# O modelo a seguir conta quantos produtos usam cada arquivo de imagem endereçado por conteúdo (veja core/armazenamento.py).
+# Quando a contagem chega a zero, o arquivo original e as suas versões redimensionadas são apagados.
+class ImagemConteudo(models.Model):
+    arquivo = models.CharField('Arquivo', max_length = 255, unique = True) # Nome do arquivo original no armazenamento.
+    largura = models.PositiveIntegerField(null = True) # Dimensões do original, usadas para listar as versões a apagar.
+    altura = models.PositiveIntegerField(null = True)
+    referencias = models.PositiveIntegerField('Referências', default = 0)
+    criado = models.DateTimeField('Data de criação', auto_now_add = True)
+
+    class Meta:
+        verbose_name = 'Imagem (conteúdo)'
+        verbose_name_plural = 'Imagens (conteúdo)'
+
+    def __str__(self):
+        return f'{self.arquivo} ({self.referencias})'
+
+# O modelo a seguir registra as versões redimensionadas geradas sob demanda (veja core/versoes.py).
+# O registro é criado, com pronta = False, antes de a versão ser gerada: a restrição de unicidade do nome funciona como trava,
+# de modo que pedidos simultâneos pela mesma versão não a geram duas vezes.
+class VersaoImagem(models.Model):
+    nome = models.CharField('Versão', max_length = 255, unique = True) # Nome do arquivo da versão no armazenamento.
+    arquivo = models.CharField('Original', max_length = 255, db_index = True) # Nome do arquivo original.
+    pronta = models.BooleanField('Pronta', default = False)
+    criado = models.DateTimeField('Data de criação', auto_now_add = True)
+    modificado = models.DateTimeField('Data de modificação', auto_now = True)
+
+    class Meta:
+        verbose_name = 'Versão de imagem'
+        verbose_name_plural = 'Versões de imagem'
+
+    def __str__(self):
+        return self.nome
+
+# O modelo a seguir guarda o estado de um envio de imagem em partes (veja core/envios.py).
+# Cada PATCH recebido grava uma parte no armazenamento e avança o campo 'recebido'; quando ele chega a 'tamanho',
+# as partes são concatenadas no arquivo final ('arquivo'), que pode então ser associado a um Produto pelo ProdutoModelForm.
+class EnvioImagem(models.Model):
+    id = models.UUIDField(primary_key = True, default = uuid.uuid4, editable = False) # Id não sequencial, usado na URL do envio.
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, null = True, blank = True, on_delete = models.CASCADE)
+    nome = models.CharField('Nome original', max_length = 255)
+    tamanho = models.BigIntegerField('Tamanho total (bytes)')
+    recebido = models.BigIntegerField('Bytes recebidos', default = 0)
+    partes = models.JSONField('Partes gravadas', default = list) # Nomes, no armazenamento, das partes já recebidas, em ordem.
+    largura = models.PositiveIntegerField(null = True, editable = False) # Dimensões lidas do cabeçalho da imagem.
+    altura = models.PositiveIntegerField(null = True, editable = False)
+    arquivo = models.CharField('Arquivo final', max_length = 255, blank = True)
+    sha256 = models.CharField('SHA-256', max_length = 64, blank = True)
+    criado = models.DateTimeField('Data de criação', auto_now_add = True)
+    modificado = models.DateTimeField('Data de modificação', auto_now = True)
+
+    class Meta:
+        verbose_name = 'Envio de imagem'
+        verbose_name_plural = 'Envios de imagem'
+
+    @property
+    def concluido(self):
+        return bool(self.arquivo)
+
+    def __str__(self):
+        return f'{self.nome} ({self.recebido}/{self.tamanho})'
+
+# O modelo a seguir é a "caixa de saída" dos e-mails do sistema (veja core/caixa_saida.py).
+# Em vez de abrir uma conexão SMTP dentro da requisição, ContatoForm.send_mail grava a mensagem aqui e retorna imediatamente;
+# o comando `python manage.py send_outbox` entrega as mensagens em lotes, reaproveitando uma única conexão SMTP.
+# Mensagens que falham são tentadas de novo com espera exponencial; depois de esgotadas as tentativas,
+# ficam com o estado 'falhou' (a "fila de mensagens mortas"), podendo ser reenviadas pelo admin.
+class MensagemEmail(models.Model):
+    PENDENTE = 'pendente'
+    ENVIANDO = 'enviando'
+    ENVIADA = 'enviada'
+    FALHOU = 'falhou'
+    ESTADOS = [
+        (PENDENTE, 'Pendente'),
+        (ENVIANDO, 'Enviando'),
+        (ENVIADA, 'Enviada'),
+        (FALHOU, 'Falhou'),
+    ]
+
+    assunto = models.CharField('Assunto', max_length = 255)
+    corpo = models.TextField('Corpo')
+    remetente = models.CharField('Remetente', max_length = 255)
+    destinatarios = models.JSONField('Destinatários', default = list)
+    cabecalhos = models.JSONField('Cabeçalhos', default = dict)
+    estado = models.CharField('Estado', max_length = 20, choices = ESTADOS, default = PENDENTE)
+    tentativas = models.PositiveIntegerField('Tentativas', default = 0)
+    proxima_tentativa = models.DateTimeField('Próxima tentativa', default = timezone.now)
+    erro = models.TextField('Último erro', blank = True)
+    criado = models.DateTimeField('Data de criação', auto_now_add = True)
+    enviado = models.DateTimeField('Data de envio', null = True, blank = True)
+
+    class Meta:
+        verbose_name = 'Mensagem de e-mail'
+        verbose_name_plural = 'Mensagens de e-mail'
+        indexes = [
+            models.Index(fields = ['estado', 'proxima_tentativa'], name = 'core_email_fila_idx'),
+            # Índice usado pelo worker para buscar as mensagens pendentes cujo horário de tentativa já chegou.
+        ]
+
+    def __str__(self):
+        return f'{self.assunto} ({self.get_estado_display()})'
+
+# O modelo a seguir representa uma importação em massa de produtos enviada pelo admin (veja core/importacao.py).
+# O manifesto (CSV ou JSONL) e o ZIP com as imagens ficam no armazenamento; o comando `python manage.py import_products --fila`
+# processa as importações pendentes em segundo plano, gravando em 'linha' o ponto de retomada (checkpoint) após cada lote.
+class ImportacaoProdutos(models.Model):
+    PENDENTE = 'pendente'
+    PROCESSANDO = 'processando'
+    CONCLUIDA = 'concluida'
+    FALHOU = 'falhou'
+    ESTADOS = [
+        (PENDENTE, 'Pendente'),
+        (PROCESSANDO, 'Processando'),
+        (CONCLUIDA, 'Concluída'),
+        (FALHOU, 'Falhou'),
+    ]
+
+    manifesto = models.FileField('Manifesto (CSV ou JSONL)', upload_to = 'importacoes')
+    imagens = models.FileField('Imagens (ZIP)', upload_to = 'importacoes')
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, null = True, blank = True, on_delete = models.SET_NULL, editable = False)
+    estado = models.CharField('Estado', max_length = 20, choices = ESTADOS, default = PENDENTE, db_index = True, editable = False)
+    linha = models.PositiveIntegerField('Último registro processado', default = 0, editable = False)
+    importados = models.PositiveIntegerField('Produtos importados', default = 0, editable = False)
+    erros = models.PositiveIntegerField('Linhas com erro', default = 0, editable = False)
+    relatorio = models.TextField('Relatório de erros', blank = True, editable = False)
+    criado = models.DateTimeField('Data de criação', auto_now_add = True)
+    modificado = models.DateTimeField('Data de modificação', auto_now = True)
+
+    class Meta:
+        verbose_name = 'Importação de produtos'
+        verbose_name_plural = 'Importações de produtos'
+
+    def __str__(self):
+        return f'{self.manifesto.name} ({self.get_estado_display()})'
+
+
+# Os modelos a seguir representam as reservas de estoque (veja core/estoque.py).
+# Uma reserva retira os itens do estoque de Produto no momento em que é criada; se não for confirmada até 'expira_em',
+# o comando `python manage.py sweep_reservations` a marca como expirada e devolve os itens ao estoque.
+class Reserva(models.Model):
+    ATIVA = 'ativa'
+    CONFIRMADA = 'confirmada'
+    LIBERADA = 'liberada'
+    EXPIRADA = 'expirada'
+    ESTADOS = [
+        (ATIVA, 'Ativa'),
+        (CONFIRMADA, 'Confirmada'),
+        (LIBERADA, 'Liberada'),
+        (EXPIRADA, 'Expirada'),
+    ]
+
+    id = models.UUIDField(primary_key = True, default = uuid.uuid4, editable = False) # Id não sequencial, entregue ao cliente.
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, null = True, blank = True, on_delete = models.SET_NULL)
+    estado = models.CharField('Estado', max_length = 20, choices = ESTADOS, default = ATIVA)
+    expira_em = models.DateTimeField('Expira em')
+    criado = models.DateTimeField('Data de criação', auto_now_add = True)
+    modificado = models.DateTimeField('Data de modificação', auto_now = True)
+
+    class Meta:
+        verbose_name = 'Reserva de estoque'
+        verbose_name_plural = 'Reservas de estoque'
+        indexes = [
+            models.Index(fields = ['estado', 'expira_em'], name = 'core_reserva_expiracao_idx'),
+            # Índice usado pela varredura para buscar as reservas ativas cujo prazo já passou.
+        ]
+
+    def __str__(self):
+        return f'{self.pk} ({self.get_estado_display()})'
+
+class ItemReserva(models.Model):
+    reserva = models.ForeignKey(Reserva, on_delete = models.CASCADE, related_name = 'itens')
+    produto = models.ForeignKey(Produto, on_delete = models.CASCADE, related_name = '+')
+    quantidade = models.PositiveIntegerField('Quantidade')
+
+    class Meta:
+        verbose_name = 'Item de reserva'
+        verbose_name_plural = 'Itens de reserva'
+        constraints = [
+            models.UniqueConstraint(fields = ['reserva', 'produto'], name = 'core_item_reserva_unico'),
+        ]
+
+    def __str__(self):
+        return f'{self.quantidade} × {self.produto_id}'
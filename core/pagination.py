@@ -0,0 +1,314 @@
+# Este módulo implementa a paginação por cursor (também chamada de "keyset pagination") usada na listagem de produtos.
+# Em vez de usar OFFSET/LIMIT (que obriga o banco a percorrer e descartar todas as linhas anteriores à página pedida),
+# a paginação por cursor guarda a posição do último item exibido — o par (criado, id) — e pede ao banco apenas
+# as linhas "depois" ou "antes" dessa posição. Assim cada página custa sempre o mesmo, não importa o tamanho do catálogo.
+
+import base64
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+ORDEM = ('-criado', '-id')
+# Ordem da listagem: produtos mais novos primeiro. O 'id' desempata produtos criados no mesmo instante,
+# garantindo uma ordem total (nenhum par de linhas com a mesma posição), requisito para o cursor ser estável.
+
+
+class CursorInvalido(ValueError):
+    """Exceção lançada quando o cursor recebido pela URL não pode ser decodificado."""
+
+
+def codificar_cursor(produto):
+    """
+    Gera o cursor opaco que aponta para a posição de um produto na listagem.
+
+    O cursor é o par (criado, id) serializado em base64 "url-safe", para poder ser usado diretamente na query string.
+    """
+    bruto = f"{produto.criado.isoformat()}|{produto.pk}"
+    return base64.urlsafe_b64encode(bruto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """
+    Converte um cursor gerado por codificar_cursor de volta no par (criado, id).
+
+    Lança CursorInvalido se o texto recebido não for um cursor válido (por exemplo, se foi editado à mão na URL).
+    """
+    try:
+        preenchido = cursor + '=' * (-len(cursor) % 4)
+        # O base64 exige que o tamanho seja múltiplo de 4; recolocamos o preenchimento '=' removido na codificação.
+        criado, pk = base64.urlsafe_b64decode(preenchido.encode()).decode().split('|')
+        return datetime.fromisoformat(criado), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        # binascii.Error (base64 corrompido) também é subclasse de ValueError.
+        raise CursorInvalido(cursor) from e
+
+
+class Pagina:
+    """
+    Resultado de uma consulta paginada.
+
+    Atributos:
+    - itens (list): Produtos da página atual, já na ordem de exibição.
+    - tamanho (int): Quantidade máxima de itens por página usada na consulta.
+    - proximo (str | None): Cursor para a próxima página (None se esta for a última).
+    - anterior (str | None): Cursor para a página anterior (None se esta for a primeira).
+    """
+
+    def __init__(self, itens, tamanho, proximo = None, anterior = None):
+        self.itens = itens
+        self.tamanho = tamanho
+        self.proximo = proximo
+        self.anterior = anterior
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+    def __bool__(self):
+        return bool(self.itens)
+
+
+def _consulta(queryset, tamanho, depois = None, antes = None):
+    # Monta a consulta limitada a `tamanho + 1` linhas a partir do cursor: o item extra serve apenas
+    # para sabermos se existe mais uma página. Para voltar uma página ('antes'), a ordem é invertida.
+    if antes:
+        criado, pk = decodificar_cursor(antes)
+        return queryset.filter(Q(criado__gt = criado) | Q(criado = criado, id__gt = pk)).order_by('criado', 'id')[:tamanho + 1]
+    if depois:
+        criado, pk = decodificar_cursor(depois)
+        queryset = queryset.filter(Q(criado__lt = criado) | Q(criado = criado, id__lt = pk))
+    return queryset.order_by(*ORDEM)[:tamanho + 1]
+
+
+def _montar(itens, tamanho, depois = None, antes = None):
+    # Monta a Pagina a partir das linhas devolvidas por _consulta.
+    ha_mais = len(itens) > tamanho
+    if antes:
+        # Ao voltar uma página, as linhas vieram na ordem invertida: desviramos o resultado.
+        itens = itens[:tamanho][::-1]
+        return Pagina(
+            itens,
+            tamanho,
+            proximo = codificar_cursor(itens[-1]),
+            anterior = codificar_cursor(itens[0]) if ha_mais else None,
+        )
+    itens = itens[:tamanho]
+    return Pagina(
+        itens,
+        tamanho,
+        proximo = codificar_cursor(itens[-1]) if ha_mais else None,
+        anterior = codificar_cursor(itens[0]) if depois and itens else None,
+    )
+
+
+def paginar(queryset, tamanho, depois = None, antes = None):
+    """
+    Retorna uma Pagina de `queryset` ordenada por ORDEM, a partir de um cursor.
+
+    Parâmetros:
+    - queryset (QuerySet): Consulta base (por exemplo, Produto.objects.filter(ativo = True)).
+    - tamanho (int): Quantidade de itens por página.
+    - depois (str | None): Cursor do último item da página atual; retorna a página seguinte.
+    - antes (str | None): Cursor do primeiro item da página atual; retorna a página anterior.
+
+    Se nenhum cursor for informado, retorna a primeira página. Cada chamada executa uma única consulta
+    limitada a `tamanho + 1` linhas. Como o cursor aponta para uma posição (e não para um número de página),
+    produtos inseridos enquanto o usuário navega não fazem itens "pularem" ou se repetirem entre páginas.
+    """
+    itens = list(_consulta(queryset, tamanho, depois, antes))
+    if antes and not itens:
+        # Se não há nada antes do cursor (por exemplo, os itens foram apagados), voltamos para a primeira página.
+        return paginar(queryset, tamanho)
+    return _montar(itens, tamanho, depois, antes)
+
+
+async def apaginar(queryset, tamanho, depois = None, antes = None):
+    """Versão assíncrona de paginar, para as views assíncronas (usa a iteração assíncrona do ORM)."""
+    itens = [item async for item in _consulta(queryset, tamanho, depois, antes)]
+    if antes and not itens:
+        return await apaginar(queryset, tamanho)
+    return _montar(itens, tamanho, depois, antes)
+
+
+def estimar_linhas(queryset):
+    """
+    Retorna a quantidade de linhas de `queryset` estimada pelas estatísticas do banco, sem percorrer a tabela,
+    ou None se o banco não fornecer a estimativa (SQLite, tabela nunca analisada).
+
+    Sem filtros, a estimativa é a da própria tabela (pg_class.reltuples no PostgreSQL, information_schema.TABLES.TABLE_ROWS
+    no MySQL); com filtros, é a quantidade de linhas prevista pelo planejador para a consulta (EXPLAIN).
+    """
+    conexao = connections[queryset.db]
+    if conexao.vendor not in ('postgresql', 'mysql'):
+        return None
+    tabela = queryset.model._meta.db_table
+    if not queryset.query.where:
+        with conexao.cursor() as cursor:
+            if conexao.vendor == 'postgresql':
+                cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [tabela])
+            else:
+                cursor.execute("SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s", [tabela])
+            linha = cursor.fetchone()
+        estimativa = linha[0] if linha else None
+    else:
+        plano = json.loads(queryset.order_by().explain(format = 'json'))
+        if conexao.vendor == 'postgresql':
+            estimativa = plano[0]['Plan']['Plan Rows']
+        else:
+            # No MySQL: linhas lidas pelo índice escolhido × fração que passa pelos demais filtros.
+            tabela_plano = plano['query_block'].get('table', {})
+            lidas = tabela_plano.get('rows_examined_per_scan')
+            estimativa = lidas * float(tabela_plano.get('filtered', 100)) / 100 if lidas is not None else None
+    if estimativa is None or estimativa < 0: # reltuples = -1: tabela ainda não analisada.
+        return None
+    return int(estimativa)
+
+
+VAR_DEPOIS = 'depois'
+VAR_ANTES = 'antes'
+# Parâmetros da query string do admin com o cursor da página seguinte e da anterior (veja PaginadorEstimado).
+
+
+def _colunas_da_ordem(queryset):
+    # Converte a ordem do queryset (por exemplo, ['-criado', '-pk']) na lista de pares (campo, decrescente).
+    # Só ordens por nomes de campos são aceitas; a ordem por expressões não tem uma posição que caiba no cursor.
+    colunas = []
+    for item in queryset.query.order_by:
+        if not isinstance(item, str) or item == '?':
+            raise ValueError(f'Ordem sem suporte à paginação por cursor: {item!r}')
+        colunas.append((item.lstrip('-'), item.startswith('-')))
+    return colunas
+
+
+def _campo(modelo, nome):
+    return modelo._meta.pk if nome == 'pk' else modelo._meta.get_field(nome)
+
+
+def codificar_posicao(objeto, colunas):
+    """
+    Gera o cursor opaco com os valores de `objeto` nas colunas da ordenação, em JSON e base64 "url-safe".
+
+    Parâmetros:
+    - objeto (Model): Item da página (o último, para a página seguinte; o primeiro, para a anterior).
+    - colunas (list): Pares (campo, decrescente) da ordenação, na ordem de prioridade.
+    """
+    valores = [_campo(type(objeto), nome).value_to_string(objeto) for nome, _ in colunas]
+    return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode().rstrip('=')
+
+
+def decodificar_posicao(cursor, modelo, colunas):
+    """
+    Converte um cursor gerado por codificar_posicao de volta na lista de valores das colunas da ordenação.
+
+    Lança CursorInvalido se o cursor foi editado à mão ou se foi gerado para outra ordenação (outra quantidade de colunas).
+    """
+    try:
+        preenchido = cursor + '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(preenchido.encode()).decode())
+        if not isinstance(valores, list) or len(valores) != len(colunas):
+            raise ValueError(cursor)
+        return [_campo(modelo, nome).to_python(valor) for (nome, _), valor in zip(colunas, valores)]
+    except (ValueError, UnicodeDecodeError, ValidationError) as e:
+        raise CursorInvalido(cursor) from e
+
+
+def _depois_de(colunas, valores):
+    # Condição "a linha vem depois da posição (x, y, ...)" na ordem das colunas, cada uma com a sua direção:
+    # a > x, ou a = x e b > y, e assim por diante. A primeira coluna ganha ainda o limite redundante a >= x:
+    # sem ele, os bancos não reconhecem o OR como um intervalo do índice e percorrem a tabela desde o começo.
+    primeira, decrescente = colunas[0]
+    condicao = Q(**{f"{primeira}__{'lte' if decrescente else 'gte'}": valores[0]})
+    alternativas = Q()
+    iguais = Q()
+    for (nome, decrescente), valor in zip(colunas, valores):
+        alternativas |= iguais & Q(**{f"{nome}__{'lt' if decrescente else 'gt'}": valor})
+        iguais &= Q(**{nome: valor})
+    return condicao & alternativas
+
+
+def consulta_por_posicao(queryset, tamanho, depois = None, antes = None):
+    """
+    Monta a consulta de uma página de `queryset`, na ordem do próprio queryset, a partir de um cursor de codificar_posicao.
+
+    Retorna o par (consulta, colunas): a consulta é limitada a `tamanho + 1` linhas (o item extra só indica se há mais
+    uma página nessa direção) e, com `antes`, vem na ordem invertida; colunas são os pares (campo, decrescente) da ordem.
+    Lança CursorInvalido se o cursor não corresponder à ordem.
+    """
+    colunas = _colunas_da_ordem(queryset)
+    cursor = antes or depois
+    if cursor:
+        valores = decodificar_posicao(cursor, queryset.model, colunas)
+        if antes:
+            # Para voltar, lemos "depois" da posição na ordem invertida; quem chama desvira o resultado.
+            invertidas = [(nome, not decrescente) for nome, decrescente in colunas]
+            queryset = queryset.filter(_depois_de(invertidas, valores)).order_by(
+                *[f"{'-' if decrescente else ''}{nome}" for nome, decrescente in invertidas])
+        else:
+            queryset = queryset.filter(_depois_de(colunas, valores))
+    return queryset[:tamanho + 1], colunas
+
+
+class PaginadorEstimado(Paginator):
+    """
+    Paginador do admin para tabelas grandes (veja ProdutoAdmin, em core/admin.py).
+
+    1) Acima de ADMIN_CONTAGEM_EXATA_ATE linhas, o total vem de estimar_linhas em vez de um COUNT(*), que no PostgreSQL
+       e no MySQL (InnoDB) percorre a tabela ou o índice inteiro a cada exibição da listagem.
+    2) As páginas são lidas por cursor, como em paginar(), mas sobre a ordem escolhida no admin: a página seguinte
+       começa logo depois dos valores das colunas da ordenação do último item exibido (VAR_DEPOIS), e a anterior logo
+       antes dos do primeiro (VAR_ANTES). O banco desce pelo índice da ordenação direto até essa posição, e a página
+       10.000 custa o mesmo que a primeira. Por isso não há links para números de página: sem o cursor, a página
+       pedida é sempre a primeira (o número só é exibido).
+
+    Parâmetros (além dos do Paginator do Django):
+    - depois (str | None): Cursor do último item da página atual; retorna a página seguinte.
+    - antes (str | None): Cursor do primeiro item da página atual; retorna a página anterior.
+    """
+
+    def __init__(self, object_list, per_page, orphans = 0, allow_empty_first_page = True, depois = None, antes = None):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self.depois = depois
+        self.antes = antes
+
+    @cached_property
+    def count(self):
+        estimativa = estimar_linhas(self.object_list)
+        if estimativa is None or estimativa < settings.ADMIN_CONTAGEM_EXATA_ATE:
+            return super().count
+        return estimativa
+
+    def page(self, number):
+        """
+        Retorna a página a partir do cursor recebido. Além dos atributos do Page do Django, a página tem `proximo` e
+        `anterior`, os cursores das páginas vizinhas (None quando não existem).
+
+        O número não é conferido com num_pages, que depende do total estimado; lança InvalidPage se o cursor é inválido.
+        """
+        if not (self.antes or self.depois):
+            number = 1
+        try:
+            consulta, colunas = consulta_por_posicao(self.object_list, self.per_page, self.depois, self.antes)
+        except CursorInvalido as e:
+            raise InvalidPage(str(e)) from e
+        itens = list(consulta)
+        if self.antes and not itens:
+            # Nada antes do cursor (os itens foram apagados, por exemplo): voltamos para a primeira página.
+            self.antes = None
+            return self.page(1)
+        ha_mais = len(itens) > self.per_page
+        itens = itens[:self.per_page]
+        if self.antes:
+            itens.reverse()
+        pagina = self._get_page(itens, max(int(number), 1), self)
+        pagina.proximo = codificar_posicao(itens[-1], colunas) if itens and (ha_mais or self.antes) else None
+        pagina.anterior = codificar_posicao(itens[0], colunas) if itens and (ha_mais if self.antes else self.depois) else None
+        self.pagina_atual = pagina # A ChangeList do admin só recebe object_list; os cursores são lidos daqui (veja core/admin.py).
+        return pagina
@@ -0,0 +1,137 @@
+# Este módulo verifica os planos de execução (EXPLAIN) das consultas mais frequentes do sistema.
+# Um índice esquecido não quebra nada: a consulta continua funcionando, só que lendo a tabela inteira ("sequential scan"),
+# e o problema só aparece quando o catálogo cresce. verificar_planos pede ao banco o plano de cada consulta e falha
+# se encontrar uma leitura sequencial estimada acima de um limite de linhas.
+# Pode ser usado em testes (a exceção PlanoIneficiente é um AssertionError) ou pelo comando
+# `python manage.py check_query_plans`. Funciona com MySQL (banco padrão), PostgreSQL (Render) e SQLite.
+
+import json
+import re
+
+from django.apps import apps
+from django.db import connections
+from django.utils import timezone
+
+LIMITE_LINHAS = 1000
+# Leituras sequenciais de tabelas pequenas são normais (e até mais rápidas que usar um índice): só acusamos as que,
+# pela estimativa do banco, passam deste número de linhas.
+
+
+class PlanoIneficiente(AssertionError):
+    """Exceção lançada quando uma consulta lê sequencialmente uma tabela com mais linhas que o limite."""
+
+
+class BancoNaoSuportado(Exception):
+    """Exceção lançada quando o banco de dados não é um dos que sabemos ler o plano (MySQL, PostgreSQL e SQLite)."""
+
+
+def consultas_criticas():
+    """
+    Retorna um dicionário {nome: queryset} com as consultas do caminho crítico da aplicação.
+
+    As consultas reproduzem as usadas pelas views: a listagem paginada (primeira página e página seguinte),
+    a busca de um produto pelo slug e o filtro por faixa de preço; e, no admin, uma página seguinte em cada ordenação
+    permitida (veja PaginadorEstimado), que precisa descer pelo índice até o cursor, por mais funda que seja a página.
+    """
+    from .models import Produto
+    from .pagination import _consulta, codificar_cursor, codificar_posicao, consulta_por_posicao
+
+    ativos = Produto.objects.filter(ativo = True)
+    cursor = codificar_cursor(Produto(pk = 1, criado = timezone.now()))
+    referencia = Produto(pk = 1, nome = 'produto', slug = 'produto', criado = timezone.now())
+    admin = {}
+    for ordem in (['-pk'], ['-criado', '-pk'], ['nome', '-pk'], ['slug']): # As ordens montadas pela ChangeList do admin.
+        queryset = Produto.objects.order_by(*ordem)
+        _, colunas = consulta_por_posicao(queryset, 100)
+        admin[f"admin_pagina_seguinte_{ordem[0].lstrip('-')}"] = consulta_por_posicao(
+            queryset, 100, depois = codificar_posicao(referencia, colunas))[0]
+    return {
+        'vitrine': _consulta(ativos, 20),
+        'vitrine_pagina_seguinte': _consulta(ativos, 20, depois = cursor),
+        'produto_por_slug': Produto.objects.filter(slug = 'produto'),
+        'faixa_de_preco': ativos.filter(preco__gte = 10, preco__lte = 100).order_by('preco'),
+        **admin,
+    }
+
+
+def varreduras(queryset):
+    """
+    Retorna a lista de leituras sequenciais do plano de execução de `queryset`, como pares (tabela, linhas estimadas).
+
+    O formato do EXPLAIN depende do banco:
+    - PostgreSQL: EXPLAIN (FORMAT JSON); nós "Seq Scan" com a estimativa "Plan Rows".
+    - MySQL: EXPLAIN FORMAT=JSON; tabelas com access_type "ALL" e a estimativa "rows_examined_per_scan" ("rows" no MariaDB).
+    - SQLite: EXPLAIN QUERY PLAN; linhas "SCAN <tabela>" sem índice. Como o SQLite não estima linhas, usamos o total da tabela.
+
+    Lança BancoNaoSuportado para os demais bancos (por exemplo, Oracle), em vez de dar as consultas como aprovadas.
+    """
+    conexao = connections[queryset.db]
+    if conexao.vendor == 'postgresql':
+        plano = json.loads(queryset.explain(format = 'json'))
+        return list(_varreduras_postgresql(plano[0]['Plan']))
+    if conexao.vendor == 'mysql':
+        plano = json.loads(queryset.explain(format = 'json'))
+        return list(_varreduras_mysql(plano))
+    if conexao.vendor == 'sqlite':
+        return list(_varreduras_sqlite(queryset.explain(), conexao))
+    raise BancoNaoSuportado(
+        f"Não é possível verificar os planos de execução no banco '{conexao.vendor}' (alias '{conexao.alias}'): "
+        "apenas MySQL, PostgreSQL e SQLite são suportados."
+    )
+
+
+def _varreduras_postgresql(no):
+    if no.get('Node Type') == 'Seq Scan':
+        yield no['Relation Name'], int(no.get('Plan Rows', 0))
+    for filho in no.get('Plans', []):
+        yield from _varreduras_postgresql(filho)
+
+
+def _varreduras_mysql(no):
+    # O plano do MySQL é uma árvore de dicionários e listas (query_block, nested_loop, ordering_operation...);
+    # cada tabela lida aparece como um dicionário com a chave access_type.
+    if isinstance(no, list):
+        for item in no:
+            yield from _varreduras_mysql(item)
+    elif isinstance(no, dict):
+        if no.get('access_type') == 'ALL':
+            yield no.get('table_name'), int(no.get('rows_examined_per_scan', no.get('rows', 0)))
+        for valor in no.values():
+            if isinstance(valor, (dict, list)):
+                yield from _varreduras_mysql(valor)
+
+
+def _varreduras_sqlite(plano, conexao):
+    # "SCAN core_produto" é uma leitura sequencial; "SCAN core_produto USING INDEX ..." percorre um índice.
+    # Atenção: no SQLite o filtro ativo = True vira "WHERE ativo" (sem comparação), que o SQLite não casa com índices
+    # iniciados por 'ativo'. A vitrine percorre então core_produto_criado_idx, já na ordem da página ("SCAN ... USING
+    # INDEX", que não é acusado), e a faixa de preço usa core_produto_faixa_preco_idx, que começa pelo preço justamente
+    # por isso. No MySQL o Django gera "ativo = 1" e o PostgreSQL casa colunas booleanas com o índice.
+    for tabela in re.findall(r'SCAN (\w+)$', plano, flags = re.MULTILINE):
+        modelo = next((m for m in apps.get_models() if m._meta.db_table == tabela), None)
+        linhas = modelo._base_manager.using(conexao.alias).count() if modelo else 0
+        yield tabela, linhas
+
+
+def verificar_planos(consultas = None, limite = LIMITE_LINHAS):
+    """
+    Verifica os planos de execução das consultas e lança PlanoIneficiente se alguma ler uma tabela inteira.
+
+    Parâmetros:
+    - consultas (dict[str, QuerySet] | None): Consultas a verificar; por padrão, consultas_criticas().
+    - limite (int): Quantidade de linhas estimadas a partir da qual uma leitura sequencial é considerada um problema.
+
+    Retorna um dicionário {nome: varreduras} com as leituras sequenciais encontradas (inclusive as abaixo do limite),
+    útil para exibir um relatório.
+    """
+    consultas = consultas_criticas() if consultas is None else consultas
+    encontradas = {nome: varreduras(queryset) for nome, queryset in consultas.items()}
+    problemas = [
+        f"{nome}: leitura sequencial de {tabela} (~{linhas} linhas)"
+        for nome, lista in encontradas.items()
+        for tabela, linhas in lista
+        if linhas > limite
+    ]
+    if problemas:
+        raise PlanoIneficiente("Consultas sem índice adequado:\n" + "\n".join(problemas))
+    return encontradas
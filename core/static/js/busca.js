@@ -0,0 +1,43 @@
+// Autocompletar do campo de busca de produtos (templates index.html e busca.html).
+// A cada pausa na digitação, pede à view sugestoes (/busca/sugestoes/?q=...) os produtos mais parecidos com o termo e
+// preenche a <datalist> ligada ao campo. Escolher uma sugestão abre a página do produto; Enter faz a busca completa.
+(function () {
+    var campo = document.getElementById('busca-termo');
+    var lista = document.getElementById('busca-sugestoes');
+    if (!campo || !lista) {
+        return;
+    }
+    var urls = {}; // Nome sugerido -> URL da página do produto.
+    var espera = null;
+    var ultimo = '';
+
+    campo.addEventListener('input', function () {
+        var termo = campo.value.trim();
+        if (urls[campo.value]) { // O usuário escolheu uma das sugestões.
+            window.location = urls[campo.value];
+            return;
+        }
+        clearTimeout(espera);
+        espera = setTimeout(function () { // Espera 150 ms sem digitação antes de pedir as sugestões.
+            if (termo.length < 2 || termo === ultimo) {
+                return;
+            }
+            ultimo = termo;
+            fetch(campo.dataset.sugestoes + '?q=' + encodeURIComponent(termo))
+                .then(function (resposta) { return resposta.json(); })
+                .then(function (dados) {
+                    if (termo !== ultimo) {
+                        return; // Chegou depois da resposta de um termo mais recente.
+                    }
+                    lista.innerHTML = '';
+                    urls = {};
+                    dados.sugestoes.forEach(function (sugestao) {
+                        var opcao = document.createElement('option');
+                        opcao.value = sugestao.nome;
+                        lista.appendChild(opcao);
+                        urls[sugestao.nome] = sugestao.url;
+                    });
+                });
+        }, 150);
+    });
+})();
@@ -0,0 +1,106 @@
+# Este módulo implementa a fila local de geração das versões redimensionadas ("renditions") das imagens de Produto.
+# Por padrão, o django-pictures gera todas as combinações de proporção × largura × densidade × tipo de arquivo
+# dentro da própria requisição que salvou a imagem, o que pode levar vários segundos (e, em produção, dezenas de uploads ao GCS).
+# Aqui substituímos o processador padrão (PICTURES["PROCESSOR"] em settings.py) por enfileirar_versoes, que apenas
+# grava uma TarefaImagem no banco de dados e retorna imediatamente. O trabalho pesado é feito depois pelo comando
+# `python manage.py process_pictures`, que consome a fila usando um pool de processos (sem Redis, RabbitMQ ou outro broker).
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image
+from pictures import utils
+
+ARMAZENAMENTO_PADRAO = ('django.core.files.storage.DefaultStorage', [], {})
+# Referência serializável ao armazenamento padrão do Django (STORAGES['default']).
+# A desconstrução do GoogleCloudStorage inclui o objeto de credenciais, que não pode ser gravado em JSON;
+# por isso, quando a imagem usa o armazenamento padrão, guardamos apenas esta referência e o worker o reconstrói a partir das settings.
+
+
+def _referencia_armazenamento(armazenamento):
+    # Substitui a desconstrução do armazenamento padrão pela referência serializável ARMAZENAMENTO_PADRAO.
+    if tuple(armazenamento) == tuple(default_storage.deconstruct()):
+        return ARMAZENAMENTO_PADRAO
+    return armazenamento
+
+
+def _referencia_versao(versao):
+    # Uma versão desconstruída tem a forma (classe, (arquivo, tipo, proporção, armazenamento, largura), {}).
+    caminho, args, kwargs = versao
+    args = list(args)
+    args[3] = _referencia_armazenamento(args[3])
+    return caminho, args, kwargs
+
+
+def enfileirar_versoes(storage, file_name, new = None, old = None):
+    """
+    Processador do django-pictures que enfileira a geração/remoção das versões em vez de executá-la.
+
+    Recebe os mesmos argumentos de pictures.tasks.process_picture (veja PICTURES["PROCESSOR"] em settings.py):
+    - storage (tuple): Armazenamento desconstruído onde está a imagem original.
+    - file_name (str): Nome do arquivo original no armazenamento.
+    - new (list[tuple]): Versões desconstruídas que devem ser geradas.
+    - old (list[tuple]): Versões desconstruídas que devem ser apagadas.
+
+    A tarefa é gravada na mesma transação que salvou o produto: se o salvamento for desfeito, a tarefa também é.
+    """
+    from .armazenamento import em_uso
+    from .models import TarefaImagem
+
+    if settings.PRODUTO_VERSOES_SOB_DEMANDA:
+        new = [] # As versões são geradas quando pedidas pela primeira vez (core/versoes.py); a fila só apaga versões antigas.
+    if new and not old and em_uso(file_name):
+        # Um arquivo endereçado por conteúdo já usado por outro produto (o mesmo conteúdo enviado de novo; veja core/armazenamento.py)
+        # já tem as suas versões geradas, ou na fila: não há nada a fazer.
+        return
+    if not new and not old:
+        return
+    TarefaImagem.objects.create(
+        armazenamento = _referencia_armazenamento(storage),
+        arquivo = file_name,
+        novas = [_referencia_versao(versao) for versao in new or []],
+        antigas = [_referencia_versao(versao) for versao in old or []],
+    )
+
+
+def gerar_versoes(armazenamento, arquivo, novas, antigas):
+    """
+    Gera as versões `novas` da imagem `arquivo` e apaga as versões `antigas`.
+
+    Esta função é executada nos processos filhos do comando process_pictures; por isso recebe apenas dados
+    serializáveis (as desconstruções gravadas na TarefaImagem) e não acessa o banco de dados.
+    """
+    armazenamento = utils.reconstruct(*armazenamento)
+    if novas:
+        with armazenamento.open(arquivo) as fs:
+            with Image.open(fs) as imagem:
+                for versao in novas:
+                    utils.reconstruct(*versao).save(imagem)
+
+    for versao in antigas:
+        utils.reconstruct(*versao).delete()
+
+
+def pool_de_processos(processos = None):
+    """
+    Cria o pool de processos dos comandos que dividem o trabalho do Pillow entre os núcleos (process_pictures, import_products).
+
+    Parâmetros:
+    - processos (int | None): Quantidade de processos (padrão: número de CPUs).
+
+    Os processos são iniciados por 'spawn', e não por fork: o ProcessPoolExecutor só cria os filhos no primeiro submit,
+    quando o processo pai já reabriu a conexão com o banco, e um filho criado por fork herdaria esse socket (fechá-lo no
+    filho encerraria também a sessão do pai). Cada filho começa um interpretador novo e chama django.setup(); os filhos
+    não acessam o banco.
+    """
+    return ProcessPoolExecutor(max_workers = processos, mp_context = multiprocessing.get_context('spawn'), initializer = django.setup)
+
+
+def versoes_pendentes(arquivo):
+    """Retorna True se ainda há tarefas não concluídas para as versões da imagem `arquivo`."""
+    from .models import TarefaImagem
+
+    return TarefaImagem.objects.filter(arquivo = arquivo, estado__in = TarefaImagem.ESTADOS_ABERTOS).exists()
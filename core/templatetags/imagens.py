@@ -0,0 +1,146 @@
+# Tags de template para exibir as imagens dos produtos de forma responsiva.
+# Em vez de entregar o arquivo original (que pode ter milhares de pixels de largura), a tag imagem_responsiva
+# gera um elemento <picture> com as versões redimensionadas ("renditions") que o PictureField de Produto.imagem
+# já produz para cada breakpoint e densidade de pixels. O navegador escolhe a menor versão suficiente para a tela.
+# Uso no template:
+#     {% load imagens %}
+#     {% imagem_responsiva produto.imagem alt=produto.nome css_class="img-fluid" %}
+
+import math
+from fractions import Fraction
+
+from pathlib import Path
+
+from django import template
+from django.conf import settings
+from django.urls import reverse
+from PIL import Image
+from pictures import utils
+
+from ..enderecos import url_midia
+from ..tasks import versoes_pendentes
+from ..versoes import formato_suportado, url_sob_demanda
+
+register = template.Library()
+
+TIPOS_MIME = {'JPG': 'image/jpeg'}
+# Tipos de arquivo aceitos pelo django-pictures cujo nome não coincide com um formato do Pillow.
+# Para os demais (PNG, WEBP, AVIF...), o tipo MIME é obtido de PIL.Image.MIME.
+
+
+def _tipo_mime(tipo):
+    Image.init() # Garante que o Pillow registrou todos os formatos disponíveis (inclusive plugins como AVIF).
+    return TIPOS_MIME.get(tipo, Image.MIME.get(tipo, f'image/{tipo.lower()}'))
+
+
+@register.inclusion_tag('imagem_responsiva.html')
+def imagem_responsiva(field_file, alt = '', sizes = None, ratio = None, css_class = ''):
+    """
+    Renderiza um <picture> com <source srcset sizes> para cada tipo de arquivo configurado no PictureField.
+
+    Parâmetros:
+    - field_file (PictureFieldFile): O arquivo de imagem do modelo (por exemplo, produto.imagem).
+    - alt (str): Texto alternativo da imagem.
+    - sizes (str | None): Valor do atributo sizes. Se omitido, é calculado a partir dos breakpoints do campo.
+    - ratio (str | None): Proporção desejada (por exemplo, "1/1"); None usa a proporção original da imagem.
+    - css_class (str): Classes CSS aplicadas ao <img>.
+
+    Os atributos width/height do <img> vêm de image_width/image_height (sem abrir o arquivo), para que o navegador
+    reserve o espaço da imagem antes de baixá-la. Se o campo não tiver versões geradas para a proporção pedida
+    (por exemplo, imagem menor que todos os breakpoints), a tag recorre ao arquivo original em um <img> simples.
+    """
+    contexto = {'alt': alt, 'css_class': css_class, 'fontes': [], 'src': None, 'width': None, 'height': None, 'sizes': sizes}
+    if not field_file:
+        return contexto
+
+    field = field_file.field
+    instancia = field_file.instance
+    largura = getattr(instancia, field.width_field, None) if field.width_field else None
+    altura = getattr(instancia, field.height_field, None) if field.height_field else None
+    if largura and altura:
+        contexto['width'] = largura
+        contexto['height'] = math.floor(largura / Fraction(ratio)) if ratio else altura
+
+    if largura and altura and versoes_pendentes(field_file.name):
+        # As versões ainda estão sendo geradas pela fila (core/tasks.py): exibimos placeholders até que fiquem prontas.
+        # Quando a fila conclui, process_pictures descarta o fragmento do produto do cache do catálogo e esta tag é
+        # renderizada de novo. Com o LocMemCache (desenvolvimento), o cache não é compartilhado com o worker da fila, e o
+        # fragmento com placeholders só é renovado após CATALOGO_CACHE_TIMEOUT.
+        return _com_placeholders(contexto, field_file, ratio or Fraction(largura, altura), sizes)
+
+    try:
+        por_tipo = field_file.aspect_ratios[ratio]
+        # Dicionário {tipo de arquivo: {largura: Picture}} com todas as versões previstas para a proporção pedida.
+    except (KeyError, OSError, ValueError):
+        # Proporção não configurada no campo, ou arquivo original ausente (sem largura/altura em cache): usamos o original.
+        contexto['src'] = url_midia(field_file.name)
+        return contexto
+
+    url = _url_sob_demanda(field_file) if settings.PRODUTO_VERSOES_SOB_DEMANDA else lambda versao: url_midia(versao.name)
+    # As URLs são montadas a partir dos nomes, sem chamar o armazenamento (veja core/enderecos.py).
+    for tipo, versoes in por_tipo.items():
+        if versoes and formato_suportado(tipo): # Sem suporte a AVIF no Pillow, as versões AVIF não existem nem são oferecidas.
+            contexto['fontes'].append({
+                'tipo': _tipo_mime(tipo),
+                'srcset': ', '.join(f'{url(versoes[w])} {w}w' for w in sorted(versoes)),
+                'versoes': versoes,
+            })
+
+    if not contexto['fontes']:
+        contexto['src'] = url_midia(field_file.name)
+        return contexto
+
+    # O src do <img> (usado por navegadores sem suporte a srcset) aponta para a versão do último tipo configurado,
+    # que por convenção é o mais compatível, com a menor largura que cobre o maior breakpoint do campo.
+    versoes = contexto['fontes'][-1]['versoes']
+    alvo = max(field.breakpoints.values())
+    largura_src = min((w for w in versoes if w >= alvo), default = max(versoes))
+    contexto['src'] = url(versoes[largura_src])
+    contexto['sizes'] = sizes or utils.sizes(field = field, container_width = field.container_width)
+    return contexto
+
+
+def _url_sob_demanda(field_file):
+    # No modo sob demanda (core/versoes.py), as versões já geradas são apontadas direto para o armazenamento e as demais
+    # para a view versao_imagem, que as gera no primeiro pedido. Uma única consulta traz as versões prontas da imagem.
+    from ..models import VersaoImagem
+
+    prontas = set(VersaoImagem.objects.filter(arquivo = field_file.name, pronta = True).values_list('nome', flat = True))
+
+    def url(versao):
+        return url_midia(versao.name) if versao.name in prontas else url_sob_demanda(versao)
+    return url
+
+
+def _com_placeholders(contexto, field_file, proporcao, sizes):
+    # Preenche o contexto com as URLs de placeholder do django-pictures (pictures.urls), geradas na hora
+    # com o tamanho exato de cada versão prevista, no lugar das versões que ainda não existem.
+    field = field_file.field
+    proporcao = Fraction(proporcao)
+    larguras = utils.source_set(
+        (contexto['width'], contexto['height']),
+        ratio = proporcao,
+        max_width = field.container_width,
+        cols = field.grid_columns,
+    )
+    if not larguras:
+        contexto['src'] = url_midia(field_file.name)
+        return contexto
+
+    tipo = field.file_types[-1]
+
+    def url(largura):
+        return reverse('pictures:placeholder', kwargs = {
+            'alt': Path(field_file.name).stem,
+            'ratio': f'{proporcao.numerator}x{proporcao.denominator}',
+            'width': largura,
+            'file_type': tipo.lower(),
+        })
+
+    contexto['fontes'] = [{
+        'tipo': _tipo_mime(tipo),
+        'srcset': ', '.join(f'{url(w)} {w}w' for w in sorted(larguras)),
+    }]
+    contexto['src'] = url(min((w for w in larguras if w >= max(field.breakpoints.values())), default = max(larguras)))
+    contexto['sizes'] = sizes or utils.sizes(field = field, container_width = field.container_width)
+    return contexto
@@ -1,3 +1,1278 @@
-from django.test import TestCase
+import asyncio
+import csv
+import hashlib
+import importlib
+import io
+import json
+import os
+import posixpath
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import caches
+from django.core.exceptions import SynchronousOnlyOperation
+from django.core.files.base import ContentFile
+from django.core.mail import EmailMessage
+from django.core.mail.backends import locmem
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.templatetags.static import static
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from PIL import Image
+
+from Django2 import urls as urls_do_projeto
+
+from . import urls as urls_do_core
+from . import busca, caixa_saida, carga, envios, estoque, instrumentacao, medicao_http, versoes, views_async
+from .armazenamento import armazenamento_produtos
+from .cache_catalogo import CHAVE_GERACAO, chave_produto, pagina_do_catalogo
+from .enderecos import url_midia, validade_garantida
+from .importacao import COLUNAS_EXPORTACAO, linhas_exportacao
+from .management.commands.process_pictures import Command as ProcessPictures
+from .management.commands.upload_media import DestinoLocal, sincronizar
+from .tasks import ARMAZENAMENTO_PADRAO
+from .facetas import celula, contagens, cubo, ler_filtros
+from .pagination import CursorInvalido, codificar_cursor, decodificar_cursor, paginar
+from .forms import ProdutoModelForm
+from .models import ContagemProdutos, EnvioImagem, ImagemConteudo, MensagemEmail, Produto, Reserva, TarefaImagem, VersaoImagem
+from .planos import BancoNaoSuportado, consultas_criticas, verificar_planos
+
+VIEWS_ASSINCRONAS = {
+    'index': views_async.index,
+    'contato': views_async.contato,
+    'produto': views_async.produto,
+    'produto_detalhe': views_async.produto_detalhe,
+}
+
+
+async def _espera(request):
+    # View de teste que apenas aguarda: se os middlewares forem todos assíncronos, várias delas rodam ao mesmo tempo.
+    await asyncio.sleep(0.3)
+    return HttpResponse('ok')
+
+
+urlpatterns = [
+    path('espera/', _espera),
+    path('', include([
+        path(str(rota.pattern), VIEWS_ASSINCRONAS.get(rota.name, rota.callback), name = rota.name)
+        for rota in urls_do_core.urlpatterns
+    ])),
+    *[rota for rota in urls_do_projeto.urlpatterns if getattr(rota, 'urlconf_name', None) != 'core.urls'],
+]
+# As mesmas rotas do projeto, com as views assíncronas de core/views_async.py, como em core/urls.py quando settings.ASGI é True.
+
+MIDDLEWARE_ASGI = [middleware for middleware in settings.MIDDLEWARE if middleware not in settings.MIDDLEWARE_SOMENTE_WSGI]
+# Os middlewares usados sob ASGI (veja Django2/settings.py).
+
+def _imagem_png(largura = 8, altura = 6, cor = 'red'):
+    # Bytes de uma imagem PNG pequena, para os testes de envio e armazenamento.
+    buffer = io.BytesIO()
+    Image.new('RGB', (largura, altura), cor).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class ComMidiaTemporaria(TestCase):
+    """Base dos testes que gravam arquivos de mídia: MEDIA_ROOT aponta para um diretório temporário, apagado ao final."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.midia = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.midia, ignore_errors = True)
+        configuracao = override_settings(MEDIA_ROOT = cls.midia)
+        configuracao.enable()
+        cls.addClassCleanup(configuracao.disable)
+        super().setUpClass()
+
+
+SEM_MANIFESTO = {**settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}}
+# Os testes rodam com DEBUG = False e sem collectstatic: {% static %} não pode depender do manifesto (staticfiles.json).
+
+
+@override_settings(ROOT_URLCONF = 'core.tests', MIDDLEWARE = MIDDLEWARE_ASGI, STORAGES = SEM_MANIFESTO)
+class ViewsAssincronasTests(TestCase):
+    """Garante que as views de core/views_async.py não fazem chamadas síncronas no loop de eventos nem passam por middlewares síncronos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('cliente', 'cliente@example.com', 'senha')
+        cls.produto = Produto.objects.create(nome = 'Camiseta Azul', preco = 50, estoque = 3)
+
+    def test_middlewares_sao_assincronos(self):
+        for middleware in MIDDLEWARE_ASGI:
+            with self.subTest(middleware = middleware):
+                self.assertTrue(getattr(import_string(middleware), 'async_capable', True))
+                # O Django considera async_capable = True quando o atributo não existe (MiddlewareMixin o define).
+
+    async def test_requisicoes_simultaneas_se_sobrepoem(self):
+        # Com um middleware síncrono, as quatro esperas de 0,3 s seriam feitas uma de cada vez (1,2 s ou mais).
+        inicio = time.perf_counter()
+        respostas = await asyncio.gather(*[self.async_client.get('/espera/') for _ in range(4)])
+        self.assertEqual([r.status_code for r in respostas], [200] * 4)
+        self.assertLess(time.perf_counter() - inicio, 0.9)
+
+    async def test_index(self):
+        try:
+            response = await self.async_client.get('/')
+        except SynchronousOnlyOperation as e:
+            self.fail(f"Chamada síncrona no loop de eventos: {e}")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Camiseta Azul')
+
+    async def test_produto_detalhe(self):
+        try:
+            response = await self.async_client.get(f'/produto/{self.produto.slug}/')
+        except SynchronousOnlyOperation as e:
+            self.fail(f"Chamada síncrona no loop de eventos: {e}")
+        self.assertEqual(response.status_code, 200)
+
+    async def test_contato(self):
+        dados = {'nome': 'Cliente', 'email': 'cliente@example.com', 'assunto': 'Dúvida', 'mensagem': 'Olá'}
+        try:
+            response = await self.async_client.get('/contato/')
+            self.assertEqual(response.status_code, 200)
+            response = await self.async_client.post('/contato/', dados)
+        except SynchronousOnlyOperation as e:
+            self.fail(f"Chamada síncrona no loop de eventos: {e}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await MensagemEmail.objects.acount(), 1)
+
+    async def test_produto(self):
+        try:
+            response = await self.async_client.get('/produto/')
+            self.assertRedirects(response, '/', fetch_redirect_response = False) # Anônimo: volta para a vitrine.
+            await self.async_client.aforce_login(self.usuario)
+            response = await self.async_client.get('/produto/')
+        except SynchronousOnlyOperation as e:
+            self.fail(f"Chamada síncrona no loop de eventos: {e}")
+        self.assertEqual(response.status_code, 200)
+
+    async def test_produto_com_envio_de_outro_usuario(self):
+        outro = await User.objects.acreate_user('outro', 'outro@example.com', 'senha')
+        envio = await EnvioImagem.objects.acreate(usuario = outro, nome = 'foto.jpg', tamanho = 3, arquivo = 'produtos/foto.jpg')
+        await self.async_client.aforce_login(self.usuario)
+        dados = {'nome': 'Camiseta Verde', 'preco': '40', 'estoque': '1', 'envio': str(envio.pk)}
+        response = await self.async_client.post('/produto/', dados)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(await Produto.objects.filter(nome = 'Camiseta Verde').aexists())
+        self.assertTrue(await EnvioImagem.objects.filter(pk = envio.pk).aexists())
+
+
+class PlanosDeExecucaoTests(TestCase):
+    """Garante que as consultas do caminho crítico (core/planos.py) não leem a tabela de produtos inteira."""
+
+    LIMITE = 100
+    # Bem abaixo da quantidade de produtos criada abaixo: qualquer leitura sequencial de core_produto é acusada.
+
+    @classmethod
+    def setUpTestData(cls):
+        Produto.objects.bulk_create([
+            Produto(nome = f'Produto {numero}', slug = f'produto-{numero}', preco = numero % 200, estoque = 1, ativo = bool(numero % 3))
+            for numero in range(3 * cls.LIMITE)
+        ])
+
+    def test_consultas_criticas_usam_indices(self):
+        try:
+            encontradas = verificar_planos(consultas_criticas(), limite = self.LIMITE)
+        except BancoNaoSuportado as e:
+            self.skipTest(str(e))
+        self.assertEqual(set(encontradas), set(consultas_criticas()))
+
+    def test_leitura_sequencial_e_acusada(self):
+        # Sem índice em 'estoque', o filtro lê a tabela inteira: verificar_planos precisa falhar.
+        if connection.vendor != 'sqlite':
+            self.skipTest("Nos demais bancos, a escolha entre índice e leitura sequencial depende das estatísticas.")
+        with self.assertRaisesMessage(AssertionError, 'leitura sequencial de core_produto'):
+            verificar_planos({'sem_indice': Produto.objects.filter(estoque = 5)}, limite = self.LIMITE)
+
+
+class InstrumentacaoTests(TestCase):
+    """Garante que só as chamadas ao armazenamento de mídia são contadas como "arm" no Server-Timing."""
+
+    def _medir(self, funcao):
+        token = instrumentacao._atual.set(instrumentacao.Medicao())
+        try:
+            funcao()
+            return instrumentacao._atual.get().armazenamento_chamadas
+        finally:
+            instrumentacao._atual.reset(token)
+
+    @override_settings(STORAGES = SEM_MANIFESTO)
+    def test_estaticos_nao_sao_contados(self):
+        # StaticFilesStorage herda de FileSystemStorage, a classe do armazenamento padrão no desenvolvimento.
+        self.assertEqual(self._medir(lambda: static('css/styles.css')), 0)
+
+    def test_armazenamento_de_midia_e_contado(self):
+        # O exists delegado ao armazenamento padrão está dentro da chamada medida e não é contado de novo.
+        self.assertEqual(self._medir(lambda: armazenamento_produtos.exists('produtos/inexistente.jpg')), 1)
+
+    def test_conexoes_e_pools_de_outros_processos(self):
+        diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, diretorio, ignore_errors = True)
+        for processo, idade in (('101-1', 0), ('102-1', instrumentacao.RECENTE + 60)):
+            caminho = os.path.join(diretorio, f'{processo}.json')
+            with open(caminho, 'w', encoding = 'utf-8') as arquivo:
+                json.dump({'requisicoes': {}, 'views': {}, 'conexoes': {'default': 2},
+                           'pools': {'default': {'pool_size': 4, 'pool_available': 3, 'requests_num': 50}}}, arquivo)
+            os.utime(caminho, (time.time() - idade, time.time() - idade))
+        self.addCleanup(setattr, instrumentacao, '_arquivo', instrumentacao._arquivo) # O arquivo deste processo não fica no diretório apagado.
+        with override_settings(METRICAS_DIRETORIO = diretorio):
+            texto = instrumentacao.texto_prometheus()
+        # Os contadores somam todos os processos, inclusive este, se o seu arquivo foi criado agora no diretório temporário.
+        proprias = instrumentacao._totais['conexoes'].get('default', 0) if instrumentacao._arquivo.startswith(diretorio) else 0
+        self.assertIn(f'django2_conexoes_abertas_total{{banco="default"}} {4 + proprias}', texto)
+        self.assertIn('django2_pool_conexoes{banco="default",processo="101-1"} 4', texto)
+        self.assertIn('django2_pool_pedidos_total{banco="default",processo="101-1"} 50', texto)
+        self.assertIn('django2_pool_esperando{banco="default",processo="101-1"} 0', texto) # Estatística ausente: zero.
+        self.assertNotIn('processo="102-1"', texto) # Processo que não grava há mais de RECENTE segundos.
+
+    def test_conexoes_persistentes_verificadas(self):
+        self.assertTrue(settings.DATABASES['default']['CONN_HEALTH_CHECKS'])
+
+
+class ProdutoModelFormTests(TestCase):
+    """Garante que o formulário de produto só aceita os envios em partes do próprio usuário."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dono = User.objects.create_user('dono', 'dono@example.com', 'senha')
+        cls.outro = User.objects.create_user('outro', 'outro@example.com', 'senha')
+        cls.envio = EnvioImagem.objects.create(usuario = cls.dono, nome = 'foto.jpg', tamanho = 3, arquivo = 'produtos/foto.jpg')
+
+    def _form(self, usuario):
+        return ProdutoModelForm({'nome': 'Camiseta', 'preco': '50', 'estoque': '1', 'envio': str(self.envio.pk)}, usuario = usuario)
+
+    def test_envio_do_proprio_usuario(self):
+        form = self._form(self.dono)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['envio'], self.envio)
+
+    def test_envio_de_outro_usuario(self):
+        form = self._form(self.outro)
+        self.assertFalse(form.is_valid())
+        self.assertIn('envio', form.errors)
+
+
+class ContatoTests(TestCase):
+    """View síncrona de contato (core/views.py)."""
+
+    def test_formulario_invalido_nao_envia(self):
+        response = self.client.post('/contato/', {'nome': 'Cliente', 'email': 'invalido', 'assunto': '', 'mensagem': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Erro ao enviar formulário!')
+        self.assertEqual(MensagemEmail.objects.count(), 0)
+
+
+class EnviosTests(ComMidiaTemporaria):
+    """Envio em partes (core/envios.py) com o armazenamento endereçado por conteúdo."""
+
+    def _enviar(self, dados, parte = 40):
+        envio = envios.criar_envio('foto.png', len(dados))
+        for deslocamento in range(0, len(dados), parte):
+            pedaco = dados[deslocamento:deslocamento + parte]
+            envio = envios.receber_parte(envio, deslocamento, io.BytesIO(pedaco), len(pedaco))
+        return envio
+
+    def test_mesmo_conteudo_enviado_duas_vezes(self):
+        dados = _imagem_png()
+        sha256 = hashlib.sha256(dados).hexdigest()
+        primeiro = self._enviar(dados)
+        segundo = self._enviar(dados) # O arquivo já existe: o armazenamento não relê o conteúdo.
+        self.assertEqual(primeiro.arquivo, segundo.arquivo)
+        self.assertEqual(primeiro.sha256, sha256)
+        self.assertEqual(segundo.sha256, sha256)
+        self.assertEqual((segundo.largura, segundo.altura), (8, 6))
+        with armazenamento_produtos.open(segundo.arquivo) as arquivo:
+            self.assertEqual(arquivo.read(), dados)
+        self.assertEqual(EnvioImagem.objects.get(pk = segundo.pk).partes, []) # As partes foram apagadas.
+
+    def test_envios_abandonados_expiram(self):
+        dados = _imagem_png()
+        incompleto = envios.criar_envio('foto.png', len(dados))
+        incompleto = envios.receber_parte(incompleto, 0, io.BytesIO(dados[:40]), 40)
+        parte, = incompleto.partes
+        concluido = self._enviar(_imagem_png(cor = 'blue'))
+        recente = envios.criar_envio('foto.png', len(dados))
+        antigo = timezone.now() - timedelta(seconds = settings.ENVIO_VALIDADE + 1)
+        EnvioImagem.objects.filter(pk__in = [incompleto.pk, concluido.pk]).update(modificado = antigo)
+        self.assertEqual(envios.expirar_envios(), 2)
+        self.assertEqual(list(EnvioImagem.objects.values_list('pk', flat = True)), [recente.pk])
+        self.assertFalse(armazenamento_produtos.exists(parte))
+        self.assertFalse(armazenamento_produtos.exists(concluido.arquivo)) # Nenhum produto usou o arquivo final.
+
+
+class SlugsTests(TestCase):
+    """Slugs únicos dos produtos (slug_unico, em core/models.py) e a migração que os tornou únicos."""
+
+    def test_slug_reservado_recebe_sufixo(self):
+        self.assertEqual(Produto.objects.create(nome = 'Envios', preco = 10, estoque = 1).slug, 'envios-2')
+
+    def test_migracao_nao_usa_slugs_reservados(self):
+        Produto.objects.bulk_create([Produto(nome = 'Envios', slug = f'provisorio-{numero}', preco = 10, estoque = 1) for numero in range(2)])
+        migracao = importlib.import_module('core.migrations.0007_indices_produto')
+        migracao.desduplicar_slugs(apps, None)
+        self.assertEqual(sorted(Produto.objects.values_list('slug', flat = True)), ['envios-2', 'envios-3'])
+
+
+class FacetasTests(TestCase):
+    """Cubo das contagens das facetas (core/facetas.py)."""
+
+    def setUp(self):
+        caches['catalogo'].clear()
+
+    def _esperado(self):
+        # As contagens calculadas direto dos produtos, sem o cubo.
+        esperado = {}
+        for ativo, preco, estoque in Produto.objects.values_list('ativo', 'preco', 'estoque'):
+            chave = celula(ativo, preco, estoque)
+            esperado[chave] = esperado.get(chave, 0) + 1
+        return esperado
+
+    def _cubo(self):
+        return {(ativo, faixa, com_estoque): quantidade for ativo, faixa, com_estoque, quantidade in cubo() if quantidade}
+
+    def test_gravacao_em_tabela_ja_preenchida(self):
+        # Produtos gravados sem signals, como em um banco anterior à migração 0014, que então monta o cubo.
+        Produto.objects.bulk_create([
+            Produto(nome = f'Produto {numero}', slug = f'produto-{numero}', preco = 30 * numero, estoque = numero % 3, ativo = numero != 4)
+            for numero in range(10)
+        ])
+        migracao = importlib.import_module('core.migrations.0014_contagem_produtos')
+        migracao.preencher_contagens(apps, None)
+
+        produto = Produto.objects.get(slug = 'produto-1')
+        produto.estoque = 0
+        produto.save()
+        Produto.objects.create(nome = 'Produto novo', preco = 10, estoque = 5)
+        Produto.objects.get(slug = 'produto-2').delete()
+
+        self.assertEqual(self._cubo(), self._esperado())
+        self.assertFalse(ContagemProdutos.objects.filter(quantidade__lt = 0).exists())
+
+    def test_quantidades_respeitam_os_demais_filtros(self):
+        Produto.objects.create(nome = 'Barato em estoque', preco = 10, estoque = 2)
+        Produto.objects.create(nome = 'Barato esgotado', preco = 10, estoque = 0)
+        Produto.objects.create(nome = 'Caro em estoque', preco = 5000, estoque = 1)
+        estoque, = contagens(ler_filtros({}), ['estoque'])
+        self.assertEqual([opcao['quantidade'] for opcao in estoque['opcoes']], [2, 1])
+        preco, = contagens(ler_filtros({'estoque': 'sem'}), ['preco'])
+        self.assertEqual(sum(opcao['quantidade'] for opcao in preco['opcoes']), 1)
+        self.assertEqual(self._cubo(), self._esperado())
+
+
+class FilaDeImagensTests(TestCase):
+    """Fila de imagens (comando process_pictures), com um pool de threads no lugar do pool de processos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.produto = Produto.objects.create(nome = 'Caneca', preco = 30, estoque = 2)
+        Produto.objects.filter(pk = cls.produto.pk).update(imagem = 'produtos/caneca.png')
+
+    def _processar(self, tarefa):
+        comando = ProcessPictures(stdout = io.StringIO(), stderr = io.StringIO())
+        reservadas = comando.reservar(10)
+        self.assertEqual([t.pk for t in reservadas], [tarefa.pk])
+        with ThreadPoolExecutor(1) as pool, self.captureOnCommitCallbacks(execute = True):
+            comando.processar(pool, reservadas, max_tentativas = 3, espera = 30)
+        tarefa.refresh_from_db()
+        return comando
+
+    def test_conclusao_descarta_o_fragmento(self):
+        caches['catalogo'].set(chave_produto(self.produto.pk), '<tr>placeholder</tr>')
+        tarefa = TarefaImagem.objects.create(armazenamento = ARMAZENAMENTO_PADRAO, arquivo = 'produtos/caneca.png')
+        self._processar(tarefa)
+        self.assertEqual(tarefa.estado, TarefaImagem.CONCLUIDA)
+        self.assertIsNone(caches['catalogo'].get(chave_produto(self.produto.pk)))
+
+    def test_falha_espera_antes_de_tentar_de_novo(self):
+        versao = ('pictures.models.PillowPicture', ['produtos/inexistente.png', 'WEBP', None, ARMAZENAMENTO_PADRAO, 100], {})
+        tarefa = TarefaImagem.objects.create(armazenamento = ARMAZENAMENTO_PADRAO, arquivo = 'produtos/inexistente.png', novas = [versao])
+        comando = self._processar(tarefa)
+        self.assertEqual((tarefa.estado, tarefa.tentativas), (TarefaImagem.PENDENTE, 1))
+        self.assertGreater(tarefa.proxima_tentativa, timezone.now() + timedelta(seconds = 25))
+        self.assertEqual(comando.reservar(10), []) # Ainda não chegou a hora da próxima tentativa.
+        TarefaImagem.objects.filter(pk = tarefa.pk).update(proxima_tentativa = timezone.now())
+        self.assertEqual([t.pk for t in comando.reservar(10)], [tarefa.pk])
+
+
+@override_settings(STORAGES = SEM_MANIFESTO)
+class PaginacaoDoAdminTests(TestCase):
+    """Listagem de produtos do admin paginada por cursor (PaginadorEstimado, em core/pagination.py), sem OFFSET."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'senha')
+        Produto.objects.bulk_create([
+            Produto(nome = f'Produto {numero % 7}', slug = f'produto-{numero}', preco = 10, estoque = 1)
+            for numero in range(250)
+        ])
+        # Nomes repetidos: na ordem por nome, o id desempata os produtos (a ChangeList acrescenta '-pk').
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _percorrer(self, url):
+        # Segue os links "Próxima" até a última página e retorna os ids exibidos, na ordem.
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            cl = response.context['cl']
+            ids += [produto.pk for produto in cl.result_list]
+            url = cl.url_proxima and reverse('admin:core_produto_changelist') + cl.url_proxima
+        return ids
+
+    def test_paginas_seguintes_percorrem_a_ordem_inteira(self):
+        url = reverse('admin:core_produto_changelist')
+        for ordem, esperada in (('', ['-pk']), ('-6', ['-criado', '-pk']), ('2', ['nome', '-pk'])):
+            with self.subTest(ordem = ordem):
+                ids = self._percorrer(url + (f'?o={ordem}' if ordem else ''))
+                self.assertEqual(ids, list(Produto.objects.order_by(*esperada).values_list('pk', flat = True)))
+
+    def test_paginas_seguintes_nao_usam_offset(self):
+        url = reverse('admin:core_produto_changelist')
+        response = self.client.get(url)
+        self.assertContains(response, 'rel="next"') # O template admin/core/produto/pagination.html, com os links por cursor.
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.get(url + response.context['cl'].url_proxima)
+        self.assertTrue(response.context['cl'].url_anterior)
+        self.assertFalse([consulta['sql'] for consulta in contexto.captured_queries if 'OFFSET' in consulta['sql']])
+
+    def test_pagina_anterior(self):
+        url = reverse('admin:core_produto_changelist')
+        primeira = self.client.get(url).context['cl']
+        segunda = self.client.get(url + primeira.url_proxima).context['cl']
+        terceira = self.client.get(url + segunda.url_proxima).context['cl']
+        volta = self.client.get(url + terceira.url_anterior).context['cl']
+        self.assertEqual(volta.page_num, 2)
+        self.assertEqual(list(volta.result_list), list(segunda.result_list))
+        inicio = self.client.get(url + volta.url_anterior).context['cl']
+        self.assertEqual(list(inicio.result_list), list(primeira.result_list))
+        self.assertIsNone(inicio.url_anterior)
+
+    def test_cursor_de_outra_ordem_e_recusado(self):
+        # O cursor da ordem padrão (só o id) não serve para a ordem por data de criação (data e id).
+        url = reverse('admin:core_produto_changelist')
+        cursor = self.client.get(url).context['cl'].url_proxima
+        response = self.client.get(url + cursor + '&o=-6')
+        self.assertRedirects(response, url + '?e=1', fetch_redirect_response = False)
+
+
+@override_settings(STORAGES = SEM_MANIFESTO)
+class BuscaTests(TestCase):
+    """Busca e sugestões do autocompletar (core/busca.py), com o índice de trigramas em memória fora do PostgreSQL."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.produto = Produto.objects.create(nome = 'Camiseta Azul', preco = 50, estoque = 3)
+        Produto.objects.create(nome = 'Caneca Branca', preco = 20, estoque = 8)
+
+    def setUp(self):
+        caches['catalogo'].clear()
+
+    def _salvar(self, **campos):
+        for campo, valor in campos.items():
+            setattr(self.produto, campo, valor)
+        with self.captureOnCommitCallbacks(execute = True):
+            self.produto.save()
+
+    def _encontrados(self, termo):
+        return ''.join(busca.pagina_da_busca(termo, 10).itens)
+
+    def test_busca_e_sugestoes(self):
+        self.assertIn('Camiseta Azul', self._encontrados('camisa'))
+        self.assertNotIn('Caneca Branca', self._encontrados('camisa'))
+        self.assertEqual(busca.sugestoes('cami'), [{'nome': 'Camiseta Azul', 'slug': 'camiseta-azul'}])
+
+    def test_alteracao_de_estoque_nao_invalida_a_busca(self):
+        self.assertTrue(busca.sugestoes('cami'))
+        geracao = caches['catalogo'].get(busca.CHAVE_GERACAO)
+        self._salvar(estoque = 0, preco = 45)
+        self.assertEqual(caches['catalogo'].get(busca.CHAVE_GERACAO), geracao)
+
+    def test_novo_nome_atualiza_busca_e_sugestoes(self):
+        self.assertTrue(busca.sugestoes('cami'))
+        self._salvar(nome = 'Regata Verde')
+        self.assertEqual(busca.sugestoes('cami'), [])
+        self.assertEqual(busca.sugestoes('regat'), [{'nome': 'Regata Verde', 'slug': 'regata-verde'}])
+        self.assertIn('Regata Verde', self._encontrados('regata'))
+
+    def test_produto_inativo_sai_da_busca(self):
+        self.assertIn('Camiseta Azul', self._encontrados('camiseta'))
+        self._salvar(ativo = False)
+        self.assertEqual(busca.sugestoes('cami'), [])
+        self.assertNotIn('Camiseta Azul', self._encontrados('camiseta'))
+
+
+class EstoqueTests(TransactionTestCase):
+    """
+    Baixas e reservas de estoque (core/estoque.py).
+
+    TransactionTestCase: dentro de um TestCase, cada transaction.atomic vira um SAVEPOINT (e o seu RELEASE), e as contagens
+    de comandos SQL deixariam de ser as de produção (o BEGIN, no SQLite).
+    """
+
+    def setUp(self):
+        self.produtos = [Produto.objects.create(nome = f'Produto {numero}', preco = 50, estoque = 10) for numero in range(5)]
+        Produto.objects.create(nome = 'Esgotado', preco = 50, estoque = 0)
+        # A combinação de facetas "sem estoque" já existe: esgotar um produto custa os dois UPDATEs das contagens.
+
+    def _estoques(self):
+        return list(Produto.objects.filter(pk__in = [p.pk for p in self.produtos]).order_by('pk').values_list('estoque', flat = True))
+
+    def _sql(self, resultado):
+        if connection.vendor != 'sqlite':
+            self.skipTest("As contagens documentadas em core/estoque.py incluem o BEGIN, que só o SQLite envia pelo cursor.")
+        return resultado.consultas
+
+    def test_baixar(self):
+        primeiro = self.produtos[0].pk
+        self.assertEqual(self._sql(estoque.baixar({primeiro: 2})), 3)
+        self.assertEqual(self._sql(estoque.baixar({primeiro: 8})), 5) # O produto esgota: mais os dois UPDATEs das facetas.
+        self.assertEqual(self._estoques(), [0, 10, 10, 10, 10])
+        contagens_gravadas = {(c.ativo, c.faixa_preco, c.com_estoque): c.quantidade for c in ContagemProdutos.objects.all()}
+        self.assertEqual(contagens_gravadas[celula(True, 50, 0)], 2)
+        self.assertEqual(contagens_gravadas[celula(True, 50, 1)], 4)
+
+    def test_estoque_insuficiente_nao_baixa_nada(self):
+        primeiro, segundo = self.produtos[0].pk, self.produtos[1].pk
+        estoque.baixar({segundo: 7})
+        with self.assertRaises(estoque.EstoqueInsuficiente) as erro:
+            estoque.baixar({primeiro: 2, segundo: 4})
+        self.assertEqual(erro.exception.faltando, {segundo: 3})
+        with self.assertRaises(estoque.EstoqueInsuficiente):
+            estoque.reservar({primeiro: 1, segundo: 4, 999999: 1})
+        self.assertEqual(self._estoques(), [10, 3, 10, 10, 10])
+        self.assertFalse(Reserva.objects.exists())
+
+    def test_reservas_nao_vendem_alem_do_estoque(self):
+        primeiro = self.produtos[0].pk
+        estoque.reservar({primeiro: 6})
+        with self.assertRaises(estoque.EstoqueInsuficiente):
+            estoque.reservar({primeiro: 6})
+        estoque.reservar({primeiro: 4})
+        self.assertEqual(self._estoques()[0], 0)
+
+    def test_reservar_confirmar_e_liberar(self):
+        itens = {produto.pk: 1 for produto in self.produtos}
+        resultado = estoque.reservar(itens)
+        self.assertEqual(self._sql(resultado), 5) # Qualquer que seja a quantidade de itens.
+        self.assertEqual(self._estoques(), [9] * 5)
+        self.assertEqual(self._sql(estoque.confirmar(resultado.reserva)), 1)
+        with self.assertRaises(estoque.ReservaEncerrada):
+            estoque.confirmar(resultado.reserva)
+        self.assertEqual(estoque.liberar(resultado.reserva).linhas, 0) # Confirmada: nada volta ao estoque.
+        self.assertEqual(self._estoques(), [9] * 5)
+
+    def test_liberar_duas_vezes(self):
+        reserva = estoque.reservar({produto.pk: 2 for produto in self.produtos}).reserva
+        primeira = estoque.liberar(reserva)
+        self.assertEqual((primeira.linhas, self._sql(primeira)), (1, 5))
+        segunda = estoque.liberar(reserva)
+        self.assertEqual((segunda.linhas, self._sql(segunda)), (0, 2))
+        self.assertEqual(self._estoques(), [10] * 5)
+
+    def test_reservas_expiradas_voltam_ao_estoque(self):
+        vencida = estoque.reservar({self.produtos[0].pk: 3}, validade = 60).reserva
+        vigente = estoque.reservar({self.produtos[0].pk: 2}, validade = 600).reserva
+        depois = timezone.now() + timedelta(seconds = 61)
+        self.assertEqual(estoque.varrer_expiradas(agora = depois).linhas, 1)
+        self.assertEqual(estoque.varrer_expiradas(agora = depois).linhas, 0)
+        self.assertEqual(self._estoques()[0], 8)
+        self.assertEqual(Reserva.objects.get(pk = vencida.pk).estado, Reserva.EXPIRADA)
+        self.assertEqual(estoque.liberar(vencida).linhas, 0) # Já devolvida pela varredura.
+        self.assertEqual(Reserva.objects.get(pk = vigente.pk).estado, Reserva.ATIVA)
+
+
+class RunServicesTests(TestCase):
+    """Supervisão do servidor web e dos comandos de segundo plano (core/management/commands/run_services.py)."""
+
+    ESPERA_LONGA = [sys.executable, '-c', 'import time; time.sleep(60)']
+
+    def _rodar(self, *web, **opcoes):
+        inicio = time.monotonic()
+        try:
+            call_command('run_services', '--espera', '0.01', '--encerramento', '5', *web, stderr = io.StringIO(), **opcoes)
+        finally:
+            self.assertLess(time.monotonic() - inicio, 30) # Nenhum processo filho ficou esperando os 60 s.
+
+    @override_settings(SERVICOS_EM_SEGUNDO_PLANO = [['comando_inexistente']])
+    def test_trabalhador_que_nao_inicia_encerra_tudo(self):
+        with self.assertRaisesMessage(CommandError, "'comando_inexistente' terminou 3 vezes seguidas"):
+            self._rodar(*self.ESPERA_LONGA)
+
+    @override_settings(SERVICOS_EM_SEGUNDO_PLANO = [['shell', '-c', 'import time; time.sleep(60)']])
+    def test_fim_do_servidor_web_encerra_tudo(self):
+        with self.assertRaises(SystemExit) as saida:
+            self._rodar(sys.executable, '-c', 'import time; time.sleep(0.5); raise SystemExit(3)')
+        self.assertEqual(saida.exception.code, 3)
+
+
+@override_settings(STORAGES = SEM_MANIFESTO)
+class PaginacaoPorCursorTests(TestCase):
+    """Listagem da vitrine paginada por cursor sobre (criado, id) (core/pagination.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        agora = timezone.now()
+        Produto.objects.bulk_create([
+            Produto(nome = f'Produto {numero}', slug = f'produto-{numero}', preco = 10, estoque = 1,
+                    criado = agora - timedelta(minutes = numero // 2)) # Dois produtos por instante: o id desempata.
+            for numero in range(25)
+        ])
+        cls.ordem = list(Produto.objects.order_by('-criado', '-id').values_list('pk', flat = True))
+
+    def setUp(self):
+        caches['catalogo'].clear()
+
+    def test_cursor_ida_e_volta(self):
+        produto = Produto.objects.get(pk = self.ordem[3])
+        self.assertEqual(decodificar_cursor(codificar_cursor(produto)), (produto.criado, produto.pk))
+        for cursor in ('nao-e-um-cursor', codificar_cursor(produto)[:-2] + '!!'):
+            with self.subTest(cursor = cursor), self.assertRaises(CursorInvalido):
+                decodificar_cursor(cursor)
+
+    def test_paginas_seguintes_e_anteriores(self):
+        queryset = Produto.objects.all()
+        paginas = [paginar(queryset, 10)]
+        while paginas[-1].proximo:
+            paginas.append(paginar(queryset, 10, depois = paginas[-1].proximo))
+        self.assertEqual([produto.pk for pagina in paginas for produto in pagina], self.ordem)
+        self.assertEqual([len(pagina) for pagina in paginas], [10, 10, 5])
+        self.assertIsNone(paginas[0].anterior)
+        volta = paginar(queryset, 10, antes = paginas[2].anterior)
+        self.assertEqual(list(volta), list(paginas[1]))
+        self.assertEqual(volta.proximo, paginas[1].proximo)
+
+    def test_produto_novo_nao_desloca_as_paginas_seguintes(self):
+        queryset = Produto.objects.all()
+        primeira = paginar(queryset, 10)
+        Produto.objects.create(nome = 'Novidade', preco = 10, estoque = 1)
+        segunda = paginar(queryset, 10, depois = primeira.proximo)
+        self.assertEqual([produto.pk for produto in segunda], self.ordem[10:20])
+
+    def test_view_com_cursor_invalido_exibe_a_primeira_pagina(self):
+        response = self.client.get('/', {'tamanho': 10, 'depois': 'adulterado'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['pagina'].anterior, None)
+        self.assertEqual(len(response.context['produtos']), 10)
+
+
+class CacheDoCatalogoTests(TestCase):
+    """Cascas de página e fragmentos por produto no cache 'catalogo' (core/cache_catalogo.py), invalidados pelos signals."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.produtos = [Produto.objects.create(nome = f'Produto {numero}', preco = 10 + numero, estoque = 5) for numero in range(3)]
+
+    def setUp(self):
+        caches['catalogo'].clear()
+
+    def _pagina(self):
+        return ''.join(pagina_do_catalogo(Produto.objects.filter(ativo = True), 10))
+
+    def _salvar(self, produto, **campos):
+        for campo, valor in campos.items():
+            setattr(produto, campo, valor)
+        with self.captureOnCommitCallbacks(execute = True):
+            produto.save()
+
+    def test_pagina_em_cache_nao_consulta_o_banco(self):
+        self._pagina()
+        with self.assertNumQueries(0):
+            self.assertIn('Produto 2', self._pagina())
+
+    def test_alteracao_descarta_so_o_fragmento_do_produto(self):
+        self._pagina()
+        geracao = caches['catalogo'].get(CHAVE_GERACAO)
+        self._salvar(self.produtos[0], estoque = 4)
+        self.assertEqual(caches['catalogo'].get(CHAVE_GERACAO), geracao) # A casca da página continua válida.
+        self.assertIsNone(caches['catalogo'].get(chave_produto(self.produtos[0].pk)))
+        self.assertIsNotNone(caches['catalogo'].get(chave_produto(self.produtos[1].pk)))
+        with self.assertNumQueries(1): # Só o produto alterado é lido do banco.
+            self.assertIn('<td scope = "row">4</td>', self._pagina())
+
+    def test_entrada_e_saida_da_listagem_descartam_as_paginas(self):
+        self._pagina()
+        with self.captureOnCommitCallbacks(execute = True):
+            Produto.objects.create(nome = 'Novidade', preco = 10, estoque = 1)
+        self.assertIn('Novidade', self._pagina())
+        self._salvar(self.produtos[1], ativo = False)
+        self.assertNotIn('Produto 1', self._pagina())
+        with self.captureOnCommitCallbacks(execute = True):
+            self.produtos[2].delete()
+        self.assertNotIn('Produto 2', self._pagina())
+
+
+class ImagemResponsivaTests(TestCase):
+    """Tag imagem_responsiva (core/templatetags/imagens.py): <picture> com srcset em vez do arquivo original."""
+
+    ORIGINAL = f"produtos/{'a' * 64}.jpg"
+
+    def _renderizar(self, largura, altura, imagem = ORIGINAL):
+        produto = Produto(pk = 1, nome = 'Camiseta', imagem = imagem, image_width = largura, image_height = altura)
+        return Template('{% load imagens %}{% imagem_responsiva produto.imagem alt=produto.nome %}').render(Context({'produto': produto}))
+
+    def test_versoes_no_lugar_do_original(self):
+        html = self._renderizar(1600, 1200)
+        for tipo in ('image/avif', 'image/webp', 'image/jpeg'):
+            self.assertIn(f'<source type = "{tipo}" srcset = "', html)
+        self.assertIn('400w.webp 400w', html)
+        self.assertIn('width = "1600" height = "1200"', html) # Espaço reservado sem abrir o arquivo.
+        self.assertNotIn(f'"{url_midia(self.ORIGINAL)}"', html)
+
+    def test_nenhuma_versao_maior_que_o_original(self):
+        html = self._renderizar(100, 80)
+        self.assertIn('100w.jpeg 100w"', html)
+        self.assertNotIn('200w', html)
+
+    def test_sem_imagem(self):
+        self.assertEqual(self._renderizar(None, None, imagem = '').strip(), '')
+
+
+class UploadMediaTests(TestCase):
+    """Sincronização incremental da pasta de mídia (core/management/commands/upload_media.py), com um destino local."""
+
+    def setUp(self):
+        self.origem = tempfile.mkdtemp()
+        self.destino = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.origem, ignore_errors = True)
+        self.addCleanup(shutil.rmtree, self.destino, ignore_errors = True)
+        for relativo, conteudo in (('produtos/a.jpg', b'aaa'), ('produtos/b.jpg', b'bbb'), ('vazio.txt', b'')):
+            self._gravar(relativo, conteudo)
+
+    def _gravar(self, relativo, conteudo):
+        caminho = os.path.join(self.origem, *relativo.split('/'))
+        os.makedirs(os.path.dirname(caminho), exist_ok = True)
+        with open(caminho, 'wb') as arquivo:
+            arquivo.write(conteudo)
+
+    def test_envia_so_o_que_mudou(self):
+        primeira = sincronizar(self.origem, DestinoLocal(self.destino))
+        self.assertEqual(sorted(primeira['enviados']), ['produtos/a.jpg', 'produtos/b.jpg']) # Arquivos vazios são ignorados.
+        segunda = sincronizar(self.origem, DestinoLocal(self.destino), cache = primeira['manifesto'])
+        self.assertEqual((segunda['enviados'], segunda['inalterados']), ([], 2))
+        self._gravar('produtos/b.jpg', b'bbbb')
+        terceira = sincronizar(self.origem, DestinoLocal(self.destino), cache = segunda['manifesto'])
+        self.assertEqual(terceira['enviados'], ['produtos/b.jpg'])
+        with open(os.path.join(self.destino, 'produtos', 'b.jpg'), 'rb') as arquivo:
+            self.assertEqual(arquivo.read(), b'bbbb')
+
+    def test_orfaos_e_dry_run(self):
+        sincronizar(self.origem, DestinoLocal(self.destino))
+        os.remove(os.path.join(self.origem, 'produtos', 'a.jpg'))
+        simulacao = sincronizar(self.origem, DestinoLocal(self.destino), dry_run = True, delete_orphans = True)
+        self.assertEqual(simulacao['apagados'], ['produtos/a.jpg'])
+        self.assertTrue(os.path.exists(os.path.join(self.destino, 'produtos', 'a.jpg')))
+        self.assertEqual(sincronizar(self.origem, DestinoLocal(self.destino))['apagados'], []) # Sem --delete-orphans.
+        sincronizar(self.origem, DestinoLocal(self.destino), delete_orphans = True)
+        self.assertFalse(os.path.exists(os.path.join(self.destino, 'produtos', 'a.jpg')))
+
+    def test_falha_passageira_e_tentada_de_novo(self):
+        class DestinoInstavel(DestinoLocal):
+            falhas = 1
+
+            def enviar(self, local_path, relativo, **metadados):
+                if relativo == 'produtos/a.jpg' and self.falhas:
+                    self.falhas -= 1
+                    raise OSError("Conexão interrompida.")
+                super().enviar(local_path, relativo, **metadados)
+
+        relatorio = sincronizar(self.origem, DestinoInstavel(self.destino), tentativas = 2)
+        self.assertEqual((sorted(relatorio['enviados']), relatorio['falhas']), (['produtos/a.jpg', 'produtos/b.jpg'], []))
+
+
+@override_settings(STORAGES = SEM_MANIFESTO)
+class DetalheDoProdutoTests(TestCase):
+    """Página do produto por slug (/produto/<slug>/), com ETag e Last-Modified derivados do campo 'modificado'."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.produto = Produto.objects.create(nome = 'Camiseta Azul', preco = 50, estoque = 3)
+
+    def test_pagina_pelo_slug(self):
+        response = self.client.get(f'/produto/{self.produto.slug}/')
+        self.assertContains(response, 'Camiseta Azul')
+        self.assertIn('must-revalidate', response.headers['Cache-Control'])
+        Produto.objects.filter(pk = self.produto.pk).update(ativo = False)
+        self.assertEqual(self.client.get(f'/produto/{self.produto.slug}/').status_code, 404)
+
+    def test_copia_atual_recebe_304(self):
+        primeira = self.client.get(f'/produto/{self.produto.slug}/')
+        for cabecalho, valor in (('If-None-Match', primeira.headers['ETag']), ('If-Modified-Since', primeira.headers['Last-Modified'])):
+            with self.subTest(cabecalho = cabecalho):
+                response = self.client.get(f'/produto/{self.produto.slug}/', headers = {cabecalho: valor})
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response.headers['ETag'], primeira.headers['ETag'])
+
+    def test_alteracao_muda_o_etag(self):
+        etag = self.client.get(f'/produto/{self.produto.slug}/').headers['ETag']
+        self.produto.estoque = 2
+        self.produto.save()
+        response = self.client.get(f'/produto/{self.produto.slug}/', headers = {'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+
+class CargaDoCatalogoTests(TestCase):
+    """Carga de fixtures em lotes (core/carga.py, comando load_catalog), pulando os registros que não mudaram."""
+
+    def _registros(self, quantidade = 5, **alteracoes):
+        registros = [
+            {'model': 'core.produto', 'pk': numero, 'fields': {
+                'nome': f'Produto {numero}', 'preco': '10.00', 'estoque': numero, 'criado': '2024-01-0%dT12:00:00Z' % numero}}
+            for numero in range(1, quantidade + 1)
+        ]
+        for pk, campos in alteracoes.items():
+            registros[int(pk.removeprefix('p')) - 1]['fields'].update(campos)
+        return registros
+
+    def test_leitura_em_streaming(self):
+        registros = self._registros()
+        class AosPoucos(io.StringIO):
+            def read(self, tamanho = -1): # Blocos menores que um registro: cada objeto chega em vários pedaços.
+                return super().read(16)
+
+        self.assertEqual(list(carga.ler_registros(AosPoucos(json.dumps(registros, indent = 2)), 'json')), registros)
+        jsonl = '\n'.join(json.dumps(registro) for registro in registros) + '\n\n'
+        self.assertEqual(list(carga.ler_registros(io.StringIO(jsonl), 'jsonl')), registros)
+        for texto in ('{"model": "core.produto"}', '[{"model": "core.produto"'):
+            with self.subTest(texto = texto), self.assertRaises(carga.CargaInvalida):
+                list(carga.ler_registros(io.StringIO(texto), 'json'))
+
+    def test_segunda_carga_pula_os_inalterados(self):
+        contagem = carga.carregar_produtos(self._registros(), lote = 2)
+        self.assertEqual(contagem, {'criados': 5, 'atualizados': 0, 'inalterados': 0})
+        self.assertEqual(Produto.objects.get(pk = 3).slug, 'produto-3')
+        self.assertEqual(Produto.objects.get(pk = 3).criado.day, 3) # A data do registro, não a da carga.
+        with self.assertNumQueries(3): # Uma consulta dos hashes por lote, nenhuma escrita.
+            contagem = carga.carregar_produtos(self._registros(), lote = 2)
+        self.assertEqual(contagem, {'criados': 0, 'atualizados': 0, 'inalterados': 5})
+        contagem = carga.carregar_produtos(self._registros(6, p2 = {'estoque': 20}), lote = 2)
+        self.assertEqual(contagem, {'criados': 1, 'atualizados': 1, 'inalterados': 4})
+        self.assertEqual(Produto.objects.get(pk = 2).estoque, 20)
+        Produto.objects.create(nome = 'Produto 7', preco = 10, estoque = 1) # A sequência do id continua depois da carga.
+
+    def test_registro_de_outro_modelo(self):
+        with self.assertRaises(carga.CargaInvalida):
+            carga.carregar_produtos([{'model': 'auth.user', 'pk': 1, 'fields': {}}])
+
+
+class ImportacaoExportacaoTests(TestCase):
+    """Importação em massa retomável (comando import_products, core/importacao.py) e exportação em streaming."""
+
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.diretorio, ignore_errors = True)
+        os.mkdir(os.path.join(self.diretorio, 'fotos'))
+        for nome, cor in (('azul.png', 'blue'), ('verde.png', 'green')):
+            with open(os.path.join(self.diretorio, 'fotos', nome), 'wb') as arquivo:
+                arquivo.write(_imagem_png(cor = cor))
+        self.manifesto = os.path.join(self.diretorio, 'produtos.csv')
+        with open(self.manifesto, 'w', encoding = 'utf-8', newline = '') as arquivo:
+            arquivo.write(
+                "nome,preco,estoque,imagem,ativo\n"
+                "Camiseta Azul,50,3,azul.png,sim\n"
+                "Camiseta Verde,40,2,verde.png,\n"
+                "Sem Preço,,1,azul.png,\n"
+                "Boné Azul,30,5,azul.png,não\n"
+                "Imagem Ausente,20,1,roxo.png,\n"
+            )
+        # Os processos do pool gravam as imagens no MEDIA_ROOT das configurações (eles não herdam override_settings).
+        self.addCleanup(self._apagar_imagens)
+
+    def _apagar_imagens(self):
+        for nome in set(Produto.objects.exclude(imagem = '').values_list('imagem', flat = True)):
+            Produto._meta.get_field('imagem').storage.delete(nome)
+
+    def _importar(self, **opcoes):
+        saida, erros = io.StringIO(), io.StringIO()
+        call_command('import_products', self.manifesto, imagens = os.path.join(self.diretorio, 'fotos'), lote = 2,
+                     processos = 1, stdout = saida, stderr = erros, **opcoes)
+        return saida.getvalue(), erros.getvalue()
+
+    def _checkpoint(self):
+        with open(f'{self.manifesto}.checkpoint.json', encoding = 'utf-8') as arquivo:
+            return json.load(arquivo)
+
+    def test_importacao_em_lotes_com_checkpoint(self):
+        saida, erros = self._importar()
+        self.assertEqual(sorted(Produto.objects.values_list('nome', flat = True)), ['Boné Azul', 'Camiseta Azul', 'Camiseta Verde'])
+        self.assertIn('Registro 3: preco', erros)
+        self.assertIn("Registro 5: imagem 'roxo.png'", erros)
+        self.assertEqual(self._checkpoint(), {'registro': 5, 'importados': 3, 'erros': 2, 'concluida': True})
+        azuis = Produto.objects.filter(nome__endswith = 'Azul')
+        self.assertEqual(len({produto.imagem.name for produto in azuis}), 1) # A mesma imagem é gravada uma única vez.
+        self.assertFalse(Produto.objects.get(nome = 'Boné Azul').ativo)
+        self.assertIn('já concluída', self._importar()[0]) # Executar de novo não duplica os produtos.
+        self.assertEqual(Produto.objects.count(), 3)
+
+    def test_retomada_continua_do_ultimo_lote(self):
+        with open(f'{self.manifesto}.checkpoint.json', 'w', encoding = 'utf-8') as arquivo:
+            json.dump({'registro': 2, 'importados': 2, 'erros': 0, 'concluida': False}, arquivo) # Interrompida após o 1º lote.
+        saida, erros = self._importar()
+        self.assertIn('Retomando após o registro 2', saida)
+        self.assertEqual(list(Produto.objects.values_list('nome', flat = True)), ['Boné Azul'])
+        self.assertEqual(self._checkpoint(), {'registro': 5, 'importados': 3, 'erros': 2, 'concluida': True})
+        self._importar(recomecar = True)
+        self.assertEqual(Produto.objects.filter(nome = 'Camiseta Azul').count(), 1)
+
+    def test_exportacao(self):
+        Produto.objects.create(nome = 'Camiseta Azul', preco = 50, estoque = 3)
+        Produto.objects.create(nome = 'Boné, "edição" especial', preco = 30, estoque = 0, ativo = False)
+        linhas = list(csv.reader(''.join(linhas_exportacao(Produto.objects.all())).splitlines()))
+        self.assertEqual(linhas[0], COLUNAS_EXPORTACAO)
+        self.assertEqual([linha[1] for linha in linhas[1:]], ['Camiseta Azul', 'Boné, "edição" especial'])
+        registros = [json.loads(linha) for linha in linhas_exportacao(Produto.objects.filter(ativo = True), 'jsonl')]
+        self.assertEqual([(r['nome'], r['preco'], r['estoque']) for r in registros], [('Camiseta Azul', '50.00', 3)])
+
+
+class VersoesSobDemandaTests(ComMidiaTemporaria):
+    """Versões das imagens geradas no primeiro pedido (view versao_imagem, core/versoes.py) e o comando prune_pictures."""
+
+    def setUp(self):
+        self.original = armazenamento_produtos.save('produtos/camiseta.png', ContentFile(_imagem_png(800, 600)))
+        self.produto = Produto.objects.create(nome = 'Camiseta', preco = 50, estoque = 3)
+        Produto.objects.filter(pk = self.produto.pk).update(imagem = self.original, image_width = 800, image_height = 600)
+        self.versao = next(versao for versao in versoes.versoes_previstas(self.original, 800, 600)
+                           if versao.file_type == 'WEBP' and versao.width == 400 and versao.aspect_ratio is None)
+
+    def test_primeiro_pedido_gera_a_versao(self):
+        url = versoes.url_sob_demanda(self.versao)
+        response = self.client.get(url)
+        self.assertRedirects(response, url_midia(self.versao.name), fetch_redirect_response = False)
+        self.assertIn('public', response.headers['Cache-Control'])
+        with armazenamento_produtos.open(self.versao.name) as arquivo, Image.open(arquivo) as imagem:
+            self.assertEqual((imagem.format, imagem.width), ('WEBP', 400))
+        self.assertTrue(VersaoImagem.objects.get(nome = self.versao.name).pronta)
+        with self.assertNumQueries(2): # Versão já gerada: o original e o registro são consultados, nada é gerado.
+            self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_versoes_nao_previstas(self):
+        for caminho in (f'{self.original}/original/123w.webp', 'produtos/outra.png/original/400w.webp',
+                        versoes.caminho_sob_demanda(self.versao).replace('.webp', '.exe')):
+            with self.subTest(caminho = caminho):
+                self.assertEqual(self.client.get(f'/imagens/{caminho}').status_code, 404)
+
+    def test_versao_em_geracao_por_outro_pedido(self):
+        VersaoImagem.objects.create(nome = self.versao.name, arquivo = self.original)
+        response = self.client.get(versoes.url_sob_demanda(self.versao))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '2')
+        self.assertFalse(VersaoImagem.objects.get(nome = self.versao.name).pronta)
+        # Uma trava abandonada (o processo que gerava a versão foi reiniciado) é assumida pelo pedido seguinte.
+        VersaoImagem.objects.update(modificado = timezone.now() - timedelta(seconds = versoes.EXPIRACAO_TRAVA + 1))
+        self.assertEqual(versoes.garantir_versao(self.versao), url_midia(self.versao.name))
+        self.assertTrue(VersaoImagem.objects.get(nome = self.versao.name).pronta)
+
+    def test_prune_pictures_apaga_as_versoes_obsoletas(self):
+        versoes.garantir_versao(self.versao)
+        obsoleta = armazenamento_produtos.save(posixpath.join(posixpath.dirname(self.versao.name), '123w.webp'), ContentFile(b'x'))
+        VersaoImagem.objects.create(nome = obsoleta, arquivo = self.original, pronta = True)
+        saida = io.StringIO()
+        call_command('prune_pictures', '--simular', stdout = saida)
+        self.assertIn(obsoleta, saida.getvalue())
+        self.assertTrue(armazenamento_produtos.exists(obsoleta))
+        call_command('prune_pictures', stdout = io.StringIO())
+        self.assertFalse(armazenamento_produtos.exists(obsoleta))
+        self.assertTrue(armazenamento_produtos.exists(self.versao.name))
+        self.assertEqual(list(VersaoImagem.objects.values_list('nome', flat = True)), [self.versao.name])
+
+
+class CodificacaoDeVersoesTests(TestCase):
+    """Codificação das versões (core/versoes.py): qualidade por formato e breakpoint, e fundo branco no JPEG."""
+
+    def test_qualidade_pelo_menor_breakpoint_que_comporta_a_largura(self):
+        for largura, esperada in ((150, 82), (200, 82), (400, 78), (992, 75), (2400, 75)):
+            with self.subTest(largura = largura):
+                self.assertEqual(versoes.qualidade('webp', largura), esperada)
+
+    def test_versoes_pequenas_usam_qualidade_maior(self):
+        imagem = Image.effect_noise((200, 200), 64).convert('RGB') # Ruído: o tamanho do arquivo acompanha a qualidade.
+        self.assertGreater(len(versoes.codificar(imagem, 'JPEG', 200)), len(versoes.codificar(imagem, 'JPEG', 2000)))
+
+    def test_transparencia_vira_fundo_branco_no_jpeg(self):
+        imagem = Image.new('RGBA', (20, 20), (255, 0, 0, 0))
+        with Image.open(io.BytesIO(versoes.codificar(imagem, 'JPEG', 20))) as jpeg:
+            self.assertEqual(jpeg.mode, 'RGB')
+            self.assertTrue(all(canal > 245 for canal in jpeg.getpixel((10, 10))))
+        for tipo in ('WEBP', 'PNG'):
+            with self.subTest(tipo = tipo), Image.open(io.BytesIO(versoes.codificar(imagem, tipo, 20))) as resultado:
+                self.assertEqual(resultado.format, tipo)
+
+    def test_formato_suportado(self):
+        self.assertTrue(versoes.formato_suportado('webp'))
+        self.assertFalse(versoes.formato_suportado('heif-inexistente'))
+
+
+class BenchmarkPicturesTests(SimpleTestCase):
+    """Relatório JSON do comando benchmark_pictures (core/medicao.py), com poucos originais pequenos e uma repetição."""
+
+    def setUp(self):
+        self.midia = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.midia, ignore_errors = True)
+        os.mkdir(os.path.join(self.midia, 'fotos'))
+        for nome, conteudo in (('a.png', _imagem_png(640, 480)), ('b.png', _imagem_png(300, 300, 'blue')), ('leia-me.txt', b'texto')):
+            with open(os.path.join(self.midia, 'fotos', nome), 'wb') as arquivo:
+                arquivo.write(conteudo)
+        configuracao = override_settings(MEDIA_ROOT = self.midia)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def _medir(self, *argumentos):
+        saida, erros = io.StringIO(), io.StringIO()
+        call_command('benchmark_pictures', '--diretorio', 'fotos', '--repeticoes', '1', '--trabalhadores', '2',
+                     '--modos', 'serial', 'threads', '--caminhos', 'padrao', 'reduce', *argumentos, stdout = saida, stderr = erros)
+        return saida.getvalue(), erros.getvalue()
+
+    def test_relatorio_json(self):
+        saida, erros = self._medir('--formatos', 'webp', 'inexistente')
+        self.assertIn('INEXISTENTE', erros) # Formato que o Pillow não grava: avisado e ignorado.
+        relatorio = json.loads(saida)
+        self.assertEqual([original['nome'] for original in relatorio['originais']], ['fotos/a.png', 'fotos/b.png'])
+        self.assertEqual(list(relatorio['etapas']['codificacao']), ['WEBP'])
+        self.assertEqual([(c['modo'], c['caminho']) for c in relatorio['cenarios']],
+                         [('serial', 'padrao'), ('serial', 'reduce'), ('threads', 'padrao'), ('threads', 'reduce')])
+        versoes = sum(original['versoes'] for original in relatorio['originais'])
+        self.assertTrue(all(cenario['versoes'] == versoes for cenario in relatorio['cenarios']))
+        self.assertEqual(relatorio['cenarios'][0]['trabalhadores'], 1)
+
+    def test_saida_em_arquivo(self):
+        destino = os.path.join(self.midia, 'medicao.json')
+        saida, _ = self._medir('--formatos', 'jpeg', '--saida', destino)
+        self.assertIn('Codificação JPEG', saida)
+        with open(destino, encoding = 'utf-8') as arquivo:
+            self.assertEqual(len(json.load(arquivo)['cenarios']), 4)
+
+    def test_sem_imagens(self):
+        os.mkdir(os.path.join(self.midia, 'vazio'))
+        with self.assertRaisesMessage(CommandError, "Nenhuma imagem encontrada."):
+            call_command('benchmark_pictures', '--diretorio', 'vazio', stdout = io.StringIO())
+
+
+# TransactionTestCase: as requisições medidas partem de threads, que usam outra conexão e só enxergam dados confirmados.
+@override_settings(STORAGES = SEM_MANIFESTO)
+class BenchmarkViewsTests(TransactionTestCase):
+    """Medição das views (core/medicao_http.py, comando benchmark_views) e comparação com uma referência."""
+
+    def setUp(self):
+        caches['catalogo'].clear()
+        self.slugs = medicao_http.criar_dados(5)
+
+    def test_latencias_e_recursos(self):
+        for view in ('index', 'produto_detalhe'):
+            with self.subTest(view = view):
+                resultado = medicao_http.medir_view(medicao_http.ClienteDjango, view, self.slugs, 12, concorrencia = 2, aquecimento = 1)
+                self.assertEqual((resultado['requisicoes'], resultado['erros']), (12, 0))
+                self.assertLessEqual(resultado['p50_ms'], resultado['p95_ms'])
+                self.assertLessEqual(resultado['p95_ms'], resultado['p99_ms'])
+        recursos = medicao_http.medir_recursos('produto_detalhe', self.slugs, amostras = 3)
+        self.assertGreater(recursos['consultas'], 0)
+
+    def test_comparacao_com_a_referencia(self):
+        referencia = {'views': {'index': {'requisicoes_por_segundo': 100, 'p95_ms': 10, 'consultas': 3, 'memoria_kib': 50}}}
+        atual = {'views': {'index': {'requisicoes_por_segundo': 95, 'p95_ms': 12, 'consultas': 4, 'memoria_kib': 40},
+                           'contato': {'p95_ms': 1}}} # View sem referência: não é comparada.
+        regressoes = {d['metrica']: d['regressao'] for d in medicao_http.comparar(atual, referencia, tolerancia = 10)}
+        self.assertEqual(regressoes, {'requisicoes_por_segundo': False, 'p95_ms': True, 'consultas': True, 'memoria_kib': False})
+
+
+@override_settings(STORAGES = SEM_MANIFESTO)
+class UrlsDeMidiaTests(TestCase):
+    """URLs de mídia montadas a partir do nome gravado (core/enderecos.py), sem chamadas ao armazenamento."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for numero in range(3):
+            produto = Produto.objects.create(nome = f'Produto {numero}', preco = 10, estoque = 1)
+            Produto.objects.filter(pk = produto.pk).update(
+                imagem = f'produtos/{str(numero) * 64}.jpg', image_width = 1200, image_height = 900) # Arquivos inexistentes.
+
+    def setUp(self):
+        caches['catalogo'].clear()
+
+    def test_paginas_nao_chamam_o_armazenamento(self):
+        original = f"produtos/{'0' * 64}.jpg"
+        gerada = next(versao for versao in versoes.versoes_previstas(original, 1200, 900) if versao.width == 400)
+        VersaoImagem.objects.create(nome = gerada.name, arquivo = original, pronta = True)
+        for caminho in ('/', f'/produto/{Produto.objects.get(imagem = original).slug}/'):
+            with self.subTest(caminho = caminho):
+                response = self.client.get(caminho)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('desc="0 chamadas"', response.headers['Server-Timing'])
+        self.assertContains(response, f'{settings.MEDIA_URL}{gerada.name} 400w') # A versão gerada aponta direto para a mídia.
+
+    def test_url_sem_assinatura(self):
+        self.assertEqual(url_midia(''), '')
+        self.assertEqual(url_midia('produtos/foto nova.jpg'), f'{settings.MEDIA_URL}produtos/foto%20nova.jpg')
+        self.assertIsNone(validade_garantida())
+
+    @override_settings(MIDIA_URLS_ASSINADAS = True, MIDIA_URL_JANELA = 600, GS_EXPIRATION = timedelta(hours = 1))
+    def test_validade_das_urls_assinadas(self):
+        self.assertEqual(validade_garantida(), 3000) # Uma URL assinada no início da janela ainda vale 1 h - 10 min no fim dela.
+
+
+class UploadStaticTests(SimpleTestCase):
+    """Envio dos arquivos estáticos com hash (comando upload_static), para uma pasta local no lugar do bucket."""
+
+    def setUp(self):
+        self.raiz = tempfile.mkdtemp()
+        self.destino = os.path.join(self.raiz, 'bucket')
+        self.addCleanup(shutil.rmtree, self.raiz, ignore_errors = True)
+        configuracao = override_settings(STATIC_ROOT = os.path.join(self.raiz, 'staticfiles'))
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def _collectstatic(self, arquivos):
+        # Simula o resultado do collectstatic: os arquivos com hash no nome (e as versões .gz) e o manifesto.
+        for nome, conteudo in arquivos.items():
+            caminho = os.path.join(settings.STATIC_ROOT, *nome.split('/'))
+            os.makedirs(os.path.dirname(caminho), exist_ok = True)
+            with open(caminho, 'wb') as arquivo:
+                arquivo.write(conteudo)
+        caminhos = {nome.replace('.1a2b3c', '').replace('.4d5e6f', ''): nome for nome in arquivos if not nome.endswith('.gz')}
+        with open(os.path.join(settings.STATIC_ROOT, 'staticfiles.json'), 'w', encoding = 'utf-8') as arquivo:
+            json.dump({'paths': caminhos, 'version': '1.1'}, arquivo)
+
+    def _enviar(self, *argumentos):
+        saida = io.StringIO()
+        call_command('upload_static', '--destino-local', self.destino, '--threads', '2', *argumentos, stdout = saida)
+        return saida.getvalue()
+
+    def test_envia_apenas_os_nomes_novos(self):
+        self._collectstatic({'css/styles.1a2b3c.css': b'body {}', 'css/styles.1a2b3c.css.gz': b'gzip', 'js/busca.1a2b3c.js': b'1;'})
+        self.assertIn('2 a enviar, 0 inalterados', self._enviar('--dry-run'))
+        self.assertFalse(os.path.exists(self.destino))
+        self.assertIn('2 enviados, 0 inalterados, 0 falhas', self._enviar())
+        with open(os.path.join(self.destino, 'css', 'styles.1a2b3c.css'), 'rb') as arquivo:
+            self.assertEqual(arquivo.read(), b'gzip') # A versão comprimida vai no lugar do arquivo (Content-Encoding: gzip).
+        self._collectstatic({'css/styles.4d5e6f.css': b'body { margin: 0 }', 'js/busca.1a2b3c.js': b'1;'})
+        self.assertIn('1 enviados, 1 inalterados, 0 falhas', self._enviar()) # Só o CSS alterado tem um nome novo.
+        self.assertTrue(os.path.exists(os.path.join(self.destino, 'css', 'styles.1a2b3c.css'))) # A versão anterior continua lá.
+
+    def test_sem_manifesto(self):
+        with self.assertRaisesMessage(CommandError, 'collectstatic'):
+            self._enviar()
+
+
+class ImagensPorConteudoTests(ComMidiaTemporaria):
+    """Imagens gravadas uma única vez por conteúdo e apagadas quando nenhum produto as usa (core/armazenamento.py)."""
+
+    def setUp(self):
+        self.dados = _imagem_png(400, 300, cor = 'green')
+
+    def _produto(self, nome, arquivo):
+        with self.captureOnCommitCallbacks(execute = True):
+            return Produto.objects.create(nome = nome, preco = 10, estoque = 1, imagem = arquivo, image_width = 400, image_height = 300)
+
+    def _apagar(self, produto):
+        with self.captureOnCommitCallbacks(execute = True):
+            produto.delete()
+
+    def test_mesmo_conteudo_mesmo_arquivo(self):
+        primeiro = armazenamento_produtos.save('produtos/foto.png', ContentFile(self.dados))
+        segundo = armazenamento_produtos.save('produtos/outro-nome.PNG', ContentFile(self.dados))
+        self.assertEqual(primeiro, segundo)
+        self.assertEqual(primeiro, f'produtos/{hashlib.sha256(self.dados).hexdigest()}.png')
+
+    def test_arquivo_apagado_com_a_ultima_referencia(self):
+        arquivo = armazenamento_produtos.save('produtos/foto.png', ContentFile(self.dados))
+        camiseta, bone = self._produto('Camiseta', arquivo), self._produto('Boné', arquivo)
+        self.assertEqual(ImagemConteudo.objects.get(arquivo = arquivo).referencias, 2)
+        self._apagar(camiseta)
+        self.assertEqual(ImagemConteudo.objects.get(arquivo = arquivo).referencias, 1)
+        self.assertTrue(armazenamento_produtos.exists(arquivo))
+        self._apagar(bone)
+        self.assertFalse(ImagemConteudo.objects.filter(arquivo = arquivo).exists())
+        self.assertFalse(armazenamento_produtos.exists(arquivo))
+        self.assertTrue(TarefaImagem.objects.filter(arquivo = arquivo).exists()) # As versões vão para a fila de imagens.
+
+    def test_novo_envio_cancela_a_exclusao_pendente(self):
+        arquivo = armazenamento_produtos.save('produtos/foto.png', ContentFile(self.dados))
+        produto = self._produto('Camiseta', arquivo)
+        with self.captureOnCommitCallbacks() as pendentes: # A exclusão só roda depois do commit.
+            produto.delete()
+        self.assertEqual(armazenamento_produtos.save('produtos/de-novo.png', ContentFile(self.dados)), arquivo)
+        for funcao in pendentes:
+            funcao()
+        self.assertTrue(armazenamento_produtos.exists(arquivo))
+
+
+class ConexaoInstavel(locmem.EmailBackend):
+    """Backend de e-mail dos testes que recusa as mensagens para falha@example.com (ou a própria conexão, com recusar_conexao)."""
+
+    def __init__(self, *args, recusar_conexao = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.recusar_conexao = recusar_conexao
+
+    def open(self):
+        if self.recusar_conexao:
+            raise ConnectionRefusedError("Servidor SMTP indisponível.")
+        return super().open()
+
+    def send_messages(self, messages):
+        if any('falha@example.com' in message.to for message in messages):
+            raise OSError("Destinatário recusado.")
+        return super().send_messages(messages)
+
+
+class CaixaDeSaidaTests(TestCase):
+    """Entrega dos e-mails da caixa de saída em lotes (core/caixa_saida.py), com novas tentativas e o estado 'falhou'."""
+
+    def _enfileirar(self, *destinatarios):
+        return [caixa_saida.enfileirar_email(EmailMessage('Contato', 'Olá', 'loja@example.com', [destinatario]))
+                for destinatario in destinatarios]
+
+    def test_entrega_em_lotes(self):
+        self._enfileirar('a@example.com', 'b@example.com', 'c@example.com')
+        self.assertEqual(caixa_saida.entregar_lote(limite = 2), (2, 0))
+        self.assertEqual(caixa_saida.entregar_lote(limite = 2), (1, 0))
+        self.assertEqual(caixa_saida.entregar_lote(limite = 2), (0, 0))
+        self.assertEqual(sorted(mensagem.to[0] for mensagem in mail.outbox), ['a@example.com', 'b@example.com', 'c@example.com'])
+        self.assertEqual(MensagemEmail.objects.filter(estado = MensagemEmail.ENVIADA, enviado__isnull = False).count(), 3)
+
+    def test_falhas_esperam_e_terminam_em_falhou(self):
+        falha, = self._enfileirar('falha@example.com')
+        self.assertEqual(caixa_saida.entregar_lote(max_tentativas = 2, espera = 30, connection = ConexaoInstavel()), (0, 1))
+        falha.refresh_from_db()
+        self.assertEqual((falha.estado, falha.tentativas), (MensagemEmail.PENDENTE, 1))
+        self.assertIn('Destinatário recusado', falha.erro)
+        self.assertGreater(falha.proxima_tentativa, timezone.now() + timedelta(seconds = 25))
+        self.assertEqual(caixa_saida.entregar_lote(max_tentativas = 2, connection = ConexaoInstavel()), (0, 0)) # Ainda esperando.
+        MensagemEmail.objects.update(proxima_tentativa = timezone.now())
+        self.assertEqual(caixa_saida.entregar_lote(max_tentativas = 2, connection = ConexaoInstavel()), (0, 1))
+        falha.refresh_from_db()
+        self.assertEqual((falha.estado, falha.tentativas), (MensagemEmail.FALHOU, 2))
+        MensagemEmail.objects.update(proxima_tentativa = timezone.now())
+        self.assertEqual(caixa_saida.entregar_lote(connection = ConexaoInstavel()), (0, 0)) # 'falhou' não volta para a fila.
+
+    def test_uma_falha_nao_interrompe_o_lote(self):
+        self._enfileirar('a@example.com', 'falha@example.com', 'c@example.com')
+        self.assertEqual(caixa_saida.entregar_lote(connection = ConexaoInstavel()), (2, 1))
+
+    def test_conexao_recusada_devolve_o_lote(self):
+        self._enfileirar('a@example.com', 'b@example.com')
+        self.assertEqual(caixa_saida.entregar_lote(connection = ConexaoInstavel(recusar_conexao = True)), (0, 2))
+        self.assertEqual(set(MensagemEmail.objects.values_list('estado', 'tentativas')), {(MensagemEmail.PENDENTE, 1)})
+
+    def test_mensagens_abandonadas_voltam_para_a_fila(self):
+        presa, recente = self._enfileirar('a@example.com', 'b@example.com')
+        MensagemEmail.objects.update(estado = MensagemEmail.ENVIANDO)
+        MensagemEmail.objects.filter(pk = presa.pk).update(proxima_tentativa = timezone.now() - timedelta(minutes = 11))
+        self.assertEqual(caixa_saida.recuperar_abandonadas(), 1)
+        self.assertEqual(MensagemEmail.objects.get(pk = presa.pk).estado, MensagemEmail.PENDENTE)
+        self.assertEqual(MensagemEmail.objects.get(pk = recente.pk).estado, MensagemEmail.ENVIANDO)
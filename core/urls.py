@@ -1,9 +1,27 @@
+from django.conf import settings
 from django.urls import path
 
-from .views import index, contato, produto
+from .views import index, busca, sugestoes, contato, produto, produto_detalhe, envios, envio, versao_imagem, metricas
+
+if settings.ASGI:
+    from .views_async import index, contato, produto, produto_detalhe
+    # Sob ASGI, as views da vitrine, do detalhe do produto, do contato e do cadastro de produtos são as versões assíncronas.
+    # As views do envio em partes continuam síncronas: elas leem o corpo da requisição em streaming (request.read),
+    # o que sob ASGI já acontece a partir de um arquivo temporário preenchido pelo servidor.
 
 urlpatterns = [
     path('', index, name = 'index'),
+    path('busca/', busca, name = 'busca'),
+    path('busca/sugestoes/', sugestoes, name = 'sugestoes'),
+    # Busca de produtos e autocompletar do campo de busca (veja core/busca.py). Síncronas também sob ASGI.
     path('contato/', contato, name = 'contato'),
     path('produto/', produto, name = 'produto'),
-]
\ No newline at end of file
+    path('produto/envios/', envios, name = 'envios'),
+    path('produto/envios/<uuid:pk>/', envio, name = 'envio'),
+    path('produto/<slug:slug>/', produto_detalhe, name = 'produto_detalhe'),
+    # Fica depois das rotas de envio: o slug 'envios' é reservado (veja SLUGS_RESERVADOS em core/models.py).
+    path('imagens/<path:caminho>', versao_imagem, name = 'versao_imagem'),
+    # Versões das imagens geradas no primeiro pedido (veja core/versoes.py). Síncrona também sob ASGI: a geração usa a CPU.
+    path('metrics', metricas, name = 'metricas'),
+    # Métricas no formato do Prometheus (veja core/instrumentacao.py); o caminho é o padrão esperado pelo Prometheus.
+]
@@ -0,0 +1,280 @@
+# Este módulo implementa a geração sob demanda das versões redimensionadas ("renditions") das imagens de Produto
+# e a limpeza das versões que a configuração atual do campo não prevê mais.
+# Por padrão, cada imagem salva gera a matriz completa de versões (proporções × larguras × tipos de arquivo), e a maior parte
+# nunca é pedida por nenhum navegador. Com PRODUTO_VERSOES_SOB_DEMANDA (settings.py):
+# 1) salvar uma imagem não gera nenhuma versão (core/tasks.py ignora as versões novas);
+# 2) a tag imagem_responsiva aponta as versões ainda não geradas para a view versao_imagem (/imagens/...), que gera a versão
+#    no primeiro pedido, grava no armazenamento e redireciona para o arquivo gravado; as versões já geradas são apontadas
+#    direto para o armazenamento;
+# 3) cada versão gerada é registrada em VersaoImagem. O registro é criado antes da geração e funciona como trava: se dois pedidos
+#    chegam juntos, só o que conseguiu criar o registro gera a versão, e o outro espera que ela fique pronta.
+# O comando `python manage.py prune_pictures` apaga as versões gravadas que não correspondem mais à configuração do campo
+# (tipos de arquivo, proporções ou larguras removidos) ou cujo original não é mais usado por nenhum produto.
+# A codificação das versões também fica aqui (VersaoPillow, a PICTURE_CLASS do django-pictures em settings.py):
+# AVIF e WebP com qualidade ajustada por breakpoint (PRODUTO_IMAGEM_QUALIDADE) e JPEG como alternativa universal.
+
+import io
+import posixpath
+import re
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from pictures.models import PictureFieldFile, PillowPicture
+
+from .enderecos import url_midia
+
+EXPIRACAO_TRAVA = 60
+# Segundos após os quais uma versão ainda marcada como "em geração" é considerada abandonada (por exemplo, se o processo
+# que a gerava foi reiniciado), e outro pedido pode assumir a geração.
+
+ESPERA_MAXIMA = 1.5
+# Segundos que um pedido espera por uma versão que outro pedido está gerando antes de desistir (VersaoOcupada).
+# A espera ocupa um worker (ou uma thread do sync_to_async) sem fazer nada: é melhor responder logo 503 com Retry-After,
+# e o navegador pede de novo, do que prender o worker pelo tempo inteiro da geração.
+
+ARQUIVO_DE_VERSAO = re.compile(r'\d+w\.\w+$')
+# Nome dos arquivos de versão gerados pelo django-pictures ("800w.png").
+
+OPCOES_DE_CODIFICACAO = {
+    'AVIF': {'speed': 6},
+    'WEBP': {'method': 4},
+    'JPEG': {'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+}
+# Opções do Pillow para cada formato, além da qualidade. speed (AVIF, 0 a 10) e method (WebP, 0 a 6) trocam tempo de
+# codificação por tamanho; os valores escolhidos são os intermediários (veja `python manage.py benchmark_image_formats`).
+
+FORMATOS_COM_QUALIDADE = {'AVIF', 'WEBP', 'JPEG'}
+# O PNG não tem perdas: o parâmetro quality não se aplica a ele.
+
+
+class VersaoOcupada(Exception):
+    """Exceção lançada quando a versão continua em geração por outro pedido após ESPERA_MAXIMA segundos."""
+
+
+def formato_suportado(tipo):
+    """Retorna True se o Pillow instalado sabe gravar o formato `tipo` (o AVIF, por exemplo, depende da libavif)."""
+    Image.init()
+    return tipo.upper() in Image.SAVE
+
+
+def qualidade(tipo, largura):
+    """
+    Retorna a qualidade de codificação de uma versão, conforme o formato e o breakpoint que a largura atende.
+
+    Parâmetros:
+    - tipo (str): Formato da versão ('AVIF', 'WEBP' ou 'JPEG').
+    - largura (int): Largura da versão em pixels.
+
+    A largura é associada ao menor breakpoint de PRODUTO_IMAGEM_QUALIDADE que a comporta (as maiores, inclusive as versões
+    de densidade 2x, ao maior breakpoint). Versões pequenas usam qualidade maior, pois os artefatos de compressão ficam
+    mais visíveis em poucas dezenas de pixels; nas grandes, a diferença não aparece e os bytes economizados são muitos.
+    """
+    from .models import Produto
+
+    breakpoints = Produto._meta.get_field('imagem').breakpoints
+    faixas = sorted((breakpoints[nome], valores) for nome, valores in settings.PRODUTO_IMAGEM_QUALIDADE.items())
+    valores = next((valores for limite, valores in faixas if largura <= limite), faixas[-1][1])
+    return valores[tipo.upper()]
+
+
+def codificar(imagem, tipo, largura):
+    """
+    Codifica uma imagem já redimensionada no formato `tipo` e retorna os bytes.
+
+    Parâmetros:
+    - imagem (PIL.Image.Image): Imagem na largura final da versão.
+    - tipo (str): Formato de destino ('AVIF', 'WEBP', 'JPEG' ou 'PNG').
+    - largura (int): Largura da versão, usada para escolher a qualidade (veja qualidade()).
+    """
+    tipo = tipo.upper()
+    if tipo == 'JPEG' and imagem.mode != 'RGB':
+        if 'A' in imagem.getbands() or imagem.mode == 'P' and 'transparency' in imagem.info:
+            # O JPEG não tem transparência: as áreas transparentes ficam brancas, como no fundo da página, e não pretas.
+            imagem = imagem.convert('RGBA')
+            fundo = Image.new('RGB', imagem.size, 'white')
+            fundo.paste(imagem, mask = imagem.getchannel('A'))
+            imagem = fundo
+        else:
+            imagem = imagem.convert('RGB')
+    opcoes = dict(OPCOES_DE_CODIFICACAO.get(tipo, {}))
+    if tipo in FORMATOS_COM_QUALIDADE:
+        opcoes['quality'] = qualidade(tipo, largura)
+    with io.BytesIO() as saida:
+        imagem.save(saida, format = tipo, **opcoes)
+        return saida.getvalue()
+
+
+class VersaoPillow(PillowPicture):
+    """
+    Versão de imagem do django-pictures (PICTURES["PICTURE_CLASS"]) codificada por codificar().
+
+    Difere da PillowPicture original apenas na gravação: qualidade por formato e breakpoint, opções de compressão
+    e fundo branco no JPEG. Formatos que o Pillow instalado não suporta são ignorados (a tag imagem_responsiva também
+    não os oferece ao navegador).
+    """
+
+    def save(self, image):
+        if not formato_suportado(self.file_type):
+            return
+        dados = codificar(self.process(image), self.file_type, self.width)
+        self.storage.delete(self.name) # Evita que o armazenamento grave com outro nome se a versão já existir.
+        self.storage.save(self.name, ContentFile(dados))
+
+
+def versoes_previstas(arquivo, largura, altura):
+    """
+    Retorna a lista de versões (objetos Picture) que a configuração atual de Produto.imagem prevê para um original.
+
+    Parâmetros:
+    - arquivo (str): Nome do arquivo original no armazenamento.
+    - largura, altura (int): Dimensões do original.
+    """
+    from .models import Produto
+
+    campo = Produto._meta.get_field('imagem')
+    versoes = PictureFieldFile.get_picture_files(
+        file_name = arquivo, img_width = largura, img_height = altura, storage = campo.storage, field = campo)
+    return [versao for tipos in versoes.values() for larguras in tipos.values() for versao in larguras.values()]
+
+
+def menor_versao(arquivo, largura, altura, proporcao = '1/1'):
+    """
+    Retorna a versão (Picture) de menor largura prevista para um original na `proporcao`, no tipo de arquivo mais
+    compatível (o último de file_types) que o Pillow sabe gravar, ou None se não houver nenhuma.
+
+    Usada nas miniaturas da listagem do admin. Como versoes_previstas, é calculada a partir do nome e das dimensões,
+    sem acessar o armazenamento.
+    """
+    from .models import Produto
+
+    campo = Produto._meta.get_field('imagem')
+    versoes = PictureFieldFile.get_picture_files(
+        file_name = arquivo, img_width = largura, img_height = altura, storage = campo.storage, field = campo)
+    for tipo in reversed(campo.file_types):
+        larguras = versoes.get(proporcao, {}).get(tipo)
+        if larguras and formato_suportado(tipo):
+            return larguras[min(larguras)]
+    return None
+
+
+def caminho_sob_demanda(versao):
+    # Caminho da versão na URL de versao_imagem: o nome do original (com a extensão, para encontrá-lo no banco),
+    # a proporção, a largura e o tipo de arquivo. Ex.: "produtos/<sha256>.jpg/1/400w.png".
+    proporcao = str(versao.aspect_ratio).replace('/', '_') if versao.aspect_ratio else 'original'
+    return f'{versao.parent_name}/{proporcao}/{versao.width}w.{versao.file_type.lower()}'
+
+
+def url_sob_demanda(versao):
+    """URL da view que gera a versão no primeiro pedido (veja core/views.py, versao_imagem)."""
+    return reverse('versao_imagem', kwargs = {'caminho': caminho_sob_demanda(versao)})
+
+
+def versao_do_caminho(caminho):
+    """
+    Retorna a versão (Picture) correspondente a um caminho de url_sob_demanda, ou None se ela não existir.
+
+    Só são aceitas versões previstas pela configuração atual do campo para o original de um produto existente:
+    a view não gera imagens de tamanhos ou tipos arbitrários pedidos na URL.
+    """
+    from .models import Produto
+
+    original = caminho.rsplit('/', 2)[0]
+    if not formato_suportado(posixpath.splitext(caminho)[1].lstrip('.')):
+        return None
+    dimensoes = Produto.objects.filter(imagem = original).values_list('image_width', 'image_height').first()
+    if not dimensoes or not all(dimensoes):
+        return None
+    return next((versao for versao in versoes_previstas(original, *dimensoes) if caminho_sob_demanda(versao) == caminho), None)
+
+
+def garantir_versao(versao):
+    """
+    Gera e grava a versão, se ainda não tiver sido gerada, e retorna a sua URL no armazenamento.
+
+    Parâmetros:
+    - versao (Picture): Versão a gerar (veja versao_do_caminho).
+
+    A trava é o próprio registro VersaoImagem (nome único): o pedido que consegue criá-lo gera a versão; os demais consultam
+    o registro a cada 100 ms até que ele fique pronto, e lançam VersaoOcupada após ESPERA_MAXIMA segundos.
+    Funciona entre os vários processos do gunicorn, pois a trava está no banco de dados.
+    """
+    from .models import VersaoImagem
+
+    limite = time.monotonic() + ESPERA_MAXIMA
+    while True:
+        registro = VersaoImagem.objects.filter(nome = versao.name).values_list('pronta', 'modificado').first()
+        if registro and registro[0]:
+            return url_midia(versao.name)
+
+        if registro is None:
+            try:
+                with transaction.atomic():
+                    VersaoImagem.objects.create(nome = versao.name, arquivo = versao.parent_name)
+                dono = True
+            except IntegrityError:
+                dono = False # Outro pedido criou o registro primeiro e está gerando a versão.
+        else:
+            # A trava expirou: assumimos a geração com um UPDATE condicional, como na reserva de tarefas de process_pictures.
+            dono = registro[1] < timezone.now() - timedelta(seconds = EXPIRACAO_TRAVA) and bool(
+                VersaoImagem.objects.filter(nome = versao.name, pronta = False, modificado = registro[1]).update(
+                    modificado = timezone.now()))
+
+        if dono:
+            try:
+                with versao.storage.open(versao.parent_name) as arquivo, Image.open(arquivo) as imagem:
+                    versao.save(imagem)
+            except BaseException:
+                VersaoImagem.objects.filter(nome = versao.name, pronta = False).delete() # Libera a trava.
+                raise
+            VersaoImagem.objects.filter(nome = versao.name).update(pronta = True, modificado = timezone.now())
+            return url_midia(versao.name)
+
+        if time.monotonic() > limite:
+            raise VersaoOcupada(versao.name)
+        time.sleep(0.1)
+
+
+def versoes_obsoletas(armazenamento, diretorio):
+    """
+    Gera os nomes dos arquivos de versão gravados em `diretorio` que a configuração atual não prevê mais.
+
+    Parâmetros:
+    - armazenamento (Storage): Armazenamento das imagens (o de Produto.imagem).
+    - diretorio (str): Diretório das imagens originais (o upload_to de Produto.imagem).
+
+    As versões de um original ficam em um subdiretório com o nome do original sem a extensão. São obsoletas as versões
+    fora da configuração atual e todas as versões de um original que nenhum produto usa. Originais sem dimensões
+    gravadas (image_width/image_height) são ignorados, por segurança.
+    """
+    from .models import Produto
+
+    originais = {}
+    for nome, largura, altura in Produto.objects.filter(imagem__startswith = f'{diretorio}/').values_list(
+            'imagem', 'image_width', 'image_height').distinct().iterator():
+        originais[posixpath.splitext(nome)[0]] = (nome, largura, altura)
+
+    subdiretorios, _ = armazenamento.listdir(diretorio)
+    for subdiretorio in subdiretorios:
+        raiz = posixpath.join(diretorio, subdiretorio)
+        original = originais.get(raiz)
+        if original and not all(original[1:]):
+            continue
+        previstas = {versao.name for versao in versoes_previstas(*original)} if original else set()
+        for nome in _arquivos(armazenamento, raiz):
+            if ARQUIVO_DE_VERSAO.search(nome) and nome not in previstas:
+                yield nome
+
+
+def _arquivos(armazenamento, diretorio):
+    subdiretorios, arquivos = armazenamento.listdir(diretorio)
+    for arquivo in arquivos:
+        yield posixpath.join(diretorio, arquivo)
+    for subdiretorio in subdiretorios:
+        yield from _arquivos(armazenamento, posixpath.join(diretorio, subdiretorio))
@@ -1,17 +1,55 @@
-from django.shortcuts import render, redirect
+import base64
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404, render, redirect
+from django.urls import reverse
+from django.utils.cache import add_never_cache_headers, get_conditional_response, patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_http_methods, require_safe
 from django.contrib import messages # Permite que sejam exibidas mensagens no contexto de nossa página/aplicação
 
+from .busca import pagina_da_busca, sugestoes as sugestoes_da_busca
 from .forms import ContatoForm, ProdutoModelForm
-from .models import Produto
+from .enderecos import validade_garantida
+from .envios import EnvioInvalido, cancelar_envio, criar_envio, receber_parte
+from .models import EnvioImagem, Produto
+from .cache_catalogo import pagina_do_catalogo
+from .facetas import FACETAS, consulta, contagens, filtrar, ler_filtros
+from .pagination import CursorInvalido
+from .instrumentacao import texto_prometheus
+from .versoes import VersaoOcupada, garantir_versao, versao_do_caminho
 
 # View 1
 def index(request):
-    # Aqui é criado um dicionário chamado context que será passado para o template.
-    # 'produtos' é a chave que o template usará para acessar os dados.
-    # Produto.objects.all() → busca todos os registros da tabela Produto no banco de dados (o modelo Produto provavelmente está definido no models.py).
-    # Ou seja, context["produtos"] conterá uma lista/QuerySet com todos os produtos.
+    # A listagem é paginada por cursor (veja core/pagination.py): cada página executa uma única consulta limitada,
+    # em vez de Produto.objects.all(), que buscava (e renderizava) o catálogo inteiro a cada requisição.
+    # Parâmetros aceitos na query string:
+    # - tamanho: quantidade de produtos por página (limitada por settings.CATALOGO_MAX_ITENS_POR_PAGINA);
+    # - depois / antes: cursores gerados pela própria página para avançar ou voltar.
+    # - preco, estoque e (apenas para a equipe) ativo: filtros por faceta (veja core/facetas.py).
+    # A página é montada a partir do cache do catálogo (veja core/cache_catalogo.py): cada item de 'produtos'
+    # é o HTML já renderizado de um produto, e o banco só é consultado para o que não estiver em cache.
+    tamanho = _tamanho_da_pagina(request)
+    filtros, facetas = _filtros_da_vitrine(request, request.user)
+    produtos = filtrar(Produto.objects.all(), filtros)
+    try:
+        pagina = pagina_do_catalogo(
+            produtos,
+            tamanho,
+            depois = request.GET.get('depois'),
+            antes = request.GET.get('antes'),
+            filtros = consulta(filtros),
+        )
+    except CursorInvalido:
+        pagina = pagina_do_catalogo(produtos, tamanho, filtros = consulta(filtros)) # Cursor adulterado ou expirado: exibimos a primeira página.
+
     context = {
-        'produtos': Produto.objects.all(),
+        'produtos': pagina.itens,
+        'pagina': pagina,
+        'facetas': contagens(filtros, facetas), # Opções de cada faceta com as quantidades, lidas do cubo (sem COUNT(*)).
+        'filtros': consulta(filtros), # Query string dos filtros, repetida nos links de navegação.
     }
     # A seguinte linha de código faz o seguinte:
     # 1) Recebe o request: É o objeto que representa a requisição HTTP feita pelo navegador (inclui informações como metodo, parâmetros, cookies etc.).
@@ -19,15 +57,55 @@ def index(request):
     # 2) Renderiza o template 'index.html': O Django procura o arquivo index.html na pasta de templates do projeto.
     # Esse HTML pode conter tags do Django como {% for %} ou {{ variável }}, que serão processadas antes do envio ao navegador.
     # 3) Passa dados para o template usando context: O context é um dicionário com variáveis que o template pode usar.
-    # Em nosso caso, context = {'produtos': Produto.objects.all()} significa que, no HTML, você pode acessar {{ produtos }} e iterar sobre ele com {% for produto in produtos %}.
     return render(request, 'index.html', context = context)
 
+def _filtros_da_vitrine(request, usuario):
+    # Filtros da vitrine e as facetas exibidas. Apenas produtos ativos aparecem na vitrine; a equipe (is_staff) pode
+    # também filtrar pelos inativos, com a faceta 'ativo'.
+    filtros = ler_filtros(request.GET)
+    if not usuario.is_staff or filtros['ativo'] is None:
+        filtros['ativo'] = True
+    facetas = FACETAS if usuario.is_staff else [faceta for faceta in FACETAS if faceta != 'ativo']
+    return filtros, facetas
+
+def _tamanho_da_pagina(request):
+    # Lê o parâmetro '?tamanho=' e o restringe ao intervalo [1, CATALOGO_MAX_ITENS_POR_PAGINA].
+    # Valores ausentes ou inválidos resultam no tamanho padrão definido em settings.CATALOGO_ITENS_POR_PAGINA.
+    try:
+        tamanho = int(request.GET.get('tamanho', settings.CATALOGO_ITENS_POR_PAGINA))
+    except ValueError:
+        tamanho = settings.CATALOGO_ITENS_POR_PAGINA
+    return max(1, min(tamanho, settings.CATALOGO_MAX_ITENS_POR_PAGINA))
+
+# A view a seguir busca produtos pelo nome e pelo slug (/busca/?q=...), do mais ao menos relevante (veja core/busca.py).
+# Os resultados usam as mesmas linhas em cache da vitrine; a navegação é pelo número da página ('?pagina=').
+@require_safe
+def busca(request):
+    termo = request.GET.get('q', '').strip()[:100]
+    try:
+        numero = max(int(request.GET.get('pagina', 1)), 1)
+    except ValueError:
+        numero = 1
+    pagina = pagina_da_busca(termo, _tamanho_da_pagina(request), numero)
+    return render(request, 'busca.html', {'termo': termo, 'produtos': pagina.itens, 'pagina': pagina})
+
+# A view a seguir responde ao autocompletar do campo de busca (/busca/sugestoes/?q=...) com até BUSCA_SUGESTOES produtos,
+# em JSON. As sugestões vêm do cache na maioria das vezes; o navegador pode reaproveitá-las por um minuto.
+@require_safe
+def sugestoes(request):
+    encontrados = sugestoes_da_busca(request.GET.get('q', '')[:100])
+    response = JsonResponse({'sugestoes': [
+        {'nome': produto['nome'], 'url': reverse('produto_detalhe', args = [produto['slug']])} for produto in encontrados
+    ]})
+    patch_cache_control(response, public = True, max_age = 60)
+    return response
+
 # View 2
 def contato(request):
     form = ContatoForm(request.POST or None) # Nosso objeto form pode ser um formulário preenchido ou vazio. Nosso form pode conter dados ou não. Conterá dados quando o usuário preencher o formulário e pressionar o botão "submit"; não conterá dados quando o usuário simplesmente carregar a página de contato
 
     if str(request.method) == 'POST': # Se o usuário preencheu corretamente o formulário e pressionou o botão "submit"
-        if str(form.is_valid()): # Objetos da classe forms.Form têm o metodo is_valid(): este metodo retorna True se o formulario nao tem erros e False, caso contrario. Para um formulario nao conter erros todos os campos devem estar devidamente preenchidos e o token de seguranca deve estar ok.
+        if form.is_valid(): # Objetos da classe forms.Form têm o metodo is_valid(): este metodo retorna True se o formulario nao tem erros e False, caso contrario. Para um formulario nao conter erros todos os campos devem estar devidamente preenchidos e o token de seguranca deve estar ok.
             # print(f"POST: {request.POST}")
             # nome = form.cleaned_data['nome'] # Metodo que armazena o valor submetido em um campo (para uma determinada chave informada) em uma variavel
             # email = form.cleaned_data['email']
@@ -54,7 +132,7 @@ def contato(request):
 def produto(request): # Define uma view Django chamada produto que recebe o objeto request.
     if str(request.user) != "AnonymousUser":
         if str(request.method) == 'POST': # Verifica se o metodo HTTP da requisição é POST (ou seja, envio de dados pelo formulário).
-            form = ProdutoModelForm(request.POST, request.FILES) # Cria uma instância do formulário ProdutoModelForm passando: 1) request.POST — dados do formulário enviados; 2) request.FILES — arquivos enviados (ex: imagem).
+            form = ProdutoModelForm(request.POST, request.FILES, usuario = request.user) # Cria uma instância do formulário ProdutoModelForm passando: 1) request.POST — dados do formulário enviados; 2) request.FILES — arquivos enviados (ex: imagem); 3) o usuário, dono dos envios em partes que o formulário aceita.
             if form.is_valid(): # Valida o formulário (checa se os dados estão corretos conforme regras do modelo e do formulário).
                 # prod = form.save(commit=False) # Cria o objeto prod do modelo Produto, mas ainda não salva no banco (commit=False).
                 # As 4 linhas de código a seguir imprimem no console os dados do produto (nome, preço, estoque, imagem).
@@ -77,3 +155,136 @@ def produto(request): # Define uma view Django chamada produto que recebe o obje
         return render(request, 'produto.html', context) # Renderiza o template produto.html, enviando o contexto com o formulário.
     else:
         return redirect("index") # O usuário só será permitido preencher o formulário se estiver logado/autenticado; caso contrário, ao tentar acessá-lo será redirecionado para a página index.html
+
+# View 4: página de detalhe de um produto, identificada pelo slug (/produto/<slug>/).
+# A resposta é condicional: o ETag e o Last-Modified vêm do campo 'modificado' do produto. Quando o navegador (ou uma CDN)
+# já tem a página e envia If-None-Match / If-Modified-Since, respondemos 304 sem renderizar o template.
+@require_safe
+def produto_detalhe(request, slug):
+    produto = get_object_or_404(Produto, slug = slug, ativo = True)
+    etag, modificado = _validadores(produto)
+    response = get_conditional_response(request, etag = etag, last_modified = modificado)
+    if response is None: # O cliente não tem a versão atual: renderizamos a página.
+        response = render(request, 'produto_detalhe.html', {'produto': produto})
+    return _com_validadores(response, etag, modificado)
+
+def _validadores(produto):
+    # Retorna o par (ETag, Last-Modified) da página de um produto.
+    # O ETag usa microssegundos, pois o Last-Modified (precisão de segundos) não distingue duas alterações no mesmo segundo.
+    etag = quote_etag(f"{produto.pk}-{int(produto.modificado.timestamp() * 1000000)}")
+    return etag, int(produto.modificado.timestamp())
+
+# A view a seguir entrega uma versão redimensionada de uma imagem de produto, gerando-a no primeiro pedido
+# (modo sob demanda, veja core/versoes.py). A resposta é um redirecionamento para o arquivo gravado no armazenamento
+# (no Render, o GCS), que o navegador guarda em cache: os bytes da imagem nunca passam pelo Django.
+# Se outro pedido estiver gerando a mesma versão por tempo demais, respondemos 503 com Retry-After.
+@require_safe
+def versao_imagem(request, caminho):
+    versao = versao_do_caminho(caminho)
+    if versao is None:
+        raise Http404("Versão de imagem inexistente.")
+    try:
+        url = garantir_versao(versao)
+    except VersaoOcupada:
+        return HttpResponse(status = 503, headers = {'Retry-After': '2'})
+    response = redirect(url)
+    max_age = settings.PRODUTO_VERSAO_CACHE_MAX_AGE
+    if validade_garantida() is not None: # Com URLs assinadas, o redirecionamento não pode durar mais que a assinatura.
+        max_age = min(max_age, validade_garantida())
+    patch_cache_control(response, public = True, max_age = max_age)
+    return response
+
+# A view a seguir expõe as métricas de todos os processos no formato do Prometheus (veja core/instrumentacao.py).
+# Com METRICAS_TOKEN definido, exige "Authorization: Bearer <token>"; sem ele, atende apenas a própria máquina.
+@require_safe
+def metricas(request):
+    if settings.METRICAS_TOKEN:
+        permitido = constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {settings.METRICAS_TOKEN}')
+    else:
+        permitido = request.META.get('REMOTE_ADDR') in ('127.0.0.1', '::1')
+    if not permitido:
+        return HttpResponse(status = 403)
+    response = HttpResponse(texto_prometheus(), content_type = 'text/plain; version=0.0.4; charset=utf-8')
+    add_never_cache_headers(response)
+    return response
+
+def _com_validadores(response, etag, modificado):
+    # Acrescenta os validadores e o Cache-Control à resposta (inclusive à 304, para o cliente renovar a validade da cópia).
+    # 'public' permite o armazenamento por CDNs; 'must-revalidate' faz com que, passado o max-age, a cópia seja revalidada.
+    response.headers.setdefault('ETag', etag)
+    response.headers.setdefault('Last-Modified', http_date(modificado))
+    patch_cache_control(response, public = True, max_age = settings.PRODUTO_CACHE_MAX_AGE, must_revalidate = True)
+    return response
+
+# Views 5 e 6: envio de imagens em partes, retomável (protocolo inspirado no tus; veja core/envios.py).
+# Assim como a view produto, exigem um usuário autenticado. As respostas seguem os cabeçalhos do tus:
+# Upload-Offset informa quantos bytes já foram recebidos e Upload-Length o tamanho total do arquivo.
+TUS_VERSAO = '1.0.0'
+
+def _resposta_tus(status, envio = None, **cabecalhos):
+    response = HttpResponse(status = status)
+    response['Tus-Resumable'] = TUS_VERSAO
+    response['Cache-Control'] = 'no-store' # O deslocamento muda a cada parte: a resposta nunca deve ser reaproveitada.
+    if envio is not None:
+        response['Upload-Offset'] = str(envio.recebido)
+        response['Upload-Length'] = str(envio.tamanho)
+    for nome, valor in cabecalhos.items():
+        response[nome.replace('_', '-')] = valor
+    return response
+
+def _nome_do_metadado(metadados):
+    # O cabeçalho Upload-Metadata traz pares "chave valor-em-base64" separados por vírgula; usamos a chave 'filename'.
+    for par in metadados.split(','):
+        chave, _, valor = par.strip().partition(' ')
+        if chave == 'filename':
+            try:
+                return base64.b64decode(valor).decode()
+            except ValueError:
+                return None
+    return None
+
+@require_http_methods(['POST'])
+def envios(request): # Cria um novo envio (POST /produto/envios/ com o cabeçalho Upload-Length).
+    if not request.user.is_authenticated:
+        return _resposta_tus(403)
+    try:
+        envio = criar_envio(
+            _nome_do_metadado(request.headers.get('Upload-Metadata', '')),
+            int(request.headers.get('Upload-Length', 0)),
+            usuario = request.user,
+        )
+    except ValueError:
+        return _resposta_tus(400)
+    except EnvioInvalido as e:
+        return HttpResponse(str(e), status = e.status)
+    return _resposta_tus(201, envio, Location = request.build_absolute_uri(f'{envio.pk}/'))
+
+@require_http_methods(['HEAD', 'PATCH', 'DELETE'])
+def envio(request, pk): # Consulta (HEAD), continua (PATCH) ou cancela (DELETE) um envio.
+    if not request.user.is_authenticated:
+        return _resposta_tus(403)
+    envio = get_object_or_404(EnvioImagem, pk = pk, usuario = request.user)
+
+    if request.method == 'HEAD':
+        return _resposta_tus(200, envio)
+    if request.method == 'DELETE':
+        cancelar_envio(envio)
+        return _resposta_tus(204)
+
+    if request.content_type != 'application/offset+octet-stream':
+        return _resposta_tus(415)
+    try:
+        envio = receber_parte(
+            envio,
+            int(request.headers.get('Upload-Offset', -1)),
+            request, # O corpo é lido diretamente do stream da requisição, em blocos, sem passar por request.body.
+            int(request.headers.get('Content-Length') or 0),
+            checksum = request.headers.get('Upload-Checksum'),
+        )
+    except ValueError:
+        return _resposta_tus(400)
+    except EnvioInvalido as e:
+        response = _resposta_tus(e.status, envio)
+        response.content = str(e)
+        return response
+    return _resposta_tus(204, envio)
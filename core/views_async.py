@@ -0,0 +1,102 @@
+# Versões assíncronas ("async def") das views index, contato e produto de core/views.py.
+# São usadas quando o projeto roda sob ASGI (Django2/asgi.py, servido por gunicorn com workers do uvicorn; veja gunicorn_asgi.conf.py).
+# Sob WSGI, cada requisição ocupa uma thread do worker do início ao fim, inclusive enquanto espera o banco, o cache ou o GCS.
+# Sob ASGI, enquanto uma view assíncrona aguarda (await) uma operação de I/O, o mesmo worker atende outras requisições.
+# Regras seguidas neste módulo, para que nenhuma chamada síncrona bloqueie o loop de eventos:
+# 1) o banco é acessado pelo ORM assíncrono (async for, acreate, asave, ain_bulk...) e o cache pelas APIs aget/aset;
+# 2) o que só existe em versão síncrona (validação de ModelForm, renderização com sessão/mensagens, gravação de arquivos
+#    no armazenamento) roda em uma thread via sync_to_async;
+# 3) o usuário é obtido com await request.auser(), e não com request.user (que consultaria a sessão de forma síncrona).
+
+from asgiref.sync import sync_to_async
+from django.contrib import messages
+from django.shortcuts import aget_object_or_404, redirect, render
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_safe
+
+from .cache_catalogo import apagina_do_catalogo
+from .facetas import acontagens, consulta, filtrar
+from .forms import ContatoForm, ProdutoModelForm
+from .models import Produto
+from .pagination import CursorInvalido
+from .views import _com_validadores, _filtros_da_vitrine, _tamanho_da_pagina, _validadores
+
+arender = sync_to_async(render)
+# render() em uma thread: os templates de contato e produto exibem as mensagens do framework de mensagens ({% bootstrap_messages %}),
+# que podem ser lidas da sessão (banco de dados).
+
+
+async def index(request):
+    # Mesma listagem paginada e em cache de views.index, montada com apagina_do_catalogo (core/cache_catalogo.py).
+    tamanho = _tamanho_da_pagina(request)
+    filtros, facetas = _filtros_da_vitrine(request, await request.auser())
+    produtos = filtrar(Produto.objects.all(), filtros)
+    try:
+        pagina = await apagina_do_catalogo(
+            produtos,
+            tamanho,
+            depois = request.GET.get('depois'),
+            antes = request.GET.get('antes'),
+            filtros = consulta(filtros),
+        )
+    except CursorInvalido:
+        pagina = await apagina_do_catalogo(produtos, tamanho, filtros = consulta(filtros))
+
+    context = {
+        'produtos': pagina.itens,
+        'pagina': pagina,
+        'facetas': await acontagens(filtros, facetas),
+        'filtros': consulta(filtros),
+    }
+    return await arender(request, 'index.html', context = context)
+    # Os produtos já chegam como fragmentos HTML, mas a renderização do restante da página (tags do bootstrap, campo de
+    # busca, {% static %}) continua síncrona e roda em uma thread, fora do loop de eventos.
+
+
+@require_safe
+async def produto_detalhe(request, slug):
+    # Mesma resposta condicional de views.produto_detalhe: um 304 custa apenas a consulta do produto, feita com o ORM assíncrono.
+    produto = await aget_object_or_404(Produto, slug = slug, ativo = True)
+    etag, modificado = _validadores(produto)
+    response = get_conditional_response(request, etag = etag, last_modified = modificado)
+    if response is None:
+        response = await arender(request, 'produto_detalhe.html', {'produto': produto})
+        # A tag imagem_responsiva consulta a fila de imagens (versoes_pendentes) e pode abrir o arquivo original.
+    return _com_validadores(response, etag, modificado)
+
+
+async def contato(request):
+    form = ContatoForm(request.POST or None)
+
+    if request.method == 'POST':
+        if form.is_valid(): # A validação de um forms.Form simples não faz I/O e pode rodar direto no loop de eventos.
+            await form.asend_mail() # Apenas grava a mensagem na caixa de saída; o SMTP é usado pelo comando send_outbox.
+            messages.success(request, 'Formulário enviado com sucesso!')
+            form = ContatoForm()
+        else:
+            messages.error(request, 'Erro ao enviar formulário!')
+
+    context = {
+        'form': form,
+    }
+    return await arender(request, 'contato.html', context)
+
+
+async def produto(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return redirect("index")
+
+    if request.method == 'POST':
+        form = ProdutoModelForm(request.POST, request.FILES, usuario = user)
+        if await sync_to_async(form.is_valid)():
+            # A validação do ModelForm consulta o banco (unicidade e o envio em partes informado), por isso roda em uma thread.
+            await form.asave()
+            messages.success(request, "Produto adicionado com sucesso!")
+        else:
+            messages.error(request, "Erro ao adicionar produto!")
+
+    context = {
+        'form': ProdutoModelForm(),
+    }
+    return await arender(request, 'produto.html', context)
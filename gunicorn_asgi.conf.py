@@ -0,0 +1,24 @@
+# Configuração do gunicorn para servir o projeto via ASGI, com workers do uvicorn.
+# Uso: gunicorn -c gunicorn_asgi.conf.py
+# O gunicorn continua gerenciando os processos (reinício de workers, timeouts, sinais), mas cada worker roda um loop de eventos
+# do uvicorn: enquanto uma view assíncrona (core/views_async.py) aguarda o banco, o cache ou o armazenamento,
+# o mesmo processo atende outras requisições, em vez de ficar parado como um worker síncrono do WSGI.
+# O arquivo não se chama gunicorn.conf.py de propósito: esse nome seria carregado automaticamente também
+# pelo comando "gunicorn Django2.wsgi:application", misturando as duas formas de execução.
+
+import os
+
+wsgi_app = 'Django2.asgi:application'
+# Apesar do nome da opção, o gunicorn apenas carrega o objeto indicado; quem fala ASGI com ele é o worker do uvicorn.
+
+worker_class = 'uvicorn_worker.UvicornWorker'
+
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+# No Render, WEB_CONCURRENCY é definida em render.yaml.
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+# O Render informa a porta na variável PORT.
+
+timeout = 60
+graceful_timeout = 30
+keepalive = 5